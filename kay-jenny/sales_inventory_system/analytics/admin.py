@@ -1,3 +1,12 @@
 from django.contrib import admin
+from .models import ProductForecast
 
-# Register your models here.
+
+@admin.register(ProductForecast)
+class ProductForecastAdmin(admin.ModelAdmin):
+    list_display = ['product', 'forecast_date', 'predicted_units', 'lower_bound', 'upper_bound', 'model_type', 'generated_at']
+    list_filter = ['model_type', 'forecast_date']
+    search_fields = ['product__name']
+    date_hierarchy = 'forecast_date'
+    list_select_related = ['product']
+    readonly_fields = ['generated_at']
@@ -0,0 +1,169 @@
+"""
+Forecast Backtesting
+
+Rolling-origin evaluation of the revenue forecast model variants:
+- Each origin fits on the history up to that day and forecasts the next
+  `horizon` days, which are compared with what actually happened
+- Accuracy: RMSE, MAE and MAPE (days with zero revenue are left out of MAPE)
+- Cost: fit+forecast time per origin and peak Python memory of one fit on
+  the largest training window (measured in a separate tracemalloc pass so
+  tracing does not distort the timings)
+- 'production' runs forecast_sales_holt_winters itself, including its
+  automatic fallback between multiplicative, additive and trend-only models
+"""
+
+import time
+import tracemalloc
+import warnings
+
+import numpy as np
+from statsmodels.tsa.holtwinters import ExponentialSmoothing
+
+from .forecasting import forecast_sales_holt_winters
+
+
+SEASONAL_PERIODS = 7
+
+
+def _exponential_smoothing(**model_kwargs):
+    def fit(train, horizon):
+        model = ExponentialSmoothing(
+            train.values,
+            seasonal_periods=SEASONAL_PERIODS if model_kwargs.get('seasonal') else None,
+            initialization_method='estimated',
+            **model_kwargs
+        )
+        return np.asarray(model.fit(optimized=True).forecast(horizon), dtype=float)
+    return fit
+
+
+def _seasonal_naive(train, horizon):
+    """Baseline: repeat the last week"""
+    last_week = train.values[-SEASONAL_PERIODS:]
+    return np.resize(last_week, horizon).astype(float)
+
+
+def _production(train, horizon):
+    result = forecast_sales_holt_winters(train, forecast_periods=horizon, seasonal_periods=SEASONAL_PERIODS)
+    if not result['success']:
+        raise ValueError(result['error'])
+    return np.array([point['value'] for point in result['forecast']], dtype=float)
+
+
+VARIANTS = {
+    'production': _production,
+    'holt_winters_mul': _exponential_smoothing(trend='add', seasonal='mul'),
+    'holt_winters_add': _exponential_smoothing(trend='add', seasonal='add'),
+    'holt_winters_damped': _exponential_smoothing(trend='add', damped_trend=True, seasonal='add'),
+    'holt': _exponential_smoothing(trend='add', seasonal=None),
+    'simple': _exponential_smoothing(trend=None, seasonal=None),
+    'seasonal_naive': _seasonal_naive,
+}
+
+
+def rolling_origin(series, fit, horizon=7, min_train=14, step=1):
+    """
+    Evaluate one variant over every origin.
+
+    Args:
+        series: pandas.Series of daily values
+        fit: callable(train Series, horizon) -> numpy array of forecasts
+        horizon: Days forecast from each origin
+        min_train: Days of history at the first origin
+        step: Days between origins
+
+    Returns:
+        dict: Accuracy, timing and memory figures for the variant
+    """
+    origins = list(range(min_train, len(series) - horizon + 1, step))
+    actuals, forecasts, fit_times = [], [], []
+    failures = 0
+
+    for origin in origins:
+        train = series.iloc[:origin]
+        started = time.perf_counter()
+        try:
+            forecast = fit(train, horizon)
+        except Exception:
+            failures += 1
+            continue
+        fit_times.append(time.perf_counter() - started)
+        actuals.append(series.values[origin:origin + horizon])
+        forecasts.append(np.clip(forecast, 0, None))
+
+    if not actuals:
+        return {'origins': len(origins), 'failures': failures, 'evaluated': 0}
+
+    actual = np.concatenate(actuals)
+    predicted = np.concatenate(forecasts)
+    errors = actual - predicted
+    nonzero = actual != 0
+
+    # Memory: one traced fit on the largest training window
+    peak_kb = None
+    tracemalloc.start()
+    try:
+        tracemalloc.reset_peak()
+        fit(series.iloc[:origins[-1]], horizon)
+        peak_kb = tracemalloc.get_traced_memory()[1] / 1024
+    except Exception:
+        pass
+    finally:
+        tracemalloc.stop()
+
+    return {
+        'origins': len(origins),
+        'failures': failures,
+        'evaluated': len(actuals),
+        'rmse': float(np.sqrt(np.mean(errors ** 2))),
+        'mae': float(np.mean(np.abs(errors))),
+        'mape': float(np.mean(np.abs(errors[nonzero] / actual[nonzero])) * 100) if nonzero.any() else None,
+        'fit_ms_mean': float(np.mean(fit_times) * 1000),
+        'fit_ms_total': float(np.sum(fit_times) * 1000),
+        'peak_memory_kb': peak_kb,
+    }
+
+
+def backtest(series, variants=None, horizon=7, min_train=14, step=1, tolerance=0.05):
+    """
+    Backtest several variants on the same series.
+
+    Args:
+        series: pandas.Series of daily values
+        variants: Variant names (default: all of VARIANTS)
+        horizon, min_train, step: See rolling_origin()
+        tolerance: Relative RMSE slack when recommending a cheaper variant
+
+    Returns:
+        dict: {'results': rows sorted by RMSE, 'best', 'recommended'}
+    """
+    if len(series) < min_train + horizon:
+        raise ValueError(
+            f"Need at least {min_train + horizon} days of history, have {len(series)}"
+        )
+
+    results = []
+    for name in variants or VARIANTS:
+        # Convergence warnings on short windows are expected; accuracy shows the effect
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore')
+            row = rolling_origin(series, VARIANTS[name], horizon=horizon, min_train=min_train, step=step)
+        row['variant'] = name
+        results.append(row)
+
+    scored = [row for row in results if row['evaluated'] and row['failures'] == 0]
+    scored.sort(key=lambda row: row['rmse'])
+    results = scored + [row for row in results if row not in scored]
+
+    best = scored[0] if scored else None
+    recommended = None
+    if best:
+        # Cheapest variant whose RMSE is within tolerance of the best
+        close = [row for row in scored if row['rmse'] <= best['rmse'] * (1 + tolerance)]
+        recommended = min(close, key=lambda row: row['fit_ms_mean'])
+
+    return {
+        'results': results,
+        'best': best['variant'] if best else None,
+        'recommended': recommended['variant'] if recommended else None,
+    }
@@ -0,0 +1,62 @@
+"""
+Per-Product Demand History
+
+Builds the product × day matrix of units sold from OrderItem in one query.
+Shared by reorder planning and per-product forecasting. Only orders with a
+completed payment count, dated by the payment (same basis as the revenue
+forecast in forecasting.prepare_sales_data).
+"""
+
+from datetime import timedelta
+
+import numpy as np
+from django.db.models import Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from sales_inventory_system.orders.models import OrderItem
+
+
+def product_demand_matrix(days=30, product_ids=None, end_date=None):
+    """
+    Daily units sold per product.
+
+    Args:
+        days: Number of days of history (ending today)
+        product_ids: Optional row order; defaults to every product that sold
+        end_date: Last day included (defaults to today)
+
+    Returns:
+        tuple: (product_ids list, dates list, numpy array of shape
+            (len(product_ids), len(dates)) with zeros for days without sales)
+    """
+    end_date = end_date or timezone.localdate()
+    start_date = end_date - timedelta(days=days - 1)
+    dates = [start_date + timedelta(days=offset) for offset in range(days)]
+
+    rows = OrderItem.objects.filter(
+        order__payment__status='COMPLETED',
+        order__payment__created_at__date__gte=start_date,
+        order__payment__created_at__date__lte=end_date,
+    ).annotate(
+        day=TruncDate('order__payment__created_at')
+    ).values_list('product_id', 'day').annotate(
+        units=Sum('quantity')
+    ).order_by()
+    rows = list(rows)
+
+    if product_ids is None:
+        product_ids = sorted({product_id for product_id, _, _ in rows})
+    product_ids = list(product_ids)
+
+    matrix = np.zeros((len(product_ids), len(dates)))
+    if not rows or not product_ids:
+        return product_ids, dates, matrix
+
+    row_index = {product_id: i for i, product_id in enumerate(product_ids)}
+    kept = [(row_index[p], (day - start_date).days, units)
+            for p, day, units in rows if p in row_index]
+    if kept:
+        r, c, v = (np.array(column) for column in zip(*kept))
+        np.add.at(matrix, (r.astype(int), c.astype(int)), v.astype(float))
+    return product_ids, dates, matrix
@@ -0,0 +1,247 @@
+"""
+Incremental Ledger Export
+
+Copies the sales and inventory ledgers out for offline analysis, writing
+only rows that are new or changed since the previous run:
+- Orders and payments change after they are created (status, amounts), so
+  they are tracked by an (updated_at, id) high-water mark
+- Order items, refunds and stock transactions are append-only and are
+  tracked by id
+- Rows newer than `settle` seconds are left for the next run, so rows from
+  transactions still committing are not skipped past
+- Reads go to the database's replica when one is configured and healthy
+
+Each database (head office and every branch) gets its own directory with
+one folder per table of gzip-compressed CSV parts and a manifest.json
+holding the column types, the watermarks and the list of parts. The
+manifest is only updated after a table's parts are complete, so an
+interrupted run is simply repeated by the next one. A changed order or
+payment appears again in a later part: readers keep the last copy of each
+id. Deleted rows are not tracked.
+
+Column values: ISO 8601 UTC timestamps, decimals as written in the database,
+true/false for booleans, foreign keys as <field>_id; an empty value is null
+for every column that is not a string.
+"""
+
+import csv
+import gzip
+import json
+import os
+from collections import namedtuple
+from datetime import datetime, timedelta, timezone as dt_timezone
+from pathlib import Path
+
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+
+from sales_inventory_system.orders.models import Order, OrderItem, Payment, Refund
+from sales_inventory_system.products.models import StockTransaction
+from sales_inventory_system.system.replicas import replica_for, replica_usable
+
+
+# name: folder and manifest key; changed_field: None for append-only tables
+Ledger = namedtuple('Ledger', ['name', 'model', 'changed_field'])
+
+LEDGERS = [
+    Ledger('orders', Order, 'updated_at'),
+    Ledger('order_items', OrderItem, None),
+    Ledger('payments', Payment, 'updated_at'),
+    Ledger('refunds', Refund, None),
+    Ledger('stock_transactions', StockTransaction, None),
+]
+
+MANIFEST_NAME = 'manifest.json'
+CHUNK_SIZE = 2000
+
+
+def export_targets(codes=None):
+    """
+    (directory name, database alias) pairs to export: every branch plus head
+    office, like the branch rollup, or only the given branch codes.
+    """
+    targets = [(code, branch['database']) for code, branch in settings.BRANCHES.items()]
+    if codes:
+        return [(code, alias) for code, alias in targets if code in codes]
+    if 'default' not in {alias for code, alias in targets}:
+        targets.insert(0, ('head_office', 'default'))
+    return targets
+
+
+def column_schema(model):
+    """[{'name', 'type', 'nullable'}] for a model's concrete fields"""
+    columns = []
+    for field in model._meta.concrete_fields:
+        internal = field.get_internal_type()
+        if field.is_relation:
+            column_type = 'int64'
+        elif internal in ('AutoField', 'BigAutoField', 'IntegerField', 'BigIntegerField',
+                          'PositiveIntegerField', 'PositiveBigIntegerField', 'PositiveSmallIntegerField',
+                          'SmallIntegerField'):
+            column_type = 'int64'
+        elif internal == 'DecimalField':
+            column_type = f'decimal({field.max_digits},{field.decimal_places})'
+        elif internal == 'DateTimeField':
+            column_type = 'timestamp[utc]'
+        elif internal == 'DateField':
+            column_type = 'date'
+        elif internal == 'BooleanField':
+            column_type = 'bool'
+        elif internal == 'FloatField':
+            column_type = 'float64'
+        elif internal == 'JSONField':
+            column_type = 'json'
+        else:
+            column_type = 'string'
+        columns.append({'name': field.attname, 'type': column_type, 'nullable': field.null})
+    return columns
+
+
+def _csv_value(value):
+    if value is None:
+        return ''
+    if isinstance(value, bool):
+        return 'true' if value else 'false'
+    if isinstance(value, datetime):
+        return value.astimezone(dt_timezone.utc).isoformat() if timezone.is_aware(value) else value.isoformat()
+    if isinstance(value, (dict, list)):
+        return json.dumps(value)
+    return value
+
+
+def load_manifest(directory):
+    path = Path(directory) / MANIFEST_NAME
+    if not path.exists():
+        return {'tables': {}}
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def _save_manifest(directory, manifest):
+    path = Path(directory) / MANIFEST_NAME
+    partial = path.with_name(f"{MANIFEST_NAME}.tmp")
+    with open(partial, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(partial, path)
+
+
+def _changed_rows(ledger, alias, watermark, cutoff):
+    """Rows past the watermark and older than the cutoff, in watermark order"""
+    rows = ledger.model.objects.using(alias)
+    if ledger.changed_field:
+        field = ledger.changed_field
+        rows = rows.filter(**{f'{field}__lt': cutoff})
+        if watermark:
+            last_changed = datetime.fromisoformat(watermark[field])
+            rows = rows.filter(
+                Q(**{f'{field}__gt': last_changed}) | Q(**{field: last_changed, 'id__gt': watermark['id']})
+            )
+        return rows.order_by(field, 'id')
+
+    rows = rows.filter(created_at__lt=cutoff)
+    if watermark:
+        rows = rows.filter(id__gt=watermark['id'])
+    return rows.order_by('id')
+
+
+def _export_ledger(ledger, alias, directory, state, run_stamp, rows_per_file):
+    """Write one table's new parts; returns (rows, parts, new watermark)"""
+    columns = [column['name'] for column in column_schema(ledger.model)]
+    cutoff = timezone.now() - timedelta(seconds=state['settle'])
+    rows = _changed_rows(ledger, alias, state['watermark'], cutoff).values_list(*columns)
+
+    table_dir = Path(directory) / ledger.name
+    table_dir.mkdir(parents=True, exist_ok=True)
+    watermark_index = columns.index(ledger.changed_field) if ledger.changed_field else None
+    id_index = columns.index('id')
+
+    parts = []
+    watermark = state['watermark']
+    handle = writer = None
+    part_rows = total = 0
+    try:
+        for row in rows.iterator(chunk_size=CHUNK_SIZE):
+            if writer is None:
+                name = f"{run_stamp}-{len(parts) + 1:04d}.csv.gz"
+                handle = gzip.open(table_dir / f"{name}.part", 'wt', newline='', encoding='utf-8')
+                writer = csv.writer(handle)
+                writer.writerow(columns)
+            writer.writerow([_csv_value(value) for value in row])
+            part_rows += 1
+            total += 1
+
+            watermark = {'id': row[id_index]}
+            if watermark_index is not None:
+                watermark[ledger.changed_field] = row[watermark_index].isoformat()
+
+            if part_rows >= rows_per_file:
+                handle.close()
+                os.replace(table_dir / f"{name}.part", table_dir / name)
+                parts.append({'file': f"{ledger.name}/{name}", 'rows': part_rows})
+                handle = writer = None
+                part_rows = 0
+        if writer is not None:
+            handle.close()
+            os.replace(table_dir / f"{name}.part", table_dir / name)
+            parts.append({'file': f"{ledger.name}/{name}", 'rows': part_rows})
+    except BaseException:
+        # Nothing from an unfinished table is kept; the next run starts from the old watermark
+        if handle is not None:
+            handle.close()
+            (table_dir / f"{name}.part").unlink(missing_ok=True)
+        for part in parts:
+            (Path(directory) / part['file']).unlink(missing_ok=True)
+        raise
+
+    return total, parts, watermark
+
+
+def export_ledgers(output_dir, codes=None, settle=60, rows_per_file=100000, full=False):
+    """
+    Export new and changed ledger rows for each target database.
+
+    Args:
+        output_dir: Root directory (one subdirectory per branch)
+        codes: Only these branch codes (default: every branch and head office)
+        settle: Seconds of the newest rows left for the next run
+        rows_per_file: Rows per compressed CSV part
+        full: Ignore the stored watermarks and export everything again
+
+    Returns:
+        list: [{'target', 'table', 'rows', 'parts'}] for every table exported
+    """
+    run_stamp = timezone.now().strftime('%Y%m%dT%H%M%S')
+    results = []
+    for target, alias in export_targets(codes):
+        directory = Path(output_dir) / target
+        directory.mkdir(parents=True, exist_ok=True)
+        manifest = load_manifest(directory)
+        manifest['database'] = alias
+
+        # Long scans stay off the primary when the target has a healthy replica
+        replica = replica_for(alias)
+        read_alias = replica if replica and replica_usable(replica) else alias
+        # A replica may be up to REPLICA_MAX_LAG behind; don't move the watermark past what it has
+        target_settle = max(settle, settings.REPLICA_MAX_LAG) if read_alias != alias else settle
+
+        for ledger in LEDGERS:
+            table = manifest['tables'].setdefault(ledger.name, {'files': []})
+            if full:
+                for part in table['files']:
+                    (directory / part['file']).unlink(missing_ok=True)
+                table.update(files=[], watermark=None)
+            state = {'watermark': table.get('watermark'), 'settle': target_settle}
+            rows, parts, watermark = _export_ledger(ledger, read_alias, directory, state, run_stamp, rows_per_file)
+
+            table.update(
+                schema=column_schema(ledger.model),
+                key='id',
+                incremental_by=ledger.changed_field or 'id',
+                watermark=watermark,
+                last_run=timezone.now().isoformat(),
+            )
+            table['files'].extend(parts)
+            _save_manifest(directory, manifest)
+            results.append({'target': target, 'table': ledger.name, 'rows': rows, 'parts': len(parts)})
+    return results
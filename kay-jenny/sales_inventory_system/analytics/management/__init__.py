@@ -0,0 +1 @@
+# Empty file for Python package
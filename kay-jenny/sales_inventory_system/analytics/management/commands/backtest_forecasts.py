@@ -0,0 +1,83 @@
+"""
+Management command to backtest the revenue forecast model variants
+Run with: python manage.py backtest_forecasts --history 60 --horizon 7
+
+Rolling-origin evaluation over the stored daily revenue (completed
+payments): every variant is refit at each origin and scored on the days
+that followed. Reports RMSE/MAE/MAPE with fit time and memory per variant,
+and recommends the cheapest variant that is about as accurate as the best.
+
+Works on the history generated by:
+    python manage.py seed_comprehensive_data --days 60
+"""
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+
+class Command(BaseCommand):
+    help = 'Backtest forecast model variants with rolling-origin evaluation'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--history', type=int, default=60, help='Days of sales history to use')
+        parser.add_argument('--horizon', type=int, default=7, help='Days forecast from each origin')
+        parser.add_argument('--min-train', type=int, default=14, help='Training days at the first origin')
+        parser.add_argument('--step', type=int, default=1, help='Days between origins')
+        parser.add_argument('--variant', action='append', dest='variants', help='Only this variant (repeatable)')
+        parser.add_argument('--tolerance', type=float, default=0.05, help='RMSE slack for recommending a cheaper variant')
+        parser.add_argument('--json', help='Also write the results to this JSON file')
+
+    def handle(self, *args, **options):
+        from sales_inventory_system.analytics.backtesting import VARIANTS, backtest
+        from sales_inventory_system.analytics.forecasting import prepare_sales_data
+
+        unknown = set(options['variants'] or []) - set(VARIANTS)
+        if unknown:
+            raise CommandError(f"Unknown variant(s): {', '.join(sorted(unknown))}. Choose from {', '.join(VARIANTS)}")
+
+        series = prepare_sales_data(days=options['history'])
+        if series.sum() == 0:
+            raise CommandError('No completed sales in the history window (seed with seed_comprehensive_data)')
+
+        try:
+            report = backtest(
+                series,
+                variants=options['variants'],
+                horizon=options['horizon'],
+                min_train=options['min_train'],
+                step=options['step'],
+                tolerance=options['tolerance'],
+            )
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Backtest over {len(series)} days, horizon {options['horizon']}, "
+            f"first origin after {options['min_train']} days"
+        ))
+        self.stdout.write(
+            f"  {'Variant':<22} {'RMSE':>10} {'MAE':>10} {'MAPE':>8} {'Fit (mean)':>11} {'Fit (total)':>12} {'Peak mem':>10}"
+        )
+        for row in report['results']:
+            if not row['evaluated'] or row['failures']:
+                self.stdout.write(self.style.WARNING(
+                    f"  {row['variant']:<22} failed at {row['failures']} of {row['origins']} origin(s)"
+                ))
+                continue
+            mape = f"{row['mape']:.1f}%" if row['mape'] is not None else 'n/a'
+            memory = f"{row['peak_memory_kb']:.0f} KB" if row['peak_memory_kb'] is not None else 'n/a'
+            self.stdout.write(
+                f"  {row['variant']:<22} {row['rmse']:>10.2f} {row['mae']:>10.2f} {mape:>8} "
+                f"{row['fit_ms_mean']:>9.1f}ms {row['fit_ms_total']:>10.0f}ms {memory:>10}"
+            )
+
+        if report['best']:
+            self.stdout.write(f"\n  Most accurate: {report['best']}")
+            self.stdout.write(self.style.SUCCESS(
+                f"  Recommended (cheapest within {options['tolerance']:.0%} of best RMSE): {report['recommended']}"
+            ))
+
+        if options['json']:
+            with open(options['json'], 'w', encoding='utf-8') as f:
+                json.dump(report, f, indent=2)
+            self.stdout.write(f"Saved to {options['json']}")
@@ -0,0 +1,49 @@
+"""
+Management command to summarize sales and stock health across branches
+Run with: python manage.py branch_rollup --days 7 [--json rollup.json]
+
+Queries every branch database (BRANCH_DATABASES) with the same aggregates:
+revenue, paid orders, average ticket, top products, ingredients below
+minimum and waste entries, plus head office totals.
+"""
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+
+class Command(BaseCommand):
+    help = 'Cross-branch sales and stock rollup for head office'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=7, help='Days of sales to include')
+        parser.add_argument('--top', type=int, default=5, help='Top products to list')
+        parser.add_argument('--json', help='Also write the rollup to this JSON file')
+
+    def handle(self, *args, **options):
+        from sales_inventory_system.analytics.rollup import branch_rollup
+
+        if options['days'] < 1 or options['top'] < 1:
+            raise CommandError('--days and --top must be at least 1')
+
+        rollup = branch_rollup(days=options['days'], top=options['top'])
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Branch rollup {rollup['start']:%Y-%m-%d %H:%M} to {rollup['end']:%Y-%m-%d %H:%M}"
+        ))
+        self.stdout.write(
+            f"  {'Branch':<20} {'Revenue':>12} {'Orders':>8} {'Avg ticket':>11} {'Low stock':>10} {'Waste':>7}"
+        )
+        for row in rollup['branches'] + [dict(rollup['totals'], name='All branches')]:
+            self.stdout.write(
+                f"  {row['name'][:20]:<20} {row['revenue']:>12,.2f} {row['orders']:>8} "
+                f"{row['average_ticket']:>11,.2f} {row['low_stock']:>10} {row['waste_entries']:>7}"
+            )
+
+        self.stdout.write('\n  Top products (all branches):')
+        for row in rollup['totals']['top_products']:
+            self.stdout.write(f"    {row['product'][:30]:<30} {row['units']:>6} units  {row['revenue']:>12,.2f}")
+
+        if options['json']:
+            with open(options['json'], 'w', encoding='utf-8') as f:
+                json.dump(rollup, f, indent=2, default=str)
+            self.stdout.write(f"Saved to {options['json']}")
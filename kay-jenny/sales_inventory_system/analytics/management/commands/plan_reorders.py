@@ -0,0 +1,83 @@
+"""
+Management command to turn expected product demand into ingredient reorders
+Run with: python manage.py plan_reorders --days 7 --lead-time 2
+
+Builds the products × ingredients recipe matrix (sub-recipes flattened),
+multiplies it by per-product daily demand (stored forecasts from
+forecast_products where available, otherwise recent sales), and
+prints the required quantity, reorder point and suggested order size for
+every ingredient. Use --csv to save the plan for purchasing.
+"""
+import csv
+
+from django.core.management.base import BaseCommand, CommandError
+
+
+class Command(BaseCommand):
+    help = 'Plan ingredient reorders from product demand and recipes'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=7, help='Planning horizon in days')
+        parser.add_argument('--history', type=int, default=30, help='Days of sales history to estimate demand from')
+        parser.add_argument('--lead-time', type=int, default=2, help='Supplier lead time in days')
+        parser.add_argument('--service-level', type=float, default=0.95, help='Target in-stock probability (0-1)')
+        parser.add_argument('--no-forecasts', action='store_true', help='Ignore stored product forecasts, use sales history only')
+        parser.add_argument('--only-reorder', action='store_true', help='List only ingredients at or below their reorder point')
+        parser.add_argument('--csv', help='Also write the plan to this CSV file')
+
+    def handle(self, *args, **options):
+        from sales_inventory_system.analytics.reorder import plan_reorders
+
+        if options['days'] < 1 or options['history'] < 1 or options['lead_time'] < 0:
+            raise CommandError('--days and --history must be at least 1, --lead-time at least 0')
+
+        try:
+            plan = plan_reorders(
+                days_ahead=options['days'],
+                history_days=options['history'],
+                lead_time_days=options['lead_time'],
+                service_level=options['service_level'],
+                use_forecasts=not options['no_forecasts'],
+            )
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        rows = plan['ingredients']
+        if options['only_reorder']:
+            rows = [row for row in rows if row['needs_reorder']]
+
+        matrix = plan['matrix']
+        self.stdout.write(self.style.SUCCESS(
+            f"Reorder plan for the next {options['days']} day(s) "
+            f"({matrix['products']} products x {matrix['ingredients']} ingredients, {matrix['nonzeros']} recipe entries)"
+        ))
+        self.stdout.write(
+            f"  Demand: forecast for {plan['forecast_products']} product(s), sales history for the rest"
+        )
+        self.stdout.write(
+            f"  {'Ingredient':<30} {'Unit':<5} {'Stock':>10} {'Use/day':>10} {'Required':>10} "
+            f"{'Reorder at':>10} {'Order':>10}"
+        )
+        for row in rows:
+            line = (
+                f"  {row['ingredient'].name[:30]:<30} {row['ingredient'].unit:<5} {row['current_stock']:>10.2f} "
+                f"{row['daily_usage']:>10.2f} {row['required']:>10.2f} {row['reorder_point']:>10.2f} "
+                f"{row['suggested_order']:>10.2f}"
+            )
+            self.stdout.write(self.style.WARNING(line) if row['needs_reorder'] else line)
+        self.stdout.write(f"\n  {plan['reorder_count']} ingredient(s) at or below their reorder point")
+
+        if options['csv']:
+            with open(options['csv'], 'w', newline='', encoding='utf-8') as f:
+                writer = csv.writer(f)
+                writer.writerow([
+                    'ingredient', 'unit', 'current_stock', 'daily_usage', 'required', 'safety_stock',
+                    'reorder_point', 'suggested_order', 'days_of_cover', 'needs_reorder',
+                ])
+                for row in rows:
+                    writer.writerow([
+                        row['ingredient'].name, row['ingredient'].unit, row['current_stock'], row['daily_usage'],
+                        row['required'], row['safety_stock'], row['reorder_point'], row['suggested_order'],
+                        row['days_of_cover'], row['needs_reorder'],
+                    ])
+            self.stdout.write(f"Saved to {options['csv']}")
@@ -0,0 +1,36 @@
+# Generated by Django 5.2.8 on 2026-10-19 06:41
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        ('products', '0008_recipe_sub_recipes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductForecast',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('forecast_date', models.DateField(db_index=True)),
+                ('predicted_units', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('lower_bound', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('upper_bound', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('std_error', models.DecimalField(decimal_places=3, help_text='Residual standard error of the fit (units/day)', max_digits=10)),
+                ('model_type', models.CharField(choices=[('HOLT_WINTERS', 'Holt-Winters (trend + weekly season)'), ('HOLT', 'Holt (trend only)'), ('MOVING_AVERAGE', 'Moving average'), ('NO_SALES', 'No recent sales')], max_length=20)),
+                ('generated_at', models.DateTimeField(db_index=True)),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='forecasts', to='products.product')),
+            ],
+            options={
+                'verbose_name': 'Product Forecast',
+                'verbose_name_plural': 'Product Forecasts',
+                'ordering': ['product', 'forecast_date'],
+                'unique_together': {('product', 'forecast_date')},
+            },
+        ),
+    ]
@@ -1,3 +1,38 @@
 from django.db import models
 
-# Create your models here.
+
+class ProductForecast(models.Model):
+    """Forecast units sold for one product on one future day (written by forecast_products)"""
+
+    MODEL_CHOICES = [
+        ('HOLT_WINTERS', 'Holt-Winters (trend + weekly season)'),
+        ('HOLT', 'Holt (trend only)'),
+        ('MOVING_AVERAGE', 'Moving average'),
+        ('NO_SALES', 'No recent sales'),
+    ]
+
+    product = models.ForeignKey(
+        'products.Product',
+        on_delete=models.CASCADE,
+        related_name='forecasts'
+    )
+    forecast_date = models.DateField(db_index=True)
+    predicted_units = models.DecimalField(max_digits=10, decimal_places=2)
+    lower_bound = models.DecimalField(max_digits=10, decimal_places=2)
+    upper_bound = models.DecimalField(max_digits=10, decimal_places=2)
+    std_error = models.DecimalField(
+        max_digits=10,
+        decimal_places=3,
+        help_text="Residual standard error of the fit (units/day)"
+    )
+    model_type = models.CharField(max_length=20, choices=MODEL_CHOICES)
+    generated_at = models.DateTimeField(db_index=True)
+
+    class Meta:
+        ordering = ['product', 'forecast_date']
+        unique_together = ('product', 'forecast_date')
+        verbose_name = "Product Forecast"
+        verbose_name_plural = "Product Forecasts"
+
+    def __str__(self):
+        return f"{self.product.name} on {self.forecast_date}: {self.predicted_units}"
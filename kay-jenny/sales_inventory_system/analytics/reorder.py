@@ -0,0 +1,151 @@
+"""
+Demand-Driven Reorder Planning
+
+Turns expected product demand into ingredient purchase needs:
+- Sparse products × ingredients matrix from each recipe's flattened
+  explosion (sub-recipes already expanded to raw ingredients)
+- Per-product daily demand (mean and spread) from the stored per-product
+  forecasts (forecast_products), falling back to OrderItem history
+- Ingredient usage = matrixᵀ · demand, computed for every ingredient at once
+- Safety stock from the usage spread, lead time and service level
+- Reorder point (never below the ingredient's min_stock) and an order-up-to
+  suggestion for ingredients at or below it
+
+Like forecasting.py this pulls in NumPy/SciPy, so import it lazily.
+"""
+
+import math
+
+import numpy as np
+from scipy import sparse
+from scipy.stats import norm
+from django.utils import timezone
+
+from sales_inventory_system.products.models import Ingredient, RecipeItem
+from .demand import product_demand_matrix
+
+
+def build_recipe_matrix():
+    """
+    Build the recipe matrix for active (non-archived) products.
+
+    Returns:
+        tuple: (product_ids, ingredient_ids, scipy.sparse.csr_matrix of
+            raw ingredient quantity per product unit)
+    """
+    recipes = RecipeItem.objects.filter(product__is_archived=False)
+
+    missing = list(recipes.filter(explosion__isnull=True).values_list('id', flat=True))
+    if missing:
+        from sales_inventory_system.products.recipe_service import RecipeService
+        RecipeService.rebuild_explosions(missing)
+
+    explosions = list(recipes.order_by('product_id').values_list('product_id', 'explosion'))
+    product_ids = [product_id for product_id, _ in explosions]
+    ingredient_ids = sorted({int(key) for _, explosion in explosions for key in (explosion or {})})
+    column = {ingredient_id: j for j, ingredient_id in enumerate(ingredient_ids)}
+
+    rows, cols, values = [], [], []
+    for i, (_, explosion) in enumerate(explosions):
+        for ingredient_id, quantity in (explosion or {}).items():
+            rows.append(i)
+            cols.append(column[int(ingredient_id)])
+            values.append(float(quantity))
+
+    matrix = sparse.csr_matrix(
+        (values, (rows, cols)), shape=(len(product_ids), len(ingredient_ids))
+    )
+    return product_ids, ingredient_ids, matrix
+
+
+def plan_reorders(days_ahead=7, history_days=30, lead_time_days=2, service_level=0.95, demand=None,
+                  use_forecasts=True):
+    """
+    Compute ingredient requirements and reorder suggestions.
+
+    Args:
+        days_ahead: Planning horizon in days
+        history_days: Days of sales history used to estimate demand
+        lead_time_days: Days between placing and receiving an order
+        service_level: Probability of not running out during the lead time
+        demand: Optional {product_id: (daily mean, daily std)} overriding the
+            history estimate
+        use_forecasts: When no demand is given, use stored ProductForecast
+            rows for products that have them
+
+    Returns:
+        dict: Per-ingredient plan rows plus matrix/parameter info
+    """
+    if not 0 < service_level < 1:
+        raise ValueError("service_level must be between 0 and 1")
+
+    product_ids, ingredient_ids, matrix = build_recipe_matrix()
+    _, _, history = product_demand_matrix(days=history_days, product_ids=product_ids)
+
+    # Demand vector (units/day) and its spread, one entry per matrix row
+    mean = history.mean(axis=1) if history.size else np.zeros(len(product_ids))
+    std = history.std(axis=1) if history.size else np.zeros(len(product_ids))
+    if demand is None and use_forecasts:
+        from .product_forecasting import stored_product_demand
+        demand = stored_product_demand(days_ahead)
+    if demand:
+        for i, product_id in enumerate(product_ids):
+            if product_id in demand:
+                mean[i], std[i] = demand[product_id]
+
+    # The whole explosion in two sparse products (independent daily demand)
+    usage = matrix.T @ mean
+    usage_std = np.sqrt(matrix.T.power(2) @ (std ** 2))
+
+    ingredients = Ingredient.objects.in_bulk(ingredient_ids)
+    current = np.array([float(ingredients[i].current_stock) for i in ingredient_ids])
+    minimum = np.array([float(ingredients[i].min_stock) for i in ingredient_ids])
+
+    z = float(norm.ppf(service_level))
+    required = usage * days_ahead
+    safety_stock = z * usage_std * math.sqrt(lead_time_days)
+    reorder_point = np.maximum(usage * lead_time_days + safety_stock, minimum)
+    # At or below the reorder point, order up to the point plus the horizon's usage
+    needs_reorder = current <= reorder_point
+    order_up_to = reorder_point + required
+    suggested = np.where(needs_reorder, np.maximum(order_up_to - current, 0), 0)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        days_of_cover = np.where(usage > 0, current / usage, np.inf)
+
+    plan = []
+    for j, ingredient_id in enumerate(ingredient_ids):
+        ingredient = ingredients[ingredient_id]
+        if not ingredient.is_active:
+            continue
+        plan.append({
+            'ingredient': ingredient,
+            'daily_usage': round(float(usage[j]), 3),
+            'required': round(float(required[j]), 3),
+            'safety_stock': round(float(safety_stock[j]), 3),
+            'reorder_point': round(float(reorder_point[j]), 3),
+            'current_stock': float(current[j]),
+            'days_of_cover': None if math.isinf(days_of_cover[j]) else round(float(days_of_cover[j]), 1),
+            'suggested_order': round(float(suggested[j]), 3),
+            'needs_reorder': bool(needs_reorder[j]),
+        })
+
+    plan.sort(key=lambda row: (not row['needs_reorder'], row['days_of_cover'] if row['days_of_cover'] is not None else float('inf')))
+
+    return {
+        'success': True,
+        'generated_at': timezone.now().isoformat(),
+        'parameters': {
+            'days_ahead': days_ahead,
+            'history_days': history_days,
+            'lead_time_days': lead_time_days,
+            'service_level': service_level,
+        },
+        'forecast_products': sum(1 for product_id in product_ids if product_id in (demand or {})),
+        'matrix': {
+            'products': len(product_ids),
+            'ingredients': len(ingredient_ids),
+            'nonzeros': int(matrix.nnz),
+        },
+        'ingredients': plan,
+        'reorder_count': sum(1 for row in plan if row['needs_reorder']),
+    }
@@ -0,0 +1,103 @@
+"""
+Head Office Rollup
+
+Cross-branch summary for head office. Every branch database is queried with
+the same few aggregate queries (no rows are copied between databases):
+- Revenue, paid orders and average ticket (completed payments)
+- Units and revenue per product, combined across branches by product name
+- Ingredients below minimum stock and waste logged
+
+Head office's own database is included as 'head office' when it has sales,
+so a single-store install keeps working before any branch is added.
+"""
+
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import Count, F, Sum
+from django.utils import timezone
+
+from sales_inventory_system.orders.models import OrderItem, Payment
+from sales_inventory_system.products.models import Ingredient, WasteLog
+
+
+def _branch_summary(alias, start, end, top):
+    payments = Payment.objects.using(alias).filter(
+        status='COMPLETED', created_at__gte=start, created_at__lt=end
+    ).aggregate(revenue=Sum('amount'), orders=Count('id'))
+    revenue = float(payments['revenue'] or 0)
+
+    products = list(
+        OrderItem.objects.using(alias).filter(
+            order__payment__status='COMPLETED',
+            order__payment__created_at__gte=start,
+            order__payment__created_at__lt=end,
+        ).values('product_name').annotate(units=Sum('quantity'), revenue=Sum('subtotal')).order_by('-units')
+    )
+    waste = WasteLog.objects.using(alias).filter(
+        waste_date__gte=start, waste_date__lt=end
+    ).aggregate(entries=Count('id'))
+
+    return {
+        'revenue': revenue,
+        'orders': payments['orders'],
+        'average_ticket': round(revenue / payments['orders'], 2) if payments['orders'] else 0.0,
+        'top_products': [
+            {'product': row['product_name'], 'units': row['units'], 'revenue': float(row['revenue'] or 0)}
+            for row in products[:top]
+        ],
+        'low_stock': Ingredient.objects.using(alias).filter(
+            is_active=True, current_stock__lt=F('min_stock')
+        ).count(),
+        'waste_entries': waste['entries'],
+        '_products': products,
+    }
+
+
+def branch_rollup(days=7, top=5, end=None):
+    """
+    Summarize sales and stock health for every branch.
+
+    Args:
+        days: Days back from end
+        top: Top products listed per branch and overall
+        end: End of the window (default: now)
+
+    Returns:
+        dict: {'start', 'end', 'branches': [rows], 'totals': row}
+    """
+    end = end or timezone.now()
+    start = end - timedelta(days=days)
+
+    targets = [(code, branch['name'], branch['database']) for code, branch in settings.BRANCHES.items()]
+    branch_aliases = {alias for code, name, alias in targets}
+    if 'default' not in branch_aliases:
+        targets.insert(0, ('', 'Head office', 'default'))
+
+    rows = []
+    combined = {}
+    for code, name, alias in targets:
+        summary = _branch_summary(alias, start, end, top)
+        if alias == 'default' and not code and not summary['orders']:
+            continue
+        for row in summary.pop('_products'):
+            total = combined.setdefault(row['product_name'], {'product': row['product_name'], 'units': 0, 'revenue': 0.0})
+            total['units'] += row['units']
+            total['revenue'] += float(row['revenue'] or 0)
+        rows.append({'branch': code, 'name': name, 'database': alias, **summary})
+
+    revenue = sum(row['revenue'] for row in rows)
+    orders = sum(row['orders'] for row in rows)
+    return {
+        'start': start,
+        'end': end,
+        'branches': rows,
+        'totals': {
+            'revenue': revenue,
+            'orders': orders,
+            'average_ticket': round(revenue / orders, 2) if orders else 0.0,
+            'top_products': sorted(combined.values(), key=lambda row: -row['units'])[:top],
+            'low_stock': sum(row['low_stock'] for row in rows),
+            'waste_entries': sum(row['waste_entries'] for row in rows),
+        },
+    }
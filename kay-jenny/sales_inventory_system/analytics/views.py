@@ -1,16 +1,21 @@
+import hashlib
+
 from django.shortcuts import render
 from django.contrib.auth.decorators import login_required, user_passes_test
 from django.http import JsonResponse
-from django.db.models import Sum, Count, F, Q, Case, When, Value, DecimalField, Prefetch
+from django.db.models import Sum, Count, Max, F, Q, Case, When, Value, DecimalField, Prefetch
 from django.db.models.functions import Cast, Coalesce, TruncDate
 from django.utils import timezone
 from django.views.decorators.cache import cache_page
-from django.core.cache import cache
 from datetime import timedelta, datetime
 from decimal import Decimal
 from sales_inventory_system.orders.models import Order, Payment, OrderItem
 from sales_inventory_system.products.models import Product
-from .forecasting import forecast_sales, forecast_ingredient_stock
+from sales_inventory_system.sales_inventory.single_flight import get_or_compute
+from sales_inventory_system.system.conditional import get_version
+from sales_inventory_system.system.replicas import replica_reads
+from sales_inventory_system.system.views import queue_export
+from .models import ProductForecast
 
 
 def is_admin(user):
@@ -21,11 +26,27 @@ def is_cashier(user):
     return user.is_authenticated and user.is_cashier
 
 
+def _report_cache_key(name, *filters):
+    """
+    Cache key for a filtered sales report. It carries the orders version,
+    so a new payment starts a fresh entry instead of waiting out the timeout.
+    """
+    digest = hashlib.md5(repr(filters).encode()).hexdigest()
+    return f"{name}_{get_version('orders')}_{digest}"
+
+
 @login_required
 @user_passes_test(is_admin)
-@cache_page(300)  # Cache for 5 minutes
+@replica_reads
 def dashboard(request):
     """Display analytics dashboard with comprehensive sales data"""
+    # Shared by all admins for 5 minutes; one request rebuilds it at a time
+    context = get_or_compute('analytics_dashboard', _dashboard_context, timeout=300, stale=600)
+    return render(request, 'analytics/dashboard.html', context)
+
+
+def _dashboard_context():
+    """Dashboard figures (plain data, so the result can be cached)"""
 
     # Date ranges
     today = timezone.now().date()
@@ -172,9 +193,9 @@ def dashboard(request):
     low_stock_products = low_stock_products[:10]
 
     # Recent orders - optimized with prefetch_related for order items
-    recent_orders = Order.objects.select_related('payment').prefetch_related(
+    recent_orders = list(Order.objects.select_related('payment').prefetch_related(
         'items__product'
-    ).order_by('-created_at')[:10]
+    ).order_by('-created_at')[:10])
 
     context = {
         # Revenue metrics
@@ -201,13 +222,13 @@ def dashboard(request):
         # Recent activity
         'recent_orders': recent_orders,
     }
-    return render(request, 'analytics/dashboard.html', context)
+    return context
 
 
 @login_required
 @user_passes_test(is_admin)
 @cache_page(60)  # Cache for 1 minute
-def sales_data_api(request):
+async def sales_data_api(request):
     """API endpoint for sales data (for charts) - Optimized to use single query"""
     from django.db.models.functions import TruncDate, TruncHour
 
@@ -230,7 +251,7 @@ def sales_data_api(request):
         # Create hour lookup for easy access
         hour_dict = {
             item['hour'].hour: float(item['total'] or 0)
-            for item in hourly_data
+            async for item in hourly_data
         }
 
         for hour in range(24):
@@ -255,7 +276,7 @@ def sales_data_api(request):
         # Create date lookup
         date_dict = {
             item['date']: float(item['total'] or 0)
-            for item in daily_data
+            async for item in daily_data
         }
 
         for i in range(7):
@@ -281,7 +302,7 @@ def sales_data_api(request):
         # Create date lookup
         date_dict = {
             item['date']: float(item['total'] or 0)
-            for item in daily_data
+            async for item in daily_data
         }
 
         for i in range(30):
@@ -333,27 +354,61 @@ def sales_forecast(request):
     if days_ahead not in valid_forecast:
         days_ahead = 7  # Default
 
-    # Sales forecast (existing)
-    cache_key = f'forecast_{days_back}_{days_ahead}'
-    forecast_result = cache.get(cache_key)
+    # Forecasts are refit by one request at a time; while that runs, other
+    # requests get the previous result (see sales_inventory/single_flight.py).
+    # Imported lazily so pandas and statsmodels are only loaded by workers
+    # that actually fit a model.
+    def fit_sales_forecast():
+        from .forecasting import forecast_sales
+        return forecast_sales(days_back=days_back, days_ahead=days_ahead)
+
+    def fit_ingredient_forecast():
+        from .forecasting import forecast_ingredient_stock
+        return forecast_ingredient_stock(days_ahead=days_ahead)
+
+    def run_stockout_simulation():
+        from .stockout import simulate_stockouts
+        return simulate_stockouts(days_ahead=days_ahead)
+
+    # Sales forecast: fresh for 30 minutes
+    forecast_result = get_or_compute(
+        f'forecast_{days_back}_{days_ahead}', fit_sales_forecast, timeout=1800, stale=3600, wait=30
+    )
 
-    if forecast_result is None:
-        # Generate forecast only if not cached
-        forecast_result = forecast_sales(days_back=days_back, days_ahead=days_ahead)
-        # Cache for 30 minutes
-        cache.set(cache_key, forecast_result, 1800)
+    # Ingredient forecast
+    ingredient_forecast_result = get_or_compute(
+        f'ingredient_forecast_{days_ahead}', fit_ingredient_forecast, timeout=1800, stale=3600, wait=30
+    )
 
-    # Ingredient forecast (new)
-    ingredient_cache_key = f'ingredient_forecast_{days_ahead}'
-    ingredient_forecast_result = cache.get(ingredient_cache_key)
+    # Stockout probabilities (Monte Carlo over past daily deductions).
+    # Fast enough to run live; cached briefly like the dashboard.
+    stockout_risk = get_or_compute(
+        f'stockout_risk_{days_ahead}', run_stockout_simulation, timeout=300, stale=600
+    )
 
-    if ingredient_forecast_result is None:
-        ingredient_forecast_result = forecast_ingredient_stock(days_ahead=days_ahead)
-        cache.set(ingredient_cache_key, ingredient_forecast_result, 1800)
+    # Per-product demand from the nightly forecast_products run (stored rows)
+    forecast_start = timezone.localdate()
+    product_forecasts = list(
+        ProductForecast.objects.filter(
+            forecast_date__gte=forecast_start,
+            forecast_date__lt=forecast_start + timedelta(days=days_ahead),
+        ).values('product__name').annotate(
+            total_units=Sum('predicted_units'),
+            lower=Sum('lower_bound'),
+            upper=Sum('upper_bound'),
+            days=Count('id'),
+        ).order_by('-total_units')[:15]
+    )
+    product_forecast_generated = ProductForecast.objects.filter(
+        forecast_date__gte=forecast_start
+    ).aggregate(latest=Max('generated_at'))['latest']
 
     context = {
         'forecast_result': forecast_result,
         'ingredient_forecast': ingredient_forecast_result,
+        'stockout_risk': stockout_risk,
+        'product_forecasts': product_forecasts,
+        'product_forecast_generated': product_forecast_generated,
         'days_back': days_back,
         'days_ahead': days_ahead,
         'historical_options': HISTORICAL_OPTIONS,
@@ -365,6 +420,7 @@ def sales_forecast(request):
 
 @login_required
 @user_passes_test(is_admin)
+@replica_reads
 def sales_report(request):
     """
     Payment drawer / Sales report with filters:
@@ -377,6 +433,67 @@ def sales_report(request):
     payment_method = request.GET.get('payment_method', 'ALL')
     days_filter = request.GET.get('days', '')  # 1, 7, 30, 90
 
+    # CSV of every matching payment is built by the export worker (Export button POSTs the filters)
+    if request.method == 'POST':
+        return queue_export(request, 'SALES', {
+            key: request.POST.get(key, '') for key in ('date_from', 'date_to', 'payment_method', 'days')
+        })
+
+    # One request at a time runs the aggregates for a filter combination
+    report = get_or_compute(
+        _report_cache_key('sales_report', date_from, date_to, payment_method, days_filter),
+        lambda: _sales_report_data(date_from, date_to, payment_method, days_filter),
+        timeout=60, stale=60,
+    )
+    recent_payments = report['payments']
+
+    # Handle AJAX requests
+    if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
+        payments_data = []
+        for payment in recent_payments:
+            payments_data.append({
+                'id': payment.id,
+                'order_id': payment.order.id,
+                'order_number': payment.order.order_number,
+                'customer_name': payment.order.customer_name or 'Walk-in',
+                'method': payment.method,
+                'amount': float(payment.amount),
+                'created_at': payment.created_at.strftime('%b %d, %Y'),
+                'created_time': payment.created_at.strftime('%I:%M %p'),
+                'processed_by': payment.processed_by.username if payment.processed_by else 'System',
+            })
+
+        return JsonResponse({
+            'success': True,
+            'payments': payments_data,
+            'summary': {
+                'total_sales': float(report['total_sales']),
+                'cash_total': float(report['cash_total']),
+                'gcash_total': float(report['gcash_total']),
+                'transaction_count': report['transaction_count'],
+                'cash_count': report['cash_count'],
+                'gcash_count': report['gcash_count'],
+            },
+            'filters': {
+                'date_from': date_from,
+                'date_to': date_to,
+                'payment_method': payment_method,
+                'days_filter': days_filter,
+            }
+        })
+
+    context = {
+        **report,
+        'date_from': date_from,
+        'date_to': date_to,
+        'payment_method': payment_method,
+        'days_filter': days_filter,
+    }
+    return render(request, 'analytics/sales_report.html', context)
+
+
+def _sales_report_data(date_from, date_to, payment_method, days_filter):
+    """Totals and latest payments for sales_report (cacheable)"""
     # Build queryset - only COMPLETED payments
     payments = Payment.objects.filter(status='COMPLETED').select_related('order', 'processed_by')
 
@@ -414,44 +531,9 @@ def sales_report(request):
     gcash_count = payments.filter(method='GCASH').count()
 
     # Get recent payments (limit for performance)
-    recent_payments = payments.order_by('-created_at')[:100]
-
-    # Handle AJAX requests
-    if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
-        payments_data = []
-        for payment in recent_payments:
-            payments_data.append({
-                'id': payment.id,
-                'order_id': payment.order.id,
-                'order_number': payment.order.order_number,
-                'customer_name': payment.order.customer_name or 'Walk-in',
-                'method': payment.method,
-                'amount': float(payment.amount),
-                'created_at': payment.created_at.strftime('%b %d, %Y'),
-                'created_time': payment.created_at.strftime('%I:%M %p'),
-                'processed_by': payment.processed_by.username if payment.processed_by else 'System',
-            })
+    recent_payments = list(payments.order_by('-created_at')[:100])
 
-        return JsonResponse({
-            'success': True,
-            'payments': payments_data,
-            'summary': {
-                'total_sales': float(total_sales),
-                'cash_total': float(cash_total),
-                'gcash_total': float(gcash_total),
-                'transaction_count': transaction_count,
-                'cash_count': cash_count,
-                'gcash_count': gcash_count,
-            },
-            'filters': {
-                'date_from': date_from,
-                'date_to': date_to,
-                'payment_method': payment_method,
-                'days_filter': days_filter,
-            }
-        })
-
-    context = {
+    return {
         'payments': recent_payments,
         'total_sales': total_sales,
         'cash_total': cash_total,
@@ -459,16 +541,12 @@ def sales_report(request):
         'transaction_count': transaction_count,
         'cash_count': cash_count,
         'gcash_count': gcash_count,
-        'date_from': date_from,
-        'date_to': date_to,
-        'payment_method': payment_method,
-        'days_filter': days_filter,
     }
-    return render(request, 'analytics/sales_report.html', context)
 
 
 @login_required
 @user_passes_test(is_cashier)
+@replica_reads
 def cashier_sales_report(request):
     """
     Cashier sales report - shows only sales processed by the current cashier
@@ -519,19 +597,27 @@ def cashier_sales_report(request):
     else:
         payment_method = 'ALL'
 
-    # Calculate totals - use optimized single query with annotations
-    aggregates = payments.aggregate(
-        total=Coalesce(Sum('amount'), Decimal('0.00')),
-        cash_total=Coalesce(Sum('amount', filter=Q(method='CASH')), Decimal('0.00')),
-        gcash_total=Coalesce(Sum('amount', filter=Q(method='GCASH')), Decimal('0.00')),
-        transaction_count=Count('id'),
-        cash_count=Count('id', filter=Q(method='CASH')),
-        gcash_count=Count('id', filter=Q(method='GCASH')),
+    def build_report():
+        # Calculate totals - use optimized single query with annotations
+        aggregates = payments.aggregate(
+            total=Coalesce(Sum('amount'), Decimal('0.00')),
+            cash_total=Coalesce(Sum('amount', filter=Q(method='CASH')), Decimal('0.00')),
+            gcash_total=Coalesce(Sum('amount', filter=Q(method='GCASH')), Decimal('0.00')),
+            transaction_count=Count('id'),
+            cash_count=Count('id', filter=Q(method='CASH')),
+            gcash_count=Count('id', filter=Q(method='GCASH')),
+        )
+        # Get recent payments (limit for performance)
+        return aggregates, list(payments[:100])
+
+    # Per cashier and filter combination; a repeated refresh reuses the result
+    aggregates, recent_payments = get_or_compute(
+        _report_cache_key(
+            'cashier_sales_report', request.user.pk, date_from, date_to, payment_method, days_filter
+        ),
+        build_report, timeout=60, stale=60,
     )
 
-    # Get recent payments (limit for performance)
-    recent_payments = list(payments[:100])
-
     # Handle AJAX requests
     if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
         payments_data = []
@@ -1,4 +1,6 @@
 from django.contrib import admin
+
+from sales_inventory_system.system.admin_mixins import LargeTableAdminMixin
 from .models import Order, OrderItem, Payment, Refund
 
 class OrderItemInline(admin.TabularInline):
@@ -11,27 +13,30 @@ class OrderItemInline(admin.TabularInline):
         return super().get_queryset(request).select_related('product')
 
 @admin.register(Order)
-class OrderAdmin(admin.ModelAdmin):
+class OrderAdmin(LargeTableAdminMixin, admin.ModelAdmin):
     list_display = ['order_number', 'customer_name', 'status', 'total_amount', 'created_at']
     list_filter = ['status', 'created_at']
     search_fields = ['order_number', 'customer_name', 'table_number']
     readonly_fields = ['order_number', 'created_at', 'updated_at']
     inlines = [OrderItemInline]
-
-    def get_queryset(self, request):
-        """Optimize queryset with select_related for foreign keys"""
-        return super().get_queryset(request).select_related('processed_by', 'payment')
+    date_hierarchy = 'created_at'
+    sortable_by = ['order_number', 'created_at']
+    # The list shows no related rows; change forms load their own
+    list_select_related = False
+    list_only_fields = ['order_number', 'customer_name', 'status', 'total_amount', 'created_at']
+    autocomplete_fields = ['processed_by']
 
 @admin.register(Payment)
-class PaymentAdmin(admin.ModelAdmin):
+class PaymentAdmin(LargeTableAdminMixin, admin.ModelAdmin):
     list_display = ['order', 'method', 'status', 'amount', 'created_at']
     list_filter = ['method', 'status', 'created_at']
     search_fields = ['order__order_number', 'reference_number']
     readonly_fields = ['created_at', 'updated_at']
-
-    def get_queryset(self, request):
-        """Optimize queryset with select_related for foreign keys"""
-        return super().get_queryset(request).select_related('order', 'processed_by')
+    date_hierarchy = 'created_at'
+    sortable_by = ['created_at']
+    list_select_related = ['order']
+    list_only_fields = ['method', 'status', 'amount', 'created_at', 'order__order_number', 'order__status']
+    autocomplete_fields = ['order', 'processed_by']
 
 
 @admin.register(Refund)
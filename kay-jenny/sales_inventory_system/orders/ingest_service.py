@@ -0,0 +1,450 @@
+"""
+Offline Order Ingestion
+
+POS terminals that lose their connection keep selling and queue each sale
+locally under a client-generated key. On reconnect the queue is uploaded in
+batches, and each batch is handled set-based:
+- Products with their recipes, already-synced keys and the ingredients the
+  batch touches are loaded with one query each (ingredients locked)
+- Orders are checked against stock in the order sent, so earlier sales win
+  when an ingredient runs short; a rejected order does not block the rest
+- Orders, items, payments, stock transactions and audit rows written with
+  bulk_create, stock changed with a single set-based UPDATE
+- A key that was already synced (or repeats within the batch) is reported
+  as a duplicate with its existing order number, so resending a batch after
+  a lost response never records a sale twice; a key committed by a
+  concurrent sync between the check and the insert (unique violation on
+  client_key) is handled the same way, by running the batch again
+
+Sales are priced at the current menu price, as in pos_checkout, and keep
+the time the terminal recorded them - the order, its payment and its stock
+deductions alike, so usage reports put the ingredients in the same period
+as the sale. They are not pushed to live screens
+(they were served while offline); order lists pick them up through the
+orders version.
+"""
+
+import uuid
+from decimal import Decimal
+
+from django.contrib.contenttypes.models import ContentType
+from django.db import IntegrityError
+from django.db.models import Case, DateTimeField, DecimalField, F, Value, When
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from sales_inventory_system.products.menu_service import MenuService
+from sales_inventory_system.products.models import Ingredient, Product, RecipeItem, StockTransaction
+from sales_inventory_system.products.movement_service import audit_stock_transactions
+from sales_inventory_system.system.activity import record_activity
+from sales_inventory_system.system.branches import branch_atomic
+from sales_inventory_system.system.conditional import bump_version
+from sales_inventory_system.system.events import publish_low_stock
+from sales_inventory_system.system.models import AuditLog
+from sales_inventory_system.system.signals import get_current_user, serialize_model_instance
+from .models import Order, OrderItem, Payment
+
+
+class OrderIngestError(Exception):
+    """Raised when a batch of offline orders cannot be processed at all"""
+    pass
+
+
+MAX_BATCH_ORDERS = 200
+PAYMENT_METHODS = {code for code, label in Payment.METHOD_CHOICES}
+
+
+def _client_key(order):
+    key = str(order.get('client_key') or '').strip()
+    if not key:
+        raise ValueError('client_key is required')
+    if len(key) > Order._meta.get_field('client_key').max_length:
+        raise ValueError('client_key is too long')
+    return key
+
+
+def _text(order, name, default=''):
+    value = str(order.get(name) or '').strip() or default
+    max_length = Order._meta.get_field(name).max_length
+    if max_length and len(value) > max_length:
+        raise ValueError(f'{name} is longer than {max_length} characters')
+    return value
+
+
+def _parse_order(order):
+    """Normalize one queued order; raises ValueError with the reason it is invalid"""
+    items = order.get('items')
+    if not isinstance(items, list) or not items:
+        raise ValueError('items must be a non-empty list')
+
+    lines = []
+    for number, item in enumerate(items, start=1):
+        try:
+            product_id = int(item.get('product_id'))
+            quantity = int(item.get('quantity'))
+        except (AttributeError, TypeError, ValueError):
+            raise ValueError(f'Item {number}: invalid product_id or quantity')
+        if quantity < 1:
+            raise ValueError(f'Item {number}: quantity must be at least 1')
+        lines.append((product_id, quantity))
+
+    payment_method = str(order.get('payment_method') or 'CASH').strip().upper()
+    if payment_method not in PAYMENT_METHODS:
+        raise ValueError(f"Unknown payment_method {order.get('payment_method')!r}")
+
+    created_at = None
+    if order.get('created_at'):
+        created_at = parse_datetime(str(order['created_at']))
+        if created_at is None:
+            raise ValueError(f"Invalid created_at {order['created_at']!r}")
+        if timezone.is_naive(created_at):
+            created_at = timezone.make_aware(created_at)
+        # A terminal clock running fast must not put sales in the future
+        created_at = min(created_at, timezone.now())
+
+    return {
+        'customer_name': _text(order, 'customer_name', 'Walk-in Customer'),
+        'table_number': _text(order, 'table_number'),
+        'notes': _text(order, 'notes'),
+        'payment_method': payment_method,
+        'created_at': created_at,
+        'lines': lines,
+    }
+
+
+def _parse_batch(orders):
+    """First pass: parse every order without touching the database"""
+    entries = []
+    for order in orders:
+        entry = {'key': None, 'order': None, 'error': None}
+        try:
+            entry['key'] = _client_key(order)
+            entry['order'] = _parse_order(order)
+        except ValueError as e:
+            entry['error'] = str(e)
+        entries.append(entry)
+    return entries
+
+
+def _is_client_key_conflict(error, entries):
+    """Whether an IntegrityError is another request committing some of these keys first"""
+    if 'client_key' not in str(error):
+        return False
+    keys = {entry['key'] for entry in entries if entry['key']}
+    return Order.objects.filter(client_key__in=keys).exists()
+
+
+def _at_sale_time(field, sold_at):
+    """CASE giving each order's time of sale, keyed on the column holding its id"""
+    return Case(
+        *[When(**{field: order_id}, then=Value(value)) for order_id, value in sold_at.items()],
+        output_field=DateTimeField(),
+    )
+
+
+def _audit_orders(orders, payments, user=None):
+    """
+    Write the audit rows (and activity counts) the Order and Payment post_save
+    signals would have written; bulk_create does not send them.
+    """
+    audit_user = get_current_user() or user
+    order_type = ContentType.objects.get_for_model(Order)
+    payment_type = ContentType.objects.get_for_model(Payment)
+    entries = [
+        AuditLog(
+            user=audit_user,
+            action='CREATE',
+            content_type=order_type,
+            object_id=order.id,
+            model_name='Order',
+            record_id=order.id,
+            description=f'Created order {order.order_number} - {order.get_status_display()} (offline sync)',
+            data_after=serialize_model_instance(order),
+        )
+        for order in orders
+    ]
+    entries.extend(
+        AuditLog(
+            user=audit_user,
+            action='CREATE',
+            content_type=payment_type,
+            object_id=payment.id,
+            model_name='Payment',
+            record_id=payment.id,
+            description=f'Payment created: {payment.get_method_display()} ₱{payment.amount} for {order.order_number}',
+            data_after=serialize_model_instance(payment),
+        )
+        for order, payment in zip(orders, payments)
+    )
+    record_activity(AuditLog.objects.bulk_create(entries))
+
+
+class OrderIngestService:
+    """Service for syncing batches of orders queued offline by POS terminals"""
+
+    @staticmethod
+    def ingest_orders(orders, user=None):
+        """
+        Record a batch of queued sales in one transaction.
+
+        Args:
+            orders: List of dicts with 'client_key', 'items' ([{'product_id',
+                'quantity'}]) and optional 'customer_name', 'table_number',
+                'notes', 'payment_method' and 'created_at' (ISO 8601 time of
+                the sale)
+            user: Cashier the sales are recorded for
+
+        Raises:
+            OrderIngestError: If the batch is larger than MAX_BATCH_ORDERS
+            IntegrityError: For any constraint failure other than a
+                concurrently synced client_key
+
+        Returns:
+            dict: {'created', 'duplicates', 'rejected', 'results'}; results
+                holds one entry per order, in the order sent, with
+                'client_key', 'status' (created / duplicate / rejected) and
+                'order_id' and 'order_number', or 'error'
+        """
+        if len(orders) > MAX_BATCH_ORDERS:
+            raise OrderIngestError(f'At most {MAX_BATCH_ORDERS} orders can be synced per request')
+
+        entries = _parse_batch(orders)
+        try:
+            return OrderIngestService._ingest(entries, user)
+        except IntegrityError as e:
+            if not _is_client_key_conflict(e, entries):
+                raise
+        # The transaction rolled back; this time those keys are found and
+        # reported as duplicates with their stored order numbers
+        return OrderIngestService._ingest(_parse_batch(orders), user)
+
+    @staticmethod
+    def _ingest(entries, user):
+        """Check and record parsed entries in one transaction (see ingest_orders)"""
+        product_ids = {
+            product_id
+            for entry in entries if entry['order']
+            for product_id, quantity in entry['order']['lines']
+        }
+
+        with branch_atomic():
+            products = Product.objects.select_related('recipe').in_bulk(product_ids)
+            explosions = {}
+            for product in products.values():
+                try:
+                    explosions[product.id] = product.recipe.get_explosion()
+                except RecipeItem.DoesNotExist:
+                    pass
+
+            # Lock every ingredient the batch may touch in one query; concurrent
+            # syncs of the same sales wait here and then see each other's keys
+            ingredients = Ingredient.objects.select_for_update().in_bulk(
+                {ingredient_id for explosion in explosions.values() for ingredient_id in explosion}
+            )
+            synced = {
+                key: (order_id, order_number)
+                for key, order_id, order_number in Order.objects.filter(
+                    client_key__in={entry['key'] for entry in entries if entry['key']}
+                ).values_list('client_key', 'id', 'order_number')
+            }
+
+            # SECOND PASS: check each order against the stock left by the ones before it
+            remaining = {ingredient_id: ingredient.current_stock for ingredient_id, ingredient in ingredients.items()}
+            first_seen = {}
+            accepted = []
+            for index, entry in enumerate(entries):
+                key = entry['key']
+                if key in synced:
+                    entry['status'] = 'duplicate'
+                    continue
+                if key in first_seen:
+                    entry['repeat_of'] = first_seen[key]
+                    continue
+                if key:
+                    first_seen[key] = index
+                if entry['error']:
+                    entry['status'] = 'rejected'
+                    continue
+
+                try:
+                    entry['needed'] = OrderIngestService._ingredients_needed(
+                        entry['order']['lines'], products, explosions, ingredients
+                    )
+                    for ingredient_id, total_needed in entry['needed'].items():
+                        if remaining[ingredient_id] < total_needed:
+                            ingredient = ingredients[ingredient_id]
+                            raise ValueError(
+                                f"Insufficient '{ingredient.name}'. Need {total_needed} {ingredient.unit}, "
+                                f"but only {remaining[ingredient_id]} available."
+                            )
+                except ValueError as e:
+                    entry.update(status='rejected', error=str(e))
+                    continue
+
+                for ingredient_id, total_needed in entry['needed'].items():
+                    remaining[ingredient_id] -= total_needed
+                entry['status'] = 'created'
+                accepted.append(entry)
+
+            if accepted:
+                OrderIngestService._write_orders(accepted, products, explosions, ingredients, user)
+
+        results = []
+        for entry in entries:
+            if 'repeat_of' in entry:
+                first = entries[entry['repeat_of']]
+                # Same key twice in one batch: one sale, reported like its first copy
+                entry.update(
+                    status='duplicate' if first['status'] in ('created', 'duplicate') else 'rejected',
+                    error=first['error'],
+                )
+                if first['status'] == 'created':
+                    synced[entry['key']] = (first['instance'].id, first['instance'].order_number)
+
+            result = {'client_key': entry['key'], 'status': entry['status']}
+            if entry['status'] == 'created':
+                result.update(
+                    order_id=entry['instance'].id,
+                    order_number=entry['instance'].order_number,
+                    total_amount=float(entry['instance'].total_amount),
+                )
+            elif entry['status'] == 'duplicate':
+                result['order_id'], result['order_number'] = synced[entry['key']]
+            else:
+                result['error'] = entry['error']
+            results.append(result)
+
+        return {
+            'created': len(accepted),
+            'duplicates': sum(1 for result in results if result['status'] == 'duplicate'),
+            'rejected': sum(1 for result in results if result['status'] == 'rejected'),
+            'results': results,
+        }
+
+    @staticmethod
+    def _ingredients_needed(lines, products, explosions, ingredients):
+        """{ingredient_id: total quantity} for one order; ValueError if it cannot be made"""
+        needed = {}
+        for product_id, quantity in lines:
+            product = products.get(product_id)
+            if product is None:
+                raise ValueError(f'Unknown product id {product_id}')
+            # STRICT: as at the counter, every product must have a recipe
+            if product_id not in explosions:
+                raise ValueError(f"Product '{product.name}' does not have a recipe defined.")
+            for ingredient_id, per_unit in explosions[product_id].items():
+                if ingredient_id not in ingredients:
+                    raise ValueError(f"Recipe for '{product.name}' uses a missing ingredient")
+                needed[ingredient_id] = needed.get(ingredient_id, Decimal('0')) + per_unit * quantity
+        return needed
+
+    @staticmethod
+    def _write_orders(accepted, products, explosions, ingredients, user):
+        """Bulk-write accepted orders and their stock deductions (inside the batch transaction)"""
+        now = timezone.now()
+
+        new_orders = []
+        for entry in accepted:
+            data = entry['order']
+            entry['instance'] = Order(
+                # save() is skipped by bulk_create; numbered the same way
+                order_number=f"ORD-{uuid.uuid4().hex[:8].upper()}",
+                customer_name=data['customer_name'],
+                table_number=data['table_number'],
+                notes=data['notes'],
+                status='FINISHED',
+                total_amount=sum(products[product_id].price * quantity for product_id, quantity in data['lines']),
+                processed_by=user,
+                client_key=entry['key'],
+            )
+            new_orders.append(entry['instance'])
+        Order.objects.bulk_create(new_orders)
+
+        OrderItem.objects.bulk_create([
+            OrderItem(
+                order=entry['instance'],
+                product=products[product_id],
+                product_name=products[product_id].name,
+                product_price=products[product_id].price,
+                quantity=quantity,
+                subtotal=products[product_id].price * quantity,
+            )
+            for entry in accepted
+            for product_id, quantity in entry['order']['lines']
+        ])
+        payments = Payment.objects.bulk_create([
+            Payment(
+                order=entry['instance'],
+                method=entry['order']['payment_method'],
+                amount=entry['instance'].total_amount,
+                status='COMPLETED',
+                processed_by=user,
+            )
+            for entry in accepted
+        ])
+
+        # auto_now_add stamped the sync time; sales reports need the time of sale
+        sold_at = {
+            entry['instance'].id: entry['order']['created_at']
+            for entry in accepted if entry['order']['created_at']
+        }
+        if sold_at:
+            Payment.objects.filter(order_id__in=sold_at).update(created_at=_at_sale_time('order_id', sold_at))
+            Order.objects.filter(id__in=sold_at).update(created_at=_at_sale_time('id', sold_at))
+            for entry in accepted:
+                if entry['instance'].id in sold_at:
+                    entry['instance'].created_at = sold_at[entry['instance'].id]
+
+        # One stock transaction per product line and ingredient, as BOMService does
+        stock_transactions = StockTransaction.objects.bulk_create([
+            StockTransaction(
+                ingredient_id=ingredient_id,
+                transaction_type='DEDUCTION',
+                quantity=per_unit * quantity,
+                unit_cost=0,
+                reference_type='order',
+                reference_id=entry['instance'].id,
+                notes=f"Deduction for {products[product_id].name} (Order: {entry['instance'].order_number})",
+                recorded_by=user,
+            )
+            for entry in accepted
+            for product_id, quantity in entry['order']['lines']
+            for ingredient_id, per_unit in explosions[product_id].items()
+        ])
+        if sold_at:
+            StockTransaction.objects.filter(
+                id__in=[transaction.id for transaction in stock_transactions if transaction.reference_id in sold_at]
+            ).update(created_at=_at_sale_time('reference_id', sold_at))
+            for transaction in stock_transactions:
+                if transaction.reference_id in sold_at:
+                    transaction.created_at = sold_at[transaction.reference_id]
+
+        totals = {}
+        for entry in accepted:
+            for ingredient_id, total_needed in entry['needed'].items():
+                totals[ingredient_id] = totals.get(ingredient_id, Decimal('0')) + total_needed
+        # current_stock keeps two decimals, as a save() would round it
+        changed = {
+            ingredient_id: total.quantize(Decimal('0.01'))
+            for ingredient_id, total in totals.items()
+            if total.quantize(Decimal('0.01')) != 0
+        }
+        if changed:
+            Ingredient.objects.filter(id__in=changed).update(
+                current_stock=F('current_stock') - Case(
+                    *[When(id=ingredient_id, then=Value(total)) for ingredient_id, total in changed.items()],
+                    output_field=DecimalField(max_digits=10, decimal_places=2),
+                ),
+                updated_at=now,
+            )
+
+        _audit_orders(new_orders, payments, user)
+        audit_stock_transactions(stock_transactions, ingredients, user)
+
+        for ingredient_id, total in changed.items():
+            ingredient = ingredients[ingredient_id]
+            previous_stock = ingredient.current_stock
+            ingredient.current_stock = previous_stock - total
+            publish_low_stock(ingredient, previous_stock)
+        MenuService.invalidate()
+        bump_version('orders')
@@ -1,9 +1,9 @@
 """
 Comprehensive seeder data generation for Cafe Kantina Sales & Inventory System.
-Generates 30 days of historical sales data (backwards from today) with realistic patterns.
-Suitable for Holt-Winters time series regression analysis.
+Generates 30 days (or --days) of historical sales data (backwards from today) with realistic patterns.
+Suitable for Holt-Winters time series regression analysis and backtest_forecasts.
 
-Usage: python manage.py seed_comprehensive_data
+Usage: python manage.py seed_comprehensive_data [--days 90]
 """
 
 from django.core.management.base import BaseCommand
@@ -24,9 +24,13 @@ from sales_inventory_system.orders.models import Order, OrderItem, Payment, Refu
 
 
 class Command(BaseCommand):
-    help = "Generate comprehensive historical sales data for the past 30 days"
+    help = "Generate comprehensive historical sales data for the past 30 days (or --days)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--days", type=int, default=30, help="Days of history to generate")
 
     def handle(self, *args, **options):
+        self.days = options["days"]
         self.stdout.write(self.style.SUCCESS("Starting comprehensive data seeding..."))
 
         try:
@@ -42,8 +46,8 @@ class Command(BaseCommand):
             self.stdout.write("\nPhase 3: Creating recipes (Bill of Materials)...")
             recipes = self._create_recipes(products, ingredients)
 
-            # Phase 4: Generate 30 days of historical orders
-            self.stdout.write("\nPhase 4: Generating 30 days of historical orders...")
+            # Phase 4: Generate historical orders
+            self.stdout.write(f"\nPhase 4: Generating {self.days} days of historical orders...")
             orders_data = self._generate_historical_orders(products, users)
 
             # Phase 5: Create payments and refunds
@@ -504,7 +508,7 @@ class Command(BaseCommand):
         return recipes
 
     def _generate_historical_orders(self, products, users):
-        """Generate 30 days of historical orders with realistic patterns."""
+        """Generate historical orders with realistic patterns."""
         orders_data = {"orders": [], "daily_sales": {}, "daily_counts": {}}
 
         today = timezone.now().replace(hour=0, minute=0, second=0, microsecond=0)
@@ -534,8 +538,8 @@ class Command(BaseCommand):
 
         total_orders_created = 0
 
-        # Generate orders for the past 30 days
-        for day_offset in range(30, 0, -1):
+        # Generate orders for the past N days
+        for day_offset in range(self.days, 0, -1):
             order_date = today - timedelta(days=day_offset)
             is_weekend = order_date.weekday() >= 5
             base_orders = (
@@ -612,6 +616,12 @@ class Command(BaseCommand):
 
                 order.total_amount = order_subtotal
                 order.save()
+
+                # auto_now/auto_now_add ignore the values passed to create();
+                # backdate with update() so the history is spread over the days
+                Order.objects.filter(pk=order.pk).update(created_at=order_time, updated_at=order_time)
+                OrderItem.objects.filter(order=order).update(created_at=order_time)
+                order.created_at = order.updated_at = order_time
                 orders_data["orders"].append(order)
 
                 if status == "FINISHED":
@@ -648,6 +658,8 @@ class Command(BaseCommand):
                 amount=order.total_amount,
                 processed_by=random.choice(cashiers),
             )
+            paid_at = order.created_at + timedelta(minutes=random.randint(1, 15))
+            Payment.objects.filter(pk=payment.pk).update(created_at=paid_at, updated_at=paid_at)
             payments_created += 1
 
             if order.status == "REFUNDED":
@@ -685,7 +697,7 @@ class Command(BaseCommand):
         self.stdout.write(f"  Ingredients: {len(ingredients)}")
         self.stdout.write(f"  Recipes: {len(recipes)}")
 
-        self.stdout.write(f"\nSales Data (30 Days):")
+        self.stdout.write(f"\nSales Data ({self.days} Days):")
         self.stdout.write(f"  Total orders: {len(orders_data['orders'])}")
 
         total_finished_orders = sum(
@@ -695,7 +707,7 @@ class Command(BaseCommand):
 
         self.stdout.write(f"  Finished orders: {total_finished_orders}")
         self.stdout.write(f"  Total revenue: {total_revenue}")
-        self.stdout.write(f"  Average orders/day: {total_finished_orders / 30:.1f}")
+        self.stdout.write(f"  Average orders/day: {total_finished_orders / self.days:.1f}")
 
         payment_methods = {
             "CASH": Payment.objects.filter(method="CASH").count(),
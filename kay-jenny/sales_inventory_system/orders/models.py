@@ -35,11 +35,20 @@ class Order(models.Model):
         related_name='processed_orders'
     )
     is_archived = models.BooleanField(default=False)
+    # Idempotency key from a POS terminal that queued the sale offline
+    # (see ingest_service.py); NULL for orders placed online
+    client_key = models.CharField(max_length=64, unique=True, null=True, blank=True, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            # Incremental ledger export (analytics/ledger_export.py) scans by change time
+            models.Index(fields=['updated_at', 'id']),
+            # Admin date drill-down (date_hierarchy) and day filters
+            models.Index(fields=['created_at']),
+        ]
 
     def __str__(self):
         return f"Order {self.order_number} - {self.get_status_display()}"
@@ -76,11 +85,32 @@ class Order(models.Model):
     @staticmethod
     def expire_old_pending_orders():
         """Expire all pending orders older than 1 hour"""
+        from sales_inventory_system.system.conditional import bump_version
+        from sales_inventory_system.system.events import publish_event
+
         one_hour_ago = timezone.now() - timedelta(hours=1)
-        expired_count = Order.objects.filter(
+        expiring = list(Order.objects.filter(
             status='PENDING',
             created_at__lt=one_hour_ago
-        ).update(status='EXPIRED')
+        ).values('id', 'order_number', 'customer_name', 'table_number'))
+        if not expiring:
+            return 0
+
+        # update() skips signals and auto_now, so stamp updated_at and announce
+        # the expiry to live screens and list polls here
+        expired_count = Order.objects.filter(
+            id__in=[order['id'] for order in expiring],
+            status='PENDING'
+        ).update(status='EXPIRED', updated_at=timezone.now())
+        bump_version('orders')
+        for order in expiring:
+            publish_event('order-expired', {
+                'order_id': order['id'],
+                'order_number': order['order_number'],
+                'status': 'EXPIRED',
+                'customer_name': order['customer_name'],
+                'table_number': order['table_number'],
+            })
         return expired_count
 
 
@@ -143,6 +173,12 @@ class Payment(models.Model):
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            # Incremental ledger export (analytics/ledger_export.py) scans by change time
+            models.Index(fields=['updated_at', 'id']),
+            # Admin date drill-down (date_hierarchy) and day filters
+            models.Index(fields=['created_at']),
+        ]
 
     def __str__(self):
         return f"Payment for {self.order.order_number} - {self.get_status_display()}"
@@ -1,3 +1,101 @@
+from datetime import timedelta
+from decimal import Decimal
+from unittest import mock
+
+from django.db import IntegrityError
 from django.test import TestCase
+from django.utils import timezone
+
+from sales_inventory_system.accounts.models import User
+from sales_inventory_system.products.models import Ingredient, Product, RecipeIngredient, RecipeItem, StockTransaction
+from .ingest_service import OrderIngestService, _parse_batch
+from .models import Order, Payment
+
+
+class OrderIngestServiceTests(TestCase):
+    """Offline POS sync (ingest_service.py)"""
+
+    def setUp(self):
+        self.cashier = User.objects.create_user('offline-cashier', password='x')
+        self.cheese = Ingredient.objects.create(name='Cheese', unit='g', current_stock=Decimal('250'))
+        self.pizza = Product.objects.create(name='Cheese Pizza', price=Decimal('300.00'))
+        recipe = RecipeItem.objects.create(product=self.pizza)
+        RecipeIngredient.objects.create(recipe=recipe, ingredient=self.cheese, quantity=Decimal('100'))
+
+    def sale(self, key, quantity=1, **fields):
+        return {'client_key': key, 'items': [{'product_id': self.pizza.id, 'quantity': quantity}], **fields}
+
+    def ingest(self, *orders):
+        return OrderIngestService.ingest_orders(list(orders), user=self.cashier)
+
+    def statuses(self, result):
+        return [item['status'] for item in result['results']]
+
+    def stock(self):
+        self.cheese.refresh_from_db()
+        return self.cheese.current_stock
+
+    def test_key_synced_in_an_earlier_batch_is_a_duplicate(self):
+        first = self.ingest(self.sale('a'))
+        second = self.ingest(self.sale('a'), self.sale('b'))
+
+        self.assertEqual(self.statuses(second), ['duplicate', 'created'])
+        self.assertEqual(second['results'][0]['order_number'], first['results'][0]['order_number'])
+        self.assertEqual(Order.objects.count(), 2)
+        self.assertEqual(self.stock(), Decimal('50'))
+
+    def test_key_repeated_within_a_batch_is_recorded_once(self):
+        result = self.ingest(self.sale('a'), self.sale('a'))
+
+        self.assertEqual(self.statuses(result), ['created', 'duplicate'])
+        self.assertEqual(result['results'][1]['order_number'], result['results'][0]['order_number'])
+        self.assertEqual(Order.objects.count(), 1)
+        self.assertEqual(self.stock(), Decimal('150'))
+
+    def test_stock_running_short_rejects_only_the_later_orders(self):
+        result = self.ingest(self.sale('a'), self.sale('b', quantity=2), self.sale('c'))
+
+        # 250 g: 'a' takes 100, 'b' needs 200 of the 150 left, 'c' still fits
+        self.assertEqual(self.statuses(result), ['created', 'rejected', 'created'])
+        self.assertIn("Insufficient 'Cheese'", result['results'][1]['error'])
+        self.assertEqual(self.stock(), Decimal('50'))
+        self.assertEqual(StockTransaction.objects.filter(transaction_type='DEDUCTION').count(), 2)
+
+    def test_key_committed_by_a_concurrent_sync_is_a_duplicate(self):
+        ingest = OrderIngestService._ingest
+        orders = [self.sale('a'), self.sale('b')]
+
+        def concurrent_sync_wins(entries, user):
+            # Another terminal commits 'a' between the key check and the insert
+            ingest(_parse_batch(orders[:1]), user)
+            raise IntegrityError('UNIQUE constraint failed: orders_order.client_key')
+
+        attempts = iter([concurrent_sync_wins, ingest])
+        with mock.patch.object(OrderIngestService, '_ingest', side_effect=lambda entries, user: next(attempts)(entries, user)):
+            result = self.ingest(*orders)
+
+        self.assertEqual(self.statuses(result), ['duplicate', 'created'])
+        self.assertEqual(Order.objects.filter(client_key='a').count(), 1)
+        self.assertEqual(self.stock(), Decimal('50'))
+
+    def test_other_constraint_failures_are_raised(self):
+        error = IntegrityError('NOT NULL constraint failed: orders_payment.amount')
+        with mock.patch.object(OrderIngestService, '_ingest', side_effect=error):
+            with self.assertRaises(IntegrityError):
+                self.ingest(self.sale('a'))
+
+    def test_sale_time_is_kept_on_order_payment_and_deductions(self):
+        sold_at = (timezone.now() - timedelta(days=2)).replace(microsecond=0)
+        future = timezone.now() + timedelta(days=1)
+        result = self.ingest(self.sale('a', created_at=sold_at.isoformat()), self.sale('b', created_at=future.isoformat()))
 
-# Create your tests here.
+        order = Order.objects.get(client_key='a')
+        self.assertEqual(order.created_at, sold_at)
+        self.assertEqual(Payment.objects.get(order=order).created_at, sold_at)
+        self.assertEqual(
+            list(StockTransaction.objects.filter(reference_id=order.id).values_list('created_at', flat=True)),
+            [sold_at],
+        )
+        # A terminal clock running fast is clamped to the sync time
+        self.assertLessEqual(Order.objects.get(client_key='b').created_at, timezone.now())
+        self.assertEqual(result['created'], 2)
@@ -5,6 +5,7 @@ app_name = 'orders'
 
 urlpatterns = [
     path('', views.order_list, name='list'),
+    path('events/', views.order_event_stream, name='event_stream'),
 
     # NEW POS Flow (Optimized)
     path('pos/', views.pos_home, name='pos_home'),
@@ -13,6 +14,8 @@ urlpatterns = [
     path('pos/update-cart/<int:product_id>/', views.pos_update_cart_quantity, name='pos_update_cart'),
     path('pos/get-cart/', views.pos_get_cart, name='pos_get_cart'),
     path('pos/get-cart-details/', views.pos_get_cart_details, name='pos_get_cart_details'),
+    path('pos/menu/', views.pos_menu_snapshot, name='pos_menu_snapshot'),
+    path('pos/sync/', views.pos_sync_orders, name='pos_sync_orders'),
     path('pos/cart/', views.pos_cart_view, name='pos_cart'),
     path('pos/checkout/', views.pos_checkout, name='pos_checkout'),
     path('pos/order/<str:order_number>/', views.pos_confirmation, name='pos_confirmation'),
@@ -1,22 +1,65 @@
+import asyncio
+import json
+import logging
+import time
+
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
-from django.http import HttpResponse, JsonResponse
-from django.db import transaction
+from django.core.cache import cache
+from django.core.handlers.asgi import ASGIRequest
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
+from django.db import IntegrityError
 from django.db.models import Q
 from django.core.paginator import Paginator
 from django.utils import timezone
+from django.views.decorators.cache import cache_control
+from django.views.decorators.http import condition
 from datetime import timedelta
 from decimal import Decimal
+from .ingest_service import OrderIngestError, OrderIngestService
 from .models import Order, OrderItem, Payment, Refund
 from sales_inventory_system.products.models import Product
+from sales_inventory_system.products.menu_service import MenuService
+from sales_inventory_system.system.branches import branch_atomic
+from sales_inventory_system.system.conditional import conditional_list, get_version
+from sales_inventory_system.system.events import aget_event_generation, aget_last_event_id, format_sse
+from sales_inventory_system.system.models import LiveEvent
+
+logger = logging.getLogger(__name__)
+
+# Live event stream tuning
+STREAM_POLL_SECONDS = 1.0      # how often an open stream checks for new events
+STREAM_KEEPALIVE_SECONDS = 15  # comment line so proxies keep idle streams open
+STREAM_MAX_SECONDS = 300       # streams end and the browser reconnects (Last-Event-ID)
+STREAM_RETRY_MS = 3000         # browser reconnect delay
+STREAM_BATCH_SIZE = 100
+
+# Order pages expire stale pending orders at most this often (all workers);
+# the expire_pending_orders command does the same from a scheduler
+EXPIRE_CHECK_SECONDS = 60
+EXPIRE_CHECK_CACHE_KEY = 'orders:expire-check'
+
+
+def _expire_pending_orders():
+    """Auto-expire pending orders older than 1 hour, once per EXPIRE_CHECK_SECONDS"""
+    if cache.add(EXPIRE_CHECK_CACHE_KEY, True, EXPIRE_CHECK_SECONDS):
+        Order.expire_old_pending_orders()
+
+
+def _order_list_version(request):
+    """Orders write-version (read-only: expiry bumps it when it runs)"""
+    # Relative time filters ("last day") change with the clock too
+    return f"{get_version('orders')}-{int(time.time() // 60)}"
+
 
 @login_required
+@conditional_list(_order_list_version)
 def order_list(request):
     """Display list of all orders with search, filter, and pagination"""
 
     # Auto-expire pending orders older than 1 hour
-    Order.expire_old_pending_orders()
+    _expire_pending_orders()
 
     # Get query parameters
     search = request.GET.get('search', '').strip()
@@ -114,11 +157,65 @@ def order_list(request):
     }
     return render(request, 'orders/list.html', context)
 
+@login_required
+async def order_event_stream(request):
+    """
+    Server-sent events for cashier screens: order-created, payment-completed,
+    order-expired and low-stock. Screens refresh only when an event arrives
+    instead of re-polling the whole order board.
+
+    Under ASGI the stream stays open. Under a sync (WSGI) server it returns the
+    pending events at once and the browser reconnects after STREAM_RETRY_MS.
+    """
+    # Resume after the last event the browser saw; new screens start from now
+    try:
+        cursor = int(request.headers.get('Last-Event-ID', ''))
+    except ValueError:
+        cursor = await aget_last_event_id()
+
+    if not isinstance(request, ASGIRequest):
+        events = [event async for event in LiveEvent.objects.filter(id__gt=cursor)[:STREAM_BATCH_SIZE]]
+        if events:
+            cursor = events[-1].id
+        body = f'retry: {STREAM_RETRY_MS}\nid: {cursor}\n\n' + ''.join(format_sse(e) for e in events)
+        response = HttpResponse(body, content_type='text/event-stream')
+        response['Cache-Control'] = 'no-cache'
+        return response
+
+    async def stream(cursor):
+        # An id line without data only moves the browser's Last-Event-ID
+        yield f'retry: {STREAM_RETRY_MS}\nid: {cursor}\n\n'
+        started = last_write = time.monotonic()
+        # Query once up front: events may have landed since the cursor was read
+        seen_generation = None
+
+        while time.monotonic() - started < STREAM_MAX_SECONDS:
+            generation = await aget_event_generation()
+            if generation != seen_generation:
+                events = [event async for event in LiveEvent.objects.filter(id__gt=cursor)[:STREAM_BATCH_SIZE]]
+                for event in events:
+                    cursor = event.id
+                    yield format_sse(event)
+                # A full batch may have more behind it: query again next tick
+                if len(events) < STREAM_BATCH_SIZE:
+                    seen_generation = generation
+                if events:
+                    last_write = time.monotonic()
+            elif time.monotonic() - last_write >= STREAM_KEEPALIVE_SECONDS:
+                yield ': keepalive\n\n'
+                last_write = time.monotonic()
+            await asyncio.sleep(STREAM_POLL_SECONDS)
+
+    response = StreamingHttpResponse(stream(cursor), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'  # disable proxy buffering (nginx)
+    return response
+
 @login_required
 def order_detail(request, pk):
     """Display details of a specific order"""
     # Auto-expire pending orders older than 1 hour
-    Order.expire_old_pending_orders()
+    _expire_pending_orders()
 
     order = get_object_or_404(Order, pk=pk)
 
@@ -132,7 +229,7 @@ def order_detail(request, pk):
 def update_order_status(request, pk):
     """Update the status of an order"""
     # Auto-expire pending orders older than 1 hour
-    Order.expire_old_pending_orders()
+    _expire_pending_orders()
 
     if request.method == 'POST':
         try:
@@ -198,7 +295,7 @@ def process_payment(request, pk):
                     'message': f'Payment is already {payment.get_status_display()}'
                 })
 
-            with transaction.atomic():
+            with branch_atomic():
                 # Update payment status
                 payment.status = 'COMPLETED'
                 payment.processed_by = request.user
@@ -276,7 +373,7 @@ def quick_payment(request, pk):
                 'message': f'Payment is already {payment.get_status_display()}'
             })
 
-        with transaction.atomic():
+        with branch_atomic():
             # Update payment status
             payment.status = 'COMPLETED'
             payment.processed_by = request.user
@@ -457,7 +554,7 @@ def pos_get_cart(request):
     return JsonResponse(simplified_cart)
 
 @login_required
-def pos_get_cart_details(request):
+async def pos_get_cart_details(request):
     """AJAX endpoint to get detailed product information for cart items"""
     if request.method != 'POST':
         return JsonResponse({'success': False, 'message': 'Invalid request method'})
@@ -474,12 +571,12 @@ def pos_get_cart_details(request):
         products = Product.objects.filter(id__in=product_ids)
         product_details = {}
 
-        for product in products:
+        async for product in products:
             product_details[str(product.id)] = {
                 'id': product.id,
                 'name': product.name,
                 'price': float(product.price),
-                'image': product.image.url if product.image else None,
+                'image': product.image_thumb_url,
             }
 
         return JsonResponse({'success': True, 'products': product_details})
@@ -487,6 +584,73 @@ def pos_get_cart_details(request):
     except Exception as e:
         return JsonResponse({'success': False, 'message': str(e)})
 
+def _menu_snapshot_etag(request):
+    """ETag for the menu snapshot: current menu version plus the requested base version"""
+    since = request.GET.get('since', '').strip()
+    version = MenuService.get_version()
+    return f'menu-{version}-since-{since}' if since else f'menu-{version}'
+
+@login_required
+@cache_control(private=True, no_cache=True)
+@condition(etag_func=_menu_snapshot_etag)
+def pos_menu_snapshot(request):
+    """
+    Versioned POS menu: all sellable products with price, category, max producible
+    units and bottleneck ingredient. Answers 304 when the menu has not changed
+    (If-None-Match), and ?since=<version> returns only products changed after it.
+    """
+    since = request.GET.get('since', '').strip()
+    if since:
+        try:
+            since = int(since)
+        except ValueError:
+            return JsonResponse({'success': False, 'message': 'since must be a menu version number'}, status=400)
+    else:
+        since = None
+
+    snapshot = MenuService.build_snapshot(since=since)
+    return JsonResponse({'success': True, **snapshot})
+
+@login_required
+def pos_sync_orders(request):
+    """
+    API endpoint for terminals uploading sales queued while offline.
+
+    Body: {"orders": [{"client_key": "<uuid>", "created_at": "2025-01-31T12:05:00+08:00",
+    "customer_name": "...", "table_number": "...", "payment_method": "CASH",
+    "items": [{"product_id": 1, "quantity": 2}, ...]}, ...]}
+
+    Answers with one result per order; resending a batch is safe.
+    """
+    if request.method != 'POST':
+        return JsonResponse({'success': False, 'message': 'Only POST method is allowed'}, status=405)
+
+    try:
+        payload = json.loads(request.body or b'{}')
+    except json.JSONDecodeError:
+        return JsonResponse({'success': False, 'message': 'Request body must be JSON'}, status=400)
+
+    orders = payload.get('orders') if isinstance(payload, dict) else None
+    if not isinstance(orders, list) or not orders:
+        return JsonResponse({'success': False, 'message': 'orders must be a non-empty list'}, status=400)
+    if not all(isinstance(order, dict) for order in orders):
+        return JsonResponse({'success': False, 'message': 'Each order must be an object'}, status=400)
+
+    try:
+        result = OrderIngestService.ingest_orders(orders, user=request.user)
+    except OrderIngestError as e:
+        return JsonResponse({'success': False, 'message': str(e)}, status=400)
+    except IntegrityError:
+        # Keys synced concurrently are already reported as duplicates by the
+        # service; anything else is a data problem on the server
+        logger.exception("Offline order sync by %s failed on a database constraint", request.user)
+        return JsonResponse(
+            {'success': False, 'message': 'These orders could not be saved. Please contact an administrator.'},
+            status=500,
+        )
+
+    return JsonResponse({'success': True, **result})
+
 @login_required
 def pos_cart_view(request):
     """Display POS cart"""
@@ -562,7 +726,7 @@ def pos_checkout(request):
                 messages.error(request, shortage_msg)
                 return redirect('orders:pos_checkout')
 
-            with transaction.atomic():
+            with branch_atomic():
                 # Calculate total amount FIRST
                 total_amount = 0
                 order_items = []
@@ -688,7 +852,7 @@ def pos_create_order(request):
                 messages.error(request, shortage_msg)
                 return redirect('orders:pos_create_order')
 
-            with transaction.atomic():
+            with branch_atomic():
                 # Create order
                 order = Order.objects.create(
                     customer_name=customer_name,
@@ -862,7 +1026,7 @@ def process_refund(request, pk):
             })
 
         try:
-            with transaction.atomic():
+            with branch_atomic():
                 # Create refund record
                 refund = Refund.objects.create(
                     order=order,
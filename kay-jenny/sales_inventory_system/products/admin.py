@@ -1,8 +1,10 @@
 from django.contrib import admin
+
+from sales_inventory_system.system.admin_mixins import LargeTableAdminMixin
 from .models import (
     Product, Ingredient, RecipeItem, RecipeIngredient,
     StockTransaction, PhysicalCount, VarianceRecord,
-    WasteLog, PrepBatch
+    WasteLog, PrepBatch, StocktakeSession, StocktakeLine
 )
 
 @admin.register(Product)
@@ -50,8 +52,9 @@ class IngredientAdmin(admin.ModelAdmin):
 class RecipeIngredientInline(admin.TabularInline):
     """Inline admin for recipe ingredients"""
     model = RecipeIngredient
+    fk_name = 'recipe'
     extra = 1
-    fields = ['ingredient', 'quantity']
+    fields = ['ingredient', 'sub_recipe', 'quantity']
 
 
 @admin.register(RecipeItem)
@@ -77,11 +80,19 @@ class RecipeItemAdmin(admin.ModelAdmin):
 
 
 @admin.register(StockTransaction)
-class StockTransactionAdmin(admin.ModelAdmin):
+class StockTransactionAdmin(LargeTableAdminMixin, admin.ModelAdmin):
     list_display = ['created_at', 'ingredient', 'transaction_type', 'quantity', 'reference_type', 'recorded_by']
     list_filter = ['transaction_type', 'created_at', 'ingredient']
     search_fields = ['ingredient__name', 'notes']
     readonly_fields = ['created_at']
+    date_hierarchy = 'created_at'
+    sortable_by = ['created_at']
+    list_select_related = ['ingredient', 'recorded_by']
+    list_only_fields = [
+        'created_at', 'transaction_type', 'quantity', 'reference_type',
+        'ingredient__name', 'ingredient__unit', 'recorded_by__username', 'recorded_by__role',
+    ]
+    autocomplete_fields = ['ingredient', 'recorded_by']
 
     fieldsets = (
         ('Transaction Details', {
@@ -104,11 +115,19 @@ class StockTransactionAdmin(admin.ModelAdmin):
 
 
 @admin.register(PhysicalCount)
-class PhysicalCountAdmin(admin.ModelAdmin):
+class PhysicalCountAdmin(LargeTableAdminMixin, admin.ModelAdmin):
     list_display = ['count_date', 'ingredient', 'physical_quantity', 'theoretical_quantity', 'variance_percentage', 'within_tolerance']
     list_filter = ['count_date', 'ingredient']
     search_fields = ['ingredient__name', 'notes']
     readonly_fields = ['variance_quantity', 'variance_percentage', 'within_tolerance', 'created_at']
+    date_hierarchy = 'count_date'
+    sortable_by = ['count_date']
+    list_select_related = ['ingredient']
+    list_only_fields = [
+        'count_date', 'physical_quantity', 'theoretical_quantity',
+        'ingredient__name', 'ingredient__unit', 'ingredient__variance_allowance',
+    ]
+    autocomplete_fields = ['ingredient', 'counted_by']
 
     fieldsets = (
         ('Count Information', {
@@ -134,11 +153,19 @@ class PhysicalCountAdmin(admin.ModelAdmin):
 
 
 @admin.register(VarianceRecord)
-class VarianceRecordAdmin(admin.ModelAdmin):
+class VarianceRecordAdmin(LargeTableAdminMixin, admin.ModelAdmin):
     list_display = ['period_end', 'ingredient', 'theoretical_used', 'actual_used', 'variance_percentage', 'within_tolerance']
     list_filter = ['period_end', 'ingredient']
     search_fields = ['ingredient__name', 'notes']
     readonly_fields = ['created_at']
+    date_hierarchy = 'period_end'
+    sortable_by = ['period_end']
+    list_select_related = ['ingredient']
+    list_only_fields = [
+        'period_end', 'theoretical_used', 'actual_used', 'variance_percentage', 'within_tolerance',
+        'ingredient__name', 'ingredient__unit',
+    ]
+    autocomplete_fields = ['ingredient']
 
     fieldsets = (
         ('Period', {
@@ -158,11 +185,19 @@ class VarianceRecordAdmin(admin.ModelAdmin):
 
 
 @admin.register(WasteLog)
-class WasteLogAdmin(admin.ModelAdmin):
+class WasteLogAdmin(LargeTableAdminMixin, admin.ModelAdmin):
     list_display = ['waste_date', 'ingredient', 'waste_type', 'quantity', 'cost_impact', 'reported_by']
     list_filter = ['waste_date', 'waste_type', 'ingredient']
     search_fields = ['ingredient__name', 'reason', 'notes']
     readonly_fields = ['cost_impact', 'created_at']
+    date_hierarchy = 'waste_date'
+    sortable_by = ['waste_date']
+    list_select_related = ['ingredient', 'reported_by']
+    list_only_fields = [
+        'waste_date', 'waste_type', 'quantity',
+        'ingredient__name', 'ingredient__unit', 'reported_by__username', 'reported_by__role',
+    ]
+    autocomplete_fields = ['ingredient', 'reported_by']
 
     fieldsets = (
         ('Waste Information', {
@@ -214,3 +249,31 @@ class PrepBatchAdmin(admin.ModelAdmin):
         if not change:  # New object
             obj.prepared_by = request.user
         super().save_model(request, obj, form, change)
+
+
+class StocktakeLineInline(admin.TabularInline):
+    """Read-only lines; counts are entered through the stocktake API or command"""
+    model = StocktakeLine
+    extra = 0
+    can_delete = False
+    fields = [
+        'ingredient', 'theoretical_quantity', 'expected_quantity', 'physical_quantity', 'variance_quantity',
+        'counted_by', 'counted_at', 'notes',
+    ]
+    readonly_fields = fields
+
+    def has_add_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(StocktakeSession)
+class StocktakeSessionAdmin(admin.ModelAdmin):
+    list_display = ['id', 'status', 'started_at', 'started_by', 'closed_at', 'closed_by']
+    list_filter = ['status', 'started_at']
+    search_fields = ['notes']
+    readonly_fields = ['status', 'started_at', 'started_by', 'closed_at', 'closed_by']
+    inlines = [StocktakeLineInline]
+
+    def has_add_permission(self, request):
+        # Sessions must be started through StocktakeService to freeze stock
+        return False
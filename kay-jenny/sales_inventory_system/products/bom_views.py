@@ -4,7 +4,7 @@ Views for Bill of Materials reports and management
 
 from django.shortcuts import render
 from django.contrib.auth.decorators import login_required
-from django.http import JsonResponse, HttpResponse
+from django.http import JsonResponse
 from django.db.models import Q, Sum, F, Avg, Max, Min, Count, Case, When, DecimalField
 from django.db.models.functions import TruncDate
 from django.utils import timezone
@@ -15,12 +15,18 @@ from .models import (
     PhysicalCount, VarianceRecord, Product
 )
 from .inventory_service import BOMService
+from sales_inventory_system.sales_inventory.single_flight import get_or_compute
+from sales_inventory_system.system.replicas import replica_reads
+from sales_inventory_system.system.views import queue_export
 import json
-import csv
-from io import StringIO
+
+
+# POSTed download value -> export type suffix (USAGE / USAGE_DETAILED, VARIANCE / VARIANCE_DETAILED)
+EXPORT_TYPES = {'csv': '', 'detailed': '_DETAILED'}
 
 
 @login_required
+@replica_reads
 def bom_dashboard(request):
     """
     Main BOM dashboard showing inventory status and key metrics.
@@ -69,6 +75,7 @@ def bom_dashboard(request):
 
 
 @login_required
+@replica_reads
 def ingredient_usage_report(request):
     """
     Comprehensive ingredient usage report for all active ingredients.
@@ -76,65 +83,23 @@ def ingredient_usage_report(request):
     Optimized to use single database query for all transactions.
     """
     days = int(request.GET.get('days', 30))
-    download = request.GET.get('download', '').lower()
-
-    end_date = timezone.now()
-    start_date = end_date - timedelta(days=days)
-
-    # Get all transactions in a single database query - optimized for performance
-    all_transactions = StockTransaction.objects.filter(
-        created_at__gte=start_date,
-        created_at__lte=end_date,
-        ingredient__is_active=True
-    ).select_related('ingredient').order_by('ingredient', '-created_at')
-
-    # Group transactions by ingredient in Python
-    ingredients_transactions = {}
-    for trans in all_transactions:
-        ing_id = trans.ingredient.id
-        if ing_id not in ingredients_transactions:
-            ingredients_transactions[ing_id] = {
-                'ingredient': trans.ingredient,
-                'transactions': [],
-                'transaction_stats': {},
-                'total_quantity': 0,
-            }
-        ingredients_transactions[ing_id]['transactions'].append(trans)
-
-    # Calculate statistics for each ingredient
-    usage_summary = []
-    total_used = 0
-    total_cost = 0
-
-    for ing_id, data in ingredients_transactions.items():
-        ingredient = data['ingredient']
-        transactions = data['transactions']
 
-        # Calculate totals by transaction type and total used
-        transaction_stats = {}
-        total_quantity = 0
+    # Downloads are POSTed and built by the export worker (see system/export_jobs.py)
+    if request.method == 'POST':
+        download = request.POST.get('download', '').lower()
+        return queue_export(
+            request, f"USAGE{EXPORT_TYPES.get(download, '')}", {'days': request.POST.get('days', days)}
+        )
 
-        for trans in transactions:
-            trans_type = trans.get_transaction_type_display()
-            transaction_stats[trans_type] = transaction_stats.get(trans_type, 0) + float(trans.quantity)
-            if trans.transaction_type in ['DEDUCTION', 'PREP']:
-                total_quantity += float(trans.quantity)
-
-        # Calculate cost
-        # Note: cost calculation not applicable with simplified ingredient system
-        ingredient_cost = 0
-
-        usage_summary.append({
-            'ingredient': ingredient,
-            'total_quantity': total_quantity,
-            'cost': ingredient_cost,
-            'transaction_stats': transaction_stats,
-            'transactions': transactions[:10],  # Latest 10 transactions
-            'transactions_count': len(transactions),
-        })
-
-        total_used += total_quantity
-        total_cost += ingredient_cost
+    # One request at a time scans the ledger; others get the previous result
+    report = get_or_compute(
+        f'bom_usage_report_{days}', lambda: _usage_summary(days), timeout=120, stale=600
+    )
+    usage_summary = report['usage_summary']
+    total_used = report['total_used']
+    total_cost = report['total_cost']
+    start_date = report['start_date']
+    end_date = report['end_date']
 
     # Calculate average cost per unit used
     avg_cost = total_cost / total_used if total_used > 0 else 0
@@ -201,12 +166,6 @@ def ingredient_usage_report(request):
             'top_used_items': top_used_data
         })
 
-    # Handle downloads
-    if download == 'csv':
-        return generate_usage_csv_download(usage_summary, days)
-    elif download == 'detailed':
-        return generate_usage_detailed_csv(usage_summary, days)
-
     context = {
         'usage_summary': sorted_by_cost,  # Default sort by cost descending
         'top_cost_items': top_cost_items,
@@ -223,47 +182,77 @@ def ingredient_usage_report(request):
     return render(request, 'products/ingredient_usage_report_enhanced.html', context)
 
 
-def generate_usage_csv_download(usage_summary, days):
-    """Generate CSV report for ingredient usage"""
-    response = HttpResponse(content_type='text/csv')
-    response['Content-Disposition'] = f'attachment; filename="ingredient_usage_{timezone.now().strftime("%Y%m%d")}.csv"'
+def _usage_summary(days):
+    """Per-ingredient usage over the last `days` days (cacheable plain data)"""
+    end_date = timezone.now()
+    start_date = end_date - timedelta(days=days)
+
+    # Get all transactions in a single database query - optimized for performance
+    all_transactions = StockTransaction.objects.filter(
+        created_at__gte=start_date,
+        created_at__lte=end_date,
+        ingredient__is_active=True
+    ).select_related('ingredient').order_by('ingredient', '-created_at')
+
+    # Group transactions by ingredient in Python
+    ingredients_transactions = {}
+    for trans in all_transactions:
+        ing_id = trans.ingredient.id
+        if ing_id not in ingredients_transactions:
+            ingredients_transactions[ing_id] = {
+                'ingredient': trans.ingredient,
+                'transactions': [],
+                'transaction_stats': {},
+                'total_quantity': 0,
+            }
+        ingredients_transactions[ing_id]['transactions'].append(trans)
 
-    writer = csv.writer(response)
-    writer.writerow(['Ingredient', 'Unit', 'Total Used', 'Transactions'])
+    # Calculate statistics for each ingredient
+    usage_summary = []
+    total_used = 0
+    total_cost = 0
 
-    for item in usage_summary:
-        writer.writerow([
-            item['ingredient'].name,
-            item['ingredient'].unit,
-            f"{item['total_quantity']:.3f}",
-            item['transactions_count']
-        ])
+    for ing_id, data in ingredients_transactions.items():
+        ingredient = data['ingredient']
+        transactions = data['transactions']
 
-    return response
+        # Calculate totals by transaction type and total used
+        transaction_stats = {}
+        total_quantity = 0
 
+        for trans in transactions:
+            trans_type = trans.get_transaction_type_display()
+            transaction_stats[trans_type] = transaction_stats.get(trans_type, 0) + float(trans.quantity)
+            if trans.transaction_type in ['DEDUCTION', 'PREP']:
+                total_quantity += float(trans.quantity)
 
-def generate_usage_detailed_csv(usage_summary, days):
-    """Generate detailed CSV report with all transactions"""
-    response = HttpResponse(content_type='text/csv')
-    response['Content-Disposition'] = f'attachment; filename="ingredient_usage_detailed_{timezone.now().strftime("%Y%m%d")}.csv"'
+        # Calculate cost
+        # Note: cost calculation not applicable with simplified ingredient system
+        ingredient_cost = 0
 
-    writer = csv.writer(response)
-    writer.writerow(['Ingredient', 'Date', 'Type', 'Quantity', 'Notes'])
+        usage_summary.append({
+            'ingredient': ingredient,
+            'total_quantity': total_quantity,
+            'cost': ingredient_cost,
+            'transaction_stats': transaction_stats,
+            'transactions': transactions[:10],  # Latest 10 transactions
+            'transactions_count': len(transactions),
+        })
 
-    for item in usage_summary:
-        for trans in item['transactions']:
-            writer.writerow([
-                item['ingredient'].name,
-                trans.created_at.strftime("%Y-%m-%d %H:%M"),
-                trans.get_transaction_type_display(),
-                f"{trans.quantity:.3f}",
-                trans.notes or ''
-            ])
+        total_used += total_quantity
+        total_cost += ingredient_cost
 
-    return response
+    return {
+        'usage_summary': usage_summary,
+        'total_used': total_used,
+        'total_cost': total_cost,
+        'start_date': start_date,
+        'end_date': end_date,
+    }
 
 
 @login_required
+@replica_reads
 def variance_analysis_report(request):
     """
     Comprehensive variance analysis report for all active ingredients.
@@ -271,8 +260,22 @@ def variance_analysis_report(request):
     Optimized to use database aggregation for statistics.
     """
     days = int(request.GET.get('days', 30))
-    download = request.GET.get('download', '').lower()
 
+    if request.method == 'POST':
+        download = request.POST.get('download', '').lower()
+        return queue_export(
+            request, f"VARIANCE{EXPORT_TYPES.get(download, '')}", {'days': request.POST.get('days', days)}
+        )
+
+    # One request at a time aggregates the variance records; others get the previous result
+    context = get_or_compute(
+        f'variance_analysis_report_{days}', lambda: _variance_summary(days), timeout=120, stale=600
+    )
+    return render(request, 'products/variance_analysis_report.html', context)
+
+
+def _variance_summary(days):
+    """Variance figures per ingredient for variance_analysis_report (cacheable)"""
     end_date = timezone.now()
     start_date = end_date - timedelta(days=days)
 
@@ -284,7 +287,7 @@ def variance_analysis_report(request):
 
     # If no records exist, return empty state
     if not all_variance_records.exists():
-        context = {
+        return {
             'variance_summary': [],
             'best_performing': [],
             'outside_tolerance': [],
@@ -295,9 +298,6 @@ def variance_analysis_report(request):
             'period_start': start_date,
             'period_end': end_date,
         }
-        if download:
-            return render(request, 'products/variance_analysis_report.html', context)
-        return render(request, 'products/variance_analysis_report.html', context)
 
     # Aggregate statistics by ingredient using database queries
     variance_stats = VarianceRecord.objects.filter(
@@ -379,13 +379,7 @@ def variance_analysis_report(request):
     best_performing = sorted(variance_summary, key=lambda x: x['avg_variance'])[:3]
     outside_tolerance = [v for v in variance_summary if v['avg_variance'] > v['ingredient'].variance_allowance]
 
-    # Handle download
-    if download == 'csv':
-        return generate_variance_csv_download(variance_summary, days)
-    elif download == 'detailed':
-        return generate_variance_detailed_csv(variance_summary, days)
-
-    context = {
+    return {
         'variance_summary': variance_summary,
         'best_performing': best_performing,
         'outside_tolerance': outside_tolerance,
@@ -397,53 +391,9 @@ def variance_analysis_report(request):
         'period_end': end_date,
     }
 
-    return render(request, 'products/variance_analysis_report.html', context)
-
-
-def generate_variance_csv_download(variance_summary, days):
-    """Generate CSV report for variance analysis"""
-    response = HttpResponse(content_type='text/csv')
-    response['Content-Disposition'] = f'attachment; filename="variance_analysis_{timezone.now().strftime("%Y%m%d")}.csv"'
-
-    writer = csv.writer(response)
-    writer.writerow(['Ingredient', 'Avg Variance %', 'Max Variance %', 'Min Variance %', 'Within Tolerance %', 'Records'])
-
-    for item in variance_summary:
-        writer.writerow([
-            item['ingredient'].name,
-            f"{item['avg_variance']:.2f}",
-            f"{item['max_variance']:.2f}",
-            f"{item['min_variance']:.2f}",
-            f"{item['within_tolerance_pct']:.2f}",
-            item['records_count']
-        ])
-
-    return response
-
-
-def generate_variance_detailed_csv(variance_summary, days):
-    """Generate detailed CSV report with all variance records"""
-    response = HttpResponse(content_type='text/csv')
-    response['Content-Disposition'] = f'attachment; filename="variance_detailed_{timezone.now().strftime("%Y%m%d")}.csv"'
-
-    writer = csv.writer(response)
-    writer.writerow(['Ingredient', 'Period End', 'Theoretical Used', 'Actual Used', 'Variance %', 'Status'])
-
-    for item in variance_summary:
-        for record in item['variance_records']:
-            writer.writerow([
-                item['ingredient'].name,
-                record.period_end.strftime("%Y-%m-%d"),
-                f"{record.theoretical_used:.3f}",
-                f"{record.actual_used:.3f}",
-                f"{record.variance_percentage:.2f}",
-                'Within Tolerance' if record.within_tolerance else 'Outside Tolerance'
-            ])
-
-    return response
-
 
 @login_required
+@replica_reads
 def low_stock_report(request):
     """
     Report of all ingredients below minimum stock level.
@@ -472,6 +422,7 @@ def low_stock_report(request):
 
 
 @login_required
+@replica_reads
 def waste_report(request):
     """
     Report of waste, spoilage, and freebies.
@@ -71,14 +71,14 @@ def api_toggle_ingredient_availability(request):
 
 @login_required
 @user_passes_test(is_cashier)
-def api_get_ingredients(request):
+async def api_get_ingredients(request):
     """API endpoint to get all ingredients with current availability"""
 
     try:
         ingredients = Ingredient.objects.filter(is_active=True).order_by('name')
 
         ingredients_data = []
-        for ingredient in ingredients:
+        async for ingredient in ingredients:
             ingredients_data.append({
                 'id': ingredient.id,
                 'name': ingredient.name,
@@ -0,0 +1,152 @@
+"""
+Product Image Variants
+
+Uploaded product photos are usually full camera resolution, far more than a
+POS tile or list thumbnail needs. Resized copies are written next to the
+original (Pillow) by a background process, not the request that saved the
+upload: build_product_images --watch picks up new and replaced images every
+few seconds (refresh_pending), and build_product_images does one pass:
+- Widths 160, 320 and 640 px (never upscaled), aspect ratio kept
+- Each width as WebP, plus JPEG for browsers without WebP
+- EXIF rotation applied, transparency flattened on white for JPEG
+
+The storage names are kept on Product.image_variants together with the
+source file name, so templates and JSON payloads build srcset URLs without
+touching the disk, and a replaced image is detected by the name mismatch
+(its old variants are deleted). Until a product's variants are built the
+original is served as before.
+
+Web processes only import this module lazily (deleting a product's files),
+so they do not load Pillow at startup.
+"""
+
+import logging
+import os
+from io import BytesIO
+
+from django.core.files.base import ContentFile
+from django.utils import timezone
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+from .menu_service import MenuService
+from .models import Product
+
+
+logger = logging.getLogger(__name__)
+
+WIDTHS = (160, 320, 640)
+DERIVED_DIR = 'products/derived'
+
+# format key -> (Pillow format, extension, save options)
+FORMATS = {
+    'webp': ('WEBP', 'webp', {'quality': 80, 'method': 4}),
+    'jpeg': ('JPEG', 'jpg', {'quality': 82, 'optimize': True, 'progressive': True}),
+}
+
+
+def _open_image(field):
+    with field.open('rb') as f:
+        image = Image.open(f)
+        image.load()
+    image = ImageOps.exif_transpose(image)
+    if image.mode in ('RGBA', 'LA', 'P'):
+        image = image.convert('RGBA')
+        background = Image.new('RGB', image.size, (255, 255, 255))
+        background.paste(image, mask=image.getchannel('A'))
+        return background
+    return image.convert('RGB')
+
+
+def build_variants(product):
+    """
+    Write resized copies of product.image.
+
+    Returns:
+        dict: {'source': image name, 'webp': [[name, width], ...], 'jpeg': [...]}
+        (only 'source' when the file cannot be read as an image)
+    """
+    field = product.image
+    storage = field.storage
+    variants = {'source': field.name}
+    try:
+        image = _open_image(field)
+    except (OSError, UnidentifiedImageError) as exc:
+        logger.warning("Product %s image %s could not be resized: %s", product.pk, field.name, exc)
+        return variants
+
+    stem = os.path.splitext(os.path.basename(field.name))[0]
+    widths = [width for width in WIDTHS if width < image.width]
+    if image.width <= WIDTHS[-1]:
+        # Smaller than the largest size: its own width is the last step
+        widths.append(image.width)
+
+    for width in widths:
+        height = max(1, round(image.height * width / image.width))
+        resized = image.resize((width, height), Image.LANCZOS)
+        for key, (pil_format, extension, options) in FORMATS.items():
+            buffer = BytesIO()
+            resized.save(buffer, pil_format, **options)
+            name = storage.save(f"{DERIVED_DIR}/{stem}-{width}w.{extension}", ContentFile(buffer.getvalue()))
+            variants.setdefault(key, []).append([name, width])
+    return variants
+
+
+def delete_variants(product):
+    """Delete the files listed in product.image_variants"""
+    storage = product.image.storage
+    for key in FORMATS:
+        for name, width in product.image_variants.get(key, []):
+            storage.delete(name)
+
+
+def needs_refresh(product):
+    """Whether the stored variants were not built from the current image"""
+    current = product.image.name if product.image else None
+    if not current:
+        return bool(product.image_variants)
+    return product.image_variants.get('source') != current
+
+
+def pending_products(using='default'):
+    """Products whose variants were not built from their current image"""
+    products = Product.objects.using(using).only('id', 'image', 'image_variants').order_by('id')
+    # Compared in Python: the menu is small, and JSON key lookups differ per backend
+    return [product for product in products.iterator(chunk_size=200) if needs_refresh(product)]
+
+
+def refresh_pending(using='default'):
+    """
+    Build variants for every product whose image changed since they were built.
+
+    Returns:
+        int: Products refreshed
+    """
+    refreshed = 0
+    for product in pending_products(using):
+        if refresh_variants(product):
+            refreshed += 1
+    return refreshed
+
+
+def refresh_variants(product):
+    """
+    Bring a product's variants in line with its current image.
+
+    Returns:
+        bool: Whether anything changed
+    """
+    if not needs_refresh(product):
+        return False
+    current = product.image.name if product.image else None
+
+    delete_variants(product)
+    variants = build_variants(product) if current else {}
+
+    # update() keeps this out of the audit trail and the post_save signal;
+    # updated_at moves so POS menu deltas pick up the new srcset
+    now = timezone.now()
+    Product.objects.using(product._state.db).filter(pk=product.pk).update(image_variants=variants, updated_at=now)
+    product.image_variants = variants
+    product.updated_at = now
+    MenuService.invalidate()
+    return True
@@ -10,13 +10,14 @@ Handles:
 """
 
 from decimal import Decimal
-from django.db import transaction
 from django.db.models import Q, F
 from django.utils import timezone
 from .models import (
     RecipeItem, StockTransaction, Ingredient,
     VarianceRecord, WasteLog, PhysicalCount
 )
+from sales_inventory_system.system.branches import branch_atomic
+from sales_inventory_system.system.events import publish_low_stock
 
 
 class IngredientDeductionError(Exception):
@@ -46,11 +47,13 @@ class BOMService:
         deductions = []
 
         try:
-            with transaction.atomic():
-                # FIRST PASS: Validate all products have recipes and ingredients are sufficient
-                for order_item in order.items.all():
+            with branch_atomic():
+                # FIRST PASS: Validate all products have recipes and total the raw
+                # ingredients needed across the order (sub-recipes already flattened)
+                lines = []
+                needed = {}
+                for order_item in order.items.select_related('product__recipe'):
                     product = order_item.product
-                    quantity = order_item.quantity
 
                     # STRICT: Product MUST have a recipe
                     try:
@@ -61,50 +64,52 @@ class BOMService:
                             "All products must have recipes before orders can be placed."
                         )
 
-                    # STRICT: Check all ingredients are sufficient BEFORE any deductions
-                    for recipe_ingredient in recipe.ingredients.all():
-                        ingredient = recipe_ingredient.ingredient
-                        total_needed = recipe_ingredient.quantity * quantity
+                    for ingredient_id, per_unit in recipe.get_explosion().items():
+                        total_needed = per_unit * order_item.quantity
+                        lines.append((product, ingredient_id, total_needed))
+                        needed[ingredient_id] = needed.get(ingredient_id, Decimal('0')) + total_needed
 
-                        if ingredient.current_stock < total_needed:
-                            raise IngredientDeductionError(
-                                f"Insufficient '{ingredient.name}' for {product.name}. "
-                                f"Need {total_needed} {ingredient.unit}, but only {ingredient.current_stock} available."
-                            )
+                # Lock every ingredient the order touches in one query
+                ingredients = Ingredient.objects.select_for_update().in_bulk(list(needed))
 
-                # SECOND PASS: Perform actual deductions (only if all validations passed)
-                for order_item in order.items.all():
-                    product = order_item.product
-                    quantity = order_item.quantity
-                    recipe = product.recipe  # Already validated to exist
-
-                    for recipe_ingredient in recipe.ingredients.all():
-                        ingredient = recipe_ingredient.ingredient
-                        total_needed = recipe_ingredient.quantity * quantity
-
-                        # Deduct from ingredient stock
-                        ingredient.current_stock -= total_needed
-                        ingredient.save()
-
-                        # Create stock transaction
-                        StockTransaction.objects.create(
-                            ingredient=ingredient,
-                            transaction_type='DEDUCTION',
-                            quantity=total_needed,
-                            unit_cost=0,
-                            reference_type='order',
-                            reference_id=order.id,
-                            notes=f"Deduction for {product.name} (Order: {order.order_number})",
-                            recorded_by=user
+                # STRICT: Check all ingredients are sufficient BEFORE any deductions
+                for product, ingredient_id, total_needed in lines:
+                    ingredient = ingredients[ingredient_id]
+                    if ingredient.current_stock < needed[ingredient_id]:
+                        raise IngredientDeductionError(
+                            f"Insufficient '{ingredient.name}' for {product.name}. "
+                            f"Need {needed[ingredient_id]} {ingredient.unit}, but only {ingredient.current_stock} available."
                         )
 
-                        deductions.append({
-                            'ingredient': ingredient.name,
-                            'quantity_deducted': total_needed,
-                            'unit': ingredient.unit,
-                            'cost': 0,
-                            'remaining_stock': ingredient.current_stock
-                        })
+                # SECOND PASS: Perform actual deductions (only if all validations passed)
+                for ingredient_id, total_needed in needed.items():
+                    ingredient = ingredients[ingredient_id]
+                    previous_stock = ingredient.current_stock
+                    ingredient.current_stock -= total_needed
+                    ingredient.save()
+                    publish_low_stock(ingredient, previous_stock)
+
+                # One stock transaction per product line, as before
+                for product, ingredient_id, total_needed in lines:
+                    ingredient = ingredients[ingredient_id]
+                    StockTransaction.objects.create(
+                        ingredient=ingredient,
+                        transaction_type='DEDUCTION',
+                        quantity=total_needed,
+                        unit_cost=0,
+                        reference_type='order',
+                        reference_id=order.id,
+                        notes=f"Deduction for {product.name} (Order: {order.order_number})",
+                        recorded_by=user
+                    )
+
+                    deductions.append({
+                        'ingredient': ingredient.name,
+                        'quantity_deducted': total_needed,
+                        'unit': ingredient.unit,
+                        'cost': 0,
+                        'remaining_stock': ingredient.current_stock
+                    })
 
                 return {
                     'success': True,
@@ -132,9 +137,7 @@ class BOMService:
             dict: Availability status with shortage details
         """
         try:
-            recipe = RecipeItem.objects.prefetch_related(
-                'ingredients__ingredient'
-            ).get(product_id=product_id)
+            recipe = RecipeItem.objects.get(product_id=product_id)
         except RecipeItem.DoesNotExist:
             # STRICT: Product MUST have a recipe
             from .models import Product
@@ -153,9 +156,12 @@ class BOMService:
 
         shortages = []
 
-        for recipe_ingredient in recipe.ingredients.all():
-            ingredient = recipe_ingredient.ingredient
-            total_needed = recipe_ingredient.quantity * quantity
+        explosion = recipe.get_explosion()
+        ingredients = Ingredient.objects.in_bulk(list(explosion))
+
+        for ingredient_id, per_unit in explosion.items():
+            ingredient = ingredients[ingredient_id]
+            total_needed = per_unit * quantity
 
             # Check if ingredient is marked as unavailable by cashier
             if not ingredient.is_available:
@@ -202,10 +208,12 @@ class BOMService:
         """
         ingredient = Ingredient.objects.get(id=ingredient_id)
 
-        with transaction.atomic():
+        with branch_atomic():
             # Reduce ingredient stock
+            previous_stock = ingredient.current_stock
             ingredient.current_stock -= quantity
             ingredient.save()
+            publish_low_stock(ingredient, previous_stock)
 
             # Create waste log
             waste_log = WasteLog.objects.create(
@@ -318,6 +326,7 @@ class BOMService:
         if physical_qty != theoretical_qty:
             ingredient.current_stock = physical_qty
             ingredient.save()
+            publish_low_stock(ingredient, theoretical_qty)
 
             # Log the adjustment as a transaction
             variance_qty = physical_qty - theoretical_qty
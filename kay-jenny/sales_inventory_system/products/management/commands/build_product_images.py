@@ -0,0 +1,69 @@
+"""
+Management command to build resized product images (thumbnails and WebP)
+Run with: python manage.py build_product_images [--force] [--watch [--interval 10]]
+
+With --watch it keeps running (Ctrl+C / SIGTERM to stop) and resizes new and
+replaced images in every database (default and branches) shortly after they
+are saved, so uploads never wait on Pillow in a web request. Run it on the
+machine that holds the media files (on Render: inside the web service).
+
+Without --watch it builds the variants in one pass - for images uploaded
+before the watcher existed, on servers without it (e.g. from cron), or for
+every product again with --force (e.g. after changing the sizes in
+image_service.py). Products whose variants are current are skipped.
+"""
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections
+
+from sales_inventory_system.products import image_service
+from sales_inventory_system.products.models import Product
+
+
+class Command(BaseCommand):
+    help = 'Build thumbnail and WebP variants of product images'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--force', action='store_true', help='Rebuild variants that are already current')
+        parser.add_argument('--watch', action='store_true', help='Keep running and resize new uploads as they appear')
+        parser.add_argument('--interval', type=float, default=10.0, help='Seconds between checks with --watch (default 10)')
+
+    def handle(self, *args, **options):
+        if options['watch']:
+            if options['force']:
+                raise CommandError('--force rebuilds everything once; run it without --watch')
+            self._watch(options['interval'])
+            return
+
+        built = skipped = failed = 0
+        products = Product.objects.exclude(image='').exclude(image__isnull=True).order_by('id')
+        for product in products.iterator(chunk_size=200):
+            if options['force'] and product.image_variants:
+                # Forget the current variants (deleting their files) so they are rebuilt
+                image_service.delete_variants(product)
+                product.image_variants = {}
+            if not image_service.refresh_variants(product):
+                skipped += 1
+            elif product.image_variants.get('webp'):
+                built += 1
+                self.stdout.write(f"  {product.name}: {len(product.image_variants['webp'])} size(s)")
+            else:
+                failed += 1
+                self.stdout.write(self.style.WARNING(f"  {product.name}: {product.image.name} is not a readable image"))
+
+        self.stdout.write(self.style.SUCCESS(f"Built {built}, skipped {skipped} current, {failed} unreadable"))
+
+    def _watch(self, interval):
+        databases = ['default', *(branch['database'] for branch in settings.BRANCHES.values())]
+        try:
+            while True:
+                for alias in databases:
+                    refreshed = image_service.refresh_pending(using=alias)
+                    if refreshed:
+                        self.stdout.write(f"Resized {refreshed} product image(s) in {alias}")
+                close_old_connections()
+                time.sleep(interval)
+        except KeyboardInterrupt:
+            pass
@@ -0,0 +1,140 @@
+"""
+Management command to import recipes (BOM) for many products at once
+Run with: python manage.py import_recipes recipes.csv [--dry-run]
+
+CSV format (one row per recipe line, header required):
+    product,ingredient,quantity
+    Margherita Pizza,Pizza Dough,250
+    Margherita Pizza,Mozzarella,120
+
+JSON format:
+    [{"product": "Margherita Pizza",
+      "ingredients": [{"ingredient": "Pizza Dough", "quantity": 250}, ...]}]
+
+Products and ingredients may be given by id or by exact name. Every listed
+product's recipe is replaced by the file's lines (only the differences are
+written); products not in the file are left alone. The whole import runs in
+one transaction and nothing is written if any line is invalid.
+"""
+import csv
+import json
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+
+from sales_inventory_system.products.models import Product, Ingredient
+from sales_inventory_system.products.recipe_service import RecipeService, RecipeValidationError
+from sales_inventory_system.system.branches import branch_atomic
+
+
+class DryRunRollback(Exception):
+    """Raised to roll back a --dry-run import"""
+    pass
+
+
+class Command(BaseCommand):
+    help = 'Import recipes for many products from a CSV or JSON file in one transaction'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='CSV or JSON file')
+        parser.add_argument('--format', choices=['csv', 'json'], help='File format (default: from extension)')
+        parser.add_argument('--dry-run', action='store_true', help='Validate and report changes without saving')
+
+    def handle(self, *args, **options):
+        path = Path(options['path'])
+        if not path.exists():
+            raise CommandError(f'File not found: {path}')
+
+        file_format = options['format'] or path.suffix.lstrip('.').lower()
+        if file_format == 'csv':
+            rows = self._read_csv(path)
+        elif file_format == 'json':
+            rows = self._read_json(path)
+        else:
+            raise CommandError('Unknown file format, use --format csv|json')
+
+        recipes = self._resolve(rows)
+
+        try:
+            with branch_atomic():
+                result = RecipeService.upsert_recipes(recipes, strict=True)
+                if options['dry_run']:
+                    raise DryRunRollback()
+        except RecipeValidationError as e:
+            raise CommandError(f'Import aborted, nothing was saved: {e}')
+        except DryRunRollback:
+            self.stdout.write(self.style.WARNING('Dry run - no changes saved'))
+
+        self.stdout.write(self.style.SUCCESS(
+            f"{len(recipes)} recipe(s): {result['created']} line(s) added, "
+            f"{result['updated']} updated, {result['deleted']} removed, "
+            f"{result['unchanged']} unchanged"
+        ))
+
+    def _read_csv(self, path):
+        with open(path, newline='', encoding='utf-8-sig') as f:
+            reader = csv.DictReader(f)
+            missing = {'product', 'ingredient', 'quantity'} - set(reader.fieldnames or [])
+            if missing:
+                raise CommandError(f"CSV is missing column(s): {', '.join(sorted(missing))}")
+            return [(row['product'], row['ingredient'], row['quantity']) for row in reader]
+
+    def _read_json(self, path):
+        try:
+            data = json.loads(path.read_text(encoding='utf-8'))
+        except json.JSONDecodeError as e:
+            raise CommandError(f'Invalid JSON: {e}')
+        if not isinstance(data, list):
+            raise CommandError('JSON must be a list of recipes')
+
+        rows = []
+        for number, recipe in enumerate(data, start=1):
+            if not isinstance(recipe, dict):
+                raise CommandError(f'Recipe {number}: expected an object with "product" and "ingredients"')
+            lines = recipe.get('ingredients') or []
+            if not isinstance(lines, list):
+                raise CommandError(f'Recipe {number}: "ingredients" must be a list')
+            if not lines:
+                # Keep the product so an empty list clears its recipe
+                rows.append((recipe.get('product'), None, None))
+            for line in lines:
+                if not isinstance(line, dict):
+                    raise CommandError(f'Recipe {number}: each ingredient must be an object with "ingredient" and "quantity"')
+                rows.append((recipe.get('product'), line.get('ingredient'), line.get('quantity')))
+        return rows
+
+    def _resolve(self, rows):
+        """Map product/ingredient names or ids to ids with one query per model"""
+        for number, (product, ingredient, quantity) in enumerate(rows, start=1):
+            if product is None or not str(product).strip():
+                raise CommandError(f'Line {number}: product is required')
+            if ingredient is not None and not str(ingredient).strip():
+                raise CommandError(f'Line {number}: ingredient is required')
+
+        product_ids = self._lookup(Product.objects.all(), {row[0] for row in rows}, 'product')
+        ingredient_ids = self._lookup(
+            Ingredient.objects.all(), {row[1] for row in rows if row[1] is not None}, 'ingredient'
+        )
+
+        recipes = {}
+        for product, ingredient, quantity in rows:
+            lines = recipes.setdefault(product_ids[str(product).strip()], [])
+            if ingredient is not None:
+                lines.append((ingredient_ids[str(ingredient).strip()], quantity))
+        return recipes
+
+    @staticmethod
+    def _lookup(queryset, keys, label):
+        keys = {str(key).strip() for key in keys if key is not None and str(key).strip()}
+        numeric = {int(key) for key in keys if key.isdigit()}
+
+        by_key = {}
+        for obj_id, name in queryset.filter(id__in=numeric).values_list('id', 'name'):
+            by_key[str(obj_id)] = obj_id
+        for obj_id, name in queryset.filter(name__in=keys).values_list('id', 'name'):
+            by_key[name] = obj_id
+
+        unknown = sorted(keys - set(by_key))
+        if unknown:
+            raise CommandError(f"Unknown {label}(s): {', '.join(unknown)}")
+        return by_key
@@ -0,0 +1,109 @@
+"""
+Management command to record many stock movements at once (deliveries,
+waste, adjustments)
+Run with: python manage.py import_stock_movements delivery.csv [--dry-run]
+
+CSV format (one row per movement, header required; unit_cost and notes
+are optional columns):
+    ingredient,type,quantity,unit_cost,notes
+    Mozzarella,PURCHASE,5000,0.42,Supplier invoice 1182
+    Pizza Dough,SPOILAGE,750,,Left out overnight
+    Tomato Sauce,ADJUSTMENT,-120,,Recount after spill
+
+Types: PURCHASE, ADJUSTMENT (signed quantity), WASTE, SPOILAGE, FREEBIE,
+SAMPLE, OTHER. Ingredients may be given by id or by exact name. The whole
+file is applied in one transaction and nothing is written if any row is
+invalid, unless --skip-invalid is given.
+"""
+import csv
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+
+from sales_inventory_system.products.models import Ingredient
+from sales_inventory_system.products.movement_service import StockMovementError, StockMovementService
+from sales_inventory_system.system.branches import branch_atomic
+
+
+class DryRunRollback(Exception):
+    """Raised to roll back a --dry-run import"""
+    pass
+
+
+class Command(BaseCommand):
+    help = 'Record purchases, waste and adjustments from a CSV file in one transaction'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='CSV file')
+        parser.add_argument('--user', help='Username to record the movements as')
+        parser.add_argument('--skip-invalid', action='store_true', help='Skip invalid rows instead of aborting')
+        parser.add_argument('--dry-run', action='store_true', help='Validate and report without saving')
+
+    def handle(self, *args, **options):
+        path = Path(options['path'])
+        if not path.exists():
+            raise CommandError(f'File not found: {path}')
+
+        user = None
+        if options['user']:
+            from django.contrib.auth import get_user_model
+            user = get_user_model().objects.filter(username=options['user']).first()
+            if user is None:
+                raise CommandError(f"Unknown user: {options['user']}")
+
+        movements = self._resolve(self._read_csv(path))
+
+        try:
+            with branch_atomic():
+                result = StockMovementService.record_movements(
+                    movements, user=user, strict=not options['skip_invalid']
+                )
+                if options['dry_run']:
+                    raise DryRunRollback()
+        except StockMovementError as e:
+            raise CommandError(f'Import aborted, nothing was saved: {e}')
+        except DryRunRollback:
+            self.stdout.write(self.style.WARNING('Dry run - no changes saved'))
+
+        for message in result['skipped']:
+            self.stdout.write(self.style.WARNING(f'  Skipped: {message}'))
+        self.stdout.write(self.style.SUCCESS(
+            f"{result['recorded']} movement(s) across {result['ingredients']} ingredient(s): "
+            f"{result['transactions']} stock transaction(s), {result['waste_logs']} waste log(s)"
+        ))
+
+    def _read_csv(self, path):
+        with open(path, newline='', encoding='utf-8-sig') as f:
+            reader = csv.DictReader(f)
+            missing = {'ingredient', 'type', 'quantity'} - set(reader.fieldnames or [])
+            if missing:
+                raise CommandError(f"CSV is missing column(s): {', '.join(sorted(missing))}")
+            return list(reader)
+
+    def _resolve(self, rows):
+        """Map ingredient names or ids to ids with one query"""
+        keys = {(row['ingredient'] or '').strip() for row in rows}
+        if '' in keys:
+            raise CommandError('Every row needs an ingredient')
+
+        by_key = {}
+        numeric = {int(key) for key in keys if key.isdigit()}
+        for obj_id in Ingredient.objects.filter(id__in=numeric).values_list('id', flat=True):
+            by_key[str(obj_id)] = obj_id
+        for obj_id, name in Ingredient.objects.filter(name__in=keys).values_list('id', 'name'):
+            by_key[name] = obj_id
+
+        unknown = sorted(keys - set(by_key))
+        if unknown:
+            raise CommandError(f"Unknown ingredient(s): {', '.join(unknown)}")
+
+        return [
+            {
+                'ingredient_id': by_key[row['ingredient'].strip()],
+                'type': row['type'],
+                'quantity': row['quantity'],
+                'unit_cost': row.get('unit_cost'),
+                'notes': row.get('notes'),
+            }
+            for row in rows
+        ]
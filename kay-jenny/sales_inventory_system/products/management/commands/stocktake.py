@@ -0,0 +1,137 @@
+"""
+Management command to run a stocktake (full physical count)
+Run with:
+    python manage.py stocktake start [--user admin]
+    python manage.py stocktake count <id> counts.csv [--user admin]
+    python manage.py stocktake status [<id>]
+    python manage.py stocktake close <id> [--user admin]
+    python manage.py stocktake cancel <id>
+
+Starting freezes system stock of every active ingredient. Counts can be
+loaded in several files (a later count of an ingredient replaces the
+earlier one). Closing writes physical counts, variance records and stock
+adjustments for every counted ingredient in one transaction.
+
+Counts CSV (header required, notes optional):
+    ingredient,quantity,notes
+    Mozzarella,4820,Walk-in cooler
+    12,950,
+Ingredients may be given by id or by exact name.
+"""
+import csv
+from pathlib import Path
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from sales_inventory_system.products.models import Ingredient, StocktakeSession
+from sales_inventory_system.products.stocktake_service import StocktakeError, StocktakeService
+
+
+class Command(BaseCommand):
+    help = 'Start, count, close or cancel a stocktake session'
+
+    def add_arguments(self, parser):
+        parser.add_argument('action', choices=['start', 'count', 'status', 'close', 'cancel'])
+        parser.add_argument('session', nargs='?', type=int, help='Stocktake id (default for status: the open one)')
+        parser.add_argument('path', nargs='?', help='Counts CSV (for count)')
+        parser.add_argument('--user', help='Username to record the action as')
+        parser.add_argument('--notes', default='', help='Session notes (for start)')
+        parser.add_argument('--skip-invalid', action='store_true', help='Skip invalid count rows instead of aborting')
+
+    def handle(self, *args, **options):
+        user = None
+        if options['user']:
+            user = get_user_model().objects.filter(username=options['user']).first()
+            if user is None:
+                raise CommandError(f"Unknown user: {options['user']}")
+
+        action = options['action']
+        if action not in ('start', 'status') and options['session'] is None:
+            raise CommandError(f'{action} needs a stocktake id')
+
+        try:
+            if action == 'start':
+                session = StocktakeService.start_session(user=user, notes=options['notes'])
+                progress = StocktakeService.progress(session)
+                self.stdout.write(self.style.SUCCESS(
+                    f"Stocktake #{session.id} started: {progress['total']} ingredient(s) frozen"
+                ))
+            elif action == 'count':
+                if not options['path']:
+                    raise CommandError('count needs a CSV file')
+                result = StocktakeService.record_counts(
+                    options['session'], self._read_counts(Path(options['path'])),
+                    user=user, strict=not options['skip_invalid'],
+                )
+                for message in result['skipped']:
+                    self.stdout.write(self.style.WARNING(f'  Skipped: {message}'))
+                self.stdout.write(self.style.SUCCESS(f"{result['recorded']} count(s) recorded"))
+                self._status(options['session'])
+            elif action == 'status':
+                self._status(options['session'])
+            elif action == 'close':
+                result = StocktakeService.close_session(options['session'], user=user)
+                self.stdout.write(self.style.SUCCESS(
+                    f"Stocktake #{result['session_id']} closed: {result['counted']} counted, "
+                    f"{result['adjusted']} adjusted, {result['uncounted']} not counted (left unchanged)"
+                ))
+                self.stdout.write(
+                    f"  {result['outside_tolerance']} ingredient(s) outside variance tolerance "
+                    f"for {result['period_start']:%Y-%m-%d} to {result['period_end']:%Y-%m-%d}"
+                )
+            else:
+                StocktakeService.cancel_session(options['session'], user=user)
+                self.stdout.write(self.style.WARNING(f"Stocktake #{options['session']} cancelled"))
+        except StocktakeError as e:
+            raise CommandError(str(e))
+
+    def _status(self, session_id):
+        if session_id is None:
+            session = StocktakeSession.objects.filter(status='OPEN').first()
+            if session is None:
+                self.stdout.write('No stocktake is open')
+                return
+        else:
+            session = StocktakeSession.objects.filter(pk=session_id).first()
+            if session is None:
+                raise CommandError(f'Stocktake #{session_id} does not exist')
+
+        progress = StocktakeService.progress(session)
+        self.stdout.write(
+            f"Stocktake #{session.id} ({session.get_status_display()}), started "
+            f"{session.started_at:%Y-%m-%d %H:%M}: {progress['counted']} of {progress['total']} counted"
+        )
+
+    def _read_counts(self, path):
+        if not path.exists():
+            raise CommandError(f'File not found: {path}')
+        with open(path, newline='', encoding='utf-8-sig') as f:
+            reader = csv.DictReader(f)
+            missing = {'ingredient', 'quantity'} - set(reader.fieldnames or [])
+            if missing:
+                raise CommandError(f"CSV is missing column(s): {', '.join(sorted(missing))}")
+            rows = list(reader)
+
+        # Resolve names or ids with one query per kind
+        keys = {(row['ingredient'] or '').strip() for row in rows}
+        if '' in keys:
+            raise CommandError('Every row needs an ingredient')
+        by_key = {}
+        numeric = {int(key) for key in keys if key.isdigit()}
+        for obj_id in Ingredient.objects.filter(id__in=numeric).values_list('id', flat=True):
+            by_key[str(obj_id)] = obj_id
+        for obj_id, name in Ingredient.objects.filter(name__in=keys).values_list('id', 'name'):
+            by_key[name] = obj_id
+        unknown = sorted(keys - set(by_key))
+        if unknown:
+            raise CommandError(f"Unknown ingredient(s): {', '.join(unknown)}")
+
+        return [
+            {
+                'ingredient_id': by_key[row['ingredient'].strip()],
+                'quantity': row['quantity'],
+                'notes': row.get('notes'),
+            }
+            for row in rows
+        ]
@@ -0,0 +1,201 @@
+"""
+POS Menu Snapshot Service
+
+Builds the sellable-product menu used by POS terminals in one pass:
+- Price, category and image for every active product
+- Max producible units and bottleneck ingredient (from the recipe's flattened
+  explosion + ingredient stock, so sub-recipes count)
+- A menu version that changes whenever products, recipes or ingredient stock change
+- "Changes since version N" deltas so terminals only download what changed
+
+The version is the latest updated_at across Product, RecipeItem and Ingredient,
+and the latest deletion (MenuTombstone), expressed in microseconds. It is
+cached in the shared cache and invalidated by signals (see products/signals.py),
+so an unchanged poll costs one cache read. Deleted products are reported under
+'removed' for MENU_TOMBSTONE_DAYS; a client whose version is older than that
+gets the full menu instead of a delta.
+"""
+
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Max, Q
+from django.utils import timezone
+
+from sales_inventory_system.system.conditional import bump_version
+from .models import Product, Ingredient, RecipeItem, MenuTombstone
+
+
+MENU_VERSION_CACHE_KEY = 'pos_menu_version'
+
+# Re-send anything touched shortly before the client's version. A row saved
+# inside a transaction that commits late can carry an updated_at slightly older
+# than a version already handed out; the overlap makes sure it is not missed.
+DELTA_OVERLAP = timedelta(seconds=5)
+
+
+class MenuService:
+    """Service for the versioned POS menu snapshot"""
+
+    @staticmethod
+    def get_version():
+        """
+        Get the current menu version.
+
+        Returns:
+            int: Microsecond timestamp of the most recent menu-affecting change
+        """
+        version = cache.get(MENU_VERSION_CACHE_KEY)
+        if version is None:
+            version = MenuService._compute_version()
+            cache.set(MENU_VERSION_CACHE_KEY, version, None)
+        return version
+
+    @staticmethod
+    def _compute_version():
+        latest = [
+            Product.objects.aggregate(latest=Max('updated_at'))['latest'],
+            RecipeItem.objects.aggregate(latest=Max('updated_at'))['latest'],
+            Ingredient.objects.aggregate(latest=Max('updated_at'))['latest'],
+            MenuTombstone.objects.aggregate(latest=Max('deleted_at'))['latest'],
+        ]
+        latest = [ts for ts in latest if ts is not None]
+        if not latest:
+            return 0
+        return MenuService._to_version(max(latest))
+
+    @staticmethod
+    def invalidate():
+        """
+        Drop the cached menu version.
+
+        Called on every menu-affecting write. The delete is repeated after the
+        surrounding transaction commits so a concurrent reader cannot cache a
+        version computed from pre-commit data.
+        """
+        cache.delete(MENU_VERSION_CACHE_KEY)
+        transaction.on_commit(lambda: cache.delete(MENU_VERSION_CACHE_KEY))
+        # Product/ingredient list polls revalidate against the same writes
+        bump_version('menu')
+
+    @staticmethod
+    def record_deletion(product_id=None):
+        """
+        Leave a tombstone for a deleted menu row and prune expired ones.
+
+        Args:
+            product_id: Deleted product, or None for an ingredient/recipe
+                delete that only has to move the version forward
+        """
+        now = timezone.now()
+        MenuTombstone.objects.filter(deleted_at__lt=now - MenuService._tombstone_retention()).delete()
+        MenuTombstone.objects.create(product_id=product_id, deleted_at=now)
+
+    @staticmethod
+    def _tombstone_retention():
+        return timedelta(days=settings.MENU_TOMBSTONE_DAYS)
+
+    @staticmethod
+    def _to_version(ts):
+        return int(ts.timestamp() * 1_000_000)
+
+    @staticmethod
+    def _from_version(version):
+        return datetime.fromtimestamp(version / 1_000_000, tz=dt_timezone.utc)
+
+    @staticmethod
+    def serialize_product(product, ingredients=None):
+        """
+        Serialize one product for the POS menu.
+        Pass {ingredient_id: Ingredient} when serializing many products so
+        stock is not fetched per product.
+        """
+        max_units, bottleneck = product.stock_capacity(ingredients)
+
+        # Ingredients switched off by a cashier make the product unsellable
+        unavailable = None
+        if product.requires_bom:
+            for ingredient, _ in product.exploded_ingredients(ingredients):
+                if not ingredient.is_available:
+                    unavailable = ingredient
+                    break
+
+        if unavailable is not None:
+            max_units = 0
+            bottleneck = unavailable
+
+        return {
+            'id': product.id,
+            'name': product.name,
+            'price': float(product.price),
+            'category': product.category or 'Other',
+            'image_url': product.image_thumb_url,
+            'image_srcset': product.image_srcset,
+            'requires_bom': product.requires_bom,
+            'max_units': max_units,
+            'available': max_units > 0,
+            'bottleneck_ingredient': {
+                'id': bottleneck.id,
+                'name': bottleneck.name,
+                'unit': bottleneck.unit,
+                'current_stock': float(bottleneck.current_stock),
+                'is_available': bottleneck.is_available,
+            } if bottleneck is not None else None,
+            'updated_at': product.updated_at.isoformat(),
+        }
+
+    @staticmethod
+    def build_snapshot(since=None):
+        """
+        Build the full menu, or only the products changed since a version.
+
+        Args:
+            since: Menu version previously received by the client (optional)
+
+        Returns:
+            dict: {'version', 'full', 'since', 'products', 'removed'}
+        """
+        # Read the version before the data: if a write lands in between, the
+        # client gets newer data under an older version and simply re-fetches it.
+        version = MenuService.get_version()
+
+        products = Product.objects.select_related('recipe').order_by('category', 'name')
+        ingredients = Ingredient.objects.in_bulk()
+
+        removed = []
+        if since and MenuService._from_version(since) < timezone.now() - MenuService._tombstone_retention():
+            # Deletions that old have been pruned; start the client over
+            since = None
+        if since:
+            changed_after = MenuService._from_version(since) - DELTA_OVERLAP
+            changed_ingredients = [
+                str(ingredient.id) for ingredient in ingredients.values()
+                if ingredient.updated_at > changed_after
+            ]
+            changed = Q(updated_at__gt=changed_after) | Q(recipe__updated_at__gt=changed_after)
+            if changed_ingredients:
+                # Explosions are keyed by ingredient id, so this also catches
+                # ingredients that are only used through a sub-recipe
+                changed |= Q(recipe__explosion__has_any_keys=changed_ingredients)
+            products = products.filter(changed)
+
+            # Products archived since the client's version drop off the menu
+            removed = [p.id for p in products if p.is_archived]
+            products = [p for p in products if not p.is_archived]
+            # Deleted since then (ids are never reused, so no overlap with products)
+            removed += MenuTombstone.objects.filter(
+                deleted_at__gt=changed_after, product_id__isnull=False
+            ).order_by('product_id').values_list('product_id', flat=True).distinct()
+        else:
+            products = products.filter(is_archived=False)
+
+        return {
+            'version': version,
+            'full': not since,
+            'since': since,
+            'products': [MenuService.serialize_product(p, ingredients) for p in products],
+            'removed': removed,
+            'generated_at': timezone.now().isoformat(),
+        }
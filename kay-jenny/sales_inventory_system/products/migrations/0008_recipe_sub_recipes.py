@@ -0,0 +1,63 @@
+# Generated by Django 5.2.8 on 2026-10-19 06:38
+
+import django.core.validators
+import django.db.models.deletion
+from decimal import Decimal
+from django.db import migrations, models
+
+
+def build_explosions(apps, schema_editor):
+    """Existing recipes have no sub-recipes yet, so their explosion is their own lines"""
+    RecipeItem = apps.get_model('products', 'RecipeItem')
+    RecipeIngredient = apps.get_model('products', 'RecipeIngredient')
+    db_alias = schema_editor.connection.alias
+
+    explosions = {recipe_id: {} for recipe_id in RecipeItem.objects.using(db_alias).values_list('id', flat=True)}
+    for recipe_id, ingredient_id, quantity in RecipeIngredient.objects.using(db_alias).values_list(
+        'recipe_id', 'ingredient_id', 'quantity'
+    ):
+        explosions[recipe_id][str(ingredient_id)] = format(quantity.normalize(), 'f')
+
+    recipes = []
+    for recipe_id, explosion in explosions.items():
+        recipes.append(RecipeItem(id=recipe_id, explosion=explosion))
+    RecipeItem.objects.using(db_alias).bulk_update(recipes, ['explosion'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0007_alter_product_name'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipeingredient',
+            name='sub_recipe',
+            field=models.ForeignKey(blank=True, help_text='Prepared intermediate (e.g. dough, sauce) used instead of a raw ingredient', null=True, on_delete=django.db.models.deletion.PROTECT, related_name='used_in', to='products.recipeitem'),
+        ),
+        migrations.AddField(
+            model_name='recipeitem',
+            name='explosion',
+            field=models.JSONField(blank=True, editable=False, help_text='Raw ingredient quantity per unit with sub-recipes flattened ({ingredient_id: quantity}). Rebuilt whenever this recipe or one of its sub-recipes changes.', null=True),
+        ),
+        migrations.AlterField(
+            model_name='recipeingredient',
+            name='ingredient',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to='products.ingredient'),
+        ),
+        migrations.AlterField(
+            model_name='recipeingredient',
+            name='quantity',
+            field=models.DecimalField(decimal_places=3, help_text='Ingredient quantity, or units of the sub-recipe, per product unit', max_digits=10, validators=[django.core.validators.MinValueValidator(Decimal('0.001'))]),
+        ),
+        migrations.AddConstraint(
+            model_name='recipeingredient',
+            constraint=models.CheckConstraint(condition=models.Q(models.Q(('ingredient__isnull', False), ('sub_recipe__isnull', True)), models.Q(('ingredient__isnull', True), ('sub_recipe__isnull', False)), _connector='OR'), name='recipe_line_ingredient_or_sub_recipe'),
+        ),
+        migrations.AddConstraint(
+            model_name='recipeingredient',
+            constraint=models.UniqueConstraint(fields=('recipe', 'sub_recipe'), name='unique_recipe_sub_recipe'),
+        ),
+        migrations.RunPython(build_explosions, migrations.RunPython.noop),
+    ]
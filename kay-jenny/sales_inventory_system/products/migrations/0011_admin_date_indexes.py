@@ -0,0 +1,31 @@
+# Generated by Django 5.2.8 on 2026-10-19 07:27
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0010_product_image_variants'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='physicalcount',
+            index=models.Index(fields=['count_date'], name='products_ph_count_d_1e910a_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='stocktransaction',
+            index=models.Index(fields=['created_at'], name='products_st_created_aa13cf_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='variancerecord',
+            index=models.Index(fields=['period_end'], name='products_va_period__a5f781_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='wastelog',
+            index=models.Index(fields=['waste_date'], name='products_wa_waste_d_a127b2_idx'),
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 5.2.8 on 2026-10-19 07:43
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0011_admin_date_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MenuTombstone',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('product_id', models.IntegerField(blank=True, help_text='Deleted product (null for ingredient/recipe deletes)', null=True)),
+                ('deleted_at', models.DateTimeField(db_index=True, default=django.utils.timezone.now)),
+            ],
+            options={
+                'ordering': ['-deleted_at'],
+            },
+        ),
+    ]
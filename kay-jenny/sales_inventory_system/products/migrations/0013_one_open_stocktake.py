@@ -0,0 +1,19 @@
+# Generated by Django 5.2.8 on 2026-10-19 07:46
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0012_menu_tombstone'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddConstraint(
+            model_name='stocktakesession',
+            constraint=models.UniqueConstraint(condition=models.Q(('status', 'OPEN')), fields=('status',), name='one_open_stocktake'),
+        ),
+    ]
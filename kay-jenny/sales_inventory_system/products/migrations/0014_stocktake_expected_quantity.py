@@ -0,0 +1,18 @@
+# Generated by Django 5.2.8 on 2026-10-19 08:04
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0013_one_open_stocktake'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='stocktakeline',
+            name='expected_quantity',
+            field=models.DecimalField(blank=True, decimal_places=3, help_text='System stock when the count was entered (sales since the start included)', max_digits=10, null=True),
+        ),
+    ]
@@ -21,6 +21,12 @@ class Product(models.Model):
         help_text="Minimum stock level before low-stock alert"
     )
     image = models.ImageField(upload_to='products/', blank=True, null=True)
+    image_variants = models.JSONField(
+        default=dict,
+        blank=True,
+        editable=False,
+        help_text="Resized WebP/JPEG copies of image (built by image_service)"
+    )
     category = models.CharField(max_length=100, blank=True)
     requires_bom = models.BooleanField(
         default=False,
@@ -46,6 +52,37 @@ class Product(models.Model):
         """Check if product is available for ordering"""
         return not self.is_archived and self.stock > 0
 
+    def _image_variants(self, fmt):
+        """[(storage name, width)] of the resized copies, [] until they are built"""
+        if not self.image or self.image_variants.get('source') != self.image.name:
+            return []
+        return self.image_variants.get(fmt, [])
+
+    def _srcset(self, fmt):
+        storage = self.image.storage
+        return ', '.join(f"{storage.url(name)} {width}w" for name, width in self._image_variants(fmt))
+
+    @property
+    def image_srcset(self):
+        """WebP srcset for <picture>/<img> ('' when there is no image or no variants yet)"""
+        return self._srcset('webp')
+
+    @property
+    def image_fallback_srcset(self):
+        """JPEG srcset for browsers without WebP"""
+        return self._srcset('jpeg')
+
+    @property
+    def image_thumb_url(self):
+        """Small JPEG for tiles and cart rows; the original upload until variants exist"""
+        if not self.image:
+            return None
+        variants = self._image_variants('jpeg')
+        if not variants:
+            return self.image.url
+        # Second-smallest is sharp enough for a tile on a 2x tablet screen
+        return self.image.storage.url(variants[min(1, len(variants) - 1)][0])
+
     @property
     def calculated_stock(self):
         """
@@ -57,27 +94,35 @@ class Product(models.Model):
             available_units = ingredient_stock / required_quantity_per_product
         Return: min(available_units) for all ingredients (bottleneck ingredient)
         """
+        return self.stock_capacity()[0]
+
+    def stock_capacity(self, ingredients=None):
+        """
+        Return (max producible units, bottleneck Ingredient or None).
+
+        Works on the recipe's flattened explosion (sub-recipes included), see
+        exploded_ingredients() for how Ingredient objects are looked up.
+        """
         # If product doesn't require a BOM or has no recipe, return hardcoded stock
         if not self.requires_bom:
-            return self.stock
+            return self.stock, None
 
         try:
-            recipe = self.recipe
+            self.recipe
         except RecipeItem.DoesNotExist:
-            return self.stock
+            return self.stock, None
 
-        # Get all ingredients in the recipe
-        recipe_ingredients = recipe.ingredients.all()
+        # Raw ingredients needed per unit
+        recipe_ingredients = self.exploded_ingredients(ingredients)
 
-        if not recipe_ingredients.exists():
+        if not recipe_ingredients:
             # Recipe exists but has no ingredients
-            return 0
+            return 0, None
 
         # Calculate available units for each ingredient
-        available_units = []
-        for recipe_ingredient in recipe_ingredients:
-            ingredient = recipe_ingredient.ingredient
-            required_qty = recipe_ingredient.quantity
+        max_units = None
+        bottleneck = None
+        for ingredient, required_qty in recipe_ingredients:
 
             # Avoid division by zero
             if required_qty == 0:
@@ -85,10 +130,51 @@ class Product(models.Model):
 
             # How many product units can we make with this ingredient?
             units_possible = int(ingredient.current_stock / required_qty)
-            available_units.append(units_possible)
+            if max_units is None or units_possible < max_units:
+                max_units = units_possible
+                bottleneck = ingredient
+
+        # The minimum (bottleneck ingredient) determines max producible units
+        return (max_units if max_units is not None else 0), bottleneck
 
-        # Return the minimum (bottleneck ingredient determines max producible units)
-        return min(available_units) if available_units else 0
+    def exploded_ingredients(self, ingredients=None):
+        """
+        Raw ingredients needed for one unit, with sub-recipes flattened.
+
+        Args:
+            ingredients: Optional {ingredient_id: Ingredient} to take objects from
+
+        Returns:
+            list: (Ingredient, quantity per unit) pairs
+
+        Ingredient objects come from `ingredients`, then from prefetched
+        recipe__ingredients__ingredient; only the remainder (ingredients that
+        are only reached through sub-recipes) is fetched in one query.
+        """
+        try:
+            recipe = self.recipe
+        except RecipeItem.DoesNotExist:
+            return []
+
+        explosion = recipe.get_explosion()
+        if not explosion:
+            return []
+
+        known = dict(ingredients) if ingredients else {}
+        if any(ingredient_id not in known for ingredient_id in explosion):
+            if 'ingredients' in getattr(recipe, '_prefetched_objects_cache', {}):
+                for line in recipe.ingredients.all():
+                    if line.ingredient_id is not None:
+                        known.setdefault(line.ingredient_id, line.ingredient)
+            missing = [ingredient_id for ingredient_id in explosion if ingredient_id not in known]
+            if missing:
+                known.update(Ingredient.objects.in_bulk(missing))
+
+        return [
+            (known[ingredient_id], quantity)
+            for ingredient_id, quantity in explosion.items()
+            if ingredient_id in known
+        ]
 
 
 class Ingredient(models.Model):
@@ -154,6 +240,13 @@ class RecipeItem(models.Model):
         help_text="Product that this recipe creates"
     )
     created_by = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True)
+    explosion = models.JSONField(
+        null=True,
+        blank=True,
+        editable=False,
+        help_text="Raw ingredient quantity per unit with sub-recipes flattened ({ingredient_id: quantity}). "
+                  "Rebuilt whenever this recipe or one of its sub-recipes changes."
+    )
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
@@ -164,6 +257,20 @@ class RecipeItem(models.Model):
     def __str__(self):
         return f"Recipe for {self.product.name}"
 
+    def get_explosion(self):
+        """
+        Flattened raw-ingredient quantities for one unit of this recipe.
+
+        Returns:
+            dict: {ingredient_id (int): Decimal quantity}
+        """
+        if self.explosion is None:
+            # Not built yet (e.g. created through a bulk write): build it now
+            from .recipe_service import RecipeService
+            RecipeService.rebuild_explosions([self.id])
+            self.explosion = RecipeItem.objects.filter(pk=self.pk).values_list('explosion', flat=True).first() or {}
+        return {int(ingredient_id): Decimal(quantity) for ingredient_id, quantity in self.explosion.items()}
+
     @property
     def total_cost(self):
         """Calculate total cost of all ingredients in recipe"""
@@ -178,19 +285,49 @@ class RecipeIngredient(models.Model):
         on_delete=models.CASCADE,
         related_name='ingredients'
     )
-    ingredient = models.ForeignKey(Ingredient, on_delete=models.CASCADE)
+    ingredient = models.ForeignKey(Ingredient, on_delete=models.CASCADE, null=True, blank=True)
+    sub_recipe = models.ForeignKey(
+        RecipeItem,
+        on_delete=models.PROTECT,
+        null=True,
+        blank=True,
+        related_name='used_in',
+        help_text="Prepared intermediate (e.g. dough, sauce) used instead of a raw ingredient"
+    )
     quantity = models.DecimalField(
         max_digits=10,
         decimal_places=3,
-        validators=[MinValueValidator(Decimal('0.001'))]
+        validators=[MinValueValidator(Decimal('0.001'))],
+        help_text="Ingredient quantity, or units of the sub-recipe, per product unit"
     )
 
     class Meta:
         unique_together = ('recipe', 'ingredient')
+        constraints = [
+            models.CheckConstraint(
+                condition=(
+                    models.Q(ingredient__isnull=False, sub_recipe__isnull=True)
+                    | models.Q(ingredient__isnull=True, sub_recipe__isnull=False)
+                ),
+                name='recipe_line_ingredient_or_sub_recipe',
+            ),
+            models.UniqueConstraint(fields=['recipe', 'sub_recipe'], name='unique_recipe_sub_recipe'),
+        ]
 
     def __str__(self):
+        if self.sub_recipe_id:
+            return f"{self.quantity} x {self.sub_recipe.product.name} for {self.recipe.product.name}"
         return f"{self.ingredient.name} ({self.quantity}{self.ingredient.unit}) for {self.recipe.product.name}"
 
+    def clean(self):
+        from django.core.exceptions import ValidationError
+        from .recipe_service import RecipeService
+
+        if (self.ingredient_id is None) == (self.sub_recipe_id is None):
+            raise ValidationError("Choose either an ingredient or a sub-recipe.")
+        if self.sub_recipe_id and self.recipe_id and RecipeService.creates_cycle(self.recipe_id, self.sub_recipe_id):
+            raise ValidationError("A recipe cannot contain itself, directly or through its sub-recipes.")
+
 
 class StockTransaction(models.Model):
     """Log all ingredient stock movements"""
@@ -222,6 +359,8 @@ class StockTransaction(models.Model):
         ordering = ['-created_at']
         indexes = [
             models.Index(fields=['ingredient', 'created_at']),
+            # Admin date drill-down (date_hierarchy) and day filters
+            models.Index(fields=['created_at']),
         ]
 
     def __str__(self):
@@ -249,6 +388,10 @@ class PhysicalCount(models.Model):
 
     class Meta:
         ordering = ['-count_date']
+        indexes = [
+            # Admin date drill-down (date_hierarchy) and day filters
+            models.Index(fields=['count_date']),
+        ]
 
     def __str__(self):
         return f"Count of {self.ingredient.name} on {self.count_date.date()}"
@@ -292,6 +435,8 @@ class VarianceRecord(models.Model):
         ordering = ['-period_end']
         indexes = [
             models.Index(fields=['ingredient', 'period_end']),
+            # Admin date drill-down (date_hierarchy) and day filters
+            models.Index(fields=['period_end']),
         ]
 
     def __str__(self):
@@ -322,6 +467,8 @@ class WasteLog(models.Model):
         ordering = ['-waste_date']
         indexes = [
             models.Index(fields=['ingredient', 'waste_date']),
+            # Admin date drill-down (date_hierarchy) and day filters
+            models.Index(fields=['waste_date']),
         ]
 
     def __str__(self):
@@ -363,8 +510,109 @@ class PrepBatch(models.Model):
 
     @property
     def expected_ingredient_usage(self):
-        """Calculate expected ingredient usage for this batch"""
+        """Calculate expected raw ingredient usage for this batch (sub-recipes flattened)"""
+        explosion = self.recipe.get_explosion()
+        ingredients = Ingredient.objects.in_bulk(list(explosion))
         usage = {}
-        for recipe_ing in self.recipe.ingredients.all():
-            usage[recipe_ing.ingredient.name] = recipe_ing.quantity * self.quantity_produced
+        for ingredient_id, quantity in explosion.items():
+            if ingredient_id in ingredients:
+                usage[ingredients[ingredient_id].name] = quantity * self.quantity_produced
         return usage
+
+
+class StocktakeSession(models.Model):
+    """A physical count of many ingredients against one frozen snapshot of system stock"""
+
+    STATUS_CHOICES = [
+        ('OPEN', 'Open'),
+        ('CLOSED', 'Closed'),
+        ('CANCELLED', 'Cancelled'),
+    ]
+
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='OPEN', db_index=True)
+    started_by = models.ForeignKey(
+        settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True,
+        related_name='stocktakes_started'
+    )
+    started_at = models.DateTimeField(default=timezone.now, help_text="Moment theoretical stock was frozen")
+    closed_by = models.ForeignKey(
+        settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True,
+        related_name='stocktakes_closed'
+    )
+    closed_at = models.DateTimeField(null=True, blank=True)
+    notes = models.TextField(blank=True)
+
+    class Meta:
+        ordering = ['-started_at']
+        constraints = [
+            # Only one count at a time; enforced by the database, not just StocktakeService
+            models.UniqueConstraint(fields=['status'], condition=models.Q(status='OPEN'), name='one_open_stocktake'),
+        ]
+
+    def __str__(self):
+        return f"Stocktake #{self.id} ({self.get_status_display()}) {self.started_at:%Y-%m-%d}"
+
+
+class StocktakeLine(models.Model):
+    """One ingredient in a stocktake: frozen theoretical quantity and the count, once entered"""
+
+    session = models.ForeignKey(StocktakeSession, on_delete=models.CASCADE, related_name='lines')
+    ingredient = models.ForeignKey(Ingredient, on_delete=models.CASCADE, related_name='stocktake_lines')
+    theoretical_quantity = models.DecimalField(
+        max_digits=10,
+        decimal_places=3,
+        help_text="System stock when the session started"
+    )
+    physical_quantity = models.DecimalField(
+        max_digits=10,
+        decimal_places=3,
+        null=True,
+        blank=True,
+        help_text="Counted quantity (empty until counted)"
+    )
+    expected_quantity = models.DecimalField(
+        max_digits=10,
+        decimal_places=3,
+        null=True,
+        blank=True,
+        help_text="System stock when the count was entered (sales since the start included)"
+    )
+    counted_by = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True)
+    counted_at = models.DateTimeField(null=True, blank=True)
+    notes = models.TextField(blank=True)
+
+    class Meta:
+        ordering = ['ingredient__name']
+        constraints = [
+            models.UniqueConstraint(fields=['session', 'ingredient'], name='unique_stocktake_ingredient'),
+        ]
+
+    def __str__(self):
+        return f"{self.ingredient.name} in stocktake #{self.session_id}"
+
+    @property
+    def variance_quantity(self):
+        """Counted minus system stock at the time of the count (None until counted)"""
+        if self.physical_quantity is None:
+            return None
+        expected = self.theoretical_quantity if self.expected_quantity is None else self.expected_quantity
+        return self.physical_quantity - expected
+
+
+class MenuTombstone(models.Model):
+    """
+    Deletion marker for the POS menu (see MenuService). Deleted rows leave
+    nothing behind for max(updated_at), so each delete records its time here:
+    the menu version never goes backwards and ?since= deltas list deleted
+    products under 'removed'. Old markers are pruned on the next delete.
+    """
+
+    product_id = models.IntegerField(null=True, blank=True, help_text="Deleted product (null for ingredient/recipe deletes)")
+    deleted_at = models.DateTimeField(default=timezone.now, db_index=True)
+
+    class Meta:
+        ordering = ['-deleted_at']
+
+    def __str__(self):
+        target = f"product #{self.product_id}" if self.product_id else "menu row"
+        return f"Deleted {target} at {self.deleted_at:%Y-%m-%d %H:%M}"
@@ -0,0 +1,267 @@
+"""
+Bulk Stock Movement Service
+
+Records many purchases, waste entries and adjustments in one transaction:
+- Every movement parsed and validated in one pass; all ingredients loaded
+  and locked with one query
+- Stock changed with a single set-based UPDATE (F() plus one CASE branch per
+  ingredient) instead of a get/save per entry
+- WasteLog, StockTransaction and audit rows written with bulk_create
+- Low-stock events published and the menu version bumped once per batch
+
+Used by the stock movement API and the import_stock_movements command.
+"""
+
+from decimal import Decimal, InvalidOperation
+
+from django.contrib.contenttypes.models import ContentType
+from django.db.models import Case, DecimalField, F, Value, When
+from django.utils import timezone
+
+from sales_inventory_system.system.activity import record_activity
+from sales_inventory_system.system.branches import branch_atomic
+from sales_inventory_system.system.events import publish_low_stock
+from sales_inventory_system.system.models import AuditLog
+from sales_inventory_system.system.signals import get_current_user, serialize_model_instance
+from .menu_service import MenuService
+from .models import Ingredient, StockTransaction, WasteLog
+
+
+class StockMovementError(Exception):
+    """Raised when a batch of stock movements contains invalid entries"""
+    pass
+
+
+# Movement type -> ledger transaction type. Waste types also create a
+# WasteLog; the ledger only distinguishes freebies from other waste.
+MOVEMENT_TYPES = {
+    'PURCHASE': 'PURCHASE',
+    'ADJUSTMENT': 'ADJUSTMENT',
+    'WASTE': 'WASTE',
+    'SPOILAGE': 'WASTE',
+    'SAMPLE': 'WASTE',
+    'OTHER': 'WASTE',
+    'FREEBIE': 'FREEBIE',
+}
+WASTE_TYPES = {code for code, label in WasteLog.WASTE_TYPES}
+
+
+def audit_stock_transactions(stock_transactions, ingredients, user=None):
+    """
+    Write the audit rows (and activity counts) the StockTransaction post_save
+    signal would have written; bulk_create does not send it.
+
+    Args:
+        stock_transactions: Saved StockTransaction instances
+        ingredients: {ingredient_id: Ingredient} covering the transactions
+        user: Fallback user when no request user is set
+    """
+    audit_user = get_current_user() or user
+    content_type = ContentType.objects.get_for_model(StockTransaction)
+    audit_logs = AuditLog.objects.bulk_create([
+        AuditLog(
+            user=audit_user,
+            action='CREATE',
+            content_type=content_type,
+            object_id=stock_transaction.id,
+            model_name='StockTransaction',
+            record_id=stock_transaction.id,
+            description=(
+                f'Stock {stock_transaction.get_transaction_type_display()}: {stock_transaction.quantity} '
+                f'{ingredients[stock_transaction.ingredient_id].unit} of '
+                f'{ingredients[stock_transaction.ingredient_id].name}'
+            ),
+            data_after=serialize_model_instance(stock_transaction),
+        )
+        for stock_transaction in stock_transactions
+    ])
+    record_activity(audit_logs)
+
+
+class StockMovementService:
+    """Service for set-based stock movement batches"""
+
+    @staticmethod
+    def parse_movements(movements):
+        """
+        Normalize raw movements.
+
+        Args:
+            movements: Iterable of dicts with 'ingredient_id', 'type', 'quantity'
+                and optional 'unit_cost' and 'notes'. Quantities are positive,
+                except ADJUSTMENT where the sign gives the direction.
+
+        Returns:
+            tuple: (list of (line number, movement dict), [error messages])
+        """
+        parsed = []
+        errors = []
+        for number, movement in enumerate(movements, start=1):
+            movement_type = str(movement.get('type') or '').strip().upper()
+            if movement_type not in MOVEMENT_TYPES:
+                errors.append(
+                    f"Line {number}: unknown type {movement.get('type')!r} "
+                    f"(use {', '.join(MOVEMENT_TYPES)})"
+                )
+                continue
+
+            try:
+                ingredient_id = int(movement.get('ingredient_id'))
+                quantity = Decimal(str(movement.get('quantity')))
+                unit_cost = movement.get('unit_cost')
+                unit_cost = Decimal(str(unit_cost)) if unit_cost not in (None, '') else None
+            except (TypeError, ValueError, InvalidOperation):
+                errors.append(
+                    f"Line {number}: invalid ingredient {movement.get('ingredient_id')!r} "
+                    f"or quantity {movement.get('quantity')!r}"
+                )
+                continue
+
+            if not quantity.is_finite() or quantity == 0:
+                errors.append(f"Line {number}: quantity must be a non-zero number")
+                continue
+            if quantity < 0 and movement_type != 'ADJUSTMENT':
+                errors.append(f"Line {number}: only ADJUSTMENT quantities may be negative")
+                continue
+            if unit_cost is not None and (not unit_cost.is_finite() or unit_cost < 0):
+                errors.append(f"Line {number}: unit_cost cannot be negative")
+                continue
+
+            parsed.append((number, {
+                'ingredient_id': ingredient_id,
+                'type': movement_type,
+                'quantity': quantity.quantize(Decimal('0.001')),
+                'unit_cost': unit_cost.quantize(Decimal('0.01')) if unit_cost is not None else None,
+                'notes': str(movement.get('notes') or '').strip(),
+            }))
+        return parsed, errors
+
+    @staticmethod
+    def record_movements(movements, user=None, strict=True):
+        """
+        Apply a batch of stock movements in one transaction.
+
+        Args:
+            movements: Iterable of movement dicts (see parse_movements)
+            user: User recording the movements
+            strict: Raise StockMovementError on any invalid movement (nothing
+                is written); otherwise invalid movements are skipped and
+                reported. A movement that would take an ingredient below zero
+                skips every movement of that ingredient.
+
+        Returns:
+            dict: {'recorded', 'ingredients', 'transactions', 'waste_logs',
+                'skipped': [error messages]}
+        """
+        parsed, errors = StockMovementService.parse_movements(movements)
+
+        with branch_atomic():
+            ingredients = Ingredient.objects.select_for_update().in_bulk(
+                {movement['ingredient_id'] for number, movement in parsed}
+            )
+
+            valid = []
+            deltas = {}
+            for number, movement in parsed:
+                if movement['ingredient_id'] not in ingredients:
+                    errors.append(f"Line {number}: unknown ingredient id {movement['ingredient_id']}")
+                    continue
+                delta = movement['quantity'] if movement['type'] in ('PURCHASE', 'ADJUSTMENT') else -movement['quantity']
+                deltas[movement['ingredient_id']] = deltas.get(movement['ingredient_id'], Decimal('0')) + delta
+                valid.append((number, movement))
+
+            # Stock may not go negative once the whole batch is applied
+            short = set()
+            for ingredient_id, delta in deltas.items():
+                ingredient = ingredients[ingredient_id]
+                if ingredient.current_stock + delta < 0:
+                    short.add(ingredient_id)
+                    errors.append(
+                        f"'{ingredient.name}' would drop below zero: "
+                        f"{ingredient.current_stock} {ingredient.unit} in stock, net change {delta}"
+                    )
+
+            if errors and strict:
+                raise StockMovementError('; '.join(errors))
+
+            valid = [(number, movement) for number, movement in valid if movement['ingredient_id'] not in short]
+            deltas = {ingredient_id: delta for ingredient_id, delta in deltas.items() if ingredient_id not in short}
+            result = {
+                'recorded': len(valid),
+                'ingredients': len(deltas),
+                'transactions': 0,
+                'waste_logs': 0,
+                'skipped': errors,
+            }
+            if not valid:
+                return result
+
+            now = timezone.now()
+            # current_stock keeps two decimals, as a save() would round it
+            changed = {
+                ingredient_id: delta.quantize(Decimal('0.01'))
+                for ingredient_id, delta in deltas.items()
+                if delta.quantize(Decimal('0.01')) != 0
+            }
+            if changed:
+                Ingredient.objects.filter(id__in=changed).update(
+                    current_stock=F('current_stock') + Case(
+                        *[When(id=ingredient_id, then=Value(delta)) for ingredient_id, delta in changed.items()],
+                        output_field=DecimalField(max_digits=10, decimal_places=2),
+                    ),
+                    updated_at=now,
+                )
+
+            # Waste logs first: their ids are the ledger references
+            waste_movements = [(number, movement) for number, movement in valid if movement['type'] in WASTE_TYPES]
+            waste_logs = WasteLog.objects.bulk_create([
+                WasteLog(
+                    ingredient_id=movement['ingredient_id'],
+                    waste_type=movement['type'],
+                    quantity=movement['quantity'],
+                    reason=movement['notes'] or movement['type'].title(),
+                    reported_by=user,
+                    waste_date=now,
+                )
+                for number, movement in waste_movements
+            ])
+            waste_log_ids = {number: log.id for (number, movement), log in zip(waste_movements, waste_logs)}
+
+            stock_transactions = StockTransaction.objects.bulk_create([
+                StockTransaction(
+                    ingredient_id=movement['ingredient_id'],
+                    transaction_type=MOVEMENT_TYPES[movement['type']],
+                    # Ledger quantities are positive; adjustments note the direction
+                    quantity=abs(movement['quantity']),
+                    unit_cost=movement['unit_cost'],
+                    reference_type='waste_log' if number in waste_log_ids else 'stock_movement',
+                    reference_id=waste_log_ids.get(number),
+                    notes=StockMovementService._ledger_note(movement),
+                    recorded_by=user,
+                )
+                for number, movement in valid
+            ])
+
+            audit_stock_transactions(stock_transactions, ingredients, user)
+
+            for ingredient_id, delta in changed.items():
+                ingredient = ingredients[ingredient_id]
+                previous_stock = ingredient.current_stock
+                ingredient.current_stock = previous_stock + delta
+                publish_low_stock(ingredient, previous_stock)
+            MenuService.invalidate()
+
+            result['transactions'] = len(stock_transactions)
+            result['waste_logs'] = len(waste_logs)
+            return result
+
+    @staticmethod
+    def _ledger_note(movement):
+        if movement['type'] == 'ADJUSTMENT':
+            direction = 'increase' if movement['quantity'] > 0 else 'decrease'
+            note = f"Stock adjustment ({direction})"
+        elif movement['type'] == 'PURCHASE':
+            note = "Stock purchase"
+        else:
+            note = movement['type']
+        return f"{note}: {movement['notes']}" if movement['notes'] else note
@@ -0,0 +1,400 @@
+"""
+Recipe (BOM) Upsert Service
+
+Replaces a product's recipe lines with a new set by applying only the
+difference against what is stored:
+- All ingredient ids validated with one query
+- Existing lines for every affected recipe loaded with one query
+- New lines bulk-inserted, changed quantities bulk-updated, removed lines deleted
+- Unchanged lines keep their row ids
+- Many products can be upserted in one transaction (recipe imports)
+
+Recipes can nest: a line may point at another product's recipe (a prepared
+intermediate such as dough or sauce) instead of a raw ingredient. Each
+recipe stores its flattened explosion ({ingredient_id: quantity per unit}),
+rebuilt here for the changed recipes and every recipe that uses them, so
+stock checks and deductions never walk the tree. Single-line saves (admin
+inlines, scripts) only queue their recipe; the queue is rebuilt once when the
+transaction commits, loading just the affected part of the recipe graph.
+"""
+
+from collections import defaultdict
+from decimal import Decimal, InvalidOperation
+
+from asgiref.local import Local
+from django.db import transaction
+from django.utils import timezone
+
+from sales_inventory_system.system.branches import branch_atomic
+from .menu_service import MenuService
+from .models import Ingredient, RecipeItem, RecipeIngredient
+
+
+# Recipes waiting for an explosion rebuild, per database alias (request-local)
+_pending_locals = Local()
+
+
+class RecipeValidationError(Exception):
+    """Raised when recipe lines reference unknown ingredients or invalid quantities"""
+    pass
+
+
+class RecipeService:
+    """Service for diff-based recipe updates"""
+
+    @staticmethod
+    def parse_lines(lines):
+        """
+        Normalize recipe lines to {ingredient_id: quantity}.
+
+        Args:
+            lines: Iterable of (ingredient_id, quantity) pairs
+
+        Returns:
+            tuple: ({ingredient_id: Decimal}, [error messages])
+        """
+        parsed = {}
+        errors = []
+        for ingredient_id, quantity in lines:
+            try:
+                ingredient_id = int(ingredient_id)
+                quantity = Decimal(str(quantity))
+            except (TypeError, ValueError, InvalidOperation):
+                errors.append(f"Invalid line: ingredient {ingredient_id!r}, quantity {quantity!r}")
+                continue
+
+            if not quantity.is_finite() or quantity <= 0:
+                errors.append(f"Quantity for ingredient {ingredient_id} must be greater than 0")
+                continue
+            if ingredient_id in parsed:
+                errors.append(f"Ingredient {ingredient_id} appears more than once")
+                continue
+            parsed[ingredient_id] = quantity.quantize(Decimal('0.001'))
+        return parsed, errors
+
+    @staticmethod
+    def upsert_recipe(product, lines, strict=False, sub_recipes=None):
+        """
+        Make a product's recipe match the given lines.
+
+        Args:
+            product: Product instance
+            lines: Iterable of (ingredient_id, quantity) pairs
+            strict: Raise on invalid lines instead of skipping them
+            sub_recipes: Optional iterable of (sub_product_id, quantity) pairs;
+                None leaves existing sub-recipe lines untouched
+
+        Returns:
+            dict: Counts of created, updated, deleted, unchanged and skipped lines
+        """
+        return RecipeService.upsert_recipes(
+            {product.id: lines},
+            strict=strict,
+            sub_recipes=None if sub_recipes is None else {product.id: sub_recipes},
+        )
+
+    @staticmethod
+    def upsert_recipes(recipes, strict=True, sub_recipes=None):
+        """
+        Upsert the recipes of several products in one transaction.
+
+        Args:
+            recipes: {product_id: iterable of (ingredient_id, quantity)}
+            strict: Raise RecipeValidationError on any invalid line (nothing is
+                written); otherwise invalid lines are skipped and reported
+            sub_recipes: Optional {product_id: iterable of (sub_product_id, quantity)}.
+                Products listed here get their sub-recipe lines replaced; the
+                sub-product must already have a recipe. Other products keep
+                their sub-recipe lines.
+
+        Returns:
+            dict: Counts of created, updated, deleted, unchanged and skipped
+                lines, plus the list of skipped-line messages
+        """
+        parsed = {}
+        errors = []
+        for product_id, lines in recipes.items():
+            parsed[product_id], line_errors = RecipeService.parse_lines(lines)
+            errors.extend(line_errors)
+
+        parsed_subs = {}
+        for product_id, lines in (sub_recipes or {}).items():
+            parsed_subs[product_id], line_errors = RecipeService.parse_lines(lines)
+            errors.extend(f"Sub-recipe: {message}" for message in line_errors)
+            parsed.setdefault(product_id, {})
+
+        # Validate every referenced ingredient with a single query
+        requested_ids = {ing_id for lines in parsed.values() for ing_id in lines}
+        known_ids = set(
+            Ingredient.objects.filter(id__in=requested_ids).values_list('id', flat=True)
+        )
+        unknown_ids = requested_ids - known_ids
+        if unknown_ids:
+            errors.append(f"Unknown ingredient id(s): {', '.join(str(i) for i in sorted(unknown_ids))}")
+            for lines in parsed.values():
+                for ing_id in unknown_ids:
+                    lines.pop(ing_id, None)
+
+        # Sub-recipes are referenced by product; resolve to recipe ids in one query
+        sub_product_ids = {sub_id for lines in parsed_subs.values() for sub_id in lines}
+        sub_recipe_ids = dict(
+            RecipeItem.objects.filter(product_id__in=sub_product_ids).values_list('product_id', 'id')
+        )
+        no_recipe = sub_product_ids - set(sub_recipe_ids)
+        if no_recipe:
+            errors.append(f"Product(s) without a recipe cannot be sub-recipes: {', '.join(str(i) for i in sorted(no_recipe))}")
+            for lines in parsed_subs.values():
+                for sub_id in no_recipe:
+                    lines.pop(sub_id, None)
+        for product_id, lines in parsed_subs.items():
+            if lines.pop(product_id, None) is not None:
+                errors.append(f"Product {product_id} cannot be a sub-recipe of itself")
+
+        if errors and strict:
+            raise RecipeValidationError('; '.join(errors))
+
+        result = {'created': 0, 'updated': 0, 'deleted': 0, 'unchanged': 0, 'skipped': errors}
+
+        with branch_atomic():
+            # One recipe per product; create the missing ones in bulk
+            recipe_ids = dict(
+                RecipeItem.objects.filter(product_id__in=parsed).values_list('product_id', 'id')
+            )
+            missing = [RecipeItem(product_id=pid) for pid in parsed if pid not in recipe_ids]
+            if missing:
+                RecipeItem.objects.bulk_create(missing)
+                recipe_ids.update(
+                    RecipeItem.objects.filter(product_id__in=parsed).values_list('product_id', 'id')
+                )
+
+            # Lines are keyed ('i', ingredient_id) or ('r', sub_recipe_id) per recipe
+            replacing_subs = {recipe_ids[pid] for pid in parsed_subs}
+            existing = {}
+            for line in RecipeIngredient.objects.filter(recipe_id__in=recipe_ids.values()):
+                if line.sub_recipe_id is not None:
+                    if line.recipe_id not in replacing_subs:
+                        continue  # Sub-recipe lines not being replaced
+                    existing[(line.recipe_id, 'r', line.sub_recipe_id)] = line
+                else:
+                    existing[(line.recipe_id, 'i', line.ingredient_id)] = line
+
+            wanted = []
+            for product_id, lines in parsed.items():
+                for ingredient_id, quantity in lines.items():
+                    wanted.append((recipe_ids[product_id], 'i', ingredient_id, quantity))
+            for product_id, lines in parsed_subs.items():
+                for sub_product_id, quantity in lines.items():
+                    wanted.append((recipe_ids[product_id], 'r', sub_recipe_ids[sub_product_id], quantity))
+
+            to_create = []
+            to_update = []
+            keep = set()
+            for recipe_id, kind, target_id, quantity in wanted:
+                key = (recipe_id, kind, target_id)
+                keep.add(key)
+                line = existing.get(key)
+                if line is None:
+                    to_create.append(RecipeIngredient(
+                        recipe_id=recipe_id,
+                        ingredient_id=target_id if kind == 'i' else None,
+                        sub_recipe_id=target_id if kind == 'r' else None,
+                        quantity=quantity,
+                    ))
+                elif line.quantity != quantity:
+                    line.quantity = quantity
+                    to_update.append(line)
+                else:
+                    result['unchanged'] += 1
+
+            to_delete = {line.id: line.recipe_id for key, line in existing.items() if key not in keep}
+
+            new_edges = [(recipe_id, target_id) for recipe_id, kind, target_id, _ in wanted if kind == 'r']
+            if new_edges:
+                cycle = RecipeService.find_cycle(new_edges, removed=set(to_delete))
+                if cycle:
+                    raise RecipeValidationError(
+                        f"Recipe {cycle} would contain itself through its sub-recipes"
+                    )
+
+            if to_delete:
+                RecipeIngredient.objects.filter(id__in=to_delete).delete()
+            if to_update:
+                RecipeIngredient.objects.bulk_update(to_update, ['quantity'], batch_size=500)
+            if to_create:
+                RecipeIngredient.objects.bulk_create(to_create, batch_size=500)
+
+            result['created'] = len(to_create)
+            result['updated'] = len(to_update)
+            result['deleted'] = len(to_delete)
+
+            # Bulk writes skip signals: refresh explosions of changed recipes
+            # (and their parents) and mark them for menu deltas
+            changed_recipes = {line.recipe_id for line in to_create + to_update}
+            changed_recipes.update(to_delete.values())
+            changed_recipes.update(recipe_ids[recipe.product_id] for recipe in missing)
+            if changed_recipes:
+                RecipeItem.objects.filter(id__in=changed_recipes).update(updated_at=timezone.now())
+                RecipeService.rebuild_explosions(changed_recipes)
+                MenuService.invalidate()
+
+        return result
+
+    # ==================== EXPLOSION ====================
+
+    @staticmethod
+    def _load_graph(recipe_ids=None):
+        """
+        Recipe lines as {recipe_id: [(ingredient_id, sub_recipe_id, quantity)]}.
+
+        Args:
+            recipe_ids: Load these recipes and every sub-recipe they nest (one
+                query per nesting level), or None for all lines in one query
+        """
+        lines = RecipeIngredient.objects.values_list('recipe_id', 'ingredient_id', 'sub_recipe_id', 'quantity')
+        graph = defaultdict(list)
+        if recipe_ids is None:
+            for recipe_id, ingredient_id, sub_recipe_id, quantity in lines:
+                graph[recipe_id].append((ingredient_id, sub_recipe_id, quantity))
+            return graph
+
+        loaded = set()
+        level = set(recipe_ids)
+        while level:
+            loaded |= level
+            next_level = set()
+            for recipe_id, ingredient_id, sub_recipe_id, quantity in lines.filter(recipe_id__in=level):
+                graph[recipe_id].append((ingredient_id, sub_recipe_id, quantity))
+                if sub_recipe_id is not None and sub_recipe_id not in loaded:
+                    next_level.add(sub_recipe_id)
+            level = next_level
+        return graph
+
+    @staticmethod
+    def _with_parents(recipe_ids):
+        """The given recipes plus every recipe that nests them (one query per level)"""
+        targets = set(recipe_ids)
+        level = set(recipe_ids)
+        while level:
+            parents = set(
+                RecipeIngredient.objects.filter(sub_recipe_id__in=level).values_list('recipe_id', flat=True)
+            )
+            level = parents - targets
+            targets |= level
+        return targets
+
+    @staticmethod
+    def schedule_rebuild(recipe_id, using='default'):
+        """
+        Rebuild a recipe's explosion when the current transaction commits.
+
+        Every recipe queued in the same transaction is rebuilt together, so
+        saving many lines costs one rebuild instead of one per line. Outside
+        a transaction the rebuild runs at once.
+        """
+        pending = getattr(_pending_locals, 'recipes', None)
+        if pending is None:
+            pending = _pending_locals.recipes = defaultdict(set)
+        pending[using].add(recipe_id)
+        # Callbacks after the first find the queue empty; ids queued by a
+        # rolled-back transaction are simply rebuilt with the next batch
+        transaction.on_commit(lambda: RecipeService._run_scheduled(using), using=using)
+
+    @staticmethod
+    def _run_scheduled(using):
+        pending = getattr(_pending_locals, 'recipes', None)
+        recipe_ids = pending.pop(using, None) if pending else None
+        if recipe_ids:
+            RecipeService.rebuild_explosions(recipe_ids)
+
+    @staticmethod
+    def creates_cycle(recipe_id, sub_recipe_id):
+        """True if adding sub_recipe_id as a line of recipe_id would nest a recipe in itself"""
+        return RecipeService.find_cycle([(recipe_id, sub_recipe_id)]) is not None
+
+    @staticmethod
+    def find_cycle(new_edges, removed=()):
+        """
+        Check proposed sub-recipe lines against the stored graph.
+
+        Args:
+            new_edges: Iterable of (recipe_id, sub_recipe_id) to add
+            removed: RecipeIngredient ids about to be deleted
+
+        Returns:
+            int or None: A recipe id that would reach itself, or None
+        """
+        children = defaultdict(set)
+        for line_id, recipe_id, sub_recipe_id in RecipeIngredient.objects.filter(
+            sub_recipe__isnull=False
+        ).values_list('id', 'recipe_id', 'sub_recipe_id'):
+            if line_id not in removed:
+                children[recipe_id].add(sub_recipe_id)
+        for recipe_id, sub_recipe_id in new_edges:
+            children[recipe_id].add(sub_recipe_id)
+
+        for start, _ in new_edges:
+            stack = list(children[start])
+            seen = set()
+            while stack:
+                node = stack.pop()
+                if node == start:
+                    return start
+                if node not in seen:
+                    seen.add(node)
+                    stack.extend(children[node])
+        return None
+
+    @staticmethod
+    def rebuild_explosions(recipe_ids=None):
+        """
+        Recompute the flattened explosion of the given recipes and every
+        recipe that (directly or indirectly) uses them as a sub-recipe.
+
+        Args:
+            recipe_ids: Changed recipe ids, or None to rebuild all recipes
+
+        Returns:
+            int: Number of recipes whose explosion changed
+        """
+        if recipe_ids is None:
+            graph = RecipeService._load_graph()
+            targets = set(RecipeItem.objects.values_list('id', flat=True))
+        else:
+            targets = RecipeService._with_parents(recipe_ids)
+            graph = RecipeService._load_graph(targets)
+
+        memo = {}
+
+        def explode(recipe_id, path):
+            if recipe_id in memo:
+                return memo[recipe_id]
+            if recipe_id in path:
+                raise RecipeValidationError(f"Recipe {recipe_id} contains itself through its sub-recipes")
+            path.add(recipe_id)
+            totals = defaultdict(Decimal)
+            for ingredient_id, sub_recipe_id, quantity in graph.get(recipe_id, []):
+                if sub_recipe_id is None:
+                    totals[ingredient_id] += quantity
+                else:
+                    for sub_ingredient_id, sub_quantity in explode(sub_recipe_id, path).items():
+                        totals[sub_ingredient_id] += quantity * sub_quantity
+            path.discard(recipe_id)
+            memo[recipe_id] = dict(totals)
+            return memo[recipe_id]
+
+        now = timezone.now()
+        changed = []
+        for recipe in RecipeItem.objects.filter(id__in=targets).only('id', 'explosion'):
+            explosion = {
+                str(ingredient_id): format(quantity.normalize(), 'f')
+                for ingredient_id, quantity in sorted(explode(recipe.id, set()).items())
+            }
+            if recipe.explosion != explosion:
+                recipe.explosion = explosion
+                recipe.updated_at = now
+                changed.append(recipe)
+
+        if changed:
+            RecipeItem.objects.bulk_update(changed, ['explosion', 'updated_at'], batch_size=500)
+            MenuService.invalidate()
+        return len(changed)
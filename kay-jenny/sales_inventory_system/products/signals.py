@@ -2,11 +2,15 @@
 Signals for BOM-related events
 """
 
-from django.db.models.signals import post_save
+from django.db.models.signals import post_save, post_delete
 from django.dispatch import receiver
 from django.contrib import messages
+from django.utils import timezone
 from sales_inventory_system.orders.models import Payment
 from .inventory_service import BOMService, IngredientDeductionError
+from .menu_service import MenuService
+from .models import Product, Ingredient, RecipeItem, RecipeIngredient
+from .recipe_service import RecipeService
 import logging
 
 logger = logging.getLogger(__name__)
@@ -63,3 +67,55 @@ def deduct_ingredients_on_payment(sender, instance, created, **kwargs):
         logger.error(
             f"Unexpected error deducting ingredients for order {instance.order.order_number}: {str(e)}"
         )
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+@receiver(post_save, sender=Ingredient)
+@receiver(post_delete, sender=Ingredient)
+@receiver(post_save, sender=RecipeItem)
+@receiver(post_delete, sender=RecipeItem)
+def invalidate_menu_version(sender, instance, **kwargs):
+    """Bump the POS menu version when products, recipes or ingredient stock change"""
+    MenuService.invalidate()
+
+
+@receiver(post_delete, sender=Product)
+@receiver(post_delete, sender=Ingredient)
+@receiver(post_delete, sender=RecipeItem)
+def record_menu_deletion(sender, instance, **kwargs):
+    """
+    Deleted rows drop out of max(updated_at); a tombstone keeps the menu
+    version moving forward and lists deleted products in menu deltas.
+    """
+    if sender is Product:
+        MenuService.record_deletion(product_id=instance.pk)
+        return
+    if sender is RecipeItem:
+        # The product stays on the menu with a different capacity
+        Product.objects.filter(pk=instance.product_id).update(updated_at=timezone.now())
+    MenuService.record_deletion()
+
+
+@receiver(post_delete, sender=Product)
+def delete_product_image_variants(sender, instance, **kwargs):
+    """Resized copies go with the product (the original upload is kept, as before)"""
+    if not instance.image_variants:
+        return
+    # Imported here so web workers only load Pillow when there is something to delete
+    from . import image_service
+    image_service.delete_variants(instance)
+
+
+@receiver(post_save, sender=RecipeIngredient)
+@receiver(post_delete, sender=RecipeIngredient)
+def touch_recipe_on_line_change(sender, instance, **kwargs):
+    """
+    Recipe lines have no timestamp of their own, so editing one marks the
+    parent recipe as updated. Menu deltas rely on RecipeItem.updated_at.
+    The flattened explosion of the recipe (and of every recipe using it as a
+    sub-recipe) is rebuilt once the transaction commits, once per recipe.
+    """
+    RecipeItem.objects.filter(pk=instance.recipe_id).update(updated_at=timezone.now())
+    RecipeService.schedule_rebuild(instance.recipe_id, using=instance._state.db)
+    MenuService.invalidate()
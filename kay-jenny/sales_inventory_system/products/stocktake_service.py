@@ -0,0 +1,317 @@
+"""
+Stocktake Session Service
+
+Runs a full physical count as one session instead of one
+record_physical_count() call per ingredient:
+- Start: system stock of every active ingredient frozen in one INSERT, so
+  all counts are compared with the same moment
+- Counts: entered incrementally or in bulk; each batch is one lookup and one
+  bulk_update, and a later count of the same ingredient replaces the earlier one.
+  Each count also records the system stock at that moment
+- Close: variances, usage for the period and stock adjustments computed for
+  all counted ingredients in set-based passes; PhysicalCount,
+  StockTransaction, VarianceRecord and audit rows bulk-inserted and stock
+  corrected with a single UPDATE
+
+Sales keep running during a count. A count is compared with the system
+stock when it was entered (the frozen stock less everything sold or moved
+since the start), and that variance is added to the stock at close, so
+movements before and after the count are each applied exactly once.
+"""
+
+from decimal import Decimal, InvalidOperation
+
+from django.db import IntegrityError
+from django.db.models import Case, Count, DecimalField, F, Max, Q, Sum, Value, When
+from django.db.models.functions import Greatest
+from django.utils import timezone
+
+from sales_inventory_system.system.branches import branch_atomic
+from sales_inventory_system.system.events import publish_low_stock
+from .menu_service import MenuService
+from .models import (
+    Ingredient, PhysicalCount, StockTransaction, StocktakeLine,
+    StocktakeSession, VarianceRecord
+)
+from .movement_service import audit_stock_transactions
+
+
+class StocktakeError(Exception):
+    """Raised for invalid stocktake operations or counts"""
+    pass
+
+
+OPEN_SESSION_MESSAGE = 'Another stocktake is still open; close or cancel it first'
+
+# VarianceRecord.variance_percentage holds at most 4 integer digits
+MAX_VARIANCE_PERCENTAGE = Decimal('9999.99')
+
+
+class StocktakeService:
+    """Service for session-based physical counts"""
+
+    @staticmethod
+    def start_session(user=None, notes='', ingredient_ids=None):
+        """
+        Open a stocktake and freeze theoretical stock.
+
+        Args:
+            user: User starting the count
+            notes: Session notes
+            ingredient_ids: Optional subset of ingredients (default: all active)
+
+        Raises:
+            StocktakeError: If another stocktake is still open
+
+        Returns:
+            StocktakeSession instance
+        """
+        if StocktakeSession.objects.filter(status='OPEN').exists():
+            raise StocktakeError(OPEN_SESSION_MESSAGE)
+
+        try:
+            with branch_atomic():
+                # A concurrent start that passed the check above fails here
+                # on the one_open_stocktake constraint
+                session = StocktakeSession.objects.create(started_by=user, notes=notes)
+
+                ingredients = Ingredient.objects.filter(is_active=True)
+                if ingredient_ids is not None:
+                    ingredients = ingredients.filter(id__in=ingredient_ids)
+                StocktakeLine.objects.bulk_create([
+                    StocktakeLine(session=session, ingredient_id=ingredient_id, theoretical_quantity=stock)
+                    for ingredient_id, stock in ingredients.values_list('id', 'current_stock')
+                ])
+        except IntegrityError as exc:
+            if 'one_open_stocktake' in str(exc) or 'stocktakesession.status' in str(exc):
+                raise StocktakeError(OPEN_SESSION_MESSAGE) from exc
+            raise
+        return session
+
+    @staticmethod
+    def record_counts(session_id, counts, user=None, strict=True):
+        """
+        Enter counted quantities for an open stocktake.
+
+        Args:
+            session_id: StocktakeSession ID
+            counts: Iterable of dicts with 'ingredient_id', 'quantity' and
+                optional 'notes'
+            user: User who counted
+            strict: Raise StocktakeError on any invalid count (nothing is
+                written); otherwise invalid counts are skipped and reported
+
+        Returns:
+            dict: {'recorded', 'skipped': [error messages]}
+        """
+        parsed = {}
+        errors = []
+        for number, count in enumerate(counts, start=1):
+            try:
+                ingredient_id = int(count.get('ingredient_id'))
+                quantity = Decimal(str(count.get('quantity')))
+            except (TypeError, ValueError, InvalidOperation):
+                errors.append(
+                    f"Line {number}: invalid ingredient {count.get('ingredient_id')!r} "
+                    f"or quantity {count.get('quantity')!r}"
+                )
+                continue
+            if not quantity.is_finite() or quantity < 0:
+                errors.append(f"Line {number}: quantity cannot be negative")
+                continue
+            if ingredient_id in parsed:
+                errors.append(f"Line {number}: ingredient {ingredient_id} is counted more than once")
+                continue
+            parsed[ingredient_id] = (quantity.quantize(Decimal('0.001')), str(count.get('notes') or '').strip())
+
+        with branch_atomic():
+            session = StocktakeService._lock_open_session(session_id)
+            lines = {
+                line.ingredient_id: line
+                for line in session.lines.filter(ingredient_id__in=parsed)
+            }
+            unknown = sorted(set(parsed) - set(lines))
+            if unknown:
+                errors.append(
+                    f"Ingredient id(s) not part of this stocktake: {', '.join(str(i) for i in unknown)}"
+                )
+            if errors and strict:
+                raise StocktakeError('; '.join(errors))
+
+            # Stock changes serialize on the ingredient rows; locking them
+            # pins what the shelf count is compared with
+            stock = dict(
+                Ingredient.objects.select_for_update().filter(id__in=lines).values_list('id', 'current_stock')
+            )
+            now = timezone.now()
+            for ingredient_id, line in lines.items():
+                line.physical_quantity, notes = parsed[ingredient_id]
+                line.expected_quantity = stock[ingredient_id]
+                line.notes = notes or line.notes
+                line.counted_by = user
+                line.counted_at = now
+            StocktakeLine.objects.bulk_update(
+                lines.values(), ['physical_quantity', 'expected_quantity', 'notes', 'counted_by', 'counted_at']
+            )
+            return {'recorded': len(lines), 'skipped': errors}
+
+    @staticmethod
+    def close_session(session_id, user=None):
+        """
+        Close a stocktake: write counts, variances and stock adjustments.
+
+        Ingredients that were never counted are left unchanged.
+
+        Args:
+            session_id: StocktakeSession ID
+            user: User closing the count
+
+        Returns:
+            dict: Summary of counted, adjusted and out-of-tolerance ingredients
+        """
+        with branch_atomic():
+            session = StocktakeService._lock_open_session(session_id)
+            lines = list(session.lines.filter(physical_quantity__isnull=False))
+            uncounted = session.lines.filter(physical_quantity__isnull=True).count()
+            ingredients = Ingredient.objects.select_for_update().in_bulk(
+                [line.ingredient_id for line in lines]
+            )
+
+            # Usage period: since the previous closed stocktake (or the start of that month)
+            period_end = session.started_at
+            period_start = StocktakeSession.objects.filter(
+                status='CLOSED', started_at__lt=period_end
+            ).aggregate(latest=Max('started_at'))['latest'] or period_end.replace(
+                day=1, hour=0, minute=0, second=0, microsecond=0
+            )
+            theoretical_used = dict(
+                StockTransaction.objects.filter(
+                    transaction_type='DEDUCTION',
+                    ingredient_id__in=list(ingredients),
+                    created_at__gte=period_start,
+                    created_at__lt=period_end,
+                ).values('ingredient_id').annotate(total=Sum('quantity')).values_list('ingredient_id', 'total')
+            )
+
+            physical_counts = PhysicalCount.objects.bulk_create([
+                PhysicalCount(
+                    ingredient_id=line.ingredient_id,
+                    counted_by_id=line.counted_by_id,
+                    physical_quantity=line.physical_quantity,
+                    theoretical_quantity=line.physical_quantity - line.variance_quantity,
+                    count_date=line.counted_at,
+                    notes=line.notes or f"Stocktake #{session.id}",
+                )
+                for line in lines
+            ])
+
+            variance_records = []
+            adjustments = []
+            for line, physical_count in zip(lines, physical_counts):
+                ingredient = ingredients[line.ingredient_id]
+                variance = line.variance_quantity
+                used = theoretical_used.get(line.ingredient_id) or Decimal('0')
+                # Missing stock counts as extra usage, surplus as less
+                usage_variance = -variance
+                base = used if used > 0 else line.theoretical_quantity
+                percentage = (usage_variance / base * 100) if base > 0 else Decimal('0')
+                percentage = max(min(percentage, MAX_VARIANCE_PERCENTAGE), -MAX_VARIANCE_PERCENTAGE)
+
+                variance_records.append(VarianceRecord(
+                    ingredient_id=line.ingredient_id,
+                    period_start=period_start,
+                    period_end=period_end,
+                    theoretical_used=used,
+                    actual_used=used + usage_variance,
+                    variance_quantity=usage_variance,
+                    variance_percentage=percentage.quantize(Decimal('0.01')),
+                    within_tolerance=abs(percentage) <= ingredient.variance_allowance,
+                    notes=f"Stocktake #{session.id}",
+                ))
+                if variance.quantize(Decimal('0.01')) != 0:
+                    adjustments.append((line, physical_count, variance.quantize(Decimal('0.01'))))
+            VarianceRecord.objects.bulk_create(variance_records)
+
+            now = timezone.now()
+            if adjustments:
+                Ingredient.objects.filter(id__in=[line.ingredient_id for line, _, _ in adjustments]).update(
+                    current_stock=Greatest(
+                        F('current_stock') + Case(
+                            *[When(id=line.ingredient_id, then=Value(delta)) for line, _, delta in adjustments],
+                            output_field=DecimalField(max_digits=10, decimal_places=2),
+                        ),
+                        Value(Decimal('0')),
+                        output_field=DecimalField(max_digits=10, decimal_places=2),
+                    ),
+                    updated_at=now,
+                )
+
+                stock_transactions = StockTransaction.objects.bulk_create([
+                    StockTransaction(
+                        ingredient_id=line.ingredient_id,
+                        transaction_type='ADJUSTMENT',
+                        quantity=abs(delta),
+                        reference_type='physical_count',
+                        reference_id=physical_count.id,
+                        notes=(
+                            f"Stocktake #{session.id} adjustment "
+                            f"({'increase' if delta > 0 else 'decrease'})"
+                        ),
+                        recorded_by=user,
+                    )
+                    for line, physical_count, delta in adjustments
+                ])
+                audit_stock_transactions(stock_transactions, ingredients, user)
+
+                for line, physical_count, delta in adjustments:
+                    ingredient = ingredients[line.ingredient_id]
+                    previous_stock = ingredient.current_stock
+                    ingredient.current_stock = max(previous_stock + delta, Decimal('0'))
+                    publish_low_stock(ingredient, previous_stock)
+                MenuService.invalidate()
+
+            session.status = 'CLOSED'
+            session.closed_by = user
+            session.closed_at = now
+            session.save(update_fields=['status', 'closed_by', 'closed_at'])
+
+            return {
+                'session_id': session.id,
+                'counted': len(lines),
+                'uncounted': uncounted,
+                'adjusted': len(adjustments),
+                'outside_tolerance': sum(1 for record in variance_records if not record.within_tolerance),
+                'net_adjustment': sum((delta for _, _, delta in adjustments), Decimal('0')),
+                'period_start': period_start,
+                'period_end': period_end,
+            }
+
+    @staticmethod
+    def cancel_session(session_id, user=None):
+        """Abandon an open stocktake without touching stock"""
+        with branch_atomic():
+            session = StocktakeService._lock_open_session(session_id)
+            session.status = 'CANCELLED'
+            session.closed_by = user
+            session.closed_at = timezone.now()
+            session.save(update_fields=['status', 'closed_by', 'closed_at'])
+            return session
+
+    @staticmethod
+    def progress(session):
+        """Counted and total line counts for a stocktake"""
+        totals = session.lines.aggregate(
+            total=Count('id'),
+            counted=Count('id', filter=Q(physical_quantity__isnull=False)),
+        )
+        return {'total': totals['total'], 'counted': totals['counted']}
+
+    @staticmethod
+    def _lock_open_session(session_id):
+        try:
+            session = StocktakeSession.objects.select_for_update().get(pk=session_id)
+        except StocktakeSession.DoesNotExist:
+            raise StocktakeError(f"Stocktake #{session_id} does not exist")
+        if session.status != 'OPEN':
+            raise StocktakeError(f"Stocktake #{session.id} is {session.get_status_display().lower()}")
+        return session
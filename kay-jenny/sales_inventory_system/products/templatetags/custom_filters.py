@@ -2,6 +2,9 @@
 Custom template filters for products app
 """
 from django import template
+from django.utils.html import format_html
+
+from sales_inventory_system.system.fragment_cache import render_fragment
 
 register = template.Library()
 
@@ -72,3 +75,77 @@ def smart_unit_display(quantity, unit):
 
     # Return as-is for other cases
     return f"{quantity:.2f}{unit}"
+
+
+# Product tiles: 4 per row on xl screens, 3 on lg, 2 on md, 1 on phones
+TILE_SIZES = "(min-width: 1280px) 25vw, (min-width: 1024px) 33vw, (min-width: 768px) 50vw, 100vw"
+
+
+@register.simple_tag
+def product_picture(product, css_class="", sizes=TILE_SIZES):
+    """
+    Product image as a responsive <picture> (WebP with JPEG fallback).
+
+    Usage in template: {% product_picture product "w-full h-full object-cover" %}
+    For small fixed-size images pass sizes, e.g. sizes="40px".
+    Falls back to the original upload until its variants are built.
+    """
+    if not product.image:
+        return ""
+    if not product.image_srcset:
+        return format_html(
+            '<img src="{}" alt="{}" class="{}" loading="lazy">',
+            product.image.url, product.name, css_class
+        )
+    return format_html(
+        '<picture class="contents">'
+        '<source type="image/webp" srcset="{}" sizes="{}">'
+        '<img src="{}" srcset="{}" sizes="{}" alt="{}" class="{}" loading="lazy" decoding="async">'
+        '</picture>',
+        product.image_srcset, sizes,
+        product.image_thumb_url, product.image_fallback_srcset, sizes, product.name, css_class
+    )
+
+
+class FragmentCacheNode(template.Node):
+    def __init__(self, nodelist, name, vary_on, versions):
+        self.nodelist = nodelist
+        self.name = name
+        self.vary_on = vary_on
+        self.versions = versions
+
+    def render(self, context):
+        name = self.name.resolve(context)
+        vary_on = [value.resolve(context) for value in self.vary_on]
+        versions = self.versions.resolve(context) if self.versions else ''
+        versions = [domain.strip() for domain in str(versions or '').split(',') if domain.strip()]
+        return render_fragment(name, vary_on, versions, lambda: self.nodelist.render(context))
+
+
+@register.tag
+def fragment_cache(parser, token):
+    """
+    Cache the enclosed block until a value it depends on changes
+    (see system/fragment_cache.py).
+
+    Usage in template:
+        {% fragment_cache "pos-tile" product %}...{% endfragment_cache %}
+        {% fragment_cache "product-tile" product versions="menu" %}...{% endfragment_cache %}
+
+    Model instances vary on pk and updated_at, lists on every member.
+    Keep {% csrf_token %} and other per-request output outside the block.
+    """
+    bits = token.split_contents()
+    if len(bits) < 2:
+        raise template.TemplateSyntaxError(f"'{bits[0]}' tag requires a fragment name")
+    nodelist = parser.parse(('endfragment_cache',))
+    parser.delete_first_token()
+
+    vary_on = []
+    versions = None
+    for bit in bits[2:]:
+        if bit.startswith('versions='):
+            versions = parser.compile_filter(bit[len('versions='):])
+        else:
+            vary_on.append(parser.compile_filter(bit))
+    return FragmentCacheNode(nodelist, parser.compile_filter(bits[1]), vary_on, versions)
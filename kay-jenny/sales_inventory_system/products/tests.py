@@ -1,3 +1,254 @@
+import json
+import tempfile
+from io import StringIO
+from decimal import Decimal
+from pathlib import Path
+
+from django.core.management import CommandError, call_command
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+
+from sales_inventory_system.accounts.models import User
+from .models import Ingredient, Product, RecipeIngredient, RecipeItem, StockTransaction, VarianceRecord, WasteLog
+from .movement_service import StockMovementError, StockMovementService
+from .recipe_service import RecipeService, RecipeValidationError
+from .stocktake_service import StocktakeError, StocktakeService
+
+
+def use_stock(ingredient, quantity):
+    """A sale-like deduction recorded while a count may be running"""
+    StockMovementService.record_movements([
+        {'ingredient_id': ingredient.id, 'type': 'WASTE', 'quantity': str(quantity)},
+    ])
+
+
+class StocktakeServiceTests(TestCase):
+    """Session-based physical counts (stocktake_service.py)"""
+
+    def setUp(self):
+        self.user = User.objects.create_user('counter', password='x', role='ADMIN')
+        self.flour = Ingredient.objects.create(name='Flour', unit='g', current_stock=Decimal('100'))
+
+    def count(self, session, quantity):
+        StocktakeService.record_counts(session.id, [{'ingredient_id': self.flour.id, 'quantity': quantity}], user=self.user)
+
+    def stock(self):
+        self.flour.refresh_from_db()
+        return self.flour.current_stock
+
+    def test_missing_stock_is_adjusted(self):
+        session = StocktakeService.start_session(user=self.user)
+        self.count(session, '97')
+        result = StocktakeService.close_session(session.id, user=self.user)
+
+        self.assertEqual(self.stock(), Decimal('97'))
+        self.assertEqual(result['net_adjustment'], Decimal('-3'))
+        self.assertEqual(VarianceRecord.objects.get(ingredient=self.flour).variance_quantity, Decimal('3'))
+
+    def test_sale_during_count_is_not_counted_twice(self):
+        session = StocktakeService.start_session(user=self.user)
+        use_stock(self.flour, 5)
+        # The shelf really holds what the system expects
+        self.count(session, '95')
+        result = StocktakeService.close_session(session.id, user=self.user)
+
+        self.assertEqual(self.stock(), Decimal('95'))
+        self.assertEqual(result['adjusted'], 0)
+        self.assertFalse(StockTransaction.objects.filter(transaction_type='ADJUSTMENT').exists())
+
+    def test_sale_after_count_is_kept(self):
+        session = StocktakeService.start_session(user=self.user)
+        use_stock(self.flour, 5)
+        self.count(session, '93')  # 2 missing
+        use_stock(self.flour, 4)
+        StocktakeService.close_session(session.id, user=self.user)
+
+        self.assertEqual(self.stock(), Decimal('89'))
+
+    def test_recount_replaces_the_earlier_count(self):
+        session = StocktakeService.start_session(user=self.user)
+        self.count(session, '80')
+        use_stock(self.flour, 10)
+        self.count(session, '90')
+        StocktakeService.close_session(session.id, user=self.user)
+
+        self.assertEqual(self.stock(), Decimal('90'))
+
+    def test_uncounted_ingredients_are_left_alone(self):
+        session = StocktakeService.start_session(user=self.user)
+        result = StocktakeService.close_session(session.id, user=self.user)
+
+        self.assertEqual(result['uncounted'], 1)
+        self.assertEqual(self.stock(), Decimal('100'))
+
+    def test_only_one_open_session(self):
+        session = StocktakeService.start_session(user=self.user)
+        with self.assertRaises(StocktakeError):
+            StocktakeService.start_session(user=self.user)
+        StocktakeService.cancel_session(session.id, user=self.user)
+        StocktakeService.start_session(user=self.user)
+
+    def test_invalid_counts(self):
+        session = StocktakeService.start_session(user=self.user)
+        with self.assertRaises(StocktakeError):
+            self.count(session, '-1')
+        result = StocktakeService.record_counts(
+            session.id,
+            [{'ingredient_id': self.flour.id, 'quantity': '50'}, {'ingredient_id': 999999, 'quantity': '1'}],
+            strict=False,
+        )
+        self.assertEqual(result['recorded'], 1)
+        self.assertEqual(len(result['skipped']), 1)
+
+
+class StockMovementServiceTests(TestCase):
+    """Batched purchases, waste and adjustments (movement_service.py)"""
+
+    def setUp(self):
+        self.flour = Ingredient.objects.create(name='Flour', unit='g', current_stock=Decimal('100'))
+        self.cheese = Ingredient.objects.create(name='Cheese', unit='g', current_stock=Decimal('50'))
+        self.basil = Ingredient.objects.create(name='Basil', unit='g', current_stock=Decimal('10'))
+
+    def move(self, ingredient, movement_type, quantity, **fields):
+        return {'ingredient_id': ingredient.id, 'type': movement_type, 'quantity': quantity, **fields}
+
+    def stock(self):
+        return dict(Ingredient.objects.values_list('name', 'current_stock'))
+
+    def test_batch_is_applied_with_one_update(self):
+        batch = [
+            self.move(self.flour, 'PURCHASE', '25.5', unit_cost='1.20'),
+            self.move(self.flour, 'WASTE', '5'),
+            self.move(self.cheese, 'ADJUSTMENT', '-2.25', notes='recount'),
+            self.move(self.basil, 'FREEBIE', '0.004'),  # rounds away on the 2-decimal stock
+        ]
+        with CaptureQueriesContext(connection) as queries:
+            result = StockMovementService.record_movements(batch)
+
+        updates = [query['sql'] for query in queries if query['sql'].startswith('UPDATE "products_ingredient"')]
+        self.assertEqual(len(updates), 1)
+        self.assertEqual(self.stock(), {'Flour': Decimal('120.50'), 'Cheese': Decimal('47.75'), 'Basil': Decimal('10.00')})
+        self.assertEqual((result['recorded'], result['ingredients'], result['transactions'], result['waste_logs']), (4, 3, 4, 2))
+
+        adjustment = StockTransaction.objects.get(transaction_type='ADJUSTMENT')
+        self.assertEqual(adjustment.quantity, Decimal('2.25'))
+        self.assertEqual(adjustment.notes, 'Stock adjustment (decrease): recount')
+        waste = StockTransaction.objects.get(transaction_type='WASTE')
+        self.assertEqual(waste.reference_id, WasteLog.objects.get(waste_type='WASTE').id)
+
+    def test_strict_batch_with_an_invalid_movement_writes_nothing(self):
+        batch = [self.move(self.flour, 'PURCHASE', '10'), self.move(self.cheese, 'WASTE', '-1'), {'type': 'THEFT'}]
+        with self.assertRaises(StockMovementError) as raised:
+            StockMovementService.record_movements(batch)
+
+        self.assertIn('Line 2', str(raised.exception))
+        self.assertIn('Line 3', str(raised.exception))
+        self.assertEqual(self.stock()['Flour'], Decimal('100'))
+        self.assertFalse(StockTransaction.objects.exists())
+
+    def test_skip_mode_records_the_valid_movements(self):
+        batch = [self.move(self.flour, 'PURCHASE', '10'), {'ingredient_id': 999999, 'type': 'PURCHASE', 'quantity': 1}]
+        result = StockMovementService.record_movements(batch, strict=False)
+
+        self.assertEqual(result['recorded'], 1)
+        self.assertEqual(len(result['skipped']), 1)
+        self.assertEqual(self.stock()['Flour'], Decimal('110'))
+
+    def test_stock_may_not_drop_below_zero_after_the_whole_batch(self):
+        # A purchase in the same batch covers the waste
+        StockMovementService.record_movements([
+            self.move(self.cheese, 'WASTE', '60'), self.move(self.cheese, 'PURCHASE', '20'),
+        ])
+        self.assertEqual(self.stock()['Cheese'], Decimal('10'))
+
+        short = [self.move(self.cheese, 'PURCHASE', '5'), self.move(self.cheese, 'SPOILAGE', '20'),
+                 self.move(self.flour, 'WASTE', '1')]
+        with self.assertRaisesMessage(StockMovementError, "'Cheese' would drop below zero"):
+            StockMovementService.record_movements(short)
+
+        # Skipping leaves out every movement of the short ingredient, not just the last
+        result = StockMovementService.record_movements(short, strict=False)
+        self.assertEqual(result['recorded'], 1)
+        self.assertEqual(self.stock(), {'Flour': Decimal('99'), 'Cheese': Decimal('10'), 'Basil': Decimal('10')})
+
+
+class RecipeServiceTests(TestCase):
+    """Diff-based recipe upserts and explosions (recipe_service.py)"""
+
+    def setUp(self):
+        self.flour = Ingredient.objects.create(name='Flour', unit='g')
+        self.cheese = Ingredient.objects.create(name='Cheese', unit='g')
+        self.basil = Ingredient.objects.create(name='Basil', unit='g')
+        self.dough = Product.objects.create(name='Dough', price=Decimal('0'))
+        self.pizza = Product.objects.create(name='Pizza', price=Decimal('300'))
+
+    def lines(self, product):
+        return dict(
+            RecipeIngredient.objects.filter(recipe__product=product, ingredient__isnull=False)
+            .values_list('ingredient_id', 'quantity')
+        )
+
+    def explosion(self, product):
+        return RecipeItem.objects.get(product=product).get_explosion()
+
+    def test_only_the_difference_is_written(self):
+        RecipeService.upsert_recipes({self.pizza.id: [(self.flour.id, 200), (self.cheese.id, 100)]})
+        kept = RecipeIngredient.objects.get(recipe__product=self.pizza, ingredient=self.flour).id
+
+        result = RecipeService.upsert_recipes({self.pizza.id: [(self.flour.id, '200'), (self.cheese.id, 120), (self.basil.id, 5)]})
+        self.assertEqual(
+            (result['created'], result['updated'], result['deleted'], result['unchanged']), (1, 1, 0, 1)
+        )
+        result = RecipeService.upsert_recipes({self.pizza.id: [(self.flour.id, 200)]})
+        self.assertEqual(result['deleted'], 2)
+
+        self.assertEqual(self.lines(self.pizza), {self.flour.id: Decimal('200')})
+        self.assertEqual(RecipeIngredient.objects.get(recipe__product=self.pizza).id, kept)
+
+    def test_invalid_lines(self):
+        bad = {self.pizza.id: [(self.flour.id, 200), (self.cheese.id, 0), (999999, 1)]}
+        with self.assertRaises(RecipeValidationError):
+            RecipeService.upsert_recipes(bad)
+        self.assertFalse(RecipeItem.objects.exists())
+
+        result = RecipeService.upsert_recipes(bad, strict=False)
+        self.assertEqual(len(result['skipped']), 2)
+        self.assertEqual(self.lines(self.pizza), {self.flour.id: Decimal('200')})
+
+    def test_explosions_of_parent_recipes_are_rebuilt(self):
+        RecipeService.upsert_recipes({self.dough.id: [(self.flour.id, 200)]})
+        RecipeService.upsert_recipes(
+            {self.pizza.id: [(self.cheese.id, 100)]}, sub_recipes={self.pizza.id: [(self.dough.id, 2)]}
+        )
+        self.assertEqual(self.explosion(self.pizza), {self.flour.id: Decimal('400'), self.cheese.id: Decimal('100')})
+
+        # Changing the sub-recipe alone refreshes the pizza too
+        RecipeService.upsert_recipes({self.dough.id: [(self.flour.id, 250)]})
+        self.assertEqual(self.explosion(self.pizza), {self.flour.id: Decimal('500'), self.cheese.id: Decimal('100')})
+
+    def test_cycles_are_rejected(self):
+        RecipeService.upsert_recipes({self.dough.id: [(self.flour.id, 200)]})
+        RecipeService.upsert_recipes({self.pizza.id: []}, sub_recipes={self.pizza.id: [(self.dough.id, 1)]})
+
+        with self.assertRaises(RecipeValidationError):
+            RecipeService.upsert_recipes({self.dough.id: [(self.flour.id, 200)]}, sub_recipes={self.dough.id: [(self.pizza.id, 1)]})
+        with self.assertRaises(RecipeValidationError):
+            RecipeService.upsert_recipes({}, sub_recipes={self.dough.id: [(self.dough.id, 1)]})
+        self.assertFalse(RecipeIngredient.objects.filter(recipe__product=self.dough, sub_recipe__isnull=False).exists())
+        self.assertEqual(self.explosion(self.pizza), {self.flour.id: Decimal('200')})
+
+    def test_import_rejects_malformed_json(self):
+        for data in ({'product': 'Pizza'}, ['Pizza'], [{'product': 'Pizza', 'ingredients': {'Flour': 1}}],
+                     [{'product': 'Pizza', 'ingredients': ['Flour']}]):
+            with tempfile.TemporaryDirectory() as directory:
+                path = Path(directory) / 'recipes.json'
+                path.write_text(json.dumps(data))
+                with self.assertRaises(CommandError):
+                    call_command('import_recipes', str(path))
 
-# Create your tests here.
+        with tempfile.TemporaryDirectory() as directory:
+            path = Path(directory) / 'recipes.json'
+            path.write_text(json.dumps([{'product': 'Pizza', 'ingredients': [{'ingredient': 'Flour', 'quantity': 180}]}]))
+            call_command('import_recipes', str(path), stdout=StringIO())
+        self.assertEqual(self.lines(self.pizza), {self.flour.id: Decimal('180')})
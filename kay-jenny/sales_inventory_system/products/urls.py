@@ -40,6 +40,11 @@ urlpatterns = [
     path('api/check-ingredient-name/', views.api_check_ingredient_name, name='api_check_ingredient_name'),
     path('api/ingredients/', views.api_list_ingredients, name='api_list_ingredients'),
     path('api/ingredients/create/', views.api_create_ingredient, name='api_create_ingredient'),
+    path('api/stock-movements/', views.api_record_stock_movements, name='api_record_stock_movements'),
+    path('api/stocktakes/', views.api_stocktakes, name='api_stocktakes'),
+    path('api/stocktakes/<int:pk>/', views.api_stocktake_detail, name='api_stocktake_detail'),
+    path('api/stocktakes/<int:pk>/counts/', views.api_stocktake_counts, name='api_stocktake_counts'),
+    path('api/stocktakes/<int:pk>/close/', views.api_stocktake_close, name='api_stocktake_close'),
     path('api/ingredient-availability/', bom_views.api_ingredient_availability, name='api_ingredient_availability'),
     path('api/search-ingredients/', views.api_search_ingredients, name='api_search_ingredients'),
     path('api/categories/', views.api_list_categories, name='api_list_categories'),
@@ -4,7 +4,12 @@ from django.contrib import messages
 from django.http import JsonResponse
 from django.db.models import F, Q, Prefetch
 from django.core.paginator import Paginator
-from .models import Product, Ingredient, RecipeItem, RecipeIngredient
+from .models import Product, Ingredient, RecipeItem, StocktakeSession
+from .movement_service import StockMovementError, StockMovementService
+from .recipe_service import RecipeService
+from .stocktake_service import StocktakeError, StocktakeService
+from sales_inventory_system.system.branches import branch_atomic
+from sales_inventory_system.system.conditional import conditional_list, domain_validator
 
 import json
 from decimal import Decimal
@@ -26,13 +31,16 @@ def product_detail(request, pk):
     context = {
         "product": product,
         "recipe_item": recipe_item,
-        "recipe_ingredients": recipe_item.ingredients.all(),
+        "recipe_ingredients": recipe_item.ingredients.select_related(
+            "ingredient", "sub_recipe__product"
+        ),
     }
     return render(request, "products/detail.html", context)
 
 
 @login_required
 @user_passes_test(is_admin)
+@conditional_list(domain_validator('menu'))
 def product_list(request):
     """List all products with search, filter, and pagination"""
 
@@ -114,7 +122,9 @@ def product_list(request):
                     "threshold": product.threshold,
                     "category": product.category or "",
                     "is_low_stock": product.is_low_stock,
-                    "image_url": product.image.url if product.image else None,
+                    "image_url": product.image_thumb_url,
+                    "image_srcset": product.image_srcset,
+                    "image_fallback_srcset": product.image_fallback_srcset,
                 }
             )
 
@@ -157,8 +167,6 @@ def product_list(request):
 def product_create(request):
     """Create a new product (with or without BOM)"""
     if request.method == "POST":
-        from django.db import transaction
-
         try:
             name = request.POST.get("name")
             description = request.POST.get("description", "")
@@ -242,7 +250,7 @@ def product_create(request):
                         },
                     )
 
-            with transaction.atomic():
+            with branch_atomic():
                 # Create product
                 product = Product.objects.create(
                     name=name,
@@ -256,23 +264,21 @@ def product_create(request):
                 )
 
                 # Create recipe item for the product (always created)
-                recipe_item = RecipeItem.objects.create(product=product)
+                RecipeItem.objects.create(product=product)
 
                 # Create recipe ingredients only if BOM is required
                 ingredients_count = 0
                 if requires_bom and ingredients_data:
-                    for ing_data in ingredients_data:
-                        try:
-                            ingredient = Ingredient.objects.get(id=ing_data.get("id"))
-                            RecipeIngredient.objects.create(
-                                recipe=recipe_item,
-                                ingredient=ingredient,
-                                quantity=Decimal(str(ing_data.get("quantity", 0))),
-                            )
-                            ingredients_count += 1
-                        except (Ingredient.DoesNotExist, ValueError, KeyError):
-                            # Skip invalid ingredients
-                            continue
+                    # Invalid ingredients are skipped; all ids validated in one query
+                    result = RecipeService.upsert_recipe(
+                        product,
+                        [
+                            (ing_data.get("id"), ing_data.get("quantity", 0))
+                            for ing_data in ingredients_data
+                            if isinstance(ing_data, dict)
+                        ],
+                    )
+                    ingredients_count = result["created"]
 
                 product_type = (
                     "Manufactured (with BOM)" if requires_bom else "Simple stock item"
@@ -512,7 +518,9 @@ def archived_products_list(request):
                     "price": float(product.price),
                     "archived_by": product.archive_info.get("archived_by", "Unknown"),
                     "archived_at": archived_at_display,
-                    "image_url": product.image.url if product.image else "",
+                    "image_url": product.image_thumb_url or "",
+                    "image_srcset": product.image_srcset,
+                    "image_fallback_srcset": product.image_fallback_srcset,
                 }
             )
 
@@ -572,6 +580,7 @@ def product_unarchive(request, pk):
 
 @login_required
 @user_passes_test(is_admin)
+@conditional_list(domain_validator('menu'))
 def ingredient_list(request):
     """List all ingredients with search and filtering"""
     search = request.GET.get("search", "").strip()
@@ -756,8 +765,6 @@ def ingredient_delete(request, pk):
 @user_passes_test(is_admin)
 def recipe_edit(request, pk):
     """Edit product recipe/BOM"""
-    from django.db import transaction
-
     product = get_object_or_404(Product, pk=pk)
 
     # Get or create recipe item
@@ -765,30 +772,29 @@ def recipe_edit(request, pk):
 
     if request.method == "POST":
         try:
-            with transaction.atomic():
-                # Delete existing ingredients
-                recipe_item.ingredients.all().delete()
-
-                # Add new ingredients from form
-                ingredients_data = request.POST.getlist("ingredient_id")
-                quantities_data = request.POST.getlist("quantity")
-
-                for ing_id, qty in zip(ingredients_data, quantities_data):
-                    if ing_id and qty:
-                        try:
-                            ingredient = Ingredient.objects.get(id=ing_id)
-                            RecipeIngredient.objects.create(
-                                recipe=recipe_item,
-                                ingredient=ingredient,
-                                quantity=Decimal(qty),
-                            )
-                        except (Ingredient.DoesNotExist, ValueError):
-                            pass
-
-                messages.success(
-                    request, f'Recipe for "{product.name}" updated successfully!'
-                )
-                return redirect("products:edit", pk=product.id)
+            # Apply only the changed lines (invalid rows are skipped)
+            ingredients_data = request.POST.getlist("ingredient_id")
+            quantities_data = request.POST.getlist("quantity")
+            sub_recipes_data = request.POST.getlist("sub_recipe_id")
+            sub_quantities_data = request.POST.getlist("sub_recipe_quantity")
+            RecipeService.upsert_recipe(
+                product,
+                [
+                    (ing_id, qty)
+                    for ing_id, qty in zip(ingredients_data, quantities_data)
+                    if ing_id and qty
+                ],
+                sub_recipes=[
+                    (sub_id, qty)
+                    for sub_id, qty in zip(sub_recipes_data, sub_quantities_data)
+                    if sub_id and qty
+                ],
+            )
+
+            messages.success(
+                request, f'Recipe for "{product.name}" updated successfully!'
+            )
+            return redirect("products:edit", pk=product.id)
 
         except Exception as e:
             messages.error(request, f"Error updating recipe: {str(e)}")
@@ -796,13 +802,26 @@ def recipe_edit(request, pk):
     # Get all active ingredients
     all_ingredients = Ingredient.objects.filter(is_active=True).order_by("name")
 
-    # Get current recipe ingredients
-    recipe_ingredients = recipe_item.ingredients.all()
+    # Get current recipe lines, split into raw ingredients and sub-recipes
+    recipe_lines = recipe_item.ingredients.select_related(
+        "ingredient", "sub_recipe__product"
+    )
+    recipe_ingredients = [line for line in recipe_lines if line.ingredient_id]
+    recipe_sub_recipes = [line for line in recipe_lines if line.sub_recipe_id]
+
+    # Other products with a recipe can be used as prepared components
+    available_sub_recipes = (
+        Product.objects.filter(recipe__isnull=False, is_archived=False)
+        .exclude(pk=product.pk)
+        .order_by("name")
+    )
 
     context = {
         "product": product,
         "recipe_item": recipe_item,
         "recipe_ingredients": recipe_ingredients,
+        "recipe_sub_recipes": recipe_sub_recipes,
+        "available_sub_recipes": available_sub_recipes,
         "all_ingredients": all_ingredients,
     }
     return render(request, "products/recipe_form.html", context)
@@ -810,13 +829,14 @@ def recipe_edit(request, pk):
 
 @login_required
 @user_passes_test(is_admin)
-def api_list_ingredients(request):
+@conditional_list(domain_validator('menu'), ajax_only=False)
+async def api_list_ingredients(request):
     """API endpoint for listing all ingredients (for product creation form)"""
     # Get all active ingredients
     ingredients = Ingredient.objects.filter(is_active=True).order_by("name")
 
     results = []
-    for ingredient in ingredients:
+    async for ingredient in ingredients:
         results.append(
             {
                 "id": ingredient.id,
@@ -898,7 +918,193 @@ def api_create_ingredient(request):
 
 @login_required
 @user_passes_test(is_admin)
-def api_search_ingredients(request):
+def api_record_stock_movements(request):
+    """
+    API endpoint for recording many stock movements at once
+    (supplier deliveries, waste, adjustments).
+
+    Body: {"movements": [{"ingredient_id": 1, "type": "PURCHASE",
+    "quantity": 500, "unit_cost": 0.25, "notes": "..."}, ...], "strict": true}
+    """
+    if request.method != "POST":
+        return JsonResponse(
+            {"success": False, "message": "Only POST method is allowed"}, status=405
+        )
+
+    try:
+        payload = json.loads(request.body or b"{}")
+    except json.JSONDecodeError:
+        return JsonResponse(
+            {"success": False, "message": "Request body must be JSON"}, status=400
+        )
+
+    movements = payload.get("movements") if isinstance(payload, dict) else None
+    if not isinstance(movements, list) or not movements:
+        return JsonResponse(
+            {"success": False, "message": "movements must be a non-empty list"},
+            status=400,
+        )
+    if not all(isinstance(movement, dict) for movement in movements):
+        return JsonResponse(
+            {"success": False, "message": "Each movement must be an object"},
+            status=400,
+        )
+
+    try:
+        result = StockMovementService.record_movements(
+            movements, user=request.user, strict=payload.get("strict", True) is not False
+        )
+    except StockMovementError as e:
+        return JsonResponse(
+            {"success": False, "message": f"Nothing was recorded: {e}"}, status=400
+        )
+
+    return JsonResponse({"success": True, **result})
+
+
+def _stocktake_summary(session):
+    progress = StocktakeService.progress(session)
+    return {
+        "id": session.id,
+        "status": session.status,
+        "started_at": session.started_at.isoformat(),
+        "closed_at": session.closed_at.isoformat() if session.closed_at else None,
+        "lines": progress["total"],
+        "counted": progress["counted"],
+    }
+
+
+@login_required
+@user_passes_test(is_admin)
+def api_stocktakes(request):
+    """
+    API endpoint for stocktakes.
+    GET: the open stocktake (if any). POST: start a stocktake, freezing
+    theoretical stock of all active ingredients.
+    """
+    if request.method == "POST":
+        try:
+            session = StocktakeService.start_session(
+                user=request.user, notes=request.POST.get("notes", "").strip()
+            )
+        except StocktakeError as e:
+            return JsonResponse({"success": False, "message": str(e)}, status=409)
+        return JsonResponse({"success": True, "stocktake": _stocktake_summary(session)})
+
+    session = StocktakeSession.objects.filter(status="OPEN").first()
+    return JsonResponse(
+        {
+            "success": True,
+            "stocktake": _stocktake_summary(session) if session else None,
+        }
+    )
+
+
+@login_required
+@user_passes_test(is_admin)
+def api_stocktake_detail(request, pk):
+    """API endpoint for a stocktake's lines: frozen quantity and count so far"""
+    session = get_object_or_404(StocktakeSession, pk=pk)
+    lines = session.lines.select_related("ingredient").order_by("ingredient__name")
+    if request.GET.get("uncounted"):
+        lines = lines.filter(physical_quantity__isnull=True)
+
+    return JsonResponse(
+        {
+            "success": True,
+            "stocktake": _stocktake_summary(session),
+            "lines": [
+                {
+                    "ingredient_id": line.ingredient_id,
+                    "name": line.ingredient.name,
+                    "unit": line.ingredient.unit,
+                    "theoretical_quantity": float(line.theoretical_quantity),
+                    "physical_quantity": (
+                        float(line.physical_quantity)
+                        if line.physical_quantity is not None
+                        else None
+                    ),
+                    "variance_quantity": (
+                        float(line.variance_quantity)
+                        if line.variance_quantity is not None
+                        else None
+                    ),
+                }
+                for line in lines
+            ],
+        }
+    )
+
+
+@login_required
+@user_passes_test(is_admin)
+def api_stocktake_counts(request, pk):
+    """
+    API endpoint for entering counts, one or many at a time.
+
+    Body: {"counts": [{"ingredient_id": 1, "quantity": 820, "notes": "..."}],
+    "strict": true}
+    """
+    if request.method != "POST":
+        return JsonResponse(
+            {"success": False, "message": "Only POST method is allowed"}, status=405
+        )
+
+    try:
+        payload = json.loads(request.body or b"{}")
+    except json.JSONDecodeError:
+        return JsonResponse(
+            {"success": False, "message": "Request body must be JSON"}, status=400
+        )
+
+    counts = payload.get("counts") if isinstance(payload, dict) else None
+    if not isinstance(counts, list) or not all(isinstance(count, dict) for count in counts):
+        return JsonResponse(
+            {"success": False, "message": "counts must be a list of objects"},
+            status=400,
+        )
+
+    try:
+        result = StocktakeService.record_counts(
+            pk, counts, user=request.user, strict=payload.get("strict", True) is not False
+        )
+    except StocktakeError as e:
+        return JsonResponse({"success": False, "message": str(e)}, status=400)
+
+    return JsonResponse({"success": True, **result})
+
+
+@login_required
+@user_passes_test(is_admin)
+def api_stocktake_close(request, pk):
+    """API endpoint for closing (applying) or cancelling a stocktake"""
+    if request.method != "POST":
+        return JsonResponse(
+            {"success": False, "message": "Only POST method is allowed"}, status=405
+        )
+
+    try:
+        if request.POST.get("action") == "cancel":
+            StocktakeService.cancel_session(pk, user=request.user)
+            return JsonResponse({"success": True, "cancelled": True})
+        result = StocktakeService.close_session(pk, user=request.user)
+    except StocktakeError as e:
+        return JsonResponse({"success": False, "message": str(e)}, status=400)
+
+    return JsonResponse(
+        {
+            "success": True,
+            **result,
+            "net_adjustment": float(result["net_adjustment"]),
+            "period_start": result["period_start"].isoformat(),
+            "period_end": result["period_end"].isoformat(),
+        }
+    )
+
+
+@login_required
+@user_passes_test(is_admin)
+async def api_search_ingredients(request):
     """API endpoint for searching ingredients (async search)"""
     query = request.GET.get("q", "").strip()
 
@@ -917,7 +1123,7 @@ def api_search_ingredients(request):
     )  # Limit to 10 results
 
     results = []
-    for ingredient in ingredients:
+    async for ingredient in ingredients:
         results.append(
             {
                 "id": ingredient.id,
@@ -934,7 +1140,8 @@ def api_search_ingredients(request):
 
 @login_required
 @user_passes_test(is_admin)
-def api_list_categories(request):
+@conditional_list(domain_validator('menu'), ajax_only=False)
+async def api_list_categories(request):
     """API endpoint for listing all product categories"""
     # Get all unique categories from non-archived products
     all_categories = (
@@ -943,7 +1150,7 @@ def api_list_categories(request):
         .distinct()
         .order_by("category")
     )
-    all_categories = [c for c in all_categories if c]  # Remove empty categories
+    all_categories = [c async for c in all_categories if c]  # Remove empty categories
 
     results = [{"name": cat} for cat in all_categories]
     return JsonResponse(results, safe=False)
@@ -5,9 +5,19 @@ It exposes the ASGI callable as a module-level variable named ``application``.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
+
+Run with gunicorn + uvicorn workers (from kay-jenny/):
+    gunicorn sales_inventory_system.sales_inventory.asgi:application -k uvicorn_worker.UvicornWorker
 """
 
 import os
+import sys
+from pathlib import Path
+
+# Add parent directory to Python path so Django can find all modules
+parent_dir = Path(__file__).parent.parent.parent
+if str(parent_dir) not in sys.path:
+    sys.path.insert(0, str(parent_dir))
 
 from django.core.asgi import get_asgi_application
 
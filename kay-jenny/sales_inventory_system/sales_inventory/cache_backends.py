@@ -0,0 +1,248 @@
+"""
+Shared local cache backend for multi-worker deployments
+
+LocMemCache keeps one private cache per gunicorn worker, so forecasts and
+dashboards are recomputed once per worker and hit rates drop as workers are
+added. SQLiteCache stores entries in a single SQLite file (WAL mode) that every
+worker process on the host opens, which gives:
+
+- One shared cache per host without running an external server
+- TTL expiry (checked on read, purged in batches during culling)
+- Oldest-written entries evicted once MAX_ENTRIES is exceeded; reads never
+  write, so cache hits from many workers don't queue on the write lock
+- Atomic add() and incr()/decr() across processes
+
+Usage (settings.CACHES):
+    "BACKEND": "sales_inventory_system.sales_inventory.cache_backends.SQLiteCache",
+    "LOCATION": "/path/to/cache.sqlite3",
+"""
+
+import os
+import pickle
+import sqlite3
+import threading
+import time
+
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+
+
+class SQLiteCache(BaseCache):
+    """File-backed cache shared by all processes on a host"""
+
+    pickle_protocol = pickle.HIGHEST_PROTOCOL
+
+    # Seconds between culls in one process; MAX_ENTRIES is a soft limit that
+    # may be overshot by the writes made in between
+    cull_interval = 5.0
+
+    # Expired rows deleted per statement while culling
+    purge_batch_size = 500
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        self._path = str(location)
+        options = params.get("OPTIONS", {})
+        self._busy_timeout = float(options.get("BUSY_TIMEOUT", 5.0))
+        self._local = threading.local()
+        self._schema_ready = False
+        self._last_cull = 0.0
+
+    # ==================== CONNECTION HANDLING ====================
+
+    def _connection(self):
+        """Return a connection owned by the current thread and process"""
+        conn = getattr(self._local, "conn", None)
+        pid = getattr(self._local, "pid", None)
+
+        # gunicorn forks workers after settings import, never reuse a parent's handle
+        if conn is None or pid != os.getpid():
+            directory = os.path.dirname(self._path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            conn = sqlite3.connect(
+                self._path,
+                timeout=self._busy_timeout,
+                isolation_level=None,  # autocommit; explicit BEGIN where atomicity matters
+                check_same_thread=False,
+            )
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+            self._ensure_schema(conn)
+        return conn
+
+    def _ensure_schema(self, conn):
+        if self._schema_ready:
+            return
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS cache_entry ("
+            " key TEXT PRIMARY KEY,"
+            " value BLOB NOT NULL,"
+            " expires REAL,"
+            " accessed REAL NOT NULL"
+            ")"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS cache_entry_accessed ON cache_entry (accessed)")
+        conn.execute("CREATE INDEX IF NOT EXISTS cache_entry_expires ON cache_entry (expires)")
+        self._schema_ready = True
+
+    # ==================== VALUE ENCODING ====================
+
+    def _encode(self, value):
+        # Plain integers are stored natively (counters stay readable from SQL)
+        if isinstance(value, int) and not isinstance(value, bool):
+            return value
+        return pickle.dumps(value, self.pickle_protocol)
+
+    @staticmethod
+    def _decode(raw):
+        if isinstance(raw, int):
+            return raw
+        return pickle.loads(raw)
+
+    # ==================== CACHE API ====================
+
+    def get(self, key, default=None, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        # Read-only: expired rows are left for _cull() to purge
+        row = self._connection().execute(
+            "SELECT value FROM cache_entry WHERE key = ? AND (expires IS NULL OR expires > ?)",
+            (key, time.time()),
+        ).fetchone()
+        if row is None:
+            return default
+        return self._decode(row[0])
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        expires = self.get_backend_timeout(timeout)
+        if expires is not None and expires <= time.time():
+            # timeout=0 means "expire immediately"
+            self._connection().execute("DELETE FROM cache_entry WHERE key = ?", (key,))
+            return
+        conn = self._connection()
+        conn.execute(
+            "INSERT OR REPLACE INTO cache_entry (key, value, expires, accessed) VALUES (?, ?, ?, ?)",
+            (key, self._encode(value), expires, time.time()),
+        )
+        self._cull(conn)
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        expires = self.get_backend_timeout(timeout)
+        now = time.time()
+        conn = self._connection()
+        # Insert, or take over a row that has already expired - in one statement
+        cursor = conn.execute(
+            "INSERT INTO cache_entry (key, value, expires, accessed) VALUES (?, ?, ?, ?) "
+            "ON CONFLICT(key) DO UPDATE SET "
+            " value = excluded.value, expires = excluded.expires, accessed = excluded.accessed "
+            "WHERE cache_entry.expires IS NOT NULL AND cache_entry.expires <= ?",
+            (key, self._encode(value), expires, now, now),
+        )
+        added = cursor.rowcount > 0
+        if added:
+            self._cull(conn)
+        return added
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        now = time.time()
+        cursor = self._connection().execute(
+            "UPDATE cache_entry SET expires = ?, accessed = ? "
+            "WHERE key = ? AND (expires IS NULL OR expires > ?)",
+            (self.get_backend_timeout(timeout), now, key, now),
+        )
+        return cursor.rowcount > 0
+
+    def delete(self, key, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        cursor = self._connection().execute("DELETE FROM cache_entry WHERE key = ?", (key,))
+        return cursor.rowcount > 0
+
+    def has_key(self, key, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        row = self._connection().execute(
+            "SELECT 1 FROM cache_entry WHERE key = ? AND (expires IS NULL OR expires > ?)",
+            (key, time.time()),
+        ).fetchone()
+        return row is not None
+
+    def incr(self, key, delta=1, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        conn = self._connection()
+        now = time.time()
+        # BEGIN IMMEDIATE takes the write lock up front, so concurrent
+        # increments from other workers serialize instead of losing updates
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute(
+                "SELECT value FROM cache_entry WHERE key = ? AND (expires IS NULL OR expires > ?)",
+                (key, now),
+            ).fetchone()
+            if row is None:
+                raise ValueError("Key '%s' not found" % key)
+            new_value = self._decode(row[0]) + delta
+            conn.execute(
+                "UPDATE cache_entry SET value = ?, accessed = ? WHERE key = ?",
+                (self._encode(new_value), now, key),
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return new_value
+
+    def clear(self):
+        self._connection().execute("DELETE FROM cache_entry")
+
+    def close(self, **kwargs):
+        # Connections are reused for the life of the worker; nothing to do per request
+        pass
+
+    # ==================== EVICTION ====================
+
+    def _cull(self, conn):
+        """
+        Drop expired rows, then the oldest-written rows once over MAX_ENTRIES.
+        Runs at most once per cull_interval per process.
+        """
+        now = time.monotonic()
+        if now - self._last_cull < self.cull_interval:
+            return
+        self._last_cull = now
+
+        count = conn.execute("SELECT COUNT(*) FROM cache_entry").fetchone()[0]
+        if count <= self._max_entries:
+            return
+
+        count -= self._purge_expired(conn)
+        if count <= self._max_entries:
+            return
+
+        if self._cull_frequency == 0:
+            conn.execute("DELETE FROM cache_entry")
+            return
+
+        cull_count = max(count // self._cull_frequency, count - self._max_entries)
+        conn.execute(
+            "DELETE FROM cache_entry WHERE key IN ("
+            " SELECT key FROM cache_entry ORDER BY accessed ASC LIMIT ?"
+            ")",
+            (cull_count,),
+        )
+
+    def _purge_expired(self, conn):
+        """Delete expired rows in short batches; returns how many went"""
+        purged = 0
+        while True:
+            cursor = conn.execute(
+                "DELETE FROM cache_entry WHERE key IN ("
+                " SELECT key FROM cache_entry WHERE expires IS NOT NULL AND expires <= ? LIMIT ?"
+                ")",
+                (time.time(), self.purge_batch_size),
+            )
+            purged += cursor.rowcount
+            if cursor.rowcount < self.purge_batch_size:
+                return purged
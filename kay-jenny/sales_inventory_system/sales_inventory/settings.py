@@ -13,6 +13,7 @@ https://docs.djangoproject.com/en/5.2/ref/settings/
 from pathlib import Path
 import os
 import dj_database_url
+from django.core.exceptions import ImproperlyConfigured
 from dotenv import load_dotenv
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -82,7 +83,9 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     "django.middleware.security.SecurityMiddleware",
-    "whitenoise.middleware.WhiteNoiseMiddleware",  # must be above others
+    "sales_inventory_system.sales_inventory.middleware.AsyncWhiteNoiseMiddleware",  # must be above others
+    "sales_inventory_system.system.middleware.BranchMiddleware",
+    "sales_inventory_system.system.middleware.ReplicaPinMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
@@ -90,6 +93,7 @@ MIDDLEWARE = [
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
     "sales_inventory_system.system.middleware.AuditMiddleware",
+    "sales_inventory_system.system.middleware.ProfilingMiddleware",
 ]
 
 ROOT_URLCONF = "sales_inventory_system.sales_inventory.urls"
@@ -119,7 +123,11 @@ WSGI_APPLICATION = "sales_inventory.wsgi.application"
 
 
 # Database configuration - default to SQLite locally, allow DATABASE_URL/engine override
-DB_CONN_MAX_AGE = int(os.getenv("DB_CONN_MAX_AGE", "600"))
+# Connections close after each request by default: under ASGI every request
+# may run sync code in a different thread, and persistent connections pile up
+# one per thread. Pool on the server side (PgBouncer) instead; raise this only
+# behind WSGI.
+DB_CONN_MAX_AGE = int(os.getenv("DB_CONN_MAX_AGE", "0"))
 DB_ENGINE = os.getenv("DB_ENGINE", "django.db.backends.sqlite3")
 DATABASE_URL = os.getenv("DATABASE_URL")
 
@@ -162,6 +170,80 @@ else:
     }
 
 
+# Branches (stores): each branch keeps its orders, products, stock and ledger
+# in its own database. Comma-separated code=location pairs, where location is
+# an SQLite file or "schema:<name>" (a schema in the default PostgreSQL
+# database), e.g. BRANCH_DATABASES="north=north.sqlite3,south=south.sqlite3"
+# Create each with: python manage.py migrate --database branch_<code>
+BRANCHES = {}
+for branch_entry in filter(None, (part.strip() for part in os.getenv("BRANCH_DATABASES", "").split(","))):
+    branch_code, _, branch_location = branch_entry.partition("=")
+    branch_code, branch_location = branch_code.strip(), branch_location.strip()
+    if not branch_code or not branch_location:
+        raise ImproperlyConfigured(f"BRANCH_DATABASES entry must be code=location: {branch_entry!r}")
+    branch_alias = f"branch_{branch_code}"
+    if branch_location.startswith("schema:"):
+        branch_db = dict(DATABASES["default"])
+        branch_db["OPTIONS"] = {
+            **branch_db.get("OPTIONS", {}),
+            "options": f"-c search_path={branch_location[len('schema:'):]},public",
+        }
+    else:
+        branch_path = Path(branch_location)
+        if not branch_path.is_absolute():
+            branch_path = BASE_DIR / branch_path
+        branch_db = {"ENGINE": "django.db.backends.sqlite3", "NAME": branch_path}
+    DATABASES[branch_alias] = branch_db
+    BRANCHES[branch_code] = {"name": branch_code.replace("_", " ").title(), "database": branch_alias}
+
+# Branch used when a request or command does not pick one (blank = head office)
+ACTIVE_BRANCH = os.getenv("ACTIVE_BRANCH") or None
+if ACTIVE_BRANCH and ACTIVE_BRANCH not in BRANCHES:
+    raise ImproperlyConfigured(f"ACTIVE_BRANCH {ACTIVE_BRANCH!r} is not in BRANCH_DATABASES")
+
+# Read replicas for reports and exports. Comma-separated primary=location
+# pairs, where primary is "default" or a branch code and location is a
+# database URL or an SQLite file (a copy, for trying it locally), e.g.
+# REPLICA_DATABASES="default=postgres://reader@replica-host/fcj_pizza"
+READ_REPLICAS = {}
+for replica_entry in filter(None, (part.strip() for part in os.getenv("REPLICA_DATABASES", "").split(","))):
+    replica_target, _, replica_location = replica_entry.partition("=")
+    replica_target, replica_location = replica_target.strip(), replica_location.strip()
+    if not replica_target or not replica_location:
+        raise ImproperlyConfigured(f"REPLICA_DATABASES entry must be primary=location: {replica_entry!r}")
+    if replica_target == "default":
+        replica_primary = "default"
+    elif replica_target in BRANCHES:
+        replica_primary = BRANCHES[replica_target]["database"]
+    else:
+        raise ImproperlyConfigured(f"REPLICA_DATABASES primary {replica_target!r} is not default or a branch")
+    if "://" in replica_location:
+        replica_db = dj_database_url.parse(replica_location, conn_max_age=DB_CONN_MAX_AGE)
+    else:
+        replica_path = Path(replica_location)
+        if not replica_path.is_absolute():
+            replica_path = BASE_DIR / replica_path
+        replica_db = {"ENGINE": "django.db.backends.sqlite3", "NAME": replica_path}
+    # Tests read the primary through the replica alias instead of a second test database
+    replica_db["TEST"] = {"MIRROR": replica_primary}
+    replica_alias = "replica" if replica_primary == "default" else f"{replica_primary}_replica"
+    DATABASES[replica_alias] = replica_db
+    READ_REPLICAS[replica_primary] = replica_alias
+
+# Replicas further behind than this are skipped (seconds)
+REPLICA_MAX_LAG = float(os.getenv("REPLICA_MAX_LAG", "30"))
+# How long a browser reads from the primary after it writes (seconds)
+REPLICA_PIN_SECONDS = int(os.getenv("REPLICA_PIN_SECONDS", "15"))
+# Health check cadence per process, and the wait before retrying a failed replica
+REPLICA_CHECK_SECONDS = 5
+REPLICA_RETRY_SECONDS = 30
+
+DATABASE_ROUTERS = [
+    "sales_inventory_system.system.routers.ReplicaRouter",
+    "sales_inventory_system.system.routers.BranchRouter",
+]
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
@@ -223,17 +305,38 @@ LOGIN_REDIRECT_URL = "/"
 LOGOUT_REDIRECT_URL = "accounts:login"
 
 # Caching configuration
+# Default is a SQLite-file cache shared by every gunicorn worker on the host, so
+# forecasts and dashboards are computed once per host instead of once per worker.
+# Set CACHE_BACKEND=django.core.cache.backends.locmem.LocMemCache for a per-process cache.
+SHARED_CACHE_BACKEND = "sales_inventory_system.sales_inventory.cache_backends.SQLiteCache"
+CACHE_BACKEND = os.getenv("CACHE_BACKEND", SHARED_CACHE_BACKEND)
 CACHES = {
     "default": {
-        "BACKEND": os.getenv("CACHE_BACKEND", "django.core.cache.backends.locmem.LocMemCache"),
-        "LOCATION": os.getenv("CACHE_LOCATION", "fcp-cache"),
+        "BACKEND": CACHE_BACKEND,
+        "LOCATION": os.getenv(
+            "CACHE_LOCATION",
+            str(BASE_DIR / "cache.sqlite3") if CACHE_BACKEND == SHARED_CACHE_BACKEND else "fcp-cache",
+        ),
         "TIMEOUT": int(os.getenv("CACHE_TIMEOUT", "300")),  # 5 minutes default
+        "KEY_FUNCTION": "sales_inventory_system.system.branches.cache_key",
         "OPTIONS": {
             "MAX_ENTRIES": int(os.getenv("CACHE_MAX_ENTRIES", "1000")),
         }
     }
 }
 
+# Seconds a rendered product tile / ingredient row stays cached ({% fragment_cache %});
+# keys change with the row, so this only bounds how long unused entries linger. 0 disables.
+FRAGMENT_CACHE_TIMEOUT = int(os.getenv("FRAGMENT_CACHE_TIMEOUT", "3600"))
+
+# Days deleted products are reported in POS menu deltas; terminals whose menu
+# is older than this download the full menu again
+MENU_TOMBSTONE_DAYS = int(os.getenv("MENU_TOMBSTONE_DAYS", "30"))
+
+# Admin ledgers in large-table mode (system/admin_mixins.py) count at most this many
+# rows per list; bigger lists show "N+" (or the table estimate on PostgreSQL/MySQL)
+ADMIN_EXACT_COUNT_LIMIT = int(os.getenv("ADMIN_EXACT_COUNT_LIMIT", "10000"))
+
 # Logging configuration for performance monitoring
 # Use console-only logging to work in production environments like Render
 LOGGING = {
@@ -270,6 +373,24 @@ LOGGING = {
     },
 }
 
+# On-demand request profiling (switched on per URL pattern at /system/profiles/)
+PROFILER_DIR = Path(os.getenv("PROFILER_DIR", str(BASE_DIR / "profiles")))
+PROFILER_RETENTION_DAYS = int(os.getenv("PROFILER_RETENTION_DAYS", "7"))
+PROFILER_MAX_FILES = int(os.getenv("PROFILER_MAX_FILES", "200"))
+PROFILER_MAX_MINUTES = 240  # profiling always switches itself off
+
+# Background CSV exports (queued by report pages, built by run_export_jobs).
+# Set EXPORT_BACKGROUND only where that worker is deployed; otherwise the
+# request that asks for an export builds it.
+EXPORT_BACKGROUND = os.getenv("EXPORT_BACKGROUND", "False").lower() == "true"
+EXPORT_MAX_ACTIVE_PER_USER = int(os.getenv("EXPORT_MAX_ACTIVE_PER_USER", "2"))
+EXPORT_RETENTION_HOURS = int(os.getenv("EXPORT_RETENTION_HOURS", "48"))
+EXPORT_STALE_SECONDS = 300  # no progress report for this long: worker is gone
+EXPORT_MAX_ATTEMPTS = 3
+
+# Incremental ledger export for offline analysis (python manage.py export_ledgers)
+LEDGER_EXPORT_DIR = Path(os.getenv("LEDGER_EXPORT_DIR", str(BASE_DIR / "ledger_exports")))
+
 # Performance optimizations
 # Session timeout (in seconds)
 SESSION_COOKIE_AGE = 3600 * 24 * 7  # 1 week
@@ -0,0 +1,89 @@
+"""
+Single-flight caching for expensive computations
+
+When a cached forecast or report expires, every request that arrives before
+it is rebuilt would otherwise recompute it at the same time - in every
+worker. get_or_compute() lets exactly one caller recompute:
+
+- Entries carry their own "fresh until" time and stay in the cache for an
+  extra stale period after it
+- Stale hit: one caller takes the refresh lock and recomputes; everyone else
+  gets the stale value immediately (stale-while-revalidate)
+- Miss: one caller computes; the others poll the cache for up to `wait`
+  seconds for its result, then compute themselves rather than fail
+- The lock is a cache.add() key, which is atomic across gunicorn workers on
+  the shared SQLite cache (and on Redis/Memcached)
+
+Usage:
+    result = get_or_compute(
+        'forecast_30_7', lambda: forecast_sales(30, 7), timeout=1800, stale=3600
+    )
+"""
+
+import logging
+import time
+from collections import namedtuple
+
+from django.core.cache import cache
+
+
+logger = logging.getLogger(__name__)
+
+# Cached envelope; values stored by older code under the same key count as misses
+CachedValue = namedtuple('CachedValue', ['value', 'fresh_until'])
+
+POLL_INTERVAL = 0.1
+
+
+def _lock_key(key):
+    return f"{key}:refresh-lock"
+
+
+def _refresh(key, compute, timeout, stale):
+    try:
+        value = compute()
+        cache.set(key, CachedValue(value, time.time() + timeout), timeout + stale)
+        return value
+    finally:
+        cache.delete(_lock_key(key))
+
+
+def get_or_compute(key, compute, timeout, stale=0, wait=10.0, lock_timeout=300):
+    """
+    Return the cached value for key, computing it at most once at a time.
+
+    Args:
+        key: Cache key
+        compute: Zero-argument callable building the value
+        timeout: Seconds the value is fresh
+        stale: Further seconds a stale value may be served while one caller refreshes
+        wait: Seconds to wait for another caller's result on a cold miss
+        lock_timeout: Seconds before an abandoned refresh lock expires
+            (should exceed the longest compute time)
+
+    Returns:
+        The cached or freshly computed value
+    """
+    entry = cache.get(key)
+    if isinstance(entry, CachedValue):
+        if entry.fresh_until > time.time():
+            return entry.value
+        if not cache.add(_lock_key(key), 1, lock_timeout):
+            return entry.value  # someone else is refreshing
+        try:
+            return _refresh(key, compute, timeout, stale)
+        except Exception:
+            logger.exception("Refreshing %s failed, serving the stale value", key)
+            return entry.value
+
+    deadline = time.monotonic() + wait
+    while True:
+        if cache.add(_lock_key(key), 1, lock_timeout):
+            return _refresh(key, compute, timeout, stale)
+        time.sleep(POLL_INTERVAL)
+        entry = cache.get(key)
+        if isinstance(entry, CachedValue):
+            return entry.value
+        if time.monotonic() >= deadline:
+            logger.warning("Gave up waiting for %s after %.0fs, computing it here", key, wait)
+            return compute()
@@ -0,0 +1,116 @@
+import os
+import tempfile
+import time
+
+from django.test import SimpleTestCase, override_settings
+
+from sales_inventory_system.system.branches import use_branch
+from .cache_backends import SQLiteCache
+
+
+class SQLiteCacheTests(SimpleTestCase):
+    """Shared SQLite cache backend (cache_backends.py)"""
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmpdir.cleanup)
+        self.cache = self.make_cache()
+
+    def make_cache(self, **options):
+        params = {
+            'TIMEOUT': 300,
+            'KEY_FUNCTION': 'sales_inventory_system.system.branches.cache_key',
+            'OPTIONS': {'MAX_ENTRIES': 10, 'CULL_FREQUENCY': 2, **options},
+        }
+        cache = SQLiteCache(os.path.join(self.tmpdir.name, 'cache.sqlite3'), params)
+        cache.cull_interval = 0
+        return cache
+
+    def rows(self):
+        return self.cache._connection().execute("SELECT COUNT(*) FROM cache_entry").fetchone()[0]
+
+    def test_set_and_get(self):
+        self.cache.set('menu', {'items': [1, 2]})
+        self.cache.set('count', 7)
+        self.assertEqual(self.cache.get('menu'), {'items': [1, 2]})
+        self.assertEqual(self.cache.get('count'), 7)
+        self.assertEqual(self.cache.get('missing', 'default'), 'default')
+
+    def test_shared_between_instances(self):
+        self.cache.set('menu', 'v1')
+        self.assertEqual(self.make_cache().get('menu'), 'v1')
+
+    def test_get_does_not_write(self):
+        self.cache.set('menu', 'v1')
+        conn = self.cache._connection()
+        changes = conn.total_changes
+        self.cache.get('menu')
+        self.cache.get('missing')
+        self.assertEqual(conn.total_changes, changes)
+
+    def test_expired_entries_are_misses(self):
+        self.cache.set('menu', 'v1', timeout=1)
+        self.cache.set('gone', 'v1', timeout=0)
+        self.assertEqual(self.cache.get('menu'), 'v1')
+        self.assertIsNone(self.cache.get('gone'))
+        self.cache._connection().execute("UPDATE cache_entry SET expires = ?", (time.time() - 1,))
+        self.assertIsNone(self.cache.get('menu'))
+        self.assertFalse(self.cache.has_key('menu'))
+        # Left for the next cull to purge
+        self.assertEqual(self.rows(), 1)
+
+    def test_add_takes_over_expired_entry(self):
+        self.assertTrue(self.cache.add('lock', 1))
+        self.assertFalse(self.cache.add('lock', 2))
+        self.cache._connection().execute("UPDATE cache_entry SET expires = ?", (time.time() - 1,))
+        self.assertTrue(self.cache.add('lock', 3))
+        self.assertEqual(self.cache.get('lock'), 3)
+
+    def test_incr(self):
+        self.cache.set('hits', 1)
+        self.assertEqual(self.cache.incr('hits', 4), 5)
+        self.assertEqual(self.cache.get('hits'), 5)
+        with self.assertRaises(ValueError):
+            self.cache.incr('missing')
+
+    def test_cull_purges_expired_first(self):
+        for i in range(10):
+            self.cache.set(f'old{i}', i, timeout=1)
+        self.cache._connection().execute("UPDATE cache_entry SET expires = ?", (time.time() - 1,))
+        self.cache.set('fresh', 'v1')
+        self.assertEqual(self.rows(), 1)
+        self.assertEqual(self.cache.get('fresh'), 'v1')
+
+    def test_cull_evicts_oldest_written(self):
+        for i in range(11):
+            self.cache.set(f'key{i}', i)
+            self.cache._connection().execute(
+                "UPDATE cache_entry SET accessed = ? WHERE key LIKE ?", (i, f'%:key{i}')
+            )
+        self.cache.set('newest', 'v1')
+        self.assertLessEqual(self.rows(), 10)
+        self.assertIsNone(self.cache.get('key0'))
+        self.assertEqual(self.cache.get('newest'), 'v1')
+
+    def test_cull_waits_for_interval(self):
+        self.cache.cull_interval = 3600
+        self.cache._last_cull = time.monotonic()
+        for i in range(15):
+            self.cache.set(f'key{i}', i)
+        self.assertEqual(self.rows(), 15)
+
+    @override_settings(BRANCHES={'north': {'name': 'North', 'database': 'default'}})
+    def test_keys_are_namespaced_per_branch(self):
+        self.cache.set('menu', 'head office')
+        with use_branch('north'):
+            self.assertIsNone(self.cache.get('menu'))
+            self.cache.set('menu', 'north')
+            self.assertEqual(self.cache.get('menu'), 'north')
+        self.assertEqual(self.cache.get('menu'), 'head office')
+
+    def test_key_prefix_and_version(self):
+        self.cache.set('menu', 'v1', version=1)
+        self.assertIsNone(self.cache.get('menu', version=2))
+        other = self.make_cache()
+        other.key_prefix = 'other'
+        self.assertIsNone(other.get('menu', version=1))
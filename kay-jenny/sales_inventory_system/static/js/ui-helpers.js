@@ -572,6 +572,36 @@ const UrlHelper = {
     }
 };
 
+/**
+ * ProductImage - Responsive product image markup for JSON payloads
+ * Same output as the {% product_picture %} template tag: WebP srcset with a
+ * JPEG fallback, or the plain image_url until the resized copies exist.
+ * Usage:
+ *   ProductImage.html(product, 'w-full h-full object-cover')
+ *   ProductImage.html(product, 'w-full h-full object-cover', '40px')
+ */
+const ProductImage = {
+    TILE_SIZES: '(min-width: 1280px) 25vw, (min-width: 1024px) 33vw, (min-width: 768px) 50vw, 100vw',
+
+    _escape(value) {
+        const div = document.createElement('div');
+        div.textContent = value == null ? '' : String(value);
+        return div.innerHTML.replace(/"/g, '&quot;');
+    },
+
+    html(product, cssClass = '', sizes = this.TILE_SIZES) {
+        if (!product.image_url) return '';
+        const alt = this._escape(product.name);
+        if (!product.image_srcset) {
+            return `<img src="${this._escape(product.image_url)}" alt="${alt}" class="${cssClass}" loading="lazy">`;
+        }
+        return `<picture class="contents">`
+            + `<source type="image/webp" srcset="${this._escape(product.image_srcset)}" sizes="${sizes}">`
+            + `<img src="${this._escape(product.image_url)}" srcset="${this._escape(product.image_fallback_srcset || '')}" sizes="${sizes}" alt="${alt}" class="${cssClass}" loading="lazy" decoding="async">`
+            + `</picture>`;
+    }
+};
+
 /**
  * AsyncFilterHandler - Reusable async filtering with URL sync, debounce, and loading states
  * Usage:
@@ -901,6 +931,7 @@ if (typeof module !== 'undefined' && module.exports) {
         PaginationHandler,
         InlineEditHandler,
         UrlHelper,
+        ProductImage,
         AsyncFilterHandler
     };
 }
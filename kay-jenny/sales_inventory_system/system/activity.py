@@ -0,0 +1,123 @@
+"""
+Audit Activity Counters
+
+The audit trail pages show per-user action totals and filter dropdowns of
+users and models. Counting those from AuditLog costs a scan that grows with
+the table; AuditActivityCounter keeps the totals instead:
+
+- One row per (user, model, action), incremented in the same transaction as
+  the audit row (post_save on AuditLog, or record_activity() after a
+  bulk_create, which sends no signals); deleting audit rows decrements
+- Readers sum the few matching rows, so page cost stays flat however large
+  the audit table gets
+- Counters for data audited before they existed (or after a manual
+  correction) are rebuilt from AuditLog with:
+  python manage.py backfill_audit_counters [--check]
+"""
+
+from collections import Counter
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Subquery, Sum
+from django.utils import timezone
+
+from sales_inventory_system.accounts.models import User
+from .models import AuditActivityCounter, AuditLog
+
+
+ACTIONS = [code for code, label in AuditLog.ACTION_CHOICES]
+
+
+def _add(user_id, model_name, action, delta):
+    counters = AuditActivityCounter.objects.filter(user_id=user_id, model_name=model_name, action=action)
+    # Only one row moves, even where NULL users have more than one
+    first = counters.filter(pk=Subquery(counters.order_by('pk').values('pk')[:1]))
+    if first.update(count=F('count') + delta, updated_at=timezone.now()) or delta < 0:
+        return
+    try:
+        with transaction.atomic():
+            AuditActivityCounter.objects.create(user_id=user_id, model_name=model_name, action=action, count=delta)
+    except IntegrityError:
+        # A concurrent writer created the row after our update missed it
+        first.update(count=F('count') + delta, updated_at=timezone.now())
+
+
+def record_activity(logs, sign=1):
+    """
+    Add audit rows to the counters (sign=-1 removes them).
+
+    Args:
+        logs: Saved AuditLog instances
+        sign: 1 for new rows, -1 for deleted rows
+    """
+    counts = Counter((log.user_id, log.model_name, log.action) for log in logs)
+    for (user_id, model_name, action), count in counts.items():
+        _add(user_id, model_name, action, count * sign)
+
+
+def user_action_counts(user):
+    """{action: count} for one user, every action present"""
+    counts = dict.fromkeys(ACTIONS, 0)
+    for row in AuditActivityCounter.objects.filter(user=user).values('action').annotate(total=Sum('count')):
+        counts[row['action']] = row['total']
+    return counts
+
+
+def model_names(user=None):
+    """Models with audit rows (for one user if given), sorted"""
+    counters = AuditActivityCounter.objects.filter(count__gt=0)
+    if user is not None:
+        counters = counters.filter(user=user)
+    return list(counters.order_by('model_name').values_list('model_name', flat=True).distinct())
+
+
+def active_users():
+    """Users with audit rows, by username"""
+    user_ids = AuditActivityCounter.objects.filter(count__gt=0, user__isnull=False).values('user_id')
+    return User.objects.filter(id__in=user_ids).order_by('username')
+
+
+def _audited_totals():
+    rows = AuditLog.objects.order_by().values('user_id', 'model_name', 'action').annotate(total=Count('id'))
+    return {(row['user_id'], row['model_name'], row['action']): row['total'] for row in rows}
+
+
+def _counted_totals():
+    rows = AuditActivityCounter.objects.order_by().values('user_id', 'model_name', 'action').annotate(total=Sum('count'))
+    return {(row['user_id'], row['model_name'], row['action']): row['total'] for row in rows if row['total']}
+
+
+def counter_drift():
+    """
+    Counters that disagree with AuditLog.
+
+    Returns:
+        list: [(user_id, model_name, action, counted, actual)]
+    """
+    actual = _audited_totals()
+    counted = _counted_totals()
+    drift = []
+    for key in set(actual) | set(counted):
+        if counted.get(key, 0) != actual.get(key, 0):
+            drift.append((*key, counted.get(key, 0), actual.get(key, 0)))
+    return sorted(drift, key=lambda row: (row[0] or 0, row[1], row[2]))
+
+
+def rebuild_counters():
+    """
+    Replace every counter with totals recounted from AuditLog (one GROUP BY).
+
+    Returns:
+        int: Counter rows written
+    """
+    totals = _audited_totals()
+    with transaction.atomic():
+        AuditActivityCounter.objects.all().delete()
+        AuditActivityCounter.objects.bulk_create(
+            [
+                AuditActivityCounter(user_id=user_id, model_name=model_name, action=action, count=total)
+                for (user_id, model_name, action), total in totals.items()
+            ],
+            batch_size=500,
+        )
+    return len(totals)
@@ -0,0 +1,178 @@
+"""
+Large-table mode for admin changelists
+
+The default changelist runs COUNT(*) over the whole (filtered) table twice,
+pages with OFFSET and renders FK dropdowns of every related row. On the
+stock, order and payment ledgers that grows with every sale.
+LargeTableAdminMixin keeps those pages flat:
+
+- Counts: unfiltered lists read the planner's row estimate on PostgreSQL
+  and MySQL; everything else counts at most ADMIN_EXACT_COUNT_LIMIT rows and
+  shows "N+" beyond that. No second full-table count, no facet counts
+- Keyset navigation: in the default newest-first order, Older/Newer links
+  carry a ?before=<id> cursor, so every page is one indexed range scan however
+  deep it is. Sorting by a column falls back to numbered pages
+- Projections: list_select_related plus list_only_fields, applied to the
+  changelist query only (change forms still load whole rows)
+- Date drill-down: set date_hierarchy to an indexed date column
+- Set autocomplete_fields for FKs to large tables; the related admin needs
+  search_fields
+"""
+
+from django.conf import settings
+from django.contrib import admin
+from django.contrib.admin.options import IncorrectLookupParameters
+from django.contrib.admin.views.main import ORDER_VAR, ChangeList
+from django.core.paginator import InvalidPage, Paginator
+from django.db import DatabaseError, connections
+from django.utils.functional import cached_property
+
+
+# Query-string cursor: show rows with a smaller id than this
+CURSOR_VAR = 'before'
+
+POSTGRES_ESTIMATE_SQL = "SELECT reltuples::bigint FROM pg_class WHERE oid = to_regclass(%s)"
+
+MYSQL_ESTIMATE_SQL = """
+    SELECT table_rows FROM information_schema.tables
+    WHERE table_schema = DATABASE() AND table_name = %s
+"""
+
+
+def estimated_rows(model, using):
+    """
+    Row count from the database's table statistics, or None where the
+    backend keeps none (SQLite) or the table has not been analyzed yet.
+    """
+    connection = connections[using]
+    if connection.vendor == 'postgresql':
+        sql, table = POSTGRES_ESTIMATE_SQL, connection.ops.quote_name(model._meta.db_table)
+    elif connection.vendor == 'mysql':
+        sql, table = MYSQL_ESTIMATE_SQL, model._meta.db_table
+    else:
+        return None
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute(sql, [table])
+            row = cursor.fetchone()
+    except DatabaseError:
+        return None
+    # PostgreSQL reports -1 for a table that was never vacuumed/analyzed
+    if not row or row[0] is None or row[0] < 0:
+        return None
+    return int(row[0])
+
+
+class EstimatedCountPaginator(Paginator):
+    """Paginator whose count never scans more than ADMIN_EXACT_COUNT_LIMIT rows"""
+
+    count_is_estimate = False  # from table statistics
+    count_is_capped = False  # more than ADMIN_EXACT_COUNT_LIMIT rows
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        limit = settings.ADMIN_EXACT_COUNT_LIMIT
+        if not queryset.query.where:
+            estimate = estimated_rows(queryset.model, queryset.db)
+            if estimate is not None and estimate > limit:
+                self.count_is_estimate = True
+                return estimate
+        count = queryset.order_by()[:limit + 1].count()
+        if count > limit:
+            self.count_is_capped = True
+            return limit
+        return count
+
+
+class LargeTableChangeList(ChangeList):
+    """ChangeList that pages by id cursor in the default order"""
+
+    def __init__(self, request, *args, **kwargs):
+        try:
+            self.cursor = int(request.GET.get(CURSOR_VAR, ''))
+        except ValueError:
+            self.cursor = None
+        self.keyset = False
+        self.newer_url = self.older_url = None
+        super().__init__(request, *args, **kwargs)
+        # Filter, sort and date links start again from the newest rows
+        self.params.pop(CURSOR_VAR, None)
+        if self.keyset:
+            self._set_keyset_links()
+
+    def get_filters_params(self, params=None):
+        lookup_params = super().get_filters_params(params)
+        lookup_params.pop(CURSOR_VAR, None)
+        return lookup_params
+
+    def get_queryset(self, request, exclude_parameters=None):
+        queryset = super().get_queryset(request, exclude_parameters)
+        only_fields = self.model_admin.list_only_fields
+        if only_fields:
+            queryset = queryset.only(*only_fields)
+        return queryset
+
+    def get_results(self, request):
+        paginator = self.model_admin.get_paginator(request, self.queryset, self.list_per_page)
+        self.result_count = paginator.count
+        self.full_result_count = None
+        self.show_full_result_count = False
+        self.show_admin_actions = True
+        self.can_show_all = False
+        self.multi_page = self.result_count > self.list_per_page
+        self.paginator = paginator
+        self.keyset = ORDER_VAR not in self.params
+
+        if self.keyset:
+            page = self.queryset
+            if self.cursor is not None:
+                page = page.filter(pk__lt=self.cursor)
+            # One extra row tells whether an older page exists
+            rows = list(page[:self.list_per_page + 1])
+            self._has_older = len(rows) > self.list_per_page
+            self.result_list = rows[:self.list_per_page]
+            return
+
+        try:
+            self.result_list = paginator.page(self.page_num).object_list
+        except InvalidPage:
+            raise IncorrectLookupParameters
+
+    def _set_keyset_links(self):
+        if self._has_older:
+            self.older_url = self.get_query_string({CURSOR_VAR: self.result_list[-1].pk})
+        if self.cursor is None:
+            return
+        # The newer page holds the next list_per_page ids at or above the
+        # cursor; its own cursor is the id just past them (none: newest page)
+        newer = (
+            self.queryset.filter(pk__gte=self.cursor)
+            .order_by('pk')
+            .values_list('pk', flat=True)[self.list_per_page:self.list_per_page + 1]
+        )
+        newer = list(newer)
+        if newer:
+            self.newer_url = self.get_query_string({CURSOR_VAR: newer[0]})
+        else:
+            self.newer_url = self.get_query_string(remove=[CURSOR_VAR])
+
+
+class LargeTableAdminMixin:
+    """
+    Admin changelist tuned for ledgers that grow without bound.
+
+    Subclasses set list_select_related, list_only_fields (the columns the
+    list and each row's __str__ read), date_hierarchy on an indexed column,
+    sortable_by limited to indexed columns and autocomplete_fields.
+    """
+
+    change_list_template = 'admin/large_table/change_list.html'
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    show_facets = admin.ShowFacets.NEVER
+    ordering = ('-pk',)
+    list_only_fields = ()
+
+    def get_changelist(self, request, **kwargs):
+        return LargeTableChangeList
@@ -0,0 +1,133 @@
+"""
+Branch (store) scoping
+
+Each branch keeps its transactional data - orders, payments, products,
+ingredient stock and the stock ledger, forecasts and live events - in its
+own database (a separate SQLite file, or a PostgreSQL schema), configured
+with BRANCH_DATABASES in settings. Users, sessions and the audit trail stay
+in the default database, which is also head office.
+
+- The current branch is request-local: set by BranchMiddleware from the
+  terminal's signed branch cookie, by use_branch() in code, or by the
+  ACTIVE_BRANCH setting for management commands and single-branch servers
+- BranchRouter sends branch-local models to the current branch's database
+- branch_atomic() opens the transaction on that database (plus default, so
+  audit rows commit or roll back with the branch writes)
+- Cache keys are namespaced per branch (cache_key is the KEY_FUNCTION)
+- Users are copied into every branch database when saved (system/signals.py;
+  sync_branches copies them all), so branch rows can point at any user
+
+Nothing here imports models; the cache configuration loads this module.
+"""
+
+from contextlib import ExitStack, contextmanager
+
+from asgiref.local import Local
+from django.conf import settings
+from django.db import transaction
+
+
+# Request-local storage, like the audit user in signals.py
+_branch_locals = Local()
+
+# Apps and models whose rows belong to a single branch
+BRANCH_LOCAL_APPS = {'products', 'orders', 'analytics'}
+BRANCH_LOCAL_MODELS = {('system', 'liveevent')}
+
+
+class UnknownBranch(ValueError):
+    """Raised when a branch code is not configured in BRANCH_DATABASES"""
+    pass
+
+
+def get_current_branch():
+    """Code of the active branch, or None for head office (default database)"""
+    code = getattr(_branch_locals, 'code', None)
+    return code or settings.ACTIVE_BRANCH
+
+
+def current_branch_code():
+    """Active branch code or '' (model field default)"""
+    return get_current_branch() or ''
+
+
+def set_current_branch(code):
+    """Set the branch for the current request/task (None falls back to ACTIVE_BRANCH)"""
+    if code and code not in settings.BRANCHES:
+        raise UnknownBranch(f"Unknown branch: {code}")
+    _branch_locals.code = code or None
+
+
+@contextmanager
+def use_branch(code):
+    """Run a block against one branch's database"""
+    previous = getattr(_branch_locals, 'code', None)
+    set_current_branch(code)
+    try:
+        yield
+    finally:
+        _branch_locals.code = previous
+
+
+def branch_database(code=None):
+    """Database alias holding a branch's data (default: the active branch)"""
+    code = code or get_current_branch()
+    if not code:
+        return 'default'
+    try:
+        return settings.BRANCHES[code]['database']
+    except KeyError:
+        raise UnknownBranch(f"Unknown branch: {code}")
+
+
+def is_branch_local(model):
+    """Whether a model (or instance) is stored per branch"""
+    meta = model._meta
+    return meta.app_label in BRANCH_LOCAL_APPS or (meta.app_label, meta.model_name) in BRANCH_LOCAL_MODELS
+
+
+@contextmanager
+def branch_atomic():
+    """
+    transaction.atomic() for writes to branch-local models.
+
+    When the branch has its own database the default database is wrapped
+    too, so audit rows and on_commit hooks follow the branch transaction.
+    """
+    alias = branch_database()
+    with ExitStack() as stack:
+        if alias != 'default':
+            stack.enter_context(transaction.atomic())
+        stack.enter_context(transaction.atomic(using=alias))
+        yield
+
+
+def upsert_rows(model, alias, objects, keep=()):
+    """
+    Insert or update rows by id in another database (no signals are sent).
+
+    Args:
+        model: Model class of the rows
+        alias: Target database alias
+        objects: Instances loaded from the source database
+        keep: Fields only set on insert (e.g. branch stock levels)
+
+    Returns:
+        int: Rows written
+    """
+    update_fields = [
+        field.name for field in model._meta.concrete_fields
+        if not field.primary_key and field.name not in keep
+    ]
+    model.objects.using(alias).bulk_create(
+        objects, batch_size=500, update_conflicts=True, unique_fields=['id'], update_fields=update_fields
+    )
+    return len(objects)
+
+
+def cache_key(key, key_prefix, version):
+    """Cache KEY_FUNCTION: Django's default key, namespaced by the active branch"""
+    code = get_current_branch()
+    if code:
+        return f"{key_prefix}:{version}:{code}:{key}"
+    return f"{key_prefix}:{version}:{key}"
@@ -0,0 +1,136 @@
+"""
+Conditional GET for polled list endpoints
+
+List pages poll their own URL with X-Requested-With: XMLHttpRequest for
+fresh JSON, and forms fetch small JSON APIs. @conditional_list answers those
+requests with 304 Not Modified, before the view builds anything, when
+nothing the response shows has changed (full HTML page loads are left alone,
+they carry per-request CSRF tokens and flash messages):
+
+- Each view names a cheap validator: a domain write-version (one cache
+  read) or a one-row query such as MAX(id)
+- The ETag hashes the validator with the user, branch and full query
+  string, so every filter/page combination has its own tag
+- Responses carry Cache-Control: private, no-cache so browsers revalidate
+  every poll, and Vary: X-Requested-With so HTML and JSON never mix
+
+Same idea as @condition on pos_menu_snapshot, extended to async views and
+to views that render HTML for page loads and JSON for polls.
+
+Domain versions are counters in the shared cache, bumped on every write
+(see MenuService.invalidate and system/signals.py):
+- 'menu': products, ingredients and recipes (stock included)
+- 'orders': orders, order items and payments
+A counter that has been evicted restarts at the current time in
+nanoseconds, so an old ETag can never match again.
+"""
+
+import hashlib
+import time
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from django.core.cache import cache
+from django.db import transaction
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+
+
+VERSION_CACHE_KEY = 'domain_version:{}'
+
+
+def get_version(domain):
+    """Current write-version of a domain"""
+    key = VERSION_CACHE_KEY.format(domain)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, time.time_ns(), None)
+        version = cache.get(key)
+    return version
+
+
+def _bump(domain):
+    key = VERSION_CACHE_KEY.format(domain)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.add(key, time.time_ns(), None)
+
+
+def bump_version(domain):
+    """
+    Mark a domain as changed.
+
+    Bumped again after the surrounding transaction commits, so a poll that
+    read the old rows mid-transaction cannot keep the new version.
+    """
+    _bump(domain)
+    transaction.on_commit(lambda: _bump(domain))
+
+
+def domain_validator(domain):
+    """Validator function for views that only show one domain's rows"""
+    def validator(request, *args, **kwargs):
+        return get_version(domain)
+    return validator
+
+
+def is_ajax(request):
+    """Same check the list views use to return JSON"""
+    return request.headers.get('X-Requested-With') == 'XMLHttpRequest'
+
+
+def _etag(request, user, validator_value):
+    user_id = user.pk if user.is_authenticated else 0
+    raw = f"{validator_value}|{user_id}|{getattr(request, 'branch', '')}|{request.get_full_path()}"
+    return f'"{hashlib.sha1(raw.encode()).hexdigest()[:32]}"'
+
+
+def _finish(request, response, etag):
+    if response.status_code in (200, 304):
+        response.headers.setdefault('ETag', etag)
+    patch_cache_control(response, private=True, no_cache=True)
+    patch_vary_headers(response, ['X-Requested-With'])
+    return response
+
+
+def conditional_list(validator, ajax_only=True):
+    """
+    View decorator: 304 for unchanged GETs (sync and async views).
+
+    Args:
+        validator: Callable taking the view's arguments and returning a value
+            that changes whenever the view's output may change
+        ajax_only: Only handle XMLHttpRequest polls (views that also render
+            full pages); False for JSON-only endpoints
+    """
+    def applies(request):
+        return request.method in ('GET', 'HEAD') and (not ajax_only or is_ajax(request))
+
+    def decorator(view_func):
+        if iscoroutinefunction(view_func):
+            async_validator = validator if iscoroutinefunction(validator) else sync_to_async(validator)
+
+            @wraps(view_func)
+            async def _wrapped(request, *args, **kwargs):
+                if not applies(request):
+                    return await view_func(request, *args, **kwargs)
+                user = await request.auser()
+                etag = _etag(request, user, await async_validator(request, *args, **kwargs))
+                response = get_conditional_response(request, etag=etag)
+                if response is None:
+                    response = await view_func(request, *args, **kwargs)
+                return _finish(request, response, etag)
+        else:
+            @wraps(view_func)
+            def _wrapped(request, *args, **kwargs):
+                if not applies(request):
+                    return view_func(request, *args, **kwargs)
+                etag = _etag(request, request.user, validator(request, *args, **kwargs))
+                response = get_conditional_response(request, etag=etag)
+                if response is None:
+                    response = view_func(request, *args, **kwargs)
+                return _finish(request, response, etag)
+
+        return _wrapped
+
+    return decorator
@@ -0,0 +1,106 @@
+"""
+Live events for connected cashier screens
+
+Order and stock changes are written to the LiveEvent table after the
+surrounding transaction commits, and streamed to browsers as server-sent
+events by orders.views.order_event_stream:
+- order-created: a new order was placed
+- payment-completed: an order was paid
+- order-expired: pending orders older than 1 hour were expired
+- low-stock: an ingredient dropped below its minimum stock level
+
+The table works across every worker process. Every write also bumps an
+event generation counter in the shared cache (an atomic incr, so racing
+publishers never move it backwards), and idle streams check that one cache
+key per tick instead of querying the database. Old events are pruned at most
+once per PRUNE_INTERVAL across all workers.
+"""
+
+import json
+import time
+from datetime import timedelta
+
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
+
+from .models import LiveEvent
+
+
+GENERATION_CACHE_KEY = 'live_event_generation'
+PRUNE_CACHE_KEY = 'live_event_pruned'
+
+# Events are only needed until every connected screen has seen them
+EVENT_RETENTION = timedelta(hours=1)
+PRUNE_INTERVAL = 300  # seconds
+
+
+def publish_event(event_type, payload):
+    """
+    Publish a live event once the current transaction commits.
+    Events from rolled-back transactions are never sent.
+
+    Args:
+        event_type: One of LiveEvent.EVENT_CHOICES
+        payload: JSON-serializable dict sent to the browser
+    """
+    transaction.on_commit(lambda: _write_event(event_type, payload))
+
+
+def _write_event(event_type, payload):
+    event = LiveEvent.objects.create(event_type=event_type, payload=payload)
+    try:
+        cache.incr(GENERATION_CACHE_KEY)
+    except ValueError:
+        # Evicted: restart above any value a stream can hold
+        cache.add(GENERATION_CACHE_KEY, time.time_ns(), None)
+
+    # Whichever worker adds the key first prunes; the rest skip until it expires
+    if cache.add(PRUNE_CACHE_KEY, True, PRUNE_INTERVAL):
+        LiveEvent.objects.filter(created_at__lt=timezone.now() - EVENT_RETENTION).delete()
+    return event
+
+
+def publish_low_stock(ingredient, previous_stock):
+    """
+    Publish a low-stock event when an ingredient crosses below its minimum.
+    Ingredients that were already low do not repeat the alert.
+    """
+    if ingredient.min_stock <= 0:
+        return
+    if previous_stock >= ingredient.min_stock > ingredient.current_stock:
+        publish_event('low-stock', {
+            'ingredient_id': ingredient.id,
+            'name': ingredient.name,
+            'current_stock': float(ingredient.current_stock),
+            'min_stock': float(ingredient.min_stock),
+            'unit': ingredient.unit,
+        })
+
+
+def get_last_event_id():
+    """Id of the newest published event (0 if none); read once per new stream"""
+    return LiveEvent.objects.order_by('-id').values_list('id', flat=True).first() or 0
+
+
+async def aget_last_event_id():
+    """Async variant of get_last_event_id for streaming views"""
+    return await LiveEvent.objects.order_by('-id').values_list('id', flat=True).afirst() or 0
+
+
+async def aget_event_generation():
+    """
+    Counter that changes whenever an event is written. Streams query the
+    table only after it moves, and must read it before querying.
+    """
+    generation = await cache.aget(GENERATION_CACHE_KEY)
+    if generation is None:
+        await cache.aadd(GENERATION_CACHE_KEY, time.time_ns(), None)
+        generation = await cache.aget(GENERATION_CACHE_KEY)
+    return generation
+
+
+def format_sse(event):
+    """Encode a LiveEvent as a server-sent events message"""
+    data = json.dumps(event.payload, separators=(',', ':'))
+    return f"id: {event.id}\nevent: {event.event_type}\ndata: {data}\n\n"
@@ -0,0 +1,496 @@
+"""
+Background CSV exports
+
+Large exports (audit trail, ingredient usage and variance, sales) used to be
+built inside the request that asked for them, holding a web worker for as
+long as the query and CSV writing took. Now the request only queues an
+ExportJob and the run_export_jobs worker builds the file (EXPORT_BACKGROUND;
+without a worker the request builds it straight away, see run_now):
+
+- submit() queues a job (report pages POST to it); an identical job that is
+  still pending or running is reused, and each user may have
+  EXPORT_MAX_ACTIVE_PER_USER jobs queued or running at once (checked under
+  a per-user cache.add() lock, so parallel submits cannot overshoot)
+- Workers claim jobs with a conditional UPDATE that stamps a claim token
+  (safe with several workers) and run at most one job per user at a time;
+  every later write by the worker must match its token
+- Rows are streamed from the database in chunks (QuerySet.iterator) into a
+  gzip-compressed CSV in a temporary file; progress and the heartbeat are
+  saved every chunk, so the "My exports" page can show a progress bar
+- The finished file is stored in the database (ExportFile), so the worker
+  and the web process need no shared disk
+- Jobs run against the branch they were submitted from, reading from its
+  replica when one is configured and healthy
+- A job whose worker died (no heartbeat for EXPORT_STALE_SECONDS) is
+  requeued, up to EXPORT_MAX_ATTEMPTS runs; requeueing clears the token, so
+  a worker that was only slow stops at its next progress report instead of
+  racing the new run
+- Finished files are deleted with their job after EXPORT_RETENTION_HOURS
+  (by the worker, or by run_now when there is none)
+
+To add an export type: add it to ExportJob.TYPE_CHOICES and register a
+function in EXPORTERS that takes the job params and returns
+(header, total_rows, rows).
+"""
+
+import csv
+import gzip
+import io
+import logging
+import secrets
+import tempfile
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Avg, Case, Count, DecimalField, F, Max, Min, Q, Sum, Value, When
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .branches import use_branch
+from .models import AuditLog, ExportFile, ExportJob
+from .replicas import use_replica
+
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 2000
+
+# Per-user submit lock: held while the limit is checked and the job inserted
+SUBMIT_LOCK_KEY = 'export-submit:{}'
+SUBMIT_LOCK_TIMEOUT = 30  # seconds before an abandoned lock expires
+SUBMIT_LOCK_WAIT = 5.0  # seconds a submit waits for the user's previous one
+
+# Housekeeping from run_now (no worker): at most once per this many seconds
+HOUSEKEEPING_KEY = 'export-housekeeping'
+HOUSEKEEPING_INTERVAL = 300
+
+
+class ExportJobError(Exception):
+    """Raised when an export cannot be queued"""
+    pass
+
+
+class ExportCancelled(Exception):
+    """Raised inside a running export whose job was deleted or requeued"""
+    pass
+
+
+def _days(params, default=30):
+    try:
+        return int(params.get('days') or default)
+    except (TypeError, ValueError):
+        return default
+
+
+# ---------------------------------------------------------------------------
+# Exporters: params -> (header, total_rows, rows)
+# ---------------------------------------------------------------------------
+
+def export_audit_trail(params):
+    """Audit trail with the audit page's filters (user, action, model, branch, date_range)"""
+    logs = AuditLog.objects.select_related('user')
+
+    user_filter = params.get('user')
+    if user_filter:
+        try:
+            logs = logs.filter(user_id=int(user_filter))
+        except (TypeError, ValueError):
+            pass
+    if params.get('action'):
+        logs = logs.filter(action=params['action'])
+    if params.get('model'):
+        logs = logs.filter(model_name=params['model'])
+    if params.get('branch'):
+        logs = logs.filter(branch=params['branch'])
+
+    date_range = params.get('date_range') or '30'
+    if date_range != 'all':
+        try:
+            logs = logs.filter(created_at__gte=timezone.now() - timedelta(days=int(date_range)))
+        except (TypeError, ValueError):
+            pass
+
+    header = ['Timestamp', 'User', 'Action', 'Model', 'Branch', 'Record ID', 'Description']
+
+    def rows():
+        for log in logs.iterator(chunk_size=CHUNK_SIZE):
+            yield [
+                log.created_at.strftime('%Y-%m-%d %H:%M:%S'),
+                log.user.username if log.user else 'System',
+                log.action,
+                log.model_name,
+                log.branch,
+                log.record_id,
+                log.description,
+            ]
+
+    return header, logs.count(), rows()
+
+
+def _usage_transactions(params):
+    from sales_inventory_system.products.models import StockTransaction
+
+    end_date = timezone.now()
+    start_date = end_date - timedelta(days=_days(params))
+    return StockTransaction.objects.filter(
+        created_at__gte=start_date,
+        created_at__lte=end_date,
+        ingredient__is_active=True
+    )
+
+
+def export_usage(params):
+    """Per-ingredient usage totals (DEDUCTION and PREP) over the last `days` days"""
+    summary = _usage_transactions(params).values(
+        'ingredient', 'ingredient__name', 'ingredient__unit'
+    ).annotate(
+        total_used=Coalesce(
+            Sum('quantity', filter=Q(transaction_type__in=['DEDUCTION', 'PREP'])),
+            Value(0),
+            output_field=DecimalField()
+        ),
+        transactions_count=Count('id'),
+    ).order_by('ingredient__name')
+
+    header = ['Ingredient', 'Unit', 'Total Used', 'Transactions']
+
+    def rows():
+        for item in summary.iterator(chunk_size=CHUNK_SIZE):
+            yield [
+                item['ingredient__name'],
+                item['ingredient__unit'],
+                f"{item['total_used']:.3f}",
+                item['transactions_count'],
+            ]
+
+    return header, summary.count(), rows()
+
+
+def export_usage_detailed(params):
+    """Every stock transaction over the last `days` days"""
+    transactions = _usage_transactions(params).select_related('ingredient').order_by(
+        'ingredient__name', '-created_at'
+    )
+
+    header = ['Ingredient', 'Date', 'Type', 'Quantity', 'Notes']
+
+    def rows():
+        for trans in transactions.iterator(chunk_size=CHUNK_SIZE):
+            yield [
+                trans.ingredient.name,
+                trans.created_at.strftime("%Y-%m-%d %H:%M"),
+                trans.get_transaction_type_display(),
+                f"{trans.quantity:.3f}",
+                trans.notes or '',
+            ]
+
+    return header, transactions.count(), rows()
+
+
+def _variance_records(params):
+    from sales_inventory_system.products.models import VarianceRecord
+
+    start_date = timezone.now() - timedelta(days=_days(params))
+    return VarianceRecord.objects.filter(period_end__gte=start_date, ingredient__is_active=True)
+
+
+def export_variance(params):
+    """Per-ingredient variance statistics over the last `days` days"""
+    summary = _variance_records(params).values('ingredient', 'ingredient__name').annotate(
+        records_count=Count('id'),
+        avg_variance=Avg('variance_percentage'),
+        max_variance=Max('variance_percentage'),
+        min_variance=Min('variance_percentage'),
+        within_tolerance_count=Count(Case(When(within_tolerance=True, then=1))),
+    ).order_by('-avg_variance')
+
+    header = ['Ingredient', 'Avg Variance %', 'Max Variance %', 'Min Variance %', 'Within Tolerance %', 'Records']
+
+    def rows():
+        for item in summary.iterator(chunk_size=CHUNK_SIZE):
+            records_count = item['records_count']
+            within_tolerance = item['within_tolerance_count'] / records_count * 100 if records_count else 0
+            yield [
+                item['ingredient__name'],
+                f"{float(item['avg_variance'] or 0):.2f}",
+                f"{float(item['max_variance'] or 0):.2f}",
+                f"{float(item['min_variance'] or 0):.2f}",
+                f"{within_tolerance:.2f}",
+                records_count,
+            ]
+
+    return header, summary.count(), rows()
+
+
+def export_variance_detailed(params):
+    """Every variance record over the last `days` days"""
+    records = _variance_records(params).select_related('ingredient').order_by('ingredient__name', '-period_end')
+
+    header = ['Ingredient', 'Period End', 'Theoretical Used', 'Actual Used', 'Variance %', 'Status']
+
+    def rows():
+        for record in records.iterator(chunk_size=CHUNK_SIZE):
+            yield [
+                record.ingredient.name,
+                record.period_end.strftime("%Y-%m-%d"),
+                f"{record.theoretical_used:.3f}",
+                f"{record.actual_used:.3f}",
+                f"{record.variance_percentage:.2f}",
+                'Within Tolerance' if record.within_tolerance else 'Outside Tolerance',
+            ]
+
+    return header, records.count(), rows()
+
+
+def export_sales(params):
+    """Completed payments with the sales report's filters (days or date_from/date_to, payment_method)"""
+    from sales_inventory_system.orders.models import Payment
+
+    payments = Payment.objects.filter(status='COMPLETED').select_related('order', 'processed_by')
+
+    days_filter = params.get('days')
+    date_from = params.get('date_from')
+    date_to = params.get('date_to')
+    if days_filter:
+        try:
+            payments = payments.filter(created_at__gte=timezone.now() - timedelta(days=int(days_filter)))
+        except (TypeError, ValueError):
+            pass
+    elif date_from and date_to:
+        payments = payments.filter(created_at__date__gte=date_from, created_at__date__lte=date_to)
+
+    payment_method = params.get('payment_method') or 'ALL'
+    if payment_method != 'ALL':
+        payments = payments.filter(method=payment_method)
+
+    payments = payments.order_by('-created_at')
+
+    header = ['Date', 'Time', 'Order Number', 'Customer', 'Method', 'Amount', 'Processed By']
+
+    def rows():
+        for payment in payments.iterator(chunk_size=CHUNK_SIZE):
+            yield [
+                payment.created_at.strftime('%Y-%m-%d'),
+                payment.created_at.strftime('%H:%M:%S'),
+                payment.order.order_number,
+                payment.order.customer_name or 'Walk-in',
+                payment.method,
+                f"{payment.amount:.2f}",
+                payment.processed_by.username if payment.processed_by else 'System',
+            ]
+
+    return header, payments.count(), rows()
+
+
+EXPORTERS = {
+    'AUDIT_TRAIL': export_audit_trail,
+    'USAGE': export_usage,
+    'USAGE_DETAILED': export_usage_detailed,
+    'VARIANCE': export_variance,
+    'VARIANCE_DETAILED': export_variance_detailed,
+    'SALES': export_sales,
+}
+
+
+# ---------------------------------------------------------------------------
+# Queue
+# ---------------------------------------------------------------------------
+
+def submit(user, export_type, params, branch=''):
+    """
+    Queue an export for a user.
+
+    Returns:
+        (job, created): created is False when an identical job was already queued
+
+    Raises:
+        ExportJobError: Unknown export type, or the user's active job limit is reached
+    """
+    if export_type not in EXPORTERS:
+        raise ExportJobError(f"Unknown export type: {export_type}")
+    params = {key: str(value) for key, value in params.items() if value not in (None, '')}
+
+    lock_key = SUBMIT_LOCK_KEY.format(user.pk)
+    deadline = time.monotonic() + SUBMIT_LOCK_WAIT
+    while not cache.add(lock_key, 1, SUBMIT_LOCK_TIMEOUT):
+        if time.monotonic() >= deadline:
+            raise ExportJobError("Another export is being queued for you. Try again in a moment.")
+        time.sleep(0.1)
+
+    try:
+        active = ExportJob.objects.filter(user=user, status__in=ExportJob.ACTIVE_STATUSES)
+        existing = active.filter(export_type=export_type, branch=branch or '')
+        for job in existing:
+            if job.params == params:
+                return job, False
+
+        limit = settings.EXPORT_MAX_ACTIVE_PER_USER
+        if active.count() >= limit:
+            raise ExportJobError(
+                f"You already have {limit} exports in progress. Wait for one to finish and try again."
+            )
+
+        job = ExportJob.objects.create(user=user, export_type=export_type, params=params, branch=branch or '')
+    finally:
+        cache.delete(lock_key)
+    return job, True
+
+
+def claim(job_id):
+    """Mark a pending job as running for this caller; returns the job, or None if someone else has it"""
+    now = timezone.now()
+    token = secrets.token_hex(16)
+    claimed = ExportJob.objects.filter(id=job_id, status='PENDING', claimed_by__isnull=True).update(
+        status='RUNNING', claimed_by=token, attempts=F('attempts') + 1,
+        started_at=now, updated_at=now, progress=0, rows_written=0,
+    )
+    return ExportJob.objects.get(id=job_id) if claimed else None
+
+
+def claim_next():
+    """Mark the oldest claimable pending job as running and return it (None when idle)"""
+    busy_users = ExportJob.objects.filter(status='RUNNING').values('user_id')
+    candidates = ExportJob.objects.filter(status='PENDING').exclude(user_id__in=busy_users)
+    for job_id in candidates.order_by('created_at').values_list('id', flat=True)[:10]:
+        job = claim(job_id)
+        if job is not None:
+            return job
+    return None
+
+
+def run_now(job):
+    """
+    Build a pending job inside the current request (EXPORT_BACKGROUND off:
+    no worker is deployed). Also does the worker's housekeeping now and then.
+
+    Returns:
+        The job as run_job left it, or the job unchanged when it was already
+        claimed by someone else
+    """
+    if cache.add(HOUSEKEEPING_KEY, 1, HOUSEKEEPING_INTERVAL):
+        requeue_stale()
+        cleanup()
+    claimed = claim(job.id)
+    if claimed is None:
+        return job
+    return run_job(claimed)
+
+
+def _update_running(job, **fields):
+    """
+    Save a running job's bookkeeping; returns False when the job was
+    cancelled, or requeued and possibly claimed by another worker.
+
+    The database is named explicitly so routers are skipped: the replica
+    router would count this as a write and move the export's remaining
+    reads to the primary.
+    """
+    fields['updated_at'] = timezone.now()
+    return bool(
+        ExportJob.objects.using('default')
+        .filter(id=job.id, status='RUNNING', claimed_by=job.claimed_by)
+        .update(**fields)
+    )
+
+
+def _report_progress(job, rows_written):
+    progress = min(99, rows_written * 100 // job.total_rows) if job.total_rows else 0
+    if not _update_running(job, rows_written=rows_written, progress=progress):
+        raise ExportCancelled(f"Export job #{job.id} was cancelled")
+
+
+def run_job(job):
+    """
+    Build a claimed job's file.
+
+    Returns:
+        The job, now DONE or FAILED, or None if it was cancelled while running
+    """
+    try:
+        with tempfile.TemporaryFile() as partial:
+            with use_branch(job.branch or None), use_replica():
+                header, total_rows, rows = EXPORTERS[job.export_type](job.params)
+                job.total_rows = total_rows
+                _update_running(job, total_rows=total_rows)
+
+                rows_written = 0
+                with gzip.GzipFile(fileobj=partial, mode='wb') as compressed, \
+                        io.TextIOWrapper(compressed, encoding='utf-8', newline='') as handle:
+                    writer = csv.writer(handle)
+                    writer.writerow(header)
+                    for row in rows:
+                        writer.writerow(row)
+                        rows_written += 1
+                        if rows_written % CHUNK_SIZE == 0:
+                            _report_progress(job, rows_written)
+
+            partial.seek(0)
+            content = partial.read()
+
+        # The file and the DONE status are saved together, and only while
+        # this run still holds the job
+        with transaction.atomic(using='default'):
+            finished = _update_running(
+                job,
+                status='DONE',
+                progress=100,
+                rows_written=rows_written,
+                file_size=len(content),
+                finished_at=timezone.now(),
+            )
+            if not finished:
+                raise ExportCancelled(f"Export job #{job.id} was cancelled")
+            ExportFile.objects.using('default').create(job_id=job.id, content=content)
+        logger.info("Export job #%s (%s) wrote %s rows", job.id, job.export_type, rows_written)
+    except ExportCancelled:
+        logger.info("Export job #%s was cancelled", job.id)
+        return None
+    except Exception as exc:
+        logger.exception("Export job #%s (%s) failed", job.id, job.export_type)
+        _update_running(job, status='FAILED', error=str(exc)[:1000], finished_at=timezone.now())
+
+    job.refresh_from_db()
+    return job
+
+
+def requeue_stale():
+    """Requeue running jobs whose worker stopped reporting; give up after EXPORT_MAX_ATTEMPTS runs"""
+    cutoff = timezone.now() - timedelta(seconds=settings.EXPORT_STALE_SECONDS)
+    requeued = failed = 0
+    stale = ExportJob.objects.filter(status='RUNNING', updated_at__lt=cutoff).values_list('id', 'claimed_by', 'attempts')
+    for job_id, token, attempts in stale:
+        # Only if the same run is still silent: a heartbeat or another
+        # housekeeping pass in the meantime leaves the job alone
+        job = ExportJob.objects.filter(id=job_id, status='RUNNING', claimed_by=token, updated_at__lt=cutoff)
+        if attempts >= settings.EXPORT_MAX_ATTEMPTS:
+            failed += job.update(
+                status='FAILED',
+                claimed_by=None,
+                error='The export worker stopped while building this file.',
+                finished_at=timezone.now(),
+                updated_at=timezone.now(),
+            )
+        else:
+            requeued += job.update(
+                status='PENDING', claimed_by=None, progress=0, rows_written=0, updated_at=timezone.now()
+            )
+    return requeued, failed
+
+
+def delete_job(job):
+    """Delete a job and its file (a running job stops at its next progress report)"""
+    job.delete()
+
+
+def cleanup():
+    """
+    Delete finished jobs (and their files) past EXPORT_RETENTION_HOURS;
+    returns how many jobs were deleted. Partial files of a killed worker
+    are temporary files the system removes.
+    """
+    cutoff = timezone.now() - timedelta(hours=settings.EXPORT_RETENTION_HOURS)
+    old_jobs = ExportJob.objects.filter(status__in=['DONE', 'FAILED'], created_at__lt=cutoff)
+    return old_jobs.delete()[1].get(ExportJob._meta.label, 0)
@@ -0,0 +1,177 @@
+"""
+Template fragment caching keyed by row versions
+
+Product grids, the POS menu and the ingredient list re-render every tile on
+each request. {% fragment_cache %} (products/templatetags/custom_filters.py)
+stores rendered tiles and category blocks, keyed by what they show instead
+of by time, so only changed tiles are rendered again:
+
+- A model instance in the key contributes its pk and updated_at; a list of
+  them (a category's products) contributes every member, so adding,
+  removing or editing one product renews its category block
+- versions="menu" adds a domain write-version (see conditional.py) for
+  fragments that show derived data, such as stock computed from ingredients
+- Keys are namespaced by branch through the cache KEY_FUNCTION; stale
+  entries are never read again and age out of the cache (oldest evicted first)
+
+Hits and misses are counted per fragment name in each process and added to
+shared counters in the cache every FLUSH_EVERY lookups or FLUSH_INTERVAL
+seconds; read them with: python manage.py fragment_cache_stats
+
+Fragments must not contain per-request output ({% csrf_token %}, the user,
+messages): render those outside the cached block.
+"""
+
+import hashlib
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import InvalidCacheBackendError, cache, caches
+from django.db.models import Model, QuerySet
+
+from .branches import use_branch
+from .conditional import get_version
+
+
+KEY_PREFIX = 'fragment'
+STATS_KEY = 'fragment_stats:{}:{}'
+STATS_NAMES_KEY = 'fragment_stats:names'
+
+FLUSH_EVERY = 500
+FLUSH_INTERVAL = 60
+
+_stats_lock = threading.Lock()
+_pending = {}
+_pending_state = {'lookups': 0, 'flushed_at': time.monotonic()}
+
+
+def fragment_store():
+    """The 'template_fragments' cache when configured (as Django's {% cache %}), else the default"""
+    try:
+        return caches['template_fragments']
+    except InvalidCacheBackendError:
+        return caches['default']
+
+
+def _vary_value(value):
+    if isinstance(value, Model):
+        changed = getattr(value, 'updated_at', None)
+        return f"{value._meta.label_lower}:{value.pk}:{changed.isoformat() if changed else ''}"
+    if isinstance(value, (list, tuple, QuerySet)):
+        return '[' + ','.join(_vary_value(item) for item in value) + ']'
+    return str(value)
+
+
+def fragment_key(name, vary_on=(), versions=()):
+    """Cache key for one rendering of a named fragment"""
+    parts = [_vary_value(value) for value in vary_on]
+    parts.extend(f"{domain}={get_version(domain)}" for domain in versions)
+    digest = hashlib.md5('|'.join(parts).encode()).hexdigest()
+    return f"{KEY_PREFIX}:{name}:{digest}"
+
+
+def render_fragment(name, vary_on, versions, render):
+    """
+    Cached output of render() for this fragment and key.
+
+    Args:
+        name: Fragment name (also the stats bucket)
+        vary_on: Values the output depends on
+        versions: Domain names whose write-version the output depends on
+        render: Zero-argument callable rendering the fragment
+
+    Returns:
+        str: Rendered fragment
+    """
+    timeout = settings.FRAGMENT_CACHE_TIMEOUT
+    if not timeout:
+        return render()
+
+    store = fragment_store()
+    key = fragment_key(name, vary_on, versions)
+    content = store.get(key)
+    if content is not None:
+        record_lookup(name, hit=True)
+        return content
+
+    record_lookup(name, hit=False)
+    content = render()
+    store.set(key, content, timeout)
+    return content
+
+
+def record_lookup(name, hit):
+    """Count one lookup; flushes this process's counts when due"""
+    with _stats_lock:
+        counts = _pending.setdefault(name, [0, 0])
+        counts[0 if hit else 1] += 1
+        _pending_state['lookups'] += 1
+        due = (
+            _pending_state['lookups'] >= FLUSH_EVERY
+            or time.monotonic() - _pending_state['flushed_at'] >= FLUSH_INTERVAL
+        )
+    if due:
+        flush_stats()
+
+
+def _add(key, delta):
+    try:
+        cache.incr(key, delta)
+    except ValueError:
+        if not cache.add(key, delta, None):
+            cache.incr(key, delta)
+
+
+def flush_stats():
+    """Add this process's pending counts to the shared counters"""
+    global _pending
+    with _stats_lock:
+        pending, _pending = _pending, {}
+        _pending_state.update(lookups=0, flushed_at=time.monotonic())
+    if not pending:
+        return
+
+    # One set of counters per install, whichever branch served the request
+    with use_branch(None):
+        names = cache.get(STATS_NAMES_KEY) or []
+        if not set(pending) <= set(names):
+            cache.set(STATS_NAMES_KEY, sorted(set(names) | set(pending)), None)
+        for name, (hits, misses) in pending.items():
+            if hits:
+                _add(STATS_KEY.format(name, 'hits'), hits)
+            if misses:
+                _add(STATS_KEY.format(name, 'misses'), misses)
+
+
+def get_stats():
+    """
+    Shared hit/miss counters.
+
+    Returns:
+        list: [{'name', 'hits', 'misses', 'hit_rate'}] sorted by name
+    """
+    flush_stats()
+    stats = []
+    with use_branch(None):
+        for name in cache.get(STATS_NAMES_KEY) or []:
+            hits = cache.get(STATS_KEY.format(name, 'hits')) or 0
+            misses = cache.get(STATS_KEY.format(name, 'misses')) or 0
+            lookups = hits + misses
+            stats.append({
+                'name': name,
+                'hits': hits,
+                'misses': misses,
+                'hit_rate': round(hits / lookups * 100, 1) if lookups else 0.0,
+            })
+    return stats
+
+
+def reset_stats():
+    """Zero the shared counters"""
+    flush_stats()
+    with use_branch(None):
+        names = cache.get(STATS_NAMES_KEY) or []
+        cache.delete_many(
+            [STATS_KEY.format(name, kind) for name in names for kind in ('hits', 'misses')] + [STATS_NAMES_KEY]
+        )
@@ -0,0 +1,37 @@
+"""
+Management command that rebuilds the audit trail's activity counters
+Run with: python manage.py backfill_audit_counters [--check]
+
+The counters (see system/activity.py) are filled by the migration that adds
+them and kept current as audit rows are written. Run this after audit rows
+were inserted or removed outside the app (raw SQL, a restored backup) to
+recount them from AuditLog with one GROUP BY. With --check it only reports
+counters that disagree with the audit table.
+"""
+from django.core.management.base import BaseCommand
+
+from sales_inventory_system.accounts.models import User
+from sales_inventory_system.system import activity
+
+
+class Command(BaseCommand):
+    help = 'Recount audit activity counters from the audit trail'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--check', action='store_true', help='Only report counters that are off')
+
+    def handle(self, *args, **options):
+        if options['check']:
+            drift = activity.counter_drift()
+            if not drift:
+                self.stdout.write(self.style.SUCCESS("All activity counters match the audit trail"))
+                return
+            usernames = dict(User.objects.filter(id__in={row[0] for row in drift}).values_list('id', 'username'))
+            for user_id, model_name, action, counted, actual in drift:
+                user = usernames.get(user_id, 'System') if user_id else 'System'
+                self.stdout.write(f"{user} {action} {model_name}: counted {counted}, audit trail has {actual}")
+            self.stdout.write(self.style.WARNING(f"{len(drift)} counter(s) off; run without --check to fix"))
+            return
+
+        rows = activity.rebuild_counters()
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {rows} activity counter(s)"))
@@ -0,0 +1,159 @@
+"""
+Management command to compare cache backends under several worker processes
+Run with: python manage.py benchmark_cache --workers 4 --ops 2000
+
+Each worker process runs the same read-through workload (get, and on a miss
+simulate the expensive computation and set) against a skewed key distribution,
+the same shape as forecast/dashboard keys being hit by several gunicorn workers.
+LocMemCache gives every process its own cache, SQLiteCache is shared by all of
+them, so the report shows how hit rate, recomputations and latency change.
+"""
+import multiprocessing
+import os
+import random
+import statistics
+import tempfile
+import time
+
+from django.core.management.base import BaseCommand
+from django.utils.module_loading import import_string
+
+
+BACKENDS = {
+    'locmem': 'django.core.cache.backends.locmem.LocMemCache',
+    'sqlite': 'sales_inventory_system.sales_inventory.cache_backends.SQLiteCache',
+}
+
+
+def _run_worker(backend_path, location, options, seed, results):
+    """Run the read-through workload in a child process and report timings"""
+    cache = import_string(backend_path)(location, {'TIMEOUT': options['ttl'], 'OPTIONS': {'MAX_ENTRIES': options['max_entries']}})
+    rng = random.Random(seed)
+
+    # Zipf-like weights: a few hot keys (today's dashboard) and a long tail
+    keys = [f'bench_key_{i}' for i in range(options['keys'])]
+    weights = [1.0 / (i + 1) for i in range(options['keys'])]
+    payload = {'forecast': [rng.random() for _ in range(options['payload_size'])]}
+
+    hits = 0
+    misses = 0
+    get_latencies = []
+    set_latencies = []
+
+    for key in rng.choices(keys, weights=weights, k=options['ops']):
+        start = time.perf_counter()
+        value = cache.get(key)
+        get_latencies.append(time.perf_counter() - start)
+
+        if value is not None:
+            hits += 1
+            continue
+
+        misses += 1
+        time.sleep(options['compute_ms'] / 1000.0)  # stand-in for a Holt-Winters fit
+        start = time.perf_counter()
+        cache.set(key, payload)
+        set_latencies.append(time.perf_counter() - start)
+
+    results.put({
+        'hits': hits,
+        'misses': misses,
+        'get_latencies': get_latencies,
+        'set_latencies': set_latencies,
+    })
+
+
+class Command(BaseCommand):
+    help = 'Benchmark hit rate and latency of LocMemCache vs the shared SQLiteCache across worker processes'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=4, help='Number of worker processes')
+        parser.add_argument('--ops', type=int, default=2000, help='Cache lookups per worker')
+        parser.add_argument('--keys', type=int, default=200, help='Size of the key space')
+        parser.add_argument('--compute-ms', type=float, default=2.0, help='Simulated cost of a cache miss')
+        parser.add_argument('--payload-size', type=int, default=100, help='Floats stored per cache value')
+        parser.add_argument('--ttl', type=int, default=300, help='Cache timeout in seconds')
+        parser.add_argument('--max-entries', type=int, default=1000, help='MAX_ENTRIES for both backends')
+        parser.add_argument(
+            '--backend', action='append', choices=sorted(BACKENDS),
+            help='Backend(s) to benchmark (default: all)'
+        )
+
+    def handle(self, *args, **options):
+        backends = options['backend'] or sorted(BACKENDS)
+        workload = {
+            'ops': options['ops'],
+            'keys': options['keys'],
+            'compute_ms': options['compute_ms'],
+            'payload_size': options['payload_size'],
+            'ttl': options['ttl'],
+            'max_entries': options['max_entries'],
+        }
+
+        self.stdout.write(
+            f"Workload: {options['workers']} workers x {options['ops']} lookups, "
+            f"{options['keys']} keys, {options['compute_ms']}ms per miss\n"
+        )
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            for name in backends:
+                location = os.path.join(tmp_dir, 'bench_cache.sqlite3') if name == 'sqlite' else f'bench-{name}'
+                report = self._benchmark(BACKENDS[name], location, workload, options['workers'])
+                self._print_report(name, report)
+
+    def _benchmark(self, backend_path, location, workload, workers):
+        ctx = multiprocessing.get_context('fork')
+        results = ctx.Queue()
+        processes = [
+            ctx.Process(target=_run_worker, args=(backend_path, location, workload, seed, results))
+            for seed in range(workers)
+        ]
+
+        started = time.perf_counter()
+        for process in processes:
+            process.start()
+        # Drain the queue before joining so large result payloads cannot block children
+        worker_results = [results.get() for _ in processes]
+        for process in processes:
+            process.join()
+        elapsed = time.perf_counter() - started
+
+        get_latencies = [lat for r in worker_results for lat in r['get_latencies']]
+        set_latencies = [lat for r in worker_results for lat in r['set_latencies']]
+        hits = sum(r['hits'] for r in worker_results)
+        misses = sum(r['misses'] for r in worker_results)
+
+        return {
+            'hits': hits,
+            'misses': misses,
+            'elapsed': elapsed,
+            'get_latencies': get_latencies,
+            'set_latencies': set_latencies,
+        }
+
+    def _print_report(self, name, report):
+        total = report['hits'] + report['misses']
+        hit_rate = (report['hits'] / total * 100) if total else 0
+
+        def percentile(values, pct):
+            if not values:
+                return 0.0
+            ordered = sorted(values)
+            index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+            return ordered[index] * 1_000_000  # microseconds
+
+        self.stdout.write(self.style.SUCCESS(f'[{name}]'))
+        self.stdout.write(f'  Hit rate:        {hit_rate:.1f}% ({report["hits"]}/{total})')
+        self.stdout.write(f'  Recomputations:  {report["misses"]}')
+        self.stdout.write(f'  Wall time:       {report["elapsed"]:.2f}s ({total / report["elapsed"]:.0f} lookups/s)')
+        self.stdout.write(
+            f'  get() latency:   p50 {percentile(report["get_latencies"], 50):.0f}us, '
+            f'p95 {percentile(report["get_latencies"], 95):.0f}us, '
+            f'mean {statistics.fmean(report["get_latencies"]) * 1_000_000:.0f}us'
+        )
+        if report['set_latencies']:
+            self.stdout.write(
+                f'  set() latency:   p50 {percentile(report["set_latencies"], 50):.0f}us, '
+                f'p95 {percentile(report["set_latencies"], 95):.0f}us'
+            )
+        self.stdout.write('')
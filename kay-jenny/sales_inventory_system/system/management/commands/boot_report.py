@@ -0,0 +1,243 @@
+"""
+Management command to report worker boot cost (import time and RSS) per app
+Run with: python manage.py boot_report --runs 3
+
+Each run starts a fresh Python process and loads the project the way a
+uvicorn worker does: django.setup(), the project's ASGI application (asgi.py),
+then every app's URLconf (which imports its views). Import time and resident
+memory are recorded after each step, along with any heavy scientific libraries
+that got loaded at boot.
+Optional modules that are meant to load lazily (e.g. analytics.forecasting) are
+measured after boot so their deferred cost stays visible.
+
+Results are appended to a JSON-lines history file so boot cost can be tracked
+over time; each report is compared with the previous entry.
+"""
+import json
+import os
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+
+HEAVY_MODULES = ['pandas', 'numpy', 'scipy', 'statsmodels', 'PIL']
+
+LAZY_MODULES = [
+    'sales_inventory_system.analytics.forecasting',
+    'sales_inventory_system.analytics.reorder',
+    'sales_inventory_system.analytics.stockout',
+]
+
+# Runs inside the child process. Prints one JSON document on stdout.
+PROBE_SCRIPT = r'''
+import importlib, json, os, sys, time
+
+def rss_kb():
+    try:
+        with open('/proc/self/status') as status:
+            for line in status:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak // 1024 if sys.platform == 'darwin' else peak
+    except ImportError:
+        return None
+
+steps = []
+def record(name, started, rss_before):
+    rss = rss_kb()
+    steps.append({
+        'step': name,
+        'seconds': time.perf_counter() - started,
+        'rss_kb': rss,
+        'rss_delta_kb': (rss - rss_before) if rss is not None and rss_before is not None else None,
+    })
+
+config = json.loads(sys.argv[1])
+steps.append({'step': 'python', 'seconds': 0.0, 'rss_kb': rss_kb(), 'rss_delta_kb': None})
+
+started, before = time.perf_counter(), rss_kb()
+import django
+django.setup()
+record('django.setup', started, before)
+
+started, before = time.perf_counter(), rss_kb()
+importlib.import_module(config['asgi_module'])
+record('asgi application + middleware', started, before)
+
+for app in config['apps']:
+    started, before = time.perf_counter(), rss_kb()
+    try:
+        importlib.import_module(app + '.urls')
+    except ModuleNotFoundError:
+        importlib.import_module(app + '.models')
+    record(app, started, before)
+
+started, before = time.perf_counter(), rss_kb()
+importlib.import_module(config['root_urlconf'])
+record('root urlconf', started, before)
+
+boot_loaded = [name for name in config['heavy'] if name in sys.modules]
+boot = {
+    'seconds': sum(s['seconds'] for s in steps),
+    'rss_kb': steps[-1]['rss_kb'],
+}
+
+lazy = []
+for module in config['lazy']:
+    started, before = time.perf_counter(), rss_kb()
+    importlib.import_module(module)
+    rss = rss_kb()
+    lazy.append({
+        'module': module,
+        'seconds': time.perf_counter() - started,
+        'rss_delta_kb': (rss - before) if rss is not None and before is not None else None,
+    })
+
+print(json.dumps({'steps': steps, 'boot': boot, 'heavy_loaded_at_boot': boot_loaded, 'lazy': lazy}))
+'''
+
+
+class Command(BaseCommand):
+    help = 'Measure worker boot import time and RSS per app, and append the result to a history file'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--runs', type=int, default=3, help='Fresh processes to measure (median is reported)')
+        parser.add_argument(
+            '--history', default=str(Path(settings.BASE_DIR) / 'boot_report.jsonl'),
+            help='JSON-lines file the report is appended to'
+        )
+        parser.add_argument('--label', default='', help='Free-form label stored with the entry (e.g. a git ref)')
+        parser.add_argument('--no-save', action='store_true', help='Print the report without appending it')
+
+    def handle(self, *args, **options):
+        if options['runs'] < 1:
+            raise CommandError('--runs must be at least 1')
+
+        apps = [app for app in settings.INSTALLED_APPS if app.startswith('sales_inventory_system.')]
+        config = {
+            'apps': apps,
+            'root_urlconf': settings.ROOT_URLCONF,
+            # Production serves asgi.application (gunicorn + uvicorn workers)
+            'asgi_module': settings.ROOT_URLCONF.rpartition('.')[0] + '.asgi',
+            'heavy': HEAVY_MODULES,
+            'lazy': LAZY_MODULES,
+        }
+
+        runs = [self._probe(config) for _ in range(options['runs'])]
+        report = self._summarize(runs)
+        report.update({
+            'timestamp': timezone.now().isoformat(),
+            'label': options['label'],
+            'runs': options['runs'],
+            'python': sys.version.split()[0],
+        })
+
+        previous = self._last_entry(options['history'])
+        self._print_report(report, previous)
+
+        if not options['no_save']:
+            with open(options['history'], 'a', encoding='utf-8') as history:
+                history.write(json.dumps(report) + '\n')
+            self.stdout.write(f"Appended to {options['history']}")
+
+    def _probe(self, config):
+        """Run the probe script in a fresh interpreter"""
+        project_root = str(Path(settings.BASE_DIR).parent)
+        env = os.environ.copy()
+        env['DJANGO_SETTINGS_MODULE'] = os.environ.get(
+            'DJANGO_SETTINGS_MODULE', 'sales_inventory_system.sales_inventory.settings'
+        )
+        env['PYTHONPATH'] = os.pathsep.join(filter(None, [project_root, env.get('PYTHONPATH')]))
+
+        result = subprocess.run(
+            [sys.executable, '-c', PROBE_SCRIPT, json.dumps(config)],
+            capture_output=True, text=True, env=env, cwd=project_root,
+        )
+        if result.returncode != 0:
+            raise CommandError(f'Boot probe failed:\n{result.stderr}')
+        return json.loads(result.stdout.strip().splitlines()[-1])
+
+    @staticmethod
+    def _summarize(runs):
+        """Median time per step across runs; memory from the first run (deterministic)"""
+        def median(values):
+            values = [v for v in values if v is not None]
+            return statistics.median(values) if values else None
+
+        steps = []
+        for index, step in enumerate(runs[0]['steps']):
+            steps.append({
+                'step': step['step'],
+                'seconds': median(run['steps'][index]['seconds'] for run in runs),
+                'rss_kb': step['rss_kb'],
+                'rss_delta_kb': step['rss_delta_kb'],
+            })
+
+        lazy = []
+        for index, item in enumerate(runs[0]['lazy']):
+            lazy.append({
+                'module': item['module'],
+                'seconds': median(run['lazy'][index]['seconds'] for run in runs),
+                'rss_delta_kb': item['rss_delta_kb'],
+            })
+
+        return {
+            'boot_seconds': median(run['boot']['seconds'] for run in runs),
+            'boot_rss_kb': runs[0]['boot']['rss_kb'],
+            'heavy_loaded_at_boot': runs[0]['heavy_loaded_at_boot'],
+            'steps': steps,
+            'lazy': lazy,
+        }
+
+    @staticmethod
+    def _last_entry(path):
+        try:
+            with open(path, encoding='utf-8') as history:
+                lines = [line for line in history if line.strip()]
+        except FileNotFoundError:
+            return None
+        return json.loads(lines[-1]) if lines else None
+
+    def _print_report(self, report, previous):
+        def mb(kb):
+            return f'{kb / 1024:7.1f} MB' if kb is not None else '      n/a'
+
+        self.stdout.write(self.style.SUCCESS(f"Worker boot report ({report['runs']} runs, median time)"))
+        self.stdout.write(f"  {'Step':<45} {'Time':>9} {'RSS':>10} {'+RSS':>10}")
+        for step in report['steps']:
+            self.stdout.write(
+                f"  {step['step']:<45} {step['seconds'] * 1000:7.0f}ms {mb(step['rss_kb'])} {mb(step['rss_delta_kb'])}"
+            )
+        self.stdout.write(f"  {'TOTAL':<45} {report['boot_seconds'] * 1000:7.0f}ms {mb(report['boot_rss_kb'])}")
+
+        if report['heavy_loaded_at_boot']:
+            self.stdout.write(self.style.WARNING(
+                f"  Heavy modules loaded at boot: {', '.join(report['heavy_loaded_at_boot'])}"
+            ))
+        else:
+            self.stdout.write('  Heavy modules loaded at boot: none')
+
+        if report['lazy']:
+            self.stdout.write('\n  Deferred (loaded on first use):')
+            for item in report['lazy']:
+                self.stdout.write(
+                    f"  {item['module']:<45} {item['seconds'] * 1000:7.0f}ms {'':>10} {mb(item['rss_delta_kb'])}"
+                )
+
+        if previous:
+            time_change = (report['boot_seconds'] - previous['boot_seconds']) * 1000
+            self.stdout.write(f"\n  vs previous ({previous['timestamp']} {previous.get('label', '')}):")
+            self.stdout.write(f'    boot time {time_change:+.0f}ms')
+            if report['boot_rss_kb'] is not None and previous.get('boot_rss_kb') is not None:
+                self.stdout.write(f"    boot RSS  {(report['boot_rss_kb'] - previous['boot_rss_kb']) / 1024:+.1f} MB")
+        self.stdout.write('')
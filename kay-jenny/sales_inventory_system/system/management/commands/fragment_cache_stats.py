@@ -0,0 +1,34 @@
+"""
+Management command that reports template fragment cache hit rates
+Run with: python manage.py fragment_cache_stats [--reset]
+
+Counts come from every worker sharing the cache (see system/fragment_cache.py);
+each worker adds its counts at least once a minute while serving pages. A low
+hit rate on a fragment whose rows rarely change usually means the cache is
+evicting it: raise CACHE_MAX_ENTRIES.
+"""
+from django.core.management.base import BaseCommand
+
+from sales_inventory_system.system import fragment_cache
+
+
+class Command(BaseCommand):
+    help = 'Show hit/miss counters of cached template fragments'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--reset', action='store_true', help='Zero the counters after printing them')
+
+    def handle(self, *args, **options):
+        stats = fragment_cache.get_stats()
+        if not stats:
+            self.stdout.write("No fragment lookups recorded yet")
+        else:
+            self.stdout.write(f"{'Fragment':<20} {'Hits':>10} {'Misses':>10} {'Hit rate':>9}")
+            for row in stats:
+                self.stdout.write(
+                    f"{row['name']:<20} {row['hits']:>10} {row['misses']:>10} {row['hit_rate']:>8.1f}%"
+                )
+
+        if options['reset']:
+            fragment_cache.reset_stats()
+            self.stdout.write(self.style.SUCCESS("Counters reset"))
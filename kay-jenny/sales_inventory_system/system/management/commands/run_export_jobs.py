@@ -0,0 +1,78 @@
+"""
+Management command that builds queued CSV exports (see system/export_jobs.py)
+Run with: python manage.py run_export_jobs [--once] [--sleep 2] [--max-jobs 0]
+
+Runs until stopped (Ctrl+C / SIGTERM), taking one job at a time. Start one
+per spare CPU on the server; workers coordinate through the database, so
+several can run side by side. With --once it processes the queue and exits,
+which suits a cron job. Stale jobs from dead workers are requeued and expired
+files deleted while idle. Set EXPORT_BACKGROUND on the web service wherever
+this runs, or requests keep building exports themselves.
+"""
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from sales_inventory_system.system import export_jobs
+
+
+# Seconds between housekeeping passes (stale jobs, expired files)
+HOUSEKEEPING_INTERVAL = 300
+
+
+class Command(BaseCommand):
+    help = 'Build queued CSV exports in the background'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='Exit when the queue is empty')
+        parser.add_argument('--sleep', type=float, default=2.0, help='Seconds to wait when the queue is empty (default 2)')
+        parser.add_argument('--max-jobs', type=int, default=0, help='Exit after this many jobs (default 0: no limit)')
+
+    def handle(self, *args, **options):
+        processed = 0
+        next_housekeeping = 0
+
+        try:
+            while True:
+                if time.monotonic() >= next_housekeeping:
+                    self._housekeeping()
+                    next_housekeeping = time.monotonic() + HOUSEKEEPING_INTERVAL
+
+                job = export_jobs.claim_next()
+                if job is None:
+                    if options['once']:
+                        break
+                    close_old_connections()
+                    time.sleep(options['sleep'])
+                    continue
+
+                started = time.monotonic()
+                job = export_jobs.run_job(job)
+                processed += 1
+                self._report(job, time.monotonic() - started)
+
+                if options['max_jobs'] and processed >= options['max_jobs']:
+                    break
+        except KeyboardInterrupt:
+            pass
+
+        self.stdout.write(f"Processed {processed} export job(s)")
+
+    def _housekeeping(self):
+        requeued, failed = export_jobs.requeue_stale()
+        removed = export_jobs.cleanup()
+        if requeued or failed or removed:
+            self.stdout.write(
+                f"Requeued {requeued} stale job(s), failed {failed}, removed {removed} expired export(s)"
+            )
+
+    def _report(self, job, seconds):
+        if job is None:
+            self.stdout.write("Export cancelled while running")
+        elif job.status == 'DONE':
+            self.stdout.write(self.style.SUCCESS(
+                f"#{job.id} {job.export_type}: {job.rows_written} rows in {seconds:.1f}s ({job.file_size} bytes)"
+            ))
+        else:
+            self.stdout.write(self.style.ERROR(f"#{job.id} {job.export_type} failed: {job.error}"))
@@ -0,0 +1,77 @@
+"""
+Management command to copy shared data from head office into branch databases
+Run with: python manage.py sync_branches [--branch north] [--catalog]
+
+Branch databases hold the full schema (python manage.py migrate --database
+branch_<code>) but only their own orders, stock and ledger. Orders and stock
+rows point at users, so every user is copied into each branch database
+(inserted or updated by id). Users saved through the app are copied as they
+are saved; run this after adding branches or loading users by other means
+(raw SQL, loaddata). With --catalog the head office products,
+ingredients and recipes are copied too; stock levels already in a branch
+are kept, and new items start with zero stock.
+"""
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.core.management.color import no_style
+from django.db import connections, transaction
+
+from sales_inventory_system.accounts.models import User
+from sales_inventory_system.products.menu_service import MenuService
+from sales_inventory_system.products.models import Ingredient, Product, RecipeIngredient, RecipeItem
+from sales_inventory_system.system.branches import upsert_rows as _upsert, use_branch
+
+
+class Command(BaseCommand):
+    help = 'Copy users (and optionally the product catalog) into branch databases'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--branch', action='append', dest='branches', help='Only this branch code (repeatable)')
+        parser.add_argument('--catalog', action='store_true', help='Also copy products, ingredients and recipes')
+
+    def handle(self, *args, **options):
+        if not settings.BRANCHES:
+            raise CommandError('No branches configured (set BRANCH_DATABASES)')
+        codes = options['branches'] or list(settings.BRANCHES)
+        unknown = set(codes) - set(settings.BRANCHES)
+        if unknown:
+            raise CommandError(f"Unknown branch(es): {', '.join(sorted(unknown))}")
+
+        users = list(User.objects.using('default').all())
+        if options['catalog']:
+            products = list(Product.objects.using('default').all())
+            ingredients = list(Ingredient.objects.using('default').all())
+            recipes = list(RecipeItem.objects.using('default').all())
+            lines = list(RecipeIngredient.objects.using('default').all())
+            # New branch items start empty; existing branch stock is not overwritten
+            for product in products:
+                product.stock = 0
+            for ingredient in ingredients:
+                ingredient.current_stock = 0
+
+        for code in codes:
+            alias = settings.BRANCHES[code]['database']
+            with transaction.atomic(using=alias):
+                counts = [f"{_upsert(User, alias, users)} user(s)"]
+                synced_models = [User]
+                if options['catalog']:
+                    counts.append(f"{_upsert(Product, alias, products, keep=['stock'])} product(s)")
+                    counts.append(f"{_upsert(Ingredient, alias, ingredients, keep=['current_stock'])} ingredient(s)")
+                    counts.append(f"{_upsert(RecipeItem, alias, recipes)} recipe(s)")
+                    # Recipe lines removed at head office are removed in the branch too
+                    RecipeIngredient.objects.using(alias).exclude(id__in=[line.id for line in lines]).delete()
+                    counts.append(f"{_upsert(RecipeIngredient, alias, lines)} recipe line(s)")
+                    synced_models += [Product, Ingredient, RecipeItem, RecipeIngredient]
+
+                # Explicit ids do not advance PostgreSQL sequences (no-op on SQLite)
+                connection = connections[alias]
+                with connection.cursor() as cursor:
+                    for sql in connection.ops.sequence_reset_sql(no_style(), synced_models):
+                        cursor.execute(sql)
+
+            if options['catalog']:
+                # The branch's POS menu is cached under its own keys
+                with use_branch(code):
+                    MenuService.invalidate()
+
+            self.stdout.write(self.style.SUCCESS(f"{code} ({alias}): {', '.join(counts)}"))
@@ -1,17 +1,38 @@
 """
-Middleware for capturing user context in audit trail
+Middleware for capturing user context in audit trail, the active branch,
+read-your-writes pinning for read replicas, and on-demand profiling
 """
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.http import FileResponse
+from django.utils.deprecation import MiddlewareMixin
+
+from . import profiling, replicas
+from .branches import set_current_branch, use_branch
 from .signals import set_current_user
 
 
+# Signed cookie that ties a POS terminal to its branch (survives logout)
+BRANCH_COOKIE = 'pos_branch'
+BRANCH_COOKIE_SALT = 'branch'
+
+
 class AuditMiddleware:
-    """Middleware to capture current user for audit logging"""
+    """Middleware to capture current user for audit logging (sync and async)"""
+
+    sync_capable = True
+    async_capable = True
 
     def __init__(self, get_response):
         self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
 
     def __call__(self, request):
-        # Set current user in thread-local storage
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+
+        # Set current user in request-local storage
         if hasattr(request, 'user') and request.user.is_authenticated:
             set_current_user(request.user)
         else:
@@ -23,3 +44,123 @@ class AuditMiddleware:
         set_current_user(None)
 
         return response
+
+    async def __acall__(self, request):
+        # request.user would hit the database synchronously; auser() does not
+        user = await request.auser() if hasattr(request, 'auser') else None
+        set_current_user(user if user is not None and user.is_authenticated else None)
+
+        response = await self.get_response(request)
+
+        set_current_user(None)
+
+        return response
+
+
+class ProfilingMiddleware(MiddlewareMixin):
+    """
+    Capture sampled requests when an admin has switched profiling on
+    (see profiling.py). Keep it last so it wraps only the view.
+    """
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if iscoroutinefunction(view_func) or not profiling.should_profile(request):
+            return None
+        return profiling.profile_view(request, view_func, view_args, view_kwargs)
+
+
+class BranchMiddleware:
+    """Activate the branch stored in the terminal's signed cookie (sync and async)"""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def _activate(self, request):
+        code = request.get_signed_cookie(BRANCH_COOKIE, default=None, salt=BRANCH_COOKIE_SALT)
+        if code not in settings.BRANCHES:
+            code = None  # branch removed from settings since the cookie was set
+        set_current_branch(code)
+        request.branch = code or settings.ACTIVE_BRANCH
+        return code
+
+    @staticmethod
+    def _keep_branch(response, code):
+        """
+        Streaming bodies (server-sent events) are produced after this
+        middleware returns; re-enter the branch while they run.
+        """
+        if not code or not response.streaming or isinstance(response, FileResponse):
+            return response
+        content = response.streaming_content
+        if response.is_async:
+            async def stream():
+                with use_branch(code):
+                    async for chunk in content:
+                        yield chunk
+        else:
+            def stream():
+                with use_branch(code):
+                    yield from content
+        response.streaming_content = stream()
+        return response
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+
+        code = self._activate(request)
+        try:
+            return self._keep_branch(self.get_response(request), code)
+        finally:
+            set_current_branch(None)
+
+    async def __acall__(self, request):
+        code = self._activate(request)
+        try:
+            return self._keep_branch(await self.get_response(request), code)
+        finally:
+            set_current_branch(None)
+
+
+class ReplicaPinMiddleware:
+    """
+    After a request writes, keep the browser's reads on the primary for
+    REPLICA_PIN_SECONDS so reports show its own changes (sync and async)
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def _pin(self, response):
+        if settings.READ_REPLICAS and replicas.has_written():
+            response.set_cookie(
+                replicas.PIN_COOKIE, '1', max_age=settings.REPLICA_PIN_SECONDS, httponly=True, samesite='Lax'
+            )
+        return response
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+
+        replicas.reset_request_state()
+        try:
+            return self._pin(self.get_response(request))
+        finally:
+            replicas.reset_request_state()
+
+    async def __acall__(self, request):
+        replicas.reset_request_state()
+        try:
+            return self._pin(await self.get_response(request))
+        finally:
+            replicas.reset_request_state()
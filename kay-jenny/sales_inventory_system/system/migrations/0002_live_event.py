@@ -0,0 +1,27 @@
+# Generated by Django 5.2.8 on 2026-10-19 06:28
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('system', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LiveEvent',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('event_type', models.CharField(choices=[('order-created', 'Order Created'), ('payment-completed', 'Payment Completed'), ('order-expired', 'Order Expired'), ('low-stock', 'Low Stock')], max_length=30)),
+                ('payload', models.JSONField(default=dict)),
+                ('created_at', models.DateTimeField(auto_now_add=True, db_index=True)),
+            ],
+            options={
+                'verbose_name': 'Live Event',
+                'verbose_name_plural': 'Live Events',
+                'ordering': ['id'],
+            },
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.8 on 2026-10-19 06:54
+
+import sales_inventory_system.system.branches
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('system', '0002_live_event'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='auditlog',
+            name='branch',
+            field=models.CharField(blank=True, db_index=True, default=sales_inventory_system.system.branches.current_branch_code, help_text='Branch whose data changed (blank for head office)', max_length=50),
+        ),
+    ]
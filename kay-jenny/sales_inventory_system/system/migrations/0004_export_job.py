@@ -0,0 +1,45 @@
+# Generated by Django 5.2.8 on 2026-10-19 07:08
+
+import django.db.models.deletion
+import sales_inventory_system.system.branches
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('system', '0003_audit_log_branch'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ExportJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('export_type', models.CharField(choices=[('AUDIT_TRAIL', 'Audit Trail'), ('USAGE', 'Ingredient Usage'), ('USAGE_DETAILED', 'Ingredient Usage (Detailed)'), ('VARIANCE', 'Variance Analysis'), ('VARIANCE_DETAILED', 'Variance Analysis (Detailed)'), ('SALES', 'Sales Report')], max_length=30)),
+                ('params', models.JSONField(blank=True, default=dict, help_text='Report filters')),
+                ('branch', models.CharField(blank=True, default=sales_inventory_system.system.branches.current_branch_code, help_text='Branch whose data is exported (blank for head office)', max_length=50)),
+                ('status', models.CharField(choices=[('PENDING', 'Pending'), ('RUNNING', 'Running'), ('DONE', 'Done'), ('FAILED', 'Failed')], db_index=True, default='PENDING', max_length=20)),
+                ('progress', models.PositiveSmallIntegerField(default=0, help_text='Percent complete')),
+                ('rows_written', models.PositiveIntegerField(default=0)),
+                ('total_rows', models.PositiveIntegerField(blank=True, null=True)),
+                ('file_name', models.CharField(blank=True, max_length=255)),
+                ('file_size', models.PositiveBigIntegerField(blank=True, null=True)),
+                ('error', models.TextField(blank=True)),
+                ('attempts', models.PositiveSmallIntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True, db_index=True)),
+                ('started_at', models.DateTimeField(blank=True, null=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                ('updated_at', models.DateTimeField(auto_now=True, help_text='Last progress report (worker heartbeat)')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='export_jobs', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Export Job',
+                'verbose_name_plural': 'Export Jobs',
+                'ordering': ['-created_at'],
+                'indexes': [models.Index(fields=['user', 'status'], name='system_expo_user_id_046038_idx'), models.Index(fields=['status', 'created_at'], name='system_expo_status_e1f9d4_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,53 @@
+# Generated by Django 5.2.8 on 2026-10-19 07:23
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def count_existing_activity(apps, schema_editor):
+    """Counters start from the audit rows already written (one GROUP BY)"""
+    AuditLog = apps.get_model('system', 'AuditLog')
+    AuditActivityCounter = apps.get_model('system', 'AuditActivityCounter')
+    db_alias = schema_editor.connection.alias
+
+    totals = AuditLog.objects.using(db_alias).order_by().values('user_id', 'model_name', 'action').annotate(
+        total=models.Count('id')
+    )
+    AuditActivityCounter.objects.using(db_alias).bulk_create(
+        [
+            AuditActivityCounter(
+                user_id=row['user_id'], model_name=row['model_name'], action=row['action'], count=row['total']
+            )
+            for row in totals
+        ],
+        batch_size=500,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('system', '0004_export_job'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AuditActivityCounter',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('model_name', models.CharField(max_length=100)),
+                ('action', models.CharField(choices=[('CREATE', 'Create'), ('UPDATE', 'Update'), ('DELETE', 'Delete'), ('ARCHIVE', 'Archive'), ('RESTORE', 'Restore')], max_length=20)),
+                ('count', models.BigIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('user', models.ForeignKey(blank=True, help_text='Null for system actions (and users since deleted, as on AuditLog)', null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='audit_activity', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Audit Activity Counter',
+                'verbose_name_plural': 'Audit Activity Counters',
+                'constraints': [models.UniqueConstraint(fields=('user', 'model_name', 'action'), name='unique_audit_activity')],
+            },
+        ),
+        migrations.RunPython(count_existing_activity, migrations.RunPython.noop),
+    ]
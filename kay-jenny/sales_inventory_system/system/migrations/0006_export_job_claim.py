@@ -0,0 +1,18 @@
+# Generated by Django 5.2.8 on 2026-10-19 07:52
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('system', '0005_audit_activity_counter'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='exportjob',
+            name='claimed_by',
+            field=models.CharField(blank=True, editable=False, help_text='Token of the worker run building this job (cleared when requeued)', max_length=32, null=True),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.8 on 2026-10-19 08:08
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('system', '0006_export_job_claim'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ExportFile',
+            fields=[
+                ('job', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='file', serialize=False, to='system.exportjob')),
+                ('content', models.BinaryField(help_text='Gzip-compressed CSV')),
+            ],
+            options={
+                'verbose_name': 'Export File',
+                'verbose_name_plural': 'Export Files',
+            },
+        ),
+        migrations.RemoveField(
+            model_name='exportjob',
+            name='file_name',
+        ),
+    ]
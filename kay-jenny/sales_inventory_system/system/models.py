@@ -1,8 +1,11 @@
 from django.db import models
 from django.conf import settings
+from django.utils import timezone
 from django.contrib.contenttypes.models import ContentType
 from django.contrib.contenttypes.fields import GenericForeignKey
 
+from .branches import current_branch_code
+
 
 class AuditLog(models.Model):
     """Comprehensive audit trail for all model changes"""
@@ -34,6 +37,14 @@ class AuditLog(models.Model):
     record_id = models.IntegerField(db_index=True)
     description = models.TextField(blank=True)
 
+    branch = models.CharField(
+        max_length=50,
+        blank=True,
+        default=current_branch_code,
+        db_index=True,
+        help_text="Branch whose data changed (blank for head office)"
+    )
+
     data_before = models.JSONField(null=True, blank=True, help_text="State before the change (for UPDATE/DELETE)")
     data_after = models.JSONField(null=True, blank=True, help_text="State after the change (for CREATE/UPDATE)")
 
@@ -69,3 +80,156 @@ class AuditLog(models.Model):
                     changes.append(f"{key}: {old_val} → {new_val}")
 
         return changes if changes else None
+
+
+class AuditActivityCounter(models.Model):
+    """
+    Running count of audit rows per user, model and action, kept up to date
+    as audit rows are written (see system/activity.py). The audit trail pages
+    read their stats and filter dropdowns from this small table instead of
+    scanning AuditLog.
+    """
+
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='audit_activity',
+        help_text="Null for system actions (and users since deleted, as on AuditLog)"
+    )
+    model_name = models.CharField(max_length=100)
+    action = models.CharField(max_length=20, choices=AuditLog.ACTION_CHOICES)
+    count = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            # NULL users may hold more than one row per model/action; readers sum
+            models.UniqueConstraint(fields=['user', 'model_name', 'action'], name='unique_audit_activity'),
+        ]
+        verbose_name = 'Audit Activity Counter'
+        verbose_name_plural = 'Audit Activity Counters'
+
+    def __str__(self):
+        user_str = self.user.username if self.user else 'System'
+        return f"{user_str} - {self.action} - {self.model_name}: {self.count}"
+
+
+class LiveEvent(models.Model):
+    """Short-lived event log feeding the live cashier board (server-sent events)"""
+
+    EVENT_CHOICES = [
+        ('order-created', 'Order Created'),
+        ('payment-completed', 'Payment Completed'),
+        ('order-expired', 'Order Expired'),
+        ('low-stock', 'Low Stock'),
+    ]
+
+    id = models.BigAutoField(primary_key=True)
+    event_type = models.CharField(max_length=30, choices=EVENT_CHOICES)
+    payload = models.JSONField(default=dict)
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    class Meta:
+        ordering = ['id']
+        verbose_name = 'Live Event'
+        verbose_name_plural = 'Live Events'
+
+    def __str__(self):
+        return f"#{self.id} {self.event_type}"
+
+
+class ExportJob(models.Model):
+    """CSV export queued by a user and built by the run_export_jobs worker"""
+
+    TYPE_CHOICES = [
+        ('AUDIT_TRAIL', 'Audit Trail'),
+        ('USAGE', 'Ingredient Usage'),
+        ('USAGE_DETAILED', 'Ingredient Usage (Detailed)'),
+        ('VARIANCE', 'Variance Analysis'),
+        ('VARIANCE_DETAILED', 'Variance Analysis (Detailed)'),
+        ('SALES', 'Sales Report'),
+    ]
+
+    STATUS_CHOICES = [
+        ('PENDING', 'Pending'),
+        ('RUNNING', 'Running'),
+        ('DONE', 'Done'),
+        ('FAILED', 'Failed'),
+    ]
+
+    ACTIVE_STATUSES = ('PENDING', 'RUNNING')
+
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='export_jobs'
+    )
+    export_type = models.CharField(max_length=30, choices=TYPE_CHOICES)
+    params = models.JSONField(default=dict, blank=True, help_text="Report filters")
+    branch = models.CharField(
+        max_length=50,
+        blank=True,
+        default=current_branch_code,
+        help_text="Branch whose data is exported (blank for head office)"
+    )
+
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='PENDING', db_index=True)
+    progress = models.PositiveSmallIntegerField(default=0, help_text="Percent complete")
+    rows_written = models.PositiveIntegerField(default=0)
+    total_rows = models.PositiveIntegerField(null=True, blank=True)
+    file_size = models.PositiveBigIntegerField(null=True, blank=True)
+    error = models.TextField(blank=True)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    claimed_by = models.CharField(
+        max_length=32,
+        null=True,
+        blank=True,
+        editable=False,
+        help_text="Token of the worker run building this job (cleared when requeued)"
+    )
+
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True, help_text="Last progress report (worker heartbeat)")
+
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['user', 'status']),
+            models.Index(fields=['status', 'created_at']),
+        ]
+        verbose_name = 'Export Job'
+        verbose_name_plural = 'Export Jobs'
+
+    def __str__(self):
+        return f"#{self.id} {self.export_type} ({self.status})"
+
+    @property
+    def is_active(self):
+        return self.status in self.ACTIVE_STATUSES
+
+    @property
+    def download_name(self):
+        """File name offered to the browser"""
+        stamp = timezone.localtime(self.created_at).strftime('%Y%m%d_%H%M')
+        return f"{self.export_type.lower()}_{stamp}.csv.gz"
+
+
+class ExportFile(models.Model):
+    """
+    Finished file of an ExportJob, kept in the database so the web process
+    can serve it wherever the worker that built it runs
+    """
+
+    job = models.OneToOneField(ExportJob, on_delete=models.CASCADE, primary_key=True, related_name='file')
+    content = models.BinaryField(help_text="Gzip-compressed CSV")
+
+    class Meta:
+        verbose_name = 'Export File'
+        verbose_name_plural = 'Export Files'
+
+    def __str__(self):
+        return f"File of export #{self.job_id}"
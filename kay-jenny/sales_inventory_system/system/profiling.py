@@ -0,0 +1,330 @@
+"""
+On-demand request profiling
+
+Admins switch profiling on from /system/profiles/ for a URL pattern and/or
+a fraction of requests; ProfilingMiddleware then captures matching requests
+on live traffic:
+- cProfile of the request (top functions by own and cumulative time)
+- Every SQL query executed, on every database alias, grouped by statement
+- A .prof dump for flame graph tools (snakeviz, flameprof)
+
+Only sync views are captured (the POS and report pages): ProfilingMiddleware
+calls them itself from process_view, which Django runs on the same thread
+as the view under ASGI too. One cProfile runs at a time per process; other
+requests sampled meanwhile record SQL only.
+
+Settings live in PROFILER_DIR/config.json so every worker on the host picks
+them up without a restart, and switch themselves off at expires_at. Captures
+are written to the same directory and pruned to PROFILER_RETENTION_DAYS /
+PROFILER_MAX_FILES on every save.
+"""
+
+import cProfile
+import io
+import json
+import logging
+import os
+import pstats
+import random
+import re
+import threading
+import time
+import uuid
+from contextlib import ExitStack
+from datetime import datetime, timedelta
+from pathlib import Path
+
+from django.conf import settings
+from django.db import connections
+from django.utils import timezone
+
+
+logger = logging.getLogger(__name__)
+
+# Queries kept per capture (the rest are only counted)
+MAX_QUERIES = 1000
+TOP_FUNCTIONS = 40
+TOP_QUERIES = 25
+
+# Capture file names: <timestamp>-<id>.json / .prof
+CAPTURE_NAME = re.compile(r'^\d{8}T\d{6}-[0-9a-f]{8}$')
+
+_config_cache = {'mtime': None, 'config': None}
+
+# cProfile cannot run twice at once (sys.monitoring is per process on 3.12+)
+_profiler_lock = threading.Lock()
+
+
+def profile_dir():
+    return Path(settings.PROFILER_DIR)
+
+
+def _config_path():
+    return profile_dir() / 'config.json'
+
+
+def load_config():
+    """Current profiler settings (re-read only when the file changes)"""
+    path = _config_path()
+    try:
+        mtime = path.stat().st_mtime
+    except OSError:
+        return None
+    if mtime != _config_cache['mtime']:
+        try:
+            config = json.loads(path.read_text(encoding='utf-8'))
+            config['pattern_re'] = re.compile(config['path_pattern']) if config.get('path_pattern') else None
+        except (OSError, ValueError, re.error):
+            config = None
+        _config_cache.update(mtime=mtime, config=config)
+    return _config_cache['config']
+
+
+def save_config(path_pattern='', sample_rate=1.0, minutes=30, user=None):
+    """
+    Switch profiling on.
+
+    Args:
+        path_pattern: Regex searched in the request path ('' = every path)
+        sample_rate: Fraction of matching requests to capture (0-1)
+        minutes: Switch off automatically after this long
+
+    Raises:
+        ValueError: Invalid pattern, rate or duration
+    """
+    if path_pattern:
+        try:
+            re.compile(path_pattern)
+        except re.error as exc:
+            raise ValueError(f"Invalid path pattern: {exc}")
+    if not 0 < sample_rate <= 1:
+        raise ValueError('Sample rate must be between 0 and 1')
+    if not 0 < minutes <= settings.PROFILER_MAX_MINUTES:
+        raise ValueError(f'Duration must be 1-{settings.PROFILER_MAX_MINUTES} minutes')
+
+    config = {
+        'enabled': True,
+        'path_pattern': path_pattern,
+        'sample_rate': sample_rate,
+        'expires_at': (timezone.localtime() + timedelta(minutes=minutes)).isoformat(),
+        'enabled_by': user.username if user else None,
+    }
+    _write_config(config)
+    return config
+
+
+def disable():
+    """Switch profiling off"""
+    config = dict(load_config() or {}, enabled=False)
+    config.pop('pattern_re', None)
+    _write_config(config)
+
+
+def _write_config(config):
+    directory = profile_dir()
+    directory.mkdir(parents=True, exist_ok=True)
+    temp = directory / f'.config-{uuid.uuid4().hex}.tmp'
+    temp.write_text(json.dumps(config, indent=2), encoding='utf-8')
+    os.replace(temp, _config_path())
+
+
+def is_active(config):
+    if not config or not config.get('enabled'):
+        return False
+    try:
+        return datetime.fromisoformat(config['expires_at']) > timezone.now()
+    except (KeyError, TypeError, ValueError):
+        return False
+
+
+def should_profile(request):
+    """Whether to capture this request (cheap: one stat() when profiling is off)"""
+    config = load_config()
+    if not is_active(config):
+        return False
+    if request.path.startswith('/system/profiles/') or request.path.startswith(settings.STATIC_URL):
+        return False
+    if config['pattern_re'] is not None and not config['pattern_re'].search(request.path):
+        return False
+    return random.random() < config.get('sample_rate', 1.0)
+
+
+class QueryRecorder:
+    """execute_wrapper that records SQL text and time for every alias"""
+
+    def __init__(self):
+        self.queries = []
+        self.count = 0
+        self.total_ms = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = (time.perf_counter() - start) * 1000
+            self.count += 1
+            self.total_ms += elapsed
+            if len(self.queries) < MAX_QUERIES:
+                self.queries.append({
+                    'sql': sql,
+                    'alias': context['connection'].alias,
+                    'ms': round(elapsed, 3),
+                    'many': many,
+                })
+
+    def record(self):
+        """Context manager installing the recorder on every configured connection"""
+        stack = ExitStack()
+        for alias in connections:
+            stack.enter_context(connections[alias].execute_wrapper(self))
+        return stack
+
+    def summary(self):
+        grouped = {}
+        for query in self.queries:
+            row = grouped.setdefault((query['alias'], query['sql']), {
+                'sql': query['sql'], 'alias': query['alias'], 'count': 0, 'total_ms': 0.0, 'max_ms': 0.0,
+            })
+            row['count'] += 1
+            row['total_ms'] += query['ms']
+            row['max_ms'] = max(row['max_ms'], query['ms'])
+        rows = sorted(grouped.values(), key=lambda row: -row['total_ms'])[:TOP_QUERIES]
+        for row in rows:
+            row['total_ms'] = round(row['total_ms'], 2)
+        return rows
+
+
+def profile_view(request, view_func, view_args, view_kwargs):
+    """Run a view under cProfile and the SQL recorder, then save the capture"""
+    recorder = QueryRecorder()
+    profiler = cProfile.Profile() if _profiler_lock.acquire(blocking=False) else None
+    response = None
+    start = time.perf_counter()
+    try:
+        with recorder.record():
+            if profiler is not None:
+                try:
+                    profiler.enable()
+                except ValueError:
+                    # Another profiler or debugger is active; record SQL only
+                    _profiler_lock.release()
+                    profiler = None
+            try:
+                response = view_func(request, *view_args, **view_kwargs)
+            finally:
+                if profiler is not None:
+                    profiler.disable()
+    finally:
+        wall_ms = (time.perf_counter() - start) * 1000
+        try:
+            save_capture(request, response, profiler, recorder, wall_ms)
+        except OSError:
+            logger.exception("Could not save profile for %s", request.path)
+        finally:
+            if profiler is not None:
+                _profiler_lock.release()
+    return response
+
+
+def _function_rows(stats, sort_key):
+    stats.sort_stats(sort_key)
+    rows = []
+    for func in stats.fcn_list[:TOP_FUNCTIONS]:
+        primitive_calls, calls, own, cumulative, callers = stats.stats[func]
+        filename, line, name = func
+        rows.append({
+            'function': name,
+            'location': f"{_short_path(filename)}:{line}" if line else filename,
+            'calls': calls,
+            'own_ms': round(own * 1000, 2),
+            'cumulative_ms': round(cumulative * 1000, 2),
+        })
+    return rows
+
+
+def _short_path(filename):
+    """Path relative to the project or site-packages, for readability"""
+    for marker in ('site-packages/', str(settings.BASE_DIR.parent) + '/'):
+        if marker in filename:
+            return filename.split(marker, 1)[1]
+    return filename
+
+
+def save_capture(request, response, profiler, recorder, wall_ms):
+    """Write one capture (JSON summary + .prof dump) and apply retention"""
+    directory = profile_dir()
+    directory.mkdir(parents=True, exist_ok=True)
+    name = f"{timezone.now():%Y%m%dT%H%M%S}-{uuid.uuid4().hex[:8]}"
+
+    capture = {
+        'name': name,
+        'captured_at': timezone.localtime().isoformat(),
+        'method': request.method,
+        'path': request.path,
+        'query_string': request.META.get('QUERY_STRING', ''),
+        'status': getattr(response, 'status_code', 500),
+        'user': request.user.username if getattr(request, 'user', None) and request.user.is_authenticated else None,
+        'branch': getattr(request, 'branch', None),
+        'wall_ms': round(wall_ms, 2),
+        'sql_count': recorder.count,
+        'sql_ms': round(recorder.total_ms, 2),
+        'queries': recorder.summary(),
+    }
+    if profiler is not None:
+        profiler.dump_stats(directory / f"{name}.prof")
+        stats = pstats.Stats(profiler, stream=io.StringIO())
+        capture['profile_ms'] = round(stats.total_tt * 1000, 2)
+        capture['top_cumulative'] = _function_rows(stats, 'cumulative')
+        capture['top_own'] = _function_rows(stats, 'tottime')
+
+    (directory / f"{name}.json").write_text(json.dumps(capture, default=str), encoding='utf-8')
+    prune()
+    return name
+
+
+def prune():
+    """Delete captures older than the retention period, then the oldest over the cap"""
+    cutoff = time.time() - settings.PROFILER_RETENTION_DAYS * 86400
+    captures = sorted(profile_dir().glob('*.json'), key=lambda path: path.name, reverse=True)
+    captures = [path for path in captures if CAPTURE_NAME.match(path.stem)]
+    for index, path in enumerate(captures):
+        try:
+            if index >= settings.PROFILER_MAX_FILES or path.stat().st_mtime < cutoff:
+                path.unlink(missing_ok=True)
+                path.with_suffix('.prof').unlink(missing_ok=True)
+        except OSError:
+            pass
+
+
+def list_captures():
+    """Capture summaries, newest first"""
+    rows = []
+    for path in sorted(profile_dir().glob('*.json'), key=lambda path: path.name, reverse=True):
+        if not CAPTURE_NAME.match(path.stem):
+            continue
+        try:
+            capture = json.loads(path.read_text(encoding='utf-8'))
+        except (OSError, ValueError):
+            continue
+        capture['top_function'] = (capture.get('top_own') or [{}])[0].get('function')
+        rows.append(capture)
+    return rows
+
+
+def get_capture(name):
+    """One capture, or None (name is validated before touching the disk)"""
+    if not CAPTURE_NAME.match(name):
+        return None
+    try:
+        return json.loads((profile_dir() / f"{name}.json").read_text(encoding='utf-8'))
+    except (OSError, ValueError):
+        return None
+
+
+def capture_dump_path(name):
+    """Path of a capture's .prof file, or None"""
+    if not CAPTURE_NAME.match(name):
+        return None
+    path = profile_dir() / f"{name}.prof"
+    return path if path.exists() else None
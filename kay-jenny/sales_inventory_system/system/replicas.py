@@ -0,0 +1,207 @@
+"""
+Read replicas for reports and exports
+
+Long aggregate scans (dashboards, sales and BOM reports, CSV exports) can
+read from a replica instead of the database the POS writes through.
+Replicas are configured with REPLICA_DATABASES in settings; each primary
+alias (default, or a branch database) maps to at most one replica.
+
+- Only code that opts in reads from a replica: views wrapped in
+  @replica_reads, or blocks run under use_replica()
+- Lag guard: a replica further behind than REPLICA_MAX_LAG seconds is skipped
+- Unavailable replicas are skipped for REPLICA_RETRY_SECONDS, and a view
+  whose replica fails mid-request is re-run against the primary
+- Read-your-writes: a request that wrote reads from the primary for the rest
+  of the request, and ReplicaPinMiddleware pins the browser to the primary
+  for REPLICA_PIN_SECONDS afterwards
+
+Health results are kept per process; checks are one small query every
+REPLICA_CHECK_SECONDS per replica.
+"""
+
+import logging
+import os
+import time
+from contextlib import contextmanager
+from functools import wraps
+
+from asgiref.local import Local
+from django.conf import settings
+from django.db import DatabaseError, connections
+
+
+logger = logging.getLogger(__name__)
+
+# Request-local storage, like the active branch in branches.py
+_replica_locals = Local()
+
+# Per-process replica health: {replica alias: (checked_at, usable)}
+_replica_health = {}
+
+# Cookie that keeps a browser on the primary right after it wrote
+PIN_COOKIE = 'replica_pin'
+
+# PostgreSQL standby lag; 0 when the standby has replayed everything it received
+POSTGRES_LAG_SQL = """
+    SELECT CASE
+        WHEN NOT pg_is_in_recovery() THEN 0
+        WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+        ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)
+    END
+"""
+
+
+def replica_for(primary):
+    """Replica alias configured for a primary alias, or None"""
+    return settings.READ_REPLICAS.get(primary)
+
+
+def primary_for(alias):
+    """Primary alias for a replica alias (other aliases are returned unchanged)"""
+    for primary, replica in settings.READ_REPLICAS.items():
+        if replica == alias:
+            return primary
+    return alias
+
+
+def replica_reads_active():
+    """Whether reads in this request/task may go to a replica"""
+    return getattr(_replica_locals, 'depth', 0) > 0 and not getattr(_replica_locals, 'wrote', False)
+
+
+def note_write():
+    """Record a write: the rest of this request reads from the primary"""
+    _replica_locals.wrote = True
+
+
+def reset_request_state():
+    """Clear per-request flags (called by ReplicaPinMiddleware)"""
+    _replica_locals.depth = 0
+    _replica_locals.wrote = False
+
+
+def has_written():
+    """Whether this request/task has written since it started"""
+    return getattr(_replica_locals, 'wrote', False)
+
+
+def _sqlite_lag(primary, replica):
+    """
+    Local stand-in for replication lag between two SQLite files: how much
+    newer the primary file (or its WAL) is than the replica copy.
+    """
+    def modified(alias):
+        name = str(connections[alias].settings_dict['NAME'])
+        return max(
+            (os.path.getmtime(path) for path in (name, f"{name}-wal") if os.path.exists(path)),
+            default=None,
+        )
+
+    replica_modified = modified(replica)
+    if replica_modified is None:
+        # Connecting would create an empty database file
+        raise DatabaseError(f"Replica database file not found: {connections[replica].settings_dict['NAME']}")
+    primary_modified = modified(primary) or replica_modified
+    with connections[replica].cursor() as cursor:
+        cursor.execute('SELECT 1')
+    return max(primary_modified - replica_modified, 0)
+
+
+def replication_lag(replica):
+    """
+    Seconds the replica is behind its primary.
+
+    Raises:
+        DatabaseError: If the replica cannot be reached
+    """
+    connection = connections[replica]
+    if connection.vendor == 'postgresql':
+        with connection.cursor() as cursor:
+            cursor.execute(POSTGRES_LAG_SQL)
+            return float(cursor.fetchone()[0] or 0)
+    if connection.vendor == 'sqlite':
+        return _sqlite_lag(primary_for(replica), replica)
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT 1')
+    return 0.0
+
+
+def replica_usable(replica):
+    """Reachable and within REPLICA_MAX_LAG; cached per process"""
+    now = time.monotonic()
+    checked = _replica_health.get(replica)
+    if checked:
+        checked_at, usable = checked
+        interval = settings.REPLICA_CHECK_SECONDS if usable else settings.REPLICA_RETRY_SECONDS
+        if now - checked_at < interval:
+            return usable
+
+    try:
+        lag = replication_lag(replica)
+    except DatabaseError as exc:
+        logger.warning("Replica %s unavailable, reading from primary: %s", replica, exc)
+        usable = False
+    else:
+        usable = lag <= settings.REPLICA_MAX_LAG
+        if not usable:
+            logger.warning("Replica %s is %.1fs behind, reading from primary", replica, lag)
+    _replica_health[replica] = (now, usable)
+    return usable
+
+
+def mark_unavailable(replica):
+    """Skip a replica until the next retry (e.g. after a failed query)"""
+    _replica_health[replica] = (time.monotonic(), False)
+
+
+@contextmanager
+def use_replica():
+    """Let reads in this block go to replicas (writes always go to the primary)"""
+    depth = getattr(_replica_locals, 'depth', 0)
+    # Only writes made inside the block keep its reads on the primary
+    wrote_before = has_written()
+    if depth == 0:
+        _replica_locals.wrote = False
+    _replica_locals.depth = depth + 1
+    try:
+        yield
+    finally:
+        _replica_locals.depth = depth
+        _replica_locals.wrote = wrote_before or has_written()
+
+
+def replica_reads(view_func):
+    """
+    View decorator: read from replicas unless the browser is pinned to the
+    primary. If a replica fails mid-request, the view runs again on the
+    primary (these views only read).
+    """
+    @wraps(view_func)
+    def _wrapped(request, *args, **kwargs):
+        if not settings.READ_REPLICAS or request.COOKIES.get(PIN_COOKIE):
+            return view_func(request, *args, **kwargs)
+
+        used = set()
+        _replica_locals.used = used
+        try:
+            with use_replica():
+                return view_func(request, *args, **kwargs)
+        except DatabaseError:
+            if not used:
+                raise
+            for replica in used:
+                logger.warning("Replica %s failed during %s, retrying on primary", replica, request.path)
+                mark_unavailable(replica)
+                connections[replica].close()
+            return view_func(request, *args, **kwargs)
+        finally:
+            _replica_locals.used = None
+
+    return _wrapped
+
+
+def note_replica_used(replica):
+    """Remember replicas read by the current replica_reads view"""
+    used = getattr(_replica_locals, 'used', None)
+    if used is not None:
+        used.add(replica)
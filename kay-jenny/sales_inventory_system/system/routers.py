@@ -0,0 +1,87 @@
+"""
+Database routers for branch (store) databases and read replicas
+
+Branch-local models (see branches.BRANCH_LOCAL_APPS) are read and written on
+the active branch's database; everything else lives in default. Every
+database carries the full schema, and users are copied into branch
+databases as they are saved (and by sync_branches) so foreign keys to them
+hold everywhere.
+
+ReplicaRouter runs first: for code that opted in to replica reads (see
+replicas.py) it swaps the primary chosen here for that primary's replica
+(outside transactions), and otherwise defers to BranchRouter.
+"""
+
+from django.db import connections
+
+from .branches import branch_database, get_current_branch, is_branch_local
+from . import replicas
+
+
+class BranchRouter:
+    """Route branch-local models to the active branch's database"""
+
+    def db_for_read(self, model, **hints):
+        if not is_branch_local(model):
+            return 'default'
+        # No active branch: let related lookups stay on their instance's database
+        return branch_database() if get_current_branch() else None
+
+    def db_for_write(self, model, **hints):
+        return self.db_for_read(model, **hints)
+
+    def allow_relation(self, obj1, obj2, **hints):
+        if obj1._state.db == obj2._state.db:
+            return True
+        # Users and other shared rows are replicated into every branch database
+        if not is_branch_local(obj1) or not is_branch_local(obj2):
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return None
+
+
+class ReplicaRouter:
+    """Send opted-in reads to the primary's replica when it is healthy"""
+
+    def db_for_read(self, model, **hints):
+        if not replicas.replica_reads_active():
+            return None
+        instance = hints.get('instance')
+        if instance is not None and instance._state.db:
+            primary = replicas.primary_for(instance._state.db)
+        elif is_branch_local(model):
+            primary = branch_database()
+        else:
+            primary = 'default'
+        replica = replicas.replica_for(primary)
+        if replica is None:
+            return primary
+        # Reads inside a transaction see its own uncommitted rows and locks
+        if connections[primary].in_atomic_block or not replicas.replica_usable(replica):
+            return primary
+        replicas.note_replica_used(replica)
+        return replica
+
+    def db_for_write(self, model, **hints):
+        # Reads after a write in the same request see it (read-your-writes)
+        replicas.note_write()
+        instance = hints.get('instance')
+        if instance is not None and instance._state.db:
+            # Rows loaded from a replica are saved to its primary
+            primary = replicas.primary_for(instance._state.db)
+            if primary != instance._state.db:
+                return primary
+        return None
+
+    def allow_relation(self, obj1, obj2, **hints):
+        if replicas.primary_for(obj1._state.db) == replicas.primary_for(obj2._state.db):
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Replicas receive their schema from the primary
+        if replicas.primary_for(db) != db:
+            return False
+        return None
@@ -1,29 +1,40 @@
 """
 Signal handlers for automatic audit trail tracking
 """
+import logging
+
+from django.conf import settings
+from django.db import DatabaseError, transaction
 from django.db.models.signals import post_save, post_delete, pre_save
 from django.dispatch import receiver
 from django.contrib.contenttypes.models import ContentType
 from django.forms.models import model_to_dict
-import threading
+from asgiref.local import Local
 
 from sales_inventory_system.accounts.models import User
 from sales_inventory_system.products.models import Product, Ingredient, StockTransaction
-from sales_inventory_system.orders.models import Order, Payment
+from sales_inventory_system.orders.models import Order, OrderItem, Payment
+from .activity import record_activity
+from .branches import upsert_rows
+from .conditional import bump_version
 from .models import AuditLog
+from .events import publish_event
+
+logger = logging.getLogger(__name__)
 
-# Thread-local storage for request context
-_thread_locals = threading.local()
+# Request-local storage: behaves like a thread-local for sync code and follows
+# the request across sync/async boundaries under ASGI
+_request_locals = Local()
 
 
 def get_current_user():
-    """Get current user from thread-local storage"""
-    return getattr(_thread_locals, 'user', None)
+    """Get current user from request-local storage"""
+    return getattr(_request_locals, 'user', None)
 
 
 def set_current_user(user):
-    """Set current user in thread-local storage"""
-    _thread_locals.user = user
+    """Set current user in request-local storage"""
+    _request_locals.user = user
 
 
 def serialize_model_instance(instance, exclude_fields=None):
@@ -131,6 +142,31 @@ def log_user_deletion(sender, instance, **kwargs):
     )
 
 
+@receiver(post_save, sender=User)
+def replicate_user_to_branches(sender, instance, raw=False, using='default', **kwargs):
+    """
+    Copy a saved user into every branch database once the save commits, so
+    orders and stock rows written there by a new user satisfy their foreign
+    keys. Deleted users are left in place (branch rows still point at them).
+    """
+    if raw or using != 'default' or not settings.BRANCHES:
+        return
+    pk = instance.pk
+
+    def replicate():
+        user = User.objects.using('default').filter(pk=pk).first()
+        if user is None:
+            return
+        for code, branch in settings.BRANCHES.items():
+            try:
+                upsert_rows(User, branch['database'], [user])
+            except DatabaseError:
+                # The user is saved at head office; sync_branches catches the branch up
+                logger.exception("Could not copy user %s to branch %s", user.username, code)
+
+    transaction.on_commit(replicate, using='default')
+
+
 # ==================== PRODUCT TRACKING ====================
 
 @receiver(post_save, sender=Product)
@@ -338,3 +374,68 @@ def capture_payment_before_state(sender, instance, **kwargs):
             instance._audit_before_state = serialize_model_instance(old_instance)
         except Payment.DoesNotExist:
             pass
+
+
+# ==================== ACTIVITY COUNTERS ====================
+
+@receiver(post_save, sender=AuditLog)
+def count_audit_activity(sender, instance, created, **kwargs):
+    """Keep the audit trail's per-user/model counters current (see activity.py)"""
+    if created:
+        record_activity([instance])
+
+
+@receiver(post_delete, sender=AuditLog)
+def uncount_audit_activity(sender, instance, **kwargs):
+    record_activity([instance], sign=-1)
+
+
+# ==================== LIVE EVENTS ====================
+
+@receiver(post_save, sender=Order)
+def publish_order_events(sender, instance, created, **kwargs):
+    """Push order-created / order-expired to connected cashier screens"""
+    previous_status = (getattr(instance, '_audit_before_state', None) or {}).get('status')
+
+    if created:
+        event_type = 'order-created'
+    elif instance.status == 'EXPIRED' and previous_status != 'EXPIRED':
+        event_type = 'order-expired'
+    else:
+        return
+
+    publish_event(event_type, {
+        'order_id': instance.id,
+        'order_number': instance.order_number,
+        'status': instance.status,
+        'customer_name': instance.customer_name,
+        'table_number': instance.table_number,
+    })
+
+
+@receiver(post_save, sender=Payment)
+def publish_payment_events(sender, instance, created, **kwargs):
+    """Push payment-completed to connected cashier screens"""
+    previous_status = (getattr(instance, '_audit_before_state', None) or {}).get('status')
+    if instance.status != 'COMPLETED' or (not created and previous_status == 'COMPLETED'):
+        return
+
+    publish_event('payment-completed', {
+        'order_id': instance.order_id,
+        'order_number': instance.order.order_number,
+        'method': instance.method,
+        'amount': float(instance.amount),
+    })
+
+
+# ==================== LIST VERSIONS ====================
+
+@receiver(post_save, sender=Order)
+@receiver(post_delete, sender=Order)
+@receiver(post_save, sender=OrderItem)
+@receiver(post_delete, sender=OrderItem)
+@receiver(post_save, sender=Payment)
+@receiver(post_delete, sender=Payment)
+def bump_orders_version(sender, instance, **kwargs):
+    """Order list polls revalidate (see conditional.py)"""
+    bump_version('orders')
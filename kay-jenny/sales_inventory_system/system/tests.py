@@ -1,3 +1,184 @@
-from django.test import TestCase
+import gzip
+import unittest
+from datetime import timedelta
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib.contenttypes.models import ContentType
+from django.db import connections, router, transaction
+from django.http import HttpResponse, StreamingHttpResponse
+from django.test import RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+
+from sales_inventory_system.accounts.models import User
+from sales_inventory_system.orders.models import Order
+from . import export_jobs, replicas
+from .branches import branch_database, get_current_branch, use_branch
+from .middleware import BRANCH_COOKIE, BRANCH_COOKIE_SALT, BranchMiddleware
+from .models import AuditLog, ExportFile, ExportJob
+
+# Run with two branches configured, e.g.
+# BRANCH_DATABASES=north=/tmp/north.sqlite3,south=/tmp/south.sqlite3 \
+#     python sales_inventory_system/manage.py test sales_inventory_system.system.tests
+BRANCH_CODES = sorted(settings.BRANCHES)[:2]
+
+
+@unittest.skipUnless(len(BRANCH_CODES) == 2, "needs two branches in BRANCH_DATABASES")
+class BranchDatabaseTests(TestCase):
+    """Branch routing (routers.py, branches.py) against two branch databases"""
+
+    databases = {'default', *(settings.BRANCHES[code]['database'] for code in BRANCH_CODES)}
+
+    def setUp(self):
+        self.first, self.second = BRANCH_CODES
+        self.first_db = branch_database(self.first)
+        self.second_db = branch_database(self.second)
+
+    def make_order(self, name, **fields):
+        return Order.objects.create(customer_name=name, total_amount=Decimal('100.00'), **fields)
+
+    def test_writes_and_reads_stay_in_their_branch(self):
+        with use_branch(self.first):
+            order = self.make_order('first')
+            self.assertEqual(order._state.db, self.first_db)
+        with use_branch(self.second):
+            self.make_order('second')
+            self.assertEqual(list(Order.objects.values_list('customer_name', flat=True)), ['second'])
+        with use_branch(self.first):
+            self.assertEqual(list(Order.objects.values_list('customer_name', flat=True)), ['first'])
+
+        self.assertFalse(Order.objects.using('default').exists())
+        self.assertFalse(Order.objects.using(self.second_db).filter(customer_name='first').exists())
+        self.assertFalse(Order.objects.using(self.first_db).filter(customer_name='second').exists())
+
+    def test_saved_users_are_copied_to_every_branch(self):
+        with self.captureOnCommitCallbacks(execute=True, using='default'):
+            user = User.objects.create_user('branch-cashier', password='x')
+        for alias in (self.first_db, self.second_db):
+            self.assertEqual(User.objects.using(alias).get(pk=user.pk).username, 'branch-cashier')
+
+        with self.captureOnCommitCallbacks(execute=True, using='default'):
+            user.first_name = 'Renamed'
+            user.save()
+        self.assertEqual(User.objects.using(self.second_db).get(pk=user.pk).first_name, 'Renamed')
+
+        # Branch rows can point at the new user straight away
+        with use_branch(self.first):
+            self.make_order('first', processed_by=user)
+        connections[self.first_db].check_constraints()
+
+    def test_streaming_response_keeps_the_branch(self):
+        signer = HttpResponse()
+        signer.set_signed_cookie(BRANCH_COOKIE, self.second, salt=BRANCH_COOKIE_SALT)
+        request = RequestFactory().get('/')
+        request.COOKIES[BRANCH_COOKIE] = signer.cookies[BRANCH_COOKIE].value
+
+        def view(request):
+            return StreamingHttpResponse(get_current_branch() for _ in range(2))
+
+        response = BranchMiddleware(view)(request)
+        self.assertIsNone(get_current_branch())
+        self.assertEqual(b''.join(response.streaming_content), self.second.encode() * 2)
+        self.assertIsNone(get_current_branch())
+
+    def test_switch_branch_rejects_offsite_next(self):
+        admin = User.objects.create_user('branch-admin', password='x', role='ADMIN')
+        self.client.force_login(admin)
+        response = self.client.post('/system/branch/', {'branch': self.first, 'next': 'https://evil.example/'})
+        self.assertEqual(response.url, '/')
+        response = self.client.post('/system/branch/', {'branch': self.first, 'next': '/orders/'})
+        self.assertEqual(response.url, '/orders/')
+
+
+@override_settings(READ_REPLICAS={'default': 'replica'})
+class ReplicaRouterTests(TransactionTestCase):
+    """ReplicaRouter (routers.py) with a default primary and its replica"""
+
+    # Transactions are part of what is tested, so no wrapping test transaction
+    databases = {'default'}
+
+    def setUp(self):
+        patcher = mock.patch.object(replicas, 'replica_usable', return_value=True)
+        self.replica_usable = patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(replicas.reset_request_state)
+
+    def test_reads_go_to_the_replica_only_when_opted_in(self):
+        self.assertEqual(Order.objects.all().db, 'default')
+        with replicas.use_replica():
+            self.assertEqual(Order.objects.all().db, 'replica')
+            self.assertEqual(User.objects.all().db, 'replica')
+        self.assertEqual(Order.objects.all().db, 'default')
+
+    def test_unusable_replica_falls_back_to_primary(self):
+        self.replica_usable.return_value = False
+        with replicas.use_replica():
+            self.assertEqual(Order.objects.all().db, 'default')
+
+    def test_writes_go_to_the_primary(self):
+        with replicas.use_replica():
+            self.assertEqual(router.db_for_write(Order), 'default')
+            loaded = Order(customer_name='replica row')
+            loaded._state.db = 'replica'
+            self.assertEqual(router.db_for_write(Order, instance=loaded), 'default')
+            # Read-your-writes: the rest of the block reads the primary
+            self.assertEqual(Order.objects.all().db, 'default')
+
+    def test_reads_in_a_transaction_stay_on_the_primary(self):
+        with replicas.use_replica():
+            with transaction.atomic():
+                self.assertEqual(Order.objects.all().db, 'default')
+            self.assertEqual(Order.objects.all().db, 'replica')
+
+    def test_saved_rows_stay_on_the_primary(self):
+        with replicas.use_replica():
+            order = Order.objects.create(customer_name='primary', total_amount=Decimal('10.00'))
+        self.assertEqual(order._state.db, 'default')
+        self.assertTrue(Order.objects.using('default').filter(pk=order.pk).exists())
+
+
+class ExportJobTests(TestCase):
+    """Background CSV exports (export_jobs.py) with and without a worker"""
+
+    def setUp(self):
+        self.admin = User.objects.create_user('export-admin', password='x', role='ADMIN')
+        AuditLog.objects.create(
+            user=self.admin, action='CREATE', content_type=ContentType.objects.get_for_model(User),
+            object_id=self.admin.pk, model_name='User', record_id=self.admin.pk, description='exported row',
+        )
+        self.client.force_login(self.admin)
+
+    def request_export(self):
+        response = self.client.post('/system/audit-trail/export/', {'date_range': 'all'})
+        self.assertEqual(response.url, '/system/exports/')
+        return ExportJob.objects.get(user=self.admin)
+
+    def download(self, job):
+        response = self.client.get(f'/system/exports/{job.pk}/download/')
+        return gzip.decompress(b''.join(response.streaming_content)).decode()
+
+    @override_settings(EXPORT_BACKGROUND=False)
+    def test_request_builds_the_export_without_a_worker(self):
+        job = self.request_export()
+        self.assertEqual(job.status, 'DONE')
+        self.assertIn('exported row', self.download(job))
+
+    @override_settings(EXPORT_BACKGROUND=True)
+    def test_worker_builds_the_queued_export(self):
+        job = self.request_export()
+        self.assertEqual(job.status, 'PENDING')
+
+        job = export_jobs.run_job(export_jobs.claim_next())
+        self.assertEqual(job.status, 'DONE')
+        self.assertEqual(job.file_size, len(ExportFile.objects.get(job=job).content))
+        self.assertIn('exported row', self.download(job))
+        self.assertIsNone(export_jobs.claim_next())
+
+    @override_settings(EXPORT_BACKGROUND=False)
+    def test_expired_exports_are_deleted_with_their_files(self):
+        job = self.request_export()
+        ExportJob.objects.filter(pk=job.pk).update(created_at=timezone.now() - timedelta(days=30))
+
+        self.assertEqual(export_jobs.cleanup(), 1)
+        self.assertFalse(ExportFile.objects.exists())
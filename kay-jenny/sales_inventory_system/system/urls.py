@@ -6,5 +6,12 @@ app_name = 'system'
 urlpatterns = [
     path('audit/', views.system_audit_trail, name='audit_trail'),
     path('audit-trail/export/', views.export_audit_trail, name='audit_trail_export'),
+    path('exports/', views.my_exports, name='my_exports'),
+    path('exports/<int:pk>/download/', views.export_download, name='export_download'),
+    path('exports/<int:pk>/delete/', views.export_delete, name='export_delete'),
+    path('branch/', views.switch_branch, name='switch_branch'),
+    path('profiles/', views.profiles, name='profiles'),
+    path('profiles/<str:name>/', views.profile_detail, name='profile_detail'),
+    path('profiles/<str:name>/download/', views.profile_download, name='profile_download'),
 
 ]
@@ -1,17 +1,36 @@
-from django.shortcuts import render, get_object_or_404
+from django.conf import settings
+from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required, user_passes_test
 from django.core.paginator import Paginator
-from django.http import JsonResponse
+from django.contrib import messages
+from django.http import FileResponse, Http404, HttpResponseNotAllowed, JsonResponse
+from django.db.models import Max
 from django.utils import timezone
+from django.utils.http import url_has_allowed_host_and_scheme
 from datetime import timedelta
+import io
+import time
 
 from sales_inventory_system.accounts.models import User
 from sales_inventory_system.accounts.views import is_admin
-from .models import AuditLog
+from . import activity, export_jobs, profiling
+from .conditional import conditional_list
+from .middleware import BRANCH_COOKIE, BRANCH_COOKIE_SALT
+from .branches import current_branch_code
+from .models import AuditLog, ExportFile, ExportJob
+
+
+def _audit_trail_version(request):
+    """Newest audit row id (rows are append-only); relative date ranges move with the clock"""
+    latest = AuditLog.objects.aggregate(latest=Max('id'))['latest']
+    if request.GET.get('date_range', '30') == 'all':
+        return latest
+    return f"{latest}-{int(time.time() // 60)}"
 
 
 @login_required
 @user_passes_test(is_admin)
+@conditional_list(_audit_trail_version)
 def system_audit_trail(request):
     """System-wide audit trail with filtering"""
 
@@ -20,6 +39,7 @@ def system_audit_trail(request):
     action_filter = request.GET.get('action', '')
     model_filter = request.GET.get('model', '')
     date_range = request.GET.get('date_range', '30')  # Default: last 30 days
+    branch_filter = request.GET.get('branch', '')
 
     # Base queryset
     audit_logs = AuditLog.objects.select_related('user', 'content_type').all()
@@ -37,6 +57,9 @@ def system_audit_trail(request):
     if model_filter:
         audit_logs = audit_logs.filter(model_name=model_filter)
 
+    if branch_filter:
+        audit_logs = audit_logs.filter(branch=branch_filter)
+
     # Date range filter
     if date_range != 'all':
         try:
@@ -46,15 +69,15 @@ def system_audit_trail(request):
         except (ValueError, TypeError):
             pass
 
-    # Get unique users and models for filter dropdowns
-    users = User.objects.filter(audit_logs__isnull=False).distinct().order_by('username')
-    models = AuditLog.objects.values_list('model_name', flat=True).distinct().order_by('model_name')
+    # Filter dropdowns come from the activity counters, not a scan of the audit table
+    users = activity.active_users()
+    models = activity.model_names()
 
     # Pagination
-    total_count = audit_logs.count()
     paginator = Paginator(audit_logs, 50)
     page_number = request.GET.get('page', 1)
     page_obj = paginator.get_page(page_number)
+    total_count = paginator.count  # already counted by the paginator
 
     # Handle AJAX requests
     if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
@@ -65,6 +88,7 @@ def system_audit_trail(request):
                 'user': log.user.username if log.user else 'System',
                 'action': log.action,
                 'model_name': log.model_name,
+                'branch': log.branch,
                 'record_id': log.record_id,
                 'description': log.description[:100] if log.description else '',
                 'created_at': log.created_at.strftime('%b %d, %g:%M %p'),
@@ -88,6 +112,7 @@ def system_audit_trail(request):
                 'user': user_filter,
                 'action': action_filter,
                 'model': model_filter,
+                'branch': branch_filter,
                 'date_range': date_range,
             }
         })
@@ -105,60 +130,12 @@ def system_audit_trail(request):
 
     return render(request, 'system/audit.html', context)
 
-import csv
-from django.http import HttpResponse
-
 @login_required
 @user_passes_test(is_admin)
 def export_audit_trail(request):
-    user_filter = request.GET.get('user', '')
-    action_filter = request.GET.get('action', '')
-    model_filter = request.GET.get('model', '')
-    date_range = request.GET.get('date_range', '30')
-
-    audit_logs = AuditLog.objects.select_related('user').all()
-
-    if user_filter:
-        audit_logs = audit_logs.filter(user_id=user_filter)
-
-    if action_filter:
-        audit_logs = audit_logs.filter(action=action_filter)
-
-    if model_filter:
-        audit_logs = audit_logs.filter(model_name=model_filter)
-
-    if date_range != 'all':
-        try:
-            days = int(date_range)
-            start_date = timezone.now() - timedelta(days=days)
-            audit_logs = audit_logs.filter(created_at__gte=start_date)
-        except:
-            pass
-
-    response = HttpResponse(content_type='text/csv')
-    response['Content-Disposition'] = 'attachment; filename="audit_trail.csv"'
-
-    writer = csv.writer(response)
-    writer.writerow([
-        'Timestamp',
-        'User',
-        'Action',
-        'Model',
-        'Record ID',
-        'Description'
-    ])
-
-    for log in audit_logs:
-        writer.writerow([
-            log.created_at.strftime('%Y-%m-%d %H:%M:%S'),
-            log.user.username if log.user else 'System',
-            log.action,
-            log.model_name,
-            log.record_id,
-            log.description
-        ])
-
-    return response
+    """Queue a CSV export of the audit trail with the page's filters (POST)"""
+    params = {key: request.POST.get(key, '') for key in ('user', 'action', 'model', 'branch', 'date_range')}
+    return queue_export(request, 'AUDIT_TRAIL', params)
 
 @login_required
 @user_passes_test(is_admin)
@@ -185,23 +162,24 @@ def user_audit_trail(request, pk):
     if model_filter:
         audit_logs = audit_logs.filter(model_name=model_filter)
 
-    # Get unique models for this user
-    models = AuditLog.objects.filter(user=user).values_list('model_name', flat=True).distinct().order_by('model_name')
+    # Models this user has touched (from the activity counters)
+    models = activity.model_names(user)
 
     # Pagination
-    total_count = audit_logs.count()
     paginator = Paginator(audit_logs, 50)
     page_number = request.GET.get('page', 1)
     page_obj = paginator.get_page(page_number)
+    total_count = paginator.count  # already counted by the paginator
 
-    # Get statistics
+    # Get statistics (one query on the activity counters)
+    counts = activity.user_action_counts(user)
     stats = {
-        'total_actions': AuditLog.objects.filter(user=user).count(),
-        'creates': AuditLog.objects.filter(user=user, action='CREATE').count(),
-        'updates': AuditLog.objects.filter(user=user, action='UPDATE').count(),
-        'deletes': AuditLog.objects.filter(user=user, action='DELETE').count(),
-        'archives': AuditLog.objects.filter(user=user, action='ARCHIVE').count(),
-        'restores': AuditLog.objects.filter(user=user, action='RESTORE').count(),
+        'total_actions': sum(counts.values()),
+        'creates': counts['CREATE'],
+        'updates': counts['UPDATE'],
+        'deletes': counts['DELETE'],
+        'archives': counts['ARCHIVE'],
+        'restores': counts['RESTORE'],
     }
 
     # Handle AJAX requests
@@ -249,3 +227,180 @@ def user_audit_trail(request, pk):
     }
 
     return render(request, 'accounts/user_audit_trail.html', context)
+
+
+@login_required
+@user_passes_test(is_admin)
+def switch_branch(request):
+    """
+    Tie this terminal to a branch (POST code; blank = head office).
+    Stored in a signed cookie so it survives cashier logins and logouts.
+    """
+    code = request.POST.get('branch', '').strip() if request.method == 'POST' else ''
+    next_url = request.POST.get('next') or request.META.get('HTTP_REFERER') or '/'
+    if request.method != 'POST':
+        return JsonResponse({
+            'current': getattr(request, 'branch', None),
+            'branches': [
+                {'code': branch_code, 'name': branch['name']}
+                for branch_code, branch in settings.BRANCHES.items()
+            ],
+        })
+
+    if code and code not in settings.BRANCHES:
+        return JsonResponse({'success': False, 'message': f'Unknown branch: {code}'}, status=400)
+
+    if not url_has_allowed_host_and_scheme(next_url, allowed_hosts={request.get_host()}, require_https=request.is_secure()):
+        next_url = '/'
+    response = redirect(next_url)
+    if code:
+        response.set_signed_cookie(
+            BRANCH_COOKIE, code, salt=BRANCH_COOKIE_SALT,
+            max_age=365 * 24 * 3600, httponly=True, samesite='Lax',
+            secure=request.is_secure(),
+        )
+    else:
+        response.delete_cookie(BRANCH_COOKIE)
+    return response
+
+
+@login_required
+@user_passes_test(is_admin)
+def profiles(request):
+    """Switch request profiling on/off and list captured profiles"""
+    if request.method == 'POST':
+        if request.POST.get('action') == 'disable':
+            profiling.disable()
+            messages.success(request, 'Profiling switched off.')
+        else:
+            try:
+                profiling.save_config(
+                    path_pattern=request.POST.get('path_pattern', '').strip(),
+                    sample_rate=float(request.POST.get('sample_percent') or 100) / 100,
+                    minutes=int(request.POST.get('minutes') or 30),
+                    user=request.user,
+                )
+            except ValueError as exc:
+                messages.error(request, str(exc))
+            else:
+                messages.success(request, 'Profiling switched on.')
+        return redirect('system:profiles')
+
+    config = profiling.load_config()
+    context = {
+        'config': config,
+        'active': profiling.is_active(config),
+        'captures': profiling.list_captures(),
+        'retention_days': settings.PROFILER_RETENTION_DAYS,
+        'max_minutes': settings.PROFILER_MAX_MINUTES,
+    }
+    return render(request, 'system/profiles.html', context)
+
+
+@login_required
+@user_passes_test(is_admin)
+def profile_detail(request, name):
+    """Top functions and queries of one captured request"""
+    capture = profiling.get_capture(name)
+    if capture is None:
+        raise Http404('Profile not found')
+    context = {
+        'capture': capture,
+        'has_dump': profiling.capture_dump_path(name) is not None,
+    }
+    return render(request, 'system/profile_detail.html', context)
+
+
+@login_required
+@user_passes_test(is_admin)
+def profile_download(request, name):
+    """cProfile dump of a capture (open with snakeviz or flameprof)"""
+    path = profiling.capture_dump_path(name)
+    if path is None:
+        raise Http404('Profile not found')
+    return FileResponse(open(path, 'rb'), as_attachment=True, filename=f"{name}.prof")
+
+
+def queue_export(request, export_type, params):
+    """
+    Queue a background export for the current user and branch, then send
+    them to My Exports (used by every report's download button).
+    Queueing writes, so it only answers POST. Without a worker
+    (EXPORT_BACKGROUND off) the file is built here before redirecting.
+    """
+    if request.method != 'POST':
+        return HttpResponseNotAllowed(['POST'])
+    try:
+        job, created = export_jobs.submit(request.user, export_type, params, branch=current_branch_code())
+    except export_jobs.ExportJobError as exc:
+        messages.error(request, str(exc))
+    else:
+        if not settings.EXPORT_BACKGROUND and job.status == 'PENDING':
+            job = export_jobs.run_now(job)
+        if job is None:
+            messages.info(request, 'The export was cancelled.')
+        elif job.status == 'DONE':
+            messages.success(request, f'{job.get_export_type_display()} export is ready to download.')
+        elif job.status == 'FAILED':
+            messages.error(request, f'{job.get_export_type_display()} export failed: {job.error}')
+        elif created:
+            messages.success(request, f'{job.get_export_type_display()} export queued. It will be ready to download here shortly.')
+        else:
+            messages.info(request, f'{job.get_export_type_display()} export is already being prepared.')
+    return redirect('system:my_exports')
+
+
+def _export_job_data(job):
+    return {
+        'id': job.id,
+        'export_type': job.get_export_type_display(),
+        'status': job.status,
+        'status_display': job.get_status_display(),
+        'progress': job.progress,
+        'rows_written': job.rows_written,
+        'total_rows': job.total_rows,
+        'file_size': job.file_size,
+        'error': job.error,
+        'created_at': timezone.localtime(job.created_at).strftime('%b %d, %Y %I:%M %p'),
+    }
+
+
+@login_required
+def my_exports(request):
+    """The user's queued and finished exports (polls its own URL for progress)"""
+    jobs = ExportJob.objects.filter(user=request.user)[:50]
+
+    if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
+        return JsonResponse({
+            'success': True,
+            'jobs': [_export_job_data(job) for job in jobs],
+        })
+
+    context = {
+        'jobs': jobs,
+        'retention_hours': settings.EXPORT_RETENTION_HOURS,
+        'max_active': settings.EXPORT_MAX_ACTIVE_PER_USER,
+    }
+    return render(request, 'system/my_exports.html', context)
+
+
+@login_required
+def export_download(request, pk):
+    """Compressed CSV of one of the user's finished exports"""
+    job = get_object_or_404(ExportJob, pk=pk, user=request.user, status='DONE')
+    content = ExportFile.objects.filter(job=job).values_list('content', flat=True).first()
+    if content is None:
+        raise Http404('Export file not found')
+    return FileResponse(
+        io.BytesIO(content), as_attachment=True, filename=job.download_name, content_type='application/gzip'
+    )
+
+
+@login_required
+def export_delete(request, pk):
+    """Cancel or remove one of the user's exports (POST)"""
+    if request.method != 'POST':
+        return JsonResponse({'success': False, 'message': 'Invalid request method'}, status=405)
+    job = get_object_or_404(ExportJob, pk=pk, user=request.user)
+    export_jobs.delete_job(job)
+    return JsonResponse({'success': True, 'message': 'Export removed'})